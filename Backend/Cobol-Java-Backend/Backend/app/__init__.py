@@ -26,10 +26,13 @@ def create_app():
         logger.info(f"Ensured directory exists: {directory}")
 
     # Register blueprints
-    from .routes import analysis, conversion, cobol_analyzer
+    from .routes import analysis, conversion, cobol_analyzer, misc, jobs, batch
     app.register_blueprint(analysis.bp)
     app.register_blueprint(conversion.bp)
     app.register_blueprint(cobol_analyzer)  # Fixed: removed .bp since cobol_analyzer is already the blueprint
+    app.register_blueprint(misc.bp)
+    app.register_blueprint(jobs.bp)
+    app.register_blueprint(batch.bp)
 
     with app.app_context():
         try:
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
@@ -11,6 +12,15 @@ load_dotenv()
 AZURE_OPENAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_KEY = os.environ.get("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
+AZURE_OPENAI_API_VERSION = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
+
+# Shared HTTP connection pool for Azure OpenAI traffic
+LLM_HTTP2 = os.environ.get("LLM_HTTP2", "True").lower() == "true"
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", 100))
+LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE", 20))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", 60))
+LLM_HTTP_TIMEOUT = float(os.environ.get("LLM_HTTP_TIMEOUT", 600))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.environ.get("LLM_HTTP_CONNECT_TIMEOUT", 10))
 
 # Azure configuration for RAG and CICS analysis
 AZURE_CONFIG = {
@@ -25,12 +35,126 @@ AZURE_CONFIG = {
     "AZURE_OPENAI_DEPLOYMENT": "gpt-4o"
 }
 
+# Chunk conversion concurrency
+CHUNK_CONVERSION_WORKERS = int(os.environ.get("CHUNK_CONVERSION_WORKERS", 4))
+CHUNK_CONVERSION_TIMEOUT = float(os.environ.get("CHUNK_CONVERSION_TIMEOUT", 300))
+# Azure OpenAI rate limiting, per deployment: request/token budgets per minute (0 = unlimited),
+# adaptive concurrency bounds and retry policy for throttled or transient failures
+LLM_RPM_LIMIT = int(os.environ.get("LLM_RPM_LIMIT", 0))
+LLM_TPM_LIMIT = int(os.environ.get("LLM_TPM_LIMIT", 0))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_MIN_CONCURRENCY = int(os.environ.get("LLM_MIN_CONCURRENCY", 1))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 5))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", 1.0))
+LLM_RETRY_MAX_DELAY = float(os.environ.get("LLM_RETRY_MAX_DELAY", 60.0))
+
+# Deployment pool: JSON list of deployments sharing the load of a model, e.g.
+# [{"name": "uk", "endpoint": "https://uk.openai.azure.com", "api_key": "...", "deployment": "gpt-4o", "weight": 2},
+#  {"name": "se", "endpoint": "https://se.openai.azure.com", "api_key": "...", "deployment": "gpt-4o", "tpm": 300000}]
+# Each entry serves "model" (default AZURE_OPENAI_DEPLOYMENT_NAME); omitted endpoint, key and version
+# default to the AZURE_OPENAI_* settings. Empty sends all traffic to the single configured deployment.
+LLM_DEPLOYMENTS = json.loads(os.environ.get("LLM_DEPLOYMENTS") or "[]")
+# Routing strategy across a pool ("least_loaded" or "quota_aware") and how long a failing deployment
+# is taken out of rotation (doubling per consecutive failure up to the maximum)
+LLM_ROUTING_STRATEGY = os.environ.get("LLM_ROUTING_STRATEGY", "least_loaded").lower()
+LLM_DEPLOYMENT_COOLDOWN = float(os.environ.get("LLM_DEPLOYMENT_COOLDOWN", 5.0))
+LLM_DEPLOYMENT_MAX_COOLDOWN = float(os.environ.get("LLM_DEPLOYMENT_MAX_COOLDOWN", 120.0))
+
+# Follow-up calls made to complete a reply cut off at its max_tokens limit
+LLM_MAX_CONTINUATIONS = int(os.environ.get("LLM_MAX_CONTINUATIONS", 3))
+
+# Hedged requests: a chunk or test call still running after the given latency percentile of its
+# kind is duplicated (on LLM_HEDGE_DEPLOYMENTS round-robin, else the same deployment) and the
+# first success wins; duplicates are capped at LLM_HEDGE_BUDGET of all calls
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "False").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 95))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", 5.0))
+LLM_HEDGE_BUDGET = float(os.environ.get("LLM_HEDGE_BUDGET", 0.1))
+LLM_HEDGE_DEPLOYMENTS = [d.strip() for d in os.environ.get("LLM_HEDGE_DEPLOYMENTS", "").split(",") if d.strip()]
+
+# Per-stage model tiering: JSON object mapping a pipeline stage (see utils/model_profiles.py) to its
+# deployment and sampling options, e.g. {"code_polish": {"model": "gpt-4o-mini", "max_tokens": 4000}}.
+# LLM_LIGHT_DEPLOYMENT, when set, serves the lightweight stages (code polish, code structure,
+# unit tests, technical requirements) unless LLM_STAGE_PROFILES says otherwise
+LLM_STAGE_PROFILES = json.loads(os.environ.get("LLM_STAGE_PROFILES") or "{}")
+LLM_LIGHT_DEPLOYMENT = os.environ.get("LLM_LIGHT_DEPLOYMENT", "")
+
+# Async gateway: LLM requests awaited at once per event loop (the rate limiters still apply).
+# LLM_ASYNC_PIPELINES runs the Flask analysis and conversion routes on the async pipelines
+# through a shared background event loop instead of one thread per LLM call
+LLM_ASYNC_MAX_IN_FLIGHT = int(os.environ.get("LLM_ASYNC_MAX_IN_FLIGHT", 64))
+LLM_ASYNC_PIPELINES = os.environ.get("LLM_ASYNC_PIPELINES", "False").lower() == "true"
+
+# Prompt token budgets: context window per deployment name as JSON, e.g. {"my-gpt4o": 128000},
+# and the window assumed for deployments that are neither listed nor named after a known model
+LLM_CONTEXT_WINDOWS = json.loads(os.environ.get("LLM_CONTEXT_WINDOWS") or "{}")
+LLM_DEFAULT_CONTEXT_WINDOW = int(os.environ.get("LLM_DEFAULT_CONTEXT_WINDOW", 128000))
+# Code chunk size and overlap for chunked conversion, in tokens
+CHUNK_TOKEN_SIZE = int(os.environ.get("CHUNK_TOKEN_SIZE", 6000))
+CHUNK_TOKEN_OVERLAP = int(os.environ.get("CHUNK_TOKEN_OVERLAP", 250))
+# Concurrent per-file unit/functional test generation calls during conversion
+TEST_GENERATION_WORKERS = int(os.environ.get("TEST_GENERATION_WORKERS", 4))
+
+# Render cobol_analysis/target_structure in prompts as compact outlines instead of pretty-printed JSON
+PROMPT_COMPACT_ARTIFACTS = os.environ.get("PROMPT_COMPACT_ARTIFACTS", "True").lower() == "true"
+
+# Worker processes used by create_cobol_json (0 = one per CPU core, 1 = analyze in-process),
+# files handed to a worker per task (0 = sized from the file count) and the smallest
+# project that is worth the cost of the process pool
+COBOL_ANALYSIS_WORKERS = int(os.environ.get("COBOL_ANALYSIS_WORKERS", 0))
+COBOL_ANALYSIS_CHUNK_SIZE = int(os.environ.get("COBOL_ANALYSIS_CHUNK_SIZE", 0))
+COBOL_ANALYSIS_PARALLEL_MIN_FILES = int(os.environ.get("COBOL_ANALYSIS_PARALLEL_MIN_FILES", 8))
+# Reuse per-file analyses of unchanged files, cached next to output/analysis/<project_id>
+COBOL_ANALYSIS_CACHE_ENABLED = os.environ.get("COBOL_ANALYSIS_CACHE_ENABLED", "True").lower() == "true"
+# Cached analyses kept decoded in memory between runs, bounded by the size of their JSON (0 = off)
+COBOL_ANALYSIS_MEMO_MAX_BYTES = int(os.environ.get("COBOL_ANALYSIS_MEMO_MAX_BYTES", 512 * 1024 * 1024))
+# Resolve COPY statements (including REPLACING) against the project's .cpy files and add the
+# copied data items to the analysis of the program that copies them
+COBOL_EXPAND_COPYBOOKS = os.environ.get("COBOL_EXPAND_COPYBOOKS", "True").lower() == "true"
+# "fixed" reads COBOL sources as reference format (sequence area, indicator column, columns 8-72);
+# "free" reads whole lines
+COBOL_SOURCE_FORMAT = os.environ.get("COBOL_SOURCE_FORMAT", "free").lower()
+
+# Maximum number of analyze-requirements stages running concurrently
+ANALYSIS_STAGE_WORKERS = int(os.environ.get("ANALYSIS_STAGE_WORKERS", 4))
+
+# Background job workers and number of finished jobs kept for status polling
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_HISTORY_LIMIT = int(os.environ.get("JOB_HISTORY_LIMIT", 200))
+# Deadline of one analysis/conversion run in seconds (0 = none) and how often the
+# client connection of a synchronous request is checked; LLM work stops at either
+PIPELINE_TIMEOUT_SECONDS = float(os.environ.get("PIPELINE_TIMEOUT_SECONDS", 1800))
+CLIENT_DISCONNECT_POLL_SECONDS = float(os.environ.get("CLIENT_DISCONNECT_POLL_SECONDS", 1.0))
+
+# Interval between keep-alive frames on Server-Sent Event streams
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+
 # Directory configurations
 UPLOAD_DIR = "uploads"
 
 # Output directory
 output_dir = 'output'
 
+# LLM response cache
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "True").lower() == "true"
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(output_dir, "llm_cache", "responses.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 5000))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Offline batch mode for portfolio conversions: "azure" submits to the Batch API,
+# "local" runs the same JSONL through the interactive client (for tests and dev)
+LLM_BATCH_BACKEND = os.environ.get("LLM_BATCH_BACKEND", "azure").lower()
+# Batch deployments are separate (Global Batch) deployments on Azure
+LLM_BATCH_DEPLOYMENT = os.environ.get("LLM_BATCH_DEPLOYMENT", AZURE_OPENAI_DEPLOYMENT_NAME)
+LLM_BATCH_DIR = os.environ.get("LLM_BATCH_DIR", os.path.join(output_dir, "batch"))
+LLM_BATCH_MAX_REQUESTS = int(os.environ.get("LLM_BATCH_MAX_REQUESTS", 50000))
+LLM_BATCH_MAX_FILE_BYTES = int(os.environ.get("LLM_BATCH_MAX_FILE_BYTES", 190 * 1024 * 1024))
+LLM_BATCH_POLL_SECONDS = float(os.environ.get("LLM_BATCH_POLL_SECONDS", 60))
+LLM_BATCH_TIMEOUT = float(os.environ.get("LLM_BATCH_TIMEOUT", 24 * 3600))
+LLM_BATCH_COMPLETION_WINDOW = os.environ.get("LLM_BATCH_COMPLETION_WINDOW", "24h")
+
 # Logging setup
 def setup_logging():
     # Get the root logger
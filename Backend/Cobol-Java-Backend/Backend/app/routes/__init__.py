@@ -1,4 +1,6 @@
 from .analysis import bp as analysis_bp
 from .conversion import bp as conversion_bp
 from .misc import bp as misc_bp
-from .cobol_analyzer_routes import bp as cobol_analyzer
\ No newline at end of file
+from .cobol_analyzer_routes import bp as cobol_analyzer
+from .jobs import bp as jobs_bp
+from .batch import bp as batch_bp
\ No newline at end of file
@@ -1,30 +1,39 @@
 from flask import Blueprint, request, jsonify, current_app
-from ..config import logger, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_NAME
-from openai import AzureOpenAI
-import json, traceback, os
+from ..config import logger, ANALYSIS_STAGE_WORKERS, LLM_ASYNC_PIPELINES
+import asyncio, json, traceback, os
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from ..utils.prompts import (
     create_business_requirements_prompt,
-    create_technical_requirements_prompt
+    create_technical_requirements_prompt,
+    TARGET_STRUCTURE_FORMAT,
+    BUSINESS_REQUIREMENTS_FORMAT,
+    TECHNICAL_REQUIREMENTS_FORMAT
 )
 from ..utils.logs import (
     log_request_details,
     log_processing_step,
     log_gpt_interaction
 )
-from ..utils.response import extract_json_from_response
+from ..utils.llm_client import get_llm_client
+from ..utils.llm_gateway import structured_completion, structured_completion_async
 from ..utils.file_classifier import classify_uploaded_files
+from ..utils.source_reader import count_lines
 from ..utils.rag_indexer import load_vector_store, query_vector_store, index_files_for_rag
 from ..utils.cobol_analyzer import create_cobol_json
+from ..utils.jobs import job_manager, JOB_SUCCEEDED
+from ..utils.cancellation import CancellationToken, ClientDisconnectWatcher, OperationCancelled
+from ..utils.errors import RequestError
+from ..utils.stage_graph import StageGraph
+from ..utils.async_bridge import run_sync
+from ..utils.model_profiles import get_stage_profile, TARGET_STRUCTURE, BUSINESS_REQUIREMENTS, TECHNICAL_REQUIREMENTS
+from ..utils.prompt_serializer import render_for_prompt, render_cobol_analysis, render_target_structure, summarize_savings
 
 bp = Blueprint('analysis', __name__, url_prefix='/cobo')
 
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    api_version="2023-05-15",
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-)
+ANALYSIS_JOB = "analyze-requirements"
+
+client = get_llm_client()
 
 def enhanced_classify_files(file_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
     """Enhanced file classification using existing classifier"""
@@ -52,7 +61,7 @@ def enhanced_classify_files(file_data: Dict[str, Any]) -> Dict[str, List[Dict[st
                         "content": file_info.get("content", ""),
                         "size": len(file_info.get("content", "")),
                         "extension": Path(file_info["fileName"]).suffix.lower(),
-                        "lines": len(str(file_info.get("content", "")).split('\n'))
+                        "lines": count_lines(str(file_info.get("content", "")))
                     }
                     enhanced[category].append(enhanced_file_info)
     
@@ -74,10 +83,8 @@ def get_cobol_files_for_analysis(classified_files: Dict[str, List[Dict[str, Any]
     
     return analysis_files
 
-def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any], classified_files: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
-    """Create target structure analysis using GPT"""
-    logger.info(f"=== TARGET STRUCTURE ANALYSIS STARTED for project: {project_id} ===")
-    
+def target_structure_messages(classified_files: Dict[str, List[Dict[str, Any]]]) -> Optional[List[Dict[str, str]]]:
+    """Build the chat messages of the target structure call, or None without COBOL content"""
     # Combine all COBOL-related content
     cobol_content = ""
     for category in ["COBOL Code", "Copybooks", "JCL"]:
@@ -85,8 +92,7 @@ def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any],
             cobol_content += f"\n\n=== {file_info['fileName']} ===\n{file_info['content']}"
     
     if not cobol_content.strip():
-        logger.warning("No COBOL content found for target structure analysis")
-        return {"error": "No COBOL content available for analysis"}
+        return None
     
     structure_prompt = f"""
     You are an expert software architect specializing in COBOL to .NET 8 migration. 
@@ -98,10 +104,6 @@ def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any],
     - .NET 8 best practices
     - Modern software patterns
     
-    Analyze the following COBOL code and provide a detailed target structure:
-    
-    {cobol_content}
-    
     Provide your analysis in the following JSON format:
     {{
       "project_name": "string",
@@ -206,62 +208,126 @@ def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any],
     8. Security considerations
     9. Logging and auditing requirements
     10. Integration points
+    
+    Analyze the following COBOL code and provide a detailed target structure:
+    
+    {cobol_content}
     """
     
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are an expert software architect specializing in COBOL to .NET 8 migration. "
+                "You understand legacy mainframe systems and modern .NET architecture patterns. "
+                "Your task is to analyze COBOL code and design a comprehensive, modern .NET 8 project structure "
+                "that maintains all business logic while following current best practices."
+            )
+        },
+        {
+            "role": "user",
+            "content": structure_prompt
+        }
+    ]
+
+def save_target_structure(project_id: str, structure_json: Dict[str, Any]) -> None:
+    """Save the target structure JSON next to the other analysis outputs"""
+    output_dir = os.path.join("output", "analysis", project_id)
+    os.makedirs(output_dir, exist_ok=True)
+    structure_path = os.path.join(output_dir, "target_structure.json")
+    with open(structure_path, "w") as f:
+        json.dump(structure_json, f, indent=2)
+    logger.info(f"Target structure saved to: {structure_path}")
+
+def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any], classified_files: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Create target structure analysis using GPT"""
+    logger.info(f"=== TARGET STRUCTURE ANALYSIS STARTED for project: {project_id} ===")
+    
+    structure_msgs = target_structure_messages(classified_files)
+    if structure_msgs is None:
+        logger.warning("No COBOL content found for target structure analysis")
+        return {"error": "No COBOL content available for analysis"}
+    
     try:
-        structure_msgs = [
-            {
-                "role": "system",
-                "content": (
-                    "You are an expert software architect specializing in COBOL to .NET 8 migration. "
-                    "You understand legacy mainframe systems and modern .NET architecture patterns. "
-                    "Your task is to analyze COBOL code and design a comprehensive, modern .NET 8 project structure "
-                    "that maintains all business logic while following current best practices."
-                )
-            },
-            {
-                "role": "user",
-                "content": structure_prompt
-            }
-        ]
-        
         log_processing_step("Calling GPT for target structure analysis", {
-            "prompt_length": len(structure_prompt),
+            "prompt_length": len(structure_msgs[1]["content"]),
             "project_id": project_id
         }, "TARGET_STRUCTURE")
         
-        structure_response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT_NAME,
+        profile = get_stage_profile(TARGET_STRUCTURE)
+        structure_json, structure_response = structured_completion(
+            client,
+            model=profile.model,
             messages=structure_msgs,
-            temperature=0.2,
-            max_tokens=4000
+            response_format=TARGET_STRUCTURE_FORMAT,
+            **profile.request_options()
         )
         
-        log_gpt_interaction("TARGET_STRUCTURE", AZURE_OPENAI_DEPLOYMENT_NAME, structure_msgs, structure_response)
+        log_gpt_interaction("TARGET_STRUCTURE", profile.model, structure_msgs, structure_response)
+        save_target_structure(project_id, structure_json)
         
-        structure_json = extract_json_from_response(structure_response.choices[0].message.content)
+        logger.info("=== TARGET STRUCTURE ANALYSIS COMPLETED ===")
+        return structure_json
         
-        # Save target structure JSON
-        output_dir = os.path.join("output", "analysis", project_id)
-        os.makedirs(output_dir, exist_ok=True)
-        structure_path = os.path.join(output_dir, "target_structure.json")
-        with open(structure_path, "w") as f:
-            json.dump(structure_json, f, indent=2)
-        logger.info(f"Target structure saved to: {structure_path}")
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating target structure analysis: {str(e)}")
+        return {"error": str(e)}
+
+async def create_target_structure_analysis_async(project_id: str, file_data: Dict[str, Any], classified_files: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Async counterpart of create_target_structure_analysis"""
+    logger.info(f"=== TARGET STRUCTURE ANALYSIS STARTED for project: {project_id} ===")
+    
+    structure_msgs = target_structure_messages(classified_files)
+    if structure_msgs is None:
+        logger.warning("No COBOL content found for target structure analysis")
+        return {"error": "No COBOL content available for analysis"}
+    
+    try:
+        log_processing_step("Calling GPT for target structure analysis", {
+            "prompt_length": len(structure_msgs[1]["content"]),
+            "project_id": project_id
+        }, "TARGET_STRUCTURE")
+        
+        profile = get_stage_profile(TARGET_STRUCTURE)
+        structure_json, structure_response = await structured_completion_async(
+            None,
+            model=profile.model,
+            messages=structure_msgs,
+            response_format=TARGET_STRUCTURE_FORMAT,
+            **profile.request_options()
+        )
+        
+        log_gpt_interaction("TARGET_STRUCTURE", profile.model, structure_msgs, structure_response)
+        await asyncio.to_thread(save_target_structure, project_id, structure_json)
         
         logger.info("=== TARGET STRUCTURE ANALYSIS COMPLETED ===")
         return structure_json
         
+    except OperationCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error creating target structure analysis: {str(e)}")
         return {"error": str(e)}
 
 @bp.route("/analysis-status", methods=["GET"])
 def analysis_status():
-    """Return the current analysis status for the project"""
+    """Return the current analysis status for the project, derived from the latest analysis job"""
     try:
-        project_id = current_app.comprehensive_analysis_data.get("project_id", "N/A")
-        cobol_files = current_app.comprehensive_analysis_data.get("cobol_files", {})
+        job = job_manager.store.latest(ANALYSIS_JOB, request.args.get("project_id"))
+        if job is not None and job.status == JOB_SUCCEEDED:
+            result = job.result
+            project_id = job.project_id
+            cobol_files = get_cobol_files_for_analysis(result.get("file_classification", {}))
+            context_ready = bool(cobol_files and result.get("conversionContextReady"))
+        else:
+            # No finished job yet: fall back to the shared analysis data if it belongs to the same project
+            analysis_data = current_app.comprehensive_analysis_data
+            project_id = job.project_id if job else analysis_data.get("project_id", "N/A")
+            same_project = job is None or analysis_data.get("project_id") == project_id
+            cobol_files = analysis_data.get("cobol_files", {}) if same_project else {}
+            context_ready = bool(cobol_files and analysis_data.get("analysis_results"))
         rag_status = {
             "standards_rag_active": hasattr(current_app, 'standards_documents') and bool(current_app.standards_documents),
             "project_rag_active": bool(cobol_files)
@@ -269,15 +335,168 @@ def analysis_status():
         return jsonify({
             "project_id": project_id,
             "project_files_loaded": len(cobol_files),
-            "conversion_context_ready": bool(cobol_files and current_app.comprehensive_analysis_data.get("analysis_results")),
-            "rag_status": rag_status
+            "conversion_context_ready": context_ready,
+            "rag_status": rag_status,
+            "job": job.to_dict(include_result=False) if job else None
         })
     except Exception as e:
         logger.error(f"Error fetching analysis status: {e}")
         return jsonify({"error": str(e)}), 500
 
-@bp.route("/analyze-requirements", methods=["POST"])
-def analyze_requirements():
+def business_requirements_messages(bus_prompt: str) -> List[Dict[str, str]]:
+    """Build the chat messages of the business requirements call"""
+    return [
+        {
+            "role": "system",
+            "content": (
+                f"You are an expert in analyzing COBOL/CICS code to extract business requirements. "
+                f"You understand COBOL, CICS commands, and mainframe business processes deeply. "
+                f"You have access to comprehensive analysis results including CICS patterns, RAG context, standards documents, and target structure analysis. "
+                f"Use the provided COBOL analysis JSON and target structure to understand program structure, variables, and dependencies. "
+                f"Output your analysis in JSON format with the following structure:\n\n"
+                f"{{\n"
+                f'  "Overview": {{\n'
+                f'    "Purpose of the System": "Describe the system\'s primary function and how it fits into the business.",\n'
+                f'    "Context and Business Impact": "Explain the operational context and value the system provides."\n'
+                f'  }},\n'
+                f'  "Objectives": {{\n'
+                f'    "Primary Objective": "Clearly state the system\'s main goal.",\n'
+                f'    "Key Outcomes": "Outline expected results (e.g., improved processing speed, customer satisfaction)."\n'
+                f'  }},\n'
+                f'  "Business Rules & Requirements": {{\n'
+                f'    "Business Purpose": "Explain the business objective behind this specific module or logic.",\n'
+                f'    "Business Rules": "List the inferred rules/conditions the system enforces.",\n'
+                f'    "Impact on System": "Describe how this part affects the system\'s overall operation.",\n'
+                f'    "Constraints": "Note any business limitations or operational restrictions."\n'
+                f'  }},\n'
+                f'  "Assumptions & Recommendations": {{\n'
+                f'    "Assumptions": "Describe what is presumed about data, processes, or environment.",\n'
+                f'    "Recommendations": "Suggest enhancements or modernization directions."\n'
+                f'  }},\n'
+                f'  "Expected Output": {{\n'
+                f'    "Output": "Describe the main outputs (e.g., reports, logs, updates).",\n'
+                f'    "Business Significance": "Explain why these outputs matter for business processes."\n'
+                f'  }}\n'
+                f"}}"
+            )
+        },
+        {
+            "role": "user",
+            "content": bus_prompt
+        }
+    ]
+
+def run_business_requirements_analysis(bus_prompt: str) -> Dict[str, Any]:
+    """Run the business requirements GPT call for a fully assembled prompt"""
+    business_msgs = business_requirements_messages(bus_prompt)
+
+    log_processing_step("Running business requirements analysis", {
+        "prompt_length": len(bus_prompt)
+    }, 7)
+
+    profile = get_stage_profile(BUSINESS_REQUIREMENTS)
+    business_json, business_response = structured_completion(
+        client,
+        model=profile.model,
+        messages=business_msgs,
+        response_format=BUSINESS_REQUIREMENTS_FORMAT,
+        **profile.request_options()
+    )
+
+    log_gpt_interaction("BUSINESS_REQUIREMENTS", profile.model, business_msgs, business_response)
+    return business_json
+
+async def run_business_requirements_analysis_async(bus_prompt: str) -> Dict[str, Any]:
+    """Async counterpart of run_business_requirements_analysis"""
+    business_msgs = business_requirements_messages(bus_prompt)
+
+    log_processing_step("Running business requirements analysis", {
+        "prompt_length": len(bus_prompt)
+    }, 7)
+
+    profile = get_stage_profile(BUSINESS_REQUIREMENTS)
+    business_json, business_response = await structured_completion_async(
+        None,
+        model=profile.model,
+        messages=business_msgs,
+        response_format=BUSINESS_REQUIREMENTS_FORMAT,
+        **profile.request_options()
+    )
+
+    log_gpt_interaction("BUSINESS_REQUIREMENTS", profile.model, business_msgs, business_response)
+    return business_json
+
+def technical_requirements_messages(tech_prompt: str) -> List[Dict[str, str]]:
+    """Build the chat messages of the technical requirements call"""
+    return [
+        {
+            "role": "system",
+            "content": (
+                f"You are an expert in COBOL to .NET 8 migration. "
+                f"You deeply understand both COBOL and .NET 8 and can identify technical challenges and requirements for migration. "
+                f"Use the provided COBOL analysis JSON and target structure to understand program structure, variables, and dependencies. "
+                f"Output your analysis in JSON format with the following structure:\n"
+                f"{{\n"
+                f'  "technicalRequirements": [\n'
+                f'    {{"id": "TR1", "description": "First technical requirement", "complexity": "High/Medium/Low"}},\n'
+                f'    {{"id": "TR2", "description": "Second technical requirement", "complexity": "High/Medium/Low"}}\n'
+                f'  ],\n'
+                f"}}"
+            )
+        },
+        {
+            "role": "user",
+            "content": tech_prompt
+        }
+    ]
+
+def run_technical_requirements_analysis(tech_prompt: str) -> Dict[str, Any]:
+    """Run the technical requirements GPT call for a fully assembled prompt"""
+    technical_msgs = technical_requirements_messages(tech_prompt)
+
+    log_processing_step("Running technical requirements analysis", {
+        "prompt_length": len(tech_prompt)
+    }, 8)
+
+    profile = get_stage_profile(TECHNICAL_REQUIREMENTS)
+    technical_json, technical_response = structured_completion(
+        client,
+        model=profile.model,
+        messages=technical_msgs,
+        response_format=TECHNICAL_REQUIREMENTS_FORMAT,
+        **profile.request_options()
+    )
+
+    log_gpt_interaction("TECHNICAL_REQUIREMENTS", profile.model, technical_msgs, technical_response)
+    return technical_json
+
+async def run_technical_requirements_analysis_async(tech_prompt: str) -> Dict[str, Any]:
+    """Async counterpart of run_technical_requirements_analysis"""
+    technical_msgs = technical_requirements_messages(tech_prompt)
+
+    log_processing_step("Running technical requirements analysis", {
+        "prompt_length": len(tech_prompt)
+    }, 8)
+
+    profile = get_stage_profile(TECHNICAL_REQUIREMENTS)
+    technical_json, technical_response = await structured_completion_async(
+        None,
+        model=profile.model,
+        messages=technical_msgs,
+        response_format=TECHNICAL_REQUIREMENTS_FORMAT,
+        **profile.request_options()
+    )
+
+    log_gpt_interaction("TECHNICAL_REQUIREMENTS", profile.model, technical_msgs, technical_response)
+    return technical_json
+
+class AnalysisRequestError(RequestError):
+    """Raised when an analysis request is invalid."""
+
+def _ignore_progress(stage, progress=None):
+    """Default progress reporter for pipeline runs that are not tracked."""
+
+def run_requirements_analysis(data, report=_ignore_progress):
     """
     Enhanced flow:
     1) Classify uploaded files
@@ -285,86 +504,102 @@ def analyze_requirements():
     3) Generate target_structure.json
     4) Index files for RAG
     5) Run GPT for business & technical requirements
+
+    Steps 2-5 run on a StageGraph so independent stages overlap.
+    `report(stage, progress)` is called as each stage starts.
+    With LLM_ASYNC_PIPELINES the async variant runs on the background event loop.
     """
-    try:
-        data = request.json
-        log_request_details("ANALYZE REQUIREMENTS", data)
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
+    if LLM_ASYNC_PIPELINES:
+        return run_sync(run_requirements_analysis_async(data, report))
+    graph, finish = plan_requirements_analysis(data, report)
+    return finish(graph.run(on_stage_start=lambda stage, done: report(stage, 0.1 + 0.85 * done)))
 
-        project_id = data.get("projectId")
-        if not project_id:
-            return jsonify({"error": "Project ID is required"}), 400
+async def run_requirements_analysis_async(data, report=_ignore_progress):
+    """
+    Async counterpart of run_requirements_analysis for an event loop (see asgi.py).
 
-        log_processing_step("Parsing request data", {
-            "has_file_data": "file_data" in data,
-            "source_language": data.get("sourceLanguage"),
-            "target_language": data.get("targetLanguage"),
-            "project_id": project_id
-        }, 1)
+    The target structure and requirements calls are awaited on the loop; COBOL
+    analysis and RAG indexing run on worker threads. Must run inside an app context.
+    """
+    graph, finish = plan_requirements_analysis(data, report, use_async=True)
+    return finish(await graph.run_async(on_stage_start=lambda stage, done: report(stage, 0.1 + 0.85 * done)))
 
-        # 1) CLASSIFY FILES
-        file_data = data.get("file_data", {})
-        if isinstance(file_data, str):
-            file_data = json.loads(file_data)
-        
-        if not file_data:
-            return jsonify({"error": "No file data provided"}), 400
-        
-        classified = enhanced_classify_files(file_data)
-        
-        log_processing_step("File classification completed", {
-            "total_files": sum(len(files) for files in classified.values()),
-            "cobol_files": len(classified.get("COBOL Code", [])),
-            "copybooks": len(classified.get("Copybooks", [])),
-            "jcl_files": len(classified.get("JCL", []))
-        }, 2)
+def plan_requirements_analysis(data, report=_ignore_progress, use_async=False):
+    """
+    Validate the request, classify its files and declare the analysis stages.
+
+    Returns the StageGraph and the function turning its results into the response;
+    with `use_async` the LLM stages are coroutine functions for StageGraph.run_async.
+    """
+    if not data:
+        raise AnalysisRequestError("No data provided")
+
+    project_id = data.get("projectId")
+    if not project_id:
+        raise AnalysisRequestError("Project ID is required")
+
+    log_processing_step("Parsing request data", {
+        "has_file_data": "file_data" in data,
+        "source_language": data.get("sourceLanguage"),
+        "target_language": data.get("targetLanguage"),
+        "project_id": project_id
+    }, 1)
 
+    # 1) CLASSIFY FILES
+    report("classification", 0.05)
+    file_data = data.get("file_data", {})
+    if isinstance(file_data, str):
+        file_data = json.loads(file_data)
+
+    if not file_data:
+        raise AnalysisRequestError("No file data provided")
+
+    classified = enhanced_classify_files(file_data)
+
+    log_processing_step("File classification completed", {
+        "total_files": sum(len(files) for files in classified.values()),
+        "cobol_files": len(classified.get("COBOL Code", [])),
+        "copybooks": len(classified.get("Copybooks", [])),
+        "jcl_files": len(classified.get("JCL", []))
+    }, 2)
+
+    # Validate requirements input before any expensive stage runs
+    src = data.get("sourceLanguage")
+    tgt = data.get("targetLanguage")
+    cobol_list = [f["content"] for f in classified.get("COBOL Code", [])]
+
+    if not src or not cobol_list:
+        raise AnalysisRequestError("Missing sourceLanguage or no COBOL code")
+
+    cobol_code_str = "\n".join(cobol_list)
+
+    # Add standards context
+    standards_context = ""
+    if hasattr(current_app, 'standards_documents') and current_app.standards_documents:
+        standards_context = f"\n\nSTANDARDS DOCUMENTS CONTEXT:\n{chr(10).join(current_app.standards_documents)}\n"
+        logger.info(f"Adding standards context with {len(current_app.standards_documents)} documents")
+
+    def generate_cobol_analysis():
         # 2) GENERATE COBOL ANALYSIS JSON
         log_processing_step("Generating COBOL analysis JSON", {"project_id": project_id}, 3)
-        cobol_json = create_cobol_json(project_id)
-        
-        # Save COBOL JSON
-        output_dir = os.path.join("output", "analysis", project_id)
-        os.makedirs(output_dir, exist_ok=True)
-        analysis_path = os.path.join(output_dir, "cobol_analysis.json")
-        with open(analysis_path, "w") as f:
-            json.dump(cobol_json, f, indent=2)
-        logger.info(f"COBOL JSON created at: {analysis_path}")
+        # Also writes output/analysis/<project_id>/cobol_analysis.json
+        return create_cobol_json(project_id)
 
+    def generate_target_structure():
         # 3) GENERATE TARGET STRUCTURE JSON
         log_processing_step("Generating target structure analysis", {"project_id": project_id}, 4)
-        target_structure = create_target_structure_analysis(project_id, file_data, classified)
+        return create_target_structure_analysis(project_id, file_data, classified)
 
+    async def generate_target_structure_async():
+        log_processing_step("Generating target structure analysis", {"project_id": project_id}, 4)
+        return await create_target_structure_analysis_async(project_id, file_data, classified)
+
+    def index_rag(cobol_analysis):
         # 4) INDEX FOR RAG
         log_processing_step("Indexing files for RAG", {"project_id": project_id}, 5)
-        index_files_for_rag(project_id, cobol_json, file_data)
-        
-        # 5) GPT REQUIREMENTS ANALYSIS
-        src = data.get("sourceLanguage")
-        tgt = data.get("targetLanguage")
-        cobol_list = [f["content"] for f in classified.get("COBOL Code", [])]
-        
-        if not src or not cobol_list:
-            return jsonify({"error": "Missing sourceLanguage or no COBOL code"}), 400
-
-        log_processing_step("Creating business and technical prompts", {
-            "source_language": src,
-            "target_language": tgt,
-            "cobol_files_count": len(cobol_list)
-        }, 6)
+        index_files_for_rag(project_id, cobol_analysis, file_data)
 
-        # Combine COBOL code and analysis
-        cobol_code_str = "\n".join(cobol_list)
-        cobol_analysis_str = json.dumps(cobol_json, indent=2)
-        target_structure_str = json.dumps(target_structure, indent=2)
-        
-        # Add standards and RAG context
-        standards_context = ""
-        if hasattr(current_app, 'standards_documents') and current_app.standards_documents:
-            standards_context = f"\n\nSTANDARDS DOCUMENTS CONTEXT:\n{chr(10).join(current_app.standards_documents)}\n"
-            logger.info(f"Adding standards context with {len(current_app.standards_documents)} documents")
-        
+    def load_rag_context(rag_indexing):
         vector_store = load_vector_store(project_id)
         rag_context = ""
         if vector_store:
@@ -374,137 +609,124 @@ def analyze_requirements():
                 logger.info(f"Added RAG context with {len(rag_results)} results")
             else:
                 logger.warning("No RAG results returned from vector store")
-        
-        bus_prompt = create_business_requirements_prompt(src, cobol_code_str) + standards_context + rag_context + f"\n\nCOBOL ANALYSIS:\n{cobol_analysis_str}" + f"\n\nTARGET STRUCTURE:\n{target_structure_str}"
-        tech_prompt = create_technical_requirements_prompt(src, tgt, cobol_code_str) + standards_context + rag_context + f"\n\nCOBOL ANALYSIS:\n{cobol_analysis_str}" + f"\n\nTARGET STRUCTURE:\n{target_structure_str}"
-
-        # Business Requirements Analysis
-        business_msgs = [
-            {
-                "role": "system",
-                "content": (
-                    f"You are an expert in analyzing COBOL/CICS code to extract business requirements. "
-                    f"You understand COBOL, CICS commands, and mainframe business processes deeply. "
-                    f"You have access to comprehensive analysis results including CICS patterns, RAG context, standards documents, and target structure analysis. "
-                    f"Use the provided COBOL analysis JSON and target structure to understand program structure, variables, and dependencies. "
-                    f"Output your analysis in JSON format with the following structure:\n\n"
-                    f"{{\n"
-                    f'  "Overview": {{\n'
-                    f'    "Purpose of the System": "Describe the system\'s primary function and how it fits into the business.",\n'
-                    f'    "Context and Business Impact": "Explain the operational context and value the system provides."\n'
-                    f'  }},\n'
-                    f'  "Objectives": {{\n'
-                    f'    "Primary Objective": "Clearly state the system\'s main goal.",\n'
-                    f'    "Key Outcomes": "Outline expected results (e.g., improved processing speed, customer satisfaction)."\n'
-                    f'  }},\n'
-                    f'  "Business Rules & Requirements": {{\n'
-                    f'    "Business Purpose": "Explain the business objective behind this specific module or logic.",\n'
-                    f'    "Business Rules": "List the inferred rules/conditions the system enforces.",\n'
-                    f'    "Impact on System": "Describe how this part affects the system\'s overall operation.",\n'
-                    f'    "Constraints": "Note any business limitations or operational restrictions."\n'
-                    f'  }},\n'
-                    f'  "Assumptions & Recommendations": {{\n'
-                    f'    "Assumptions": "Describe what is presumed about data, processes, or environment.",\n'
-                    f'    "Recommendations": "Suggest enhancements or modernization directions."\n'
-                    f'  }},\n'
-                    f'  "Expected Output": {{\n'
-                    f'    "Output": "Describe the main outputs (e.g., reports, logs, updates).",\n'
-                    f'    "Business Significance": "Explain why these outputs matter for business processes."\n'
-                    f'  }}\n'
-                    f"}}"
-                )
-            },
-            {
-                "role": "user",
-                "content": bus_prompt
-            }
-        ]
+        return rag_context
 
-        log_processing_step("Running business requirements analysis", {
-            "prompt_length": len(bus_prompt)
-        }, 7)
+    serialization_stats = {}
 
-        business_response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT_NAME,
-            messages=business_msgs,
-            temperature=0.3,
-            max_tokens=4000
-        )
+    def build_requirements_context(cobol_analysis, target_structure, rag_context):
+        log_processing_step("Creating business and technical prompts", {
+            "source_language": src,
+            "target_language": tgt,
+            "cobol_files_count": len(cobol_list)
+        }, 6)
+        # Both requirements prompts share this context; tokens are counted for the business stage's model
+        model = get_stage_profile(BUSINESS_REQUIREMENTS).model
+        cobol_analysis_str = render_for_prompt("cobol_analysis", cobol_analysis, render_cobol_analysis,
+                                               model, serialization_stats)
+        target_structure_str = render_for_prompt("target_structure", target_structure, render_target_structure,
+                                                 model, serialization_stats)
+        # Project-stable context goes between the static instructions and the source code and
+        # RAG results, so both requirements calls share a prefix the provider can cache
+        return {
+            "project": standards_context + f"\n\nCOBOL ANALYSIS:\n{cobol_analysis_str}" + f"\n\nTARGET STRUCTURE:\n{target_structure_str}\n",
+            "volatile": rag_context
+        }
 
-        log_gpt_interaction("BUSINESS_REQUIREMENTS", AZURE_OPENAI_DEPLOYMENT_NAME, business_msgs, business_response)
-
-        business_json = extract_json_from_response(business_response.choices[0].message.content)
-
-        # Technical Requirements Analysis
-        technical_msgs = [
-            {
-                "role": "system",
-                "content": (
-                    f"You are an expert in COBOL to .NET 8 migration. "
-                    f"You deeply understand both COBOL and .NET 8 and can identify technical challenges and requirements for migration. "
-                    f"Use the provided COBOL analysis JSON and target structure to understand program structure, variables, and dependencies. "
-                    f"Output your analysis in JSON format with the following structure:\n"
-                    f"{{\n"
-                    f'  "technicalRequirements": [\n'
-                    f'    {{"id": "TR1", "description": "First technical requirement", "complexity": "High/Medium/Low"}},\n'
-                    f'    {{"id": "TR2", "description": "Second technical requirement", "complexity": "High/Medium/Low"}}\n'
-                    f'  ],\n'
-                    f"}}"
-                )
-            },
-            {
-                "role": "user",
-                "content": tech_prompt
-            }
-        ]
+    def business_prompt(requirements_context):
+        return create_business_requirements_prompt(src, cobol_code_str, requirements_context["project"]) + requirements_context["volatile"]
 
-        log_processing_step("Running technical requirements analysis", {
-            "prompt_length": len(tech_prompt)
-        }, 8)
+    def technical_prompt(requirements_context):
+        return create_technical_requirements_prompt(src, tgt, cobol_code_str, requirements_context["project"]) + requirements_context["volatile"]
 
-        technical_response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT_NAME,
-            messages=technical_msgs,
-            temperature=0.3,
-            max_tokens=4000
-        )
+    def analyze_business_requirements(requirements_context):
+        return run_business_requirements_analysis(business_prompt(requirements_context))
 
-        log_gpt_interaction("TECHNICAL_REQUIREMENTS", AZURE_OPENAI_DEPLOYMENT_NAME, technical_msgs, technical_response)
+    def analyze_technical_requirements(requirements_context):
+        return run_technical_requirements_analysis(technical_prompt(requirements_context))
 
-        technical_json = extract_json_from_response(technical_response.choices[0].message.content)
+    async def analyze_business_requirements_async(requirements_context):
+        return await run_business_requirements_analysis_async(business_prompt(requirements_context))
 
-        # Store analysis data for conversion use
-        current_app.comprehensive_analysis_data = {
-            "project_id": project_id,
-            "cobol_files": get_cobol_files_for_analysis(classified),
-            "classified_files": classified,
-            "cobol_analysis": cobol_json,
-            "target_structure": target_structure,
-            "analysis_results": {
-                "business_requirements": business_json,
-                "technical_requirements": technical_json,
-                "status": "success"
-            }
-        }
+    async def analyze_technical_requirements_async(requirements_context):
+        return await run_technical_requirements_analysis_async(technical_prompt(requirements_context))
 
-        log_processing_step("Analysis completed successfully", {
-            "business_rules_count": len(business_json.get("Business Rules & Requirements", {}).get("Business Rules", [])),
-            "technical_requirements_count": len(technical_json.get("technicalRequirements", [])),
-            "target_structure_created": bool(target_structure and "error" not in target_structure),
-            "conversionContextReady": True
-        }, 9)
+    # Independent stages run concurrently: target structure overlaps COBOL analysis and RAG
+    # indexing, and the business and technical calls run side by side.
+    graph = StageGraph("analyze_requirements", max_workers=ANALYSIS_STAGE_WORKERS)
+    graph.add("cobol_analysis", generate_cobol_analysis)
+    graph.add("target_structure", generate_target_structure_async if use_async else generate_target_structure)
+    graph.add("rag_indexing", index_rag, depends_on=["cobol_analysis"])
+    graph.add("rag_context", load_rag_context, depends_on=["rag_indexing"])
+    graph.add("requirements_context", build_requirements_context,
+              depends_on=["cobol_analysis", "target_structure", "rag_context"])
+    graph.add("business_requirements",
+              analyze_business_requirements_async if use_async else analyze_business_requirements,
+              depends_on=["requirements_context"])
+    graph.add("technical_requirements",
+              analyze_technical_requirements_async if use_async else analyze_technical_requirements,
+              depends_on=["requirements_context"])
 
-        return jsonify({
-            "status": "success",
-            "project_id": project_id,
+    def finish(stage_results):
+        return _finish_requirements_analysis(project_id, classified, stage_results, graph.timings, serialization_stats)
+
+    return graph, finish
+
+def _finish_requirements_analysis(project_id, classified, stage_results, stage_timings, serialization_stats):
+    """Store the analysis for conversion and build the response of a completed run"""
+    cobol_json = stage_results["cobol_analysis"]
+    target_structure = stage_results["target_structure"]
+    business_json = stage_results["business_requirements"]
+    technical_json = stage_results["technical_requirements"]
+
+    # Store analysis data for conversion use
+    current_app.comprehensive_analysis_data = {
+        "project_id": project_id,
+        "cobol_files": get_cobol_files_for_analysis(classified),
+        "classified_files": classified,
+        "cobol_analysis": cobol_json,
+        "target_structure": target_structure,
+        "analysis_results": {
             "business_requirements": business_json,
             "technical_requirements": technical_json,
-            "target_structure": target_structure,
-            "file_classification": classified,
-            "cobol_analysis": cobol_json,
-            "conversionContextReady": True
-        })
+            "status": "success"
+        }
+    }
+
+    log_processing_step("Analysis completed successfully", {
+        "business_rules_count": len(business_json.get("Business Rules & Requirements", {}).get("Business Rules", [])),
+        "technical_requirements_count": len(technical_json.get("technicalRequirements", [])),
+        "target_structure_created": bool(target_structure and "error" not in target_structure),
+        "conversionContextReady": True
+    }, 9)
+
+    return {
+        "status": "success",
+        "project_id": project_id,
+        "business_requirements": business_json,
+        "technical_requirements": technical_json,
+        "target_structure": target_structure,
+        "file_classification": classified,
+        "cobol_analysis": cobol_json,
+        "stage_timings": stage_timings,
+        "prompt_token_savings": summarize_savings(serialization_stats),
+        "conversionContextReady": True
+    }
+
+@bp.route("/analyze-requirements", methods=["POST"])
+def analyze_requirements():
+    """Run the requirements analysis pipeline in the request thread"""
+    try:
+        data = request.json
+        log_request_details("ANALYZE REQUIREMENTS", data)
+        project_id = data.get("projectId") if isinstance(data, dict) else None
+        # Stop spending LLM and embedding quota once the client has gone away or the deadline has passed
+        token = CancellationToken()
+        with ClientDisconnectWatcher(request.environ, token):
+            result = job_manager.run_inline(ANALYSIS_JOB, project_id, run_requirements_analysis, data, token=token)
+        return jsonify(result)
 
+    except RequestError as e:
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         logger.error(f"❌ Analysis failed: {str(e)}")
         traceback.print_exc()
@@ -0,0 +1,192 @@
+from flask import Blueprint, request, jsonify
+from ..config import logger, LLM_BATCH_DEPLOYMENT
+import json, os, re
+from ..utils.prompts import (
+    create_business_requirements_prompt,
+    create_technical_requirements_prompt,
+    BUSINESS_REQUIREMENTS_FORMAT,
+    TECHNICAL_REQUIREMENTS_FORMAT
+)
+from ..utils.code_converter import create_code_converter
+from ..utils.db_usage import detect_database_usage
+from ..utils.db_templates import get_db_template
+from ..utils.llm_batch import BatchItem, BatchRunner, get_batch_backend
+from ..utils.llm_gateway import parse_structured_content
+from ..utils.jobs import job_manager
+from ..utils.errors import RequestError
+from ..utils.model_profiles import get_stage_profile, BUSINESS_REQUIREMENTS, TECHNICAL_REQUIREMENTS
+from .analysis import enhanced_classify_files, business_requirements_messages, technical_requirements_messages
+from .conversion import save_conversion_output
+
+bp = Blueprint('batch', __name__, url_prefix='/cobo')
+
+PORTFOLIO_JOB = "convert-batch"
+SOURCE_LANGUAGE = "COBOL"
+TARGET_LANGUAGE = "C#"
+
+class PortfolioRequestError(RequestError):
+    """Raised when a portfolio batch request is invalid."""
+
+def _ignore_progress(stage, progress=None):
+    """Default progress reporter for pipeline runs that are not tracked."""
+
+def _class_name(file_name):
+    """PascalCase class name for a COBOL program file name."""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return "".join(part.capitalize() for part in re.split(r"[^A-Za-z0-9]+", stem) if part) or "Program"
+
+def plan_analysis_requests(programs, converter, chunks):
+    """
+    Requirements prompts for every program plus the structure prompt of every multi-chunk program.
+
+    Batch requests all go to the batch deployment; only the sampling options come from the stage profiles.
+    """
+    items = []
+    for name, source in programs.items():
+        items.append(BatchItem(
+            f"{name}::business", LLM_BATCH_DEPLOYMENT,
+            business_requirements_messages(create_business_requirements_prompt(SOURCE_LANGUAGE, source)),
+            response_format=BUSINESS_REQUIREMENTS_FORMAT, **get_stage_profile(BUSINESS_REQUIREMENTS).request_options()
+        ))
+        items.append(BatchItem(
+            f"{name}::technical", LLM_BATCH_DEPLOYMENT,
+            technical_requirements_messages(create_technical_requirements_prompt(SOURCE_LANGUAGE, TARGET_LANGUAGE, source)),
+            response_format=TECHNICAL_REQUIREMENTS_FORMAT, **get_stage_profile(TECHNICAL_REQUIREMENTS).request_options()
+        ))
+        if len(chunks[name]) > 1:
+            items.append(BatchItem(
+                f"{name}::structure", LLM_BATCH_DEPLOYMENT,
+                converter.program_structure_messages(chunks[name], SOURCE_LANGUAGE, TARGET_LANGUAGE),
+                **converter.structure_request_options()
+            ))
+    return items
+
+def plan_chunk_requests(programs, converter, chunks, requirements, structures):
+    """One conversion request per chunk of every program, carrying its requirements and structure."""
+    items = []
+    for name, source in programs.items():
+        db_setup_template = get_db_template(TARGET_LANGUAGE) if detect_database_usage(source, SOURCE_LANGUAGE).get("has_db", False) else ""
+        for index in range(len(chunks[name])):
+            items.append(BatchItem(
+                f"{name}::chunk::{index}", LLM_BATCH_DEPLOYMENT,
+                converter.program_chunk_messages(
+                    chunks[name], index, SOURCE_LANGUAGE, TARGET_LANGUAGE,
+                    requirements[name]["business"],
+                    requirements[name]["technical"],
+                    db_setup_template, structures[name]
+                ),
+                **converter.chunk_request_options()
+            ))
+    return items
+
+def _content(response):
+    return response.choices[0].message.content if response is not None else None
+
+def run_portfolio_conversion(data, report=_ignore_progress, runner=None):
+    """
+    Convert a whole portfolio of COBOL programs through the offline Batch API.
+
+    All requirements and structure prompts go out as one batch, then all chunk
+    conversions as a second one; results are merged per program with the
+    CodeConverter merge and materialized through the regular conversion output.
+    `report(stage, progress)` is called as each stage starts.
+    """
+    if not data:
+        raise PortfolioRequestError("No data provided")
+
+    project_id = data.get("projectId")
+    if not project_id:
+        raise PortfolioRequestError("Project ID is required")
+
+    file_data = data.get("file_data", {})
+    if isinstance(file_data, str):
+        file_data = json.loads(file_data)
+    programs = {f["fileName"]: f["content"] for f in enhanced_classify_files(file_data).get("COBOL Code", [])}
+    if not programs:
+        raise PortfolioRequestError("No COBOL programs provided")
+
+    runner = runner or BatchRunner(get_batch_backend())
+    converter = create_code_converter(model_name=LLM_BATCH_DEPLOYMENT)
+
+    report("chunking", 0.05)
+    chunks = {name: converter.chunk_code(source, SOURCE_LANGUAGE) or [source] for name, source in programs.items()}
+    logger.info(f"Portfolio {project_id}: {len(programs)} programs, {sum(map(len, chunks.values()))} chunks")
+
+    # Round 1: requirements and structure are independent of each other
+    report("analysis", 0.1)
+    analysis = runner.run(plan_analysis_requests(programs, converter, chunks), name=f"{project_id}-analysis")
+    requirements, structures = {}, {}
+    for name in programs:
+        requirements[name] = {
+            "business": parse_structured_content(_content(analysis.get(f"{name}::business")) or ""),
+            "technical": parse_structured_content(_content(analysis.get(f"{name}::technical")) or "")
+        }
+        structures[name] = converter.parse_structure_content(
+            _content(analysis.get(f"{name}::structure")) or "Could not determine code structure", TARGET_LANGUAGE
+        )
+
+    # Round 2: every chunk of every program
+    report("conversion", 0.4)
+    converted = runner.run(plan_chunk_requests(programs, converter, chunks, requirements, structures),
+                           name=f"{project_id}-conversion")
+
+    report("merge", 0.85)
+    converted_code, conversion_notes = [], []
+    for name in programs:
+        results = []
+        for index in range(len(chunks[name])):
+            content = _content(converted.get(f"{name}::chunk::{index}"))
+            if content is None:
+                results.append({
+                    "convertedCode": "",
+                    "conversionNotes": f"Error converting chunk {index+1}: no batch result",
+                    "potentialIssues": [f"Chunk {index+1} could not be converted"],
+                    "databaseUsed": False
+                })
+            else:
+                results.append(converter.parse_chunk_content(content, TARGET_LANGUAGE))
+        merged = converter.merge_results(results, TARGET_LANGUAGE, structures[name])
+        class_name = _class_name(name)
+        converted_code.append({"file_name": f"{class_name}.cs", "path": "Converted", "content": merged.get("convertedCode", "")})
+        if merged.get("conversionNotes"):
+            conversion_notes.append({"note": f"{name}: {merged['conversionNotes']}", "severity": "Info"})
+        conversion_notes.extend({"note": f"{name}: {issue}", "severity": "Warning"} for issue in merged.get("potentialIssues", []))
+
+    analysis_dir = os.path.join("output", "analysis", project_id)
+    os.makedirs(analysis_dir, exist_ok=True)
+    with open(os.path.join(analysis_dir, "batch_requirements.json"), "w") as f:
+        json.dump(requirements, f, indent=2)
+
+    report("materialization", 0.95)
+    converted_json = {"converted_code": converted_code, "conversion_notes": conversion_notes}
+    files = save_conversion_output(project_id, converted_json, [], None)
+
+    return {
+        "status": "success",
+        "project_id": project_id,
+        "programs": sorted(programs),
+        "converted_code": converted_code,
+        "conversion_notes": conversion_notes,
+        "requirements": requirements,
+        "files": files
+    }
+
+@bp.route("/convert/batch", methods=["POST"])
+def convert_portfolio_batch():
+    """Queue an offline batch conversion of every COBOL program in file_data and return its job id"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        job = job_manager.submit(PORTFOLIO_JOB, data.get("projectId"), run_portfolio_conversion, data)
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"{bp.url_prefix}/jobs/{job.id}"
+        }), 202
+    except RuntimeError as e:
+        logger.warning(f"Batch job submission rejected: {e}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error submitting batch conversion: {e}")
+        return jsonify({"error": str(e)}), 500
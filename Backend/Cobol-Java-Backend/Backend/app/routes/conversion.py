@@ -1,29 +1,47 @@
-from flask import Blueprint, request, jsonify, current_app
-from ..config import logger, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_NAME, output_dir
-from openai import AzureOpenAI
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from ..config import (
+    logger, SSE_HEARTBEAT_SECONDS, TEST_GENERATION_WORKERS, PIPELINE_TIMEOUT_SECONDS, LLM_ASYNC_PIPELINES, output_dir
+)
 import logging
 import os
 from ..utils.code_converter import create_code_converter
-from ..utils.prompts import create_code_conversion_prompt, create_unit_test_prompt, create_functional_test_prompt
+from ..utils.prompts import (
+    create_code_conversion_prompt, create_unit_test_prompt, create_functional_test_prompt,
+    CODE_CONVERSION_FORMAT, UNIT_TEST_FORMAT, FUNCTIONAL_TEST_FORMAT
+)
 from ..utils.logs import log_request_details, log_processing_step, log_gpt_interaction
-from ..utils.response import extract_json_from_response
+from ..utils.response import ConvertedFileScanner
+from ..utils.llm_client import get_llm_client
+from ..utils.llm_gateway import (
+    stream_chat_completion, structured_completion, parse_structured_content,
+    chat_completion_async, structured_completion_async
+)
 from ..utils.db_usage import detect_database_usage
 from ..utils.db_templates import get_db_template
 from ..utils.rag_indexer import load_vector_store, query_vector_store
+from ..utils.jobs import job_manager
+from ..utils.cancellation import CancellationToken, ClientDisconnectWatcher, OperationCancelled, cancellation_scope
+from ..utils.errors import RequestError
+from ..utils.test_pipeline import TestGenerationPipeline, generate_tests_async
+from ..utils.async_bridge import run_sync
+from ..utils.prompt_packer import PromptSection, pack_sections, get_prompt_budget, count_message_tokens, TRIM_ENDS
+from ..utils.prompt_serializer import render_for_prompt, render_cobol_analysis, render_target_structure, summarize_savings
+from ..utils.prompt_layout import PromptBlock, layout_messages, STATIC, PROJECT, VOLATILE
+from ..utils.model_profiles import get_stage_profile, CODE_CONVERSION, UNIT_TESTS, FUNCTIONAL_TESTS
+import asyncio
 import json
 import re
 import time
 import traceback
 import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from pathlib import Path
 
 bp = Blueprint('conversion', __name__, url_prefix='/cobo')
 
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    api_version="2023-05-15",
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-)
+CONVERSION_JOB = "convert"
+
+client = get_llm_client()
 
 def save_json_response(cobol_filename, json_obj):
     """Save the full JSON response to the json_output directory, using the COBOL filename as base."""
@@ -274,361 +292,610 @@ def load_analysis_data(project_id):
     
     return analysis_data
 
-@bp.route("/convert", methods=["POST"])
-def convert_cobol_to_csharp():
-    try:
-        data = request.json
-        project_id = data.get("projectId")
-        
-        if not project_id:
-            logger.error("Project ID is missing in request")
-            return jsonify({"error": "Project ID is missing. Please upload files first.", "files": {}}), 400
-
-        logger.info(f"Starting conversion for project: {project_id}")
+class ConversionRequestError(RequestError):
+    """Raised when a conversion request cannot be served."""
 
-        # Load analysis data (cobol_analysis.json and target_structure.json)
-        analysis_data = load_analysis_data(project_id)
-        
-        if not analysis_data.get("cobol_analysis"):
-            logger.error(f"No COBOL analysis data found for project: {project_id}")
-            return jsonify({"error": "No analysis data found. Please run analysis first.", "files": {}}), 400
-        
-        cobol_json = analysis_data["cobol_analysis"]
-        target_structure = analysis_data.get("target_structure", {})
-        
-        logger.info(f"Loaded analysis data for project: {project_id}")
+def prepare_conversion(data):
+    """Load analysis data and source code for a conversion request and build the conversion messages."""
+    project_id = data.get("projectId")
+    
+    if not project_id:
+        logger.error("Project ID is missing in request")
+        raise ConversionRequestError("Project ID is missing. Please upload files first.")
 
-        # Get source code - try multiple sources
-        source_code = {}
-        
-        # First try: from request data
-        request_source_code = data.get("sourceCode", {})
-        if request_source_code:
-            logger.info("Using source code from request")
-            if isinstance(request_source_code, str):
-                try:
-                    request_source_code = json.loads(request_source_code)
-                except json.JSONDecodeError:
-                    logger.error("Failed to parse sourceCode from request")
-                    request_source_code = {}
-            
-            # Extract content from file objects
-            for file_name, file_data in request_source_code.items():
-                if isinstance(file_data, dict) and 'content' in file_data:
-                    source_code[file_name] = file_data['content']
-                elif isinstance(file_data, str):
-                    source_code[file_name] = file_data
-        
-        # Second try: from project files
-        if not source_code:
-            logger.info("Getting source code from project files")
-            source_code = get_source_code_from_project(project_id)
-        
-        # Validate source code
-        if not source_code:
-            logger.error(f"No source code found for project: {project_id}")
-            return jsonify({"error": "No source code found. Please upload COBOL files first.", "files": {}}), 400
-        
-        # Filter only COBOL-related files
-        cobol_code_list = []
-        for file_name, content in source_code.items():
-            if isinstance(content, str) and content.strip():
-                # Check if it's a COBOL file
-                if (file_name.lower().endswith(('.cbl', '.cpy', '.jcl')) or 
-                    any(keyword in content.upper() for keyword in ['IDENTIFICATION DIVISION', 'PROGRAM-ID', 'PROCEDURE DIVISION', 'WORKING-STORAGE'])):
-                    cobol_code_list.append(content)
-                    logger.info(f"Added COBOL file: {file_name}")
-        
-        if not cobol_code_list:
-            logger.error("No valid COBOL code found in source files")
-            return jsonify({"error": "No valid COBOL code found for conversion.", "files": {}}), 400
-        
-        logger.info(f"Found {len(cobol_code_list)} COBOL files for conversion")
-        
-        # Prepare conversion data
-        cobol_code_str = "\n".join(cobol_code_list)
-        cobol_analysis_str = json.dumps(cobol_json, indent=2)
-        target_structure_str = json.dumps(target_structure, indent=2)
-
-        # Load RAG context
-        vector_store = load_vector_store(project_id)
-        rag_context = ""
-        standards_context = ""
-        if vector_store:
-            rag_results = query_vector_store(vector_store, "Relevant COBOL program and C# conversion patterns", k=5)
-            if rag_results:
-                rag_context = "\n\nRAG CONTEXT:\n" + "\n".join([f"Source: {r.metadata.get('source', 'unknown')}\n{r.page_content}\n" for r in rag_results])
-                standards_results = query_vector_store(vector_store, "Relevant coding standards and guidelines", k=3)
-                if standards_results:
-                    standards_context = "\n\nSTANDARDS CONTEXT:\n" + "\n".join([f"Source: {r.metadata.get('source', 'unknown')}\n{r.page_content}\n" for r in standards_results])
-                logger.info("Added RAG and standards context")
-            else:
-                logger.warning("No RAG results returned from vector store")
+    logger.info(f"Starting conversion for project: {project_id}")
 
-        # Detect database usage and get DB template
-        db_usage = detect_database_usage(cobol_code_str, source_language="COBOL")
-        db_type = db_usage.get("db_type", "none")
-        db_setup_template = get_db_template("C#") if db_usage.get("has_db", False) else ""
+    # Load analysis data (cobol_analysis.json and target_structure.json)
+    analysis_data = load_analysis_data(project_id)
+    
+    if not analysis_data.get("cobol_analysis"):
+        logger.error(f"No COBOL analysis data found for project: {project_id}")
+        raise ConversionRequestError("No analysis data found. Please run analysis first.")
+    
+    cobol_json = analysis_data["cobol_analysis"]
+    target_structure = analysis_data.get("target_structure", {})
+    
+    logger.info(f"Loaded analysis data for project: {project_id}")
 
-        # Create enhanced conversion prompt
-        conversion_prompt = f"""
-        You are an expert COBOL to C# (.NET 8) migration specialist. Convert the provided COBOL code to a modern, 
-        well-structured C# application following the target structure and requirements provided.
-        
-        IMPORTANT: Use the target structure as your blueprint for organizing the code. Create ALL the files and 
-        components specified in the target structure.
-        
-        **SOURCE CODE:**
-        {cobol_code_str}
-        
-        **COBOL ANALYSIS:**
-        {cobol_analysis_str}
-        
-        **TARGET STRUCTURE (FOLLOW THIS CLOSELY):**
-        {target_structure_str}
-        
-        
-        **DATABASE TEMPLATE:**
-        {db_setup_template}
-        
-        **RAG CONTEXT:**
-        {rag_context}
-        
-        **STANDARDS CONTEXT:**
-        {standards_context}
-        
-        **CONVERSION GUIDELINES:**
-        1. Follow the target structure exactly - create all specified projects, folders, and files
-        2. Map all COBOL data structures to appropriate C# models/entities
-        3. Convert all CICS operations to appropriate .NET patterns
-        4. Implement proper service layer architecture
-        5. Create comprehensive API controllers with proper endpoints
-        6. Use Entity Framework Core for data access
-        7. Implement proper dependency injection
-        8. Add comprehensive error handling and logging
-        9. Follow .NET 8 best practices and conventions
-        10. Ensure thread safety and async/await patterns
-        11. Add proper validation and security measures
-        12. Include proper configuration management
-        
-        **REQUIRED OUTPUT:** Provide a complete C# .NET 8 solution with proper folder structure.
-        """
-
-        # Call Azure OpenAI for conversion
-        conversion_msgs = [
-            {
-                "role": "system",
-                "content": (
-                    "You are an expert COBOL to C# migration specialist with deep knowledge of both mainframe systems and modern .NET development. "
-                    "Your task is to convert COBOL/CICS applications to modern, scalable C# .NET 8 applications. "
-                    "You understand enterprise architecture patterns, clean code principles, and modern development practices. "
-                    "You MUST follow the provided target structure precisely and create ALL specified components. "
-                    "Output your conversion as a JSON object with the following structure:\n"
-                    "{\n"
-                    "  \"converted_code\": [\n"
-                    "    {\n"
-                    "      \"file_name\": \"string\",\n"
-                    "      \"path\": \"string\",\n"
-                    "      \"content\": \"string\"\n"
-                    "    }\n"
-                    "  ],\n"
-                    "  \"conversion_notes\": [\n"
-                    "    {\"note\": \"string\", \"severity\": \"Info/Warning/Error\"}\n"
-                    "  ],\n"
-                    "  \"unit_tests\": \"string\",\n"
-                    "  \"functional_tests\": \"string\"\n"
-                    "}"
-                )
-            },
-            {
-                "role": "user",
-                "content": conversion_prompt
-            }
+    # Get source code - try multiple sources
+    source_code = {}
+    
+    # First try: from request data
+    request_source_code = data.get("sourceCode", {})
+    if request_source_code:
+        logger.info("Using source code from request")
+        if isinstance(request_source_code, str):
+            try:
+                request_source_code = json.loads(request_source_code)
+            except json.JSONDecodeError:
+                logger.error("Failed to parse sourceCode from request")
+                request_source_code = {}
+        
+        # Extract content from file objects
+        for file_name, file_data in request_source_code.items():
+            if isinstance(file_data, dict) and 'content' in file_data:
+                source_code[file_name] = file_data['content']
+            elif isinstance(file_data, str):
+                source_code[file_name] = file_data
+    
+    # Second try: from project files
+    if not source_code:
+        logger.info("Getting source code from project files")
+        source_code = get_source_code_from_project(project_id)
+    
+    # Validate source code
+    if not source_code:
+        logger.error(f"No source code found for project: {project_id}")
+        raise ConversionRequestError("No source code found. Please upload COBOL files first.")
+    
+    # Filter only COBOL-related files
+    cobol_code_list = []
+    for file_name, content in source_code.items():
+        if isinstance(content, str) and content.strip():
+            # Check if it's a COBOL file
+            if (file_name.lower().endswith(('.cbl', '.cpy', '.jcl')) or 
+                any(keyword in content.upper() for keyword in ['IDENTIFICATION DIVISION', 'PROGRAM-ID', 'PROCEDURE DIVISION', 'WORKING-STORAGE'])):
+                cobol_code_list.append(content)
+                logger.info(f"Added COBOL file: {file_name}")
+    
+    if not cobol_code_list:
+        logger.error("No valid COBOL code found in source files")
+        raise ConversionRequestError("No valid COBOL code found for conversion.")
+    
+    logger.info(f"Found {len(cobol_code_list)} COBOL files for conversion")
+    
+    # Prepare conversion data
+    cobol_code_str = "\n".join(cobol_code_list)
+    serialization_stats = {}
+    profile = get_stage_profile(CODE_CONVERSION)
+    cobol_analysis_str = render_for_prompt("cobol_analysis", cobol_json, render_cobol_analysis,
+                                           profile.model, serialization_stats)
+    target_structure_str = render_for_prompt("target_structure", target_structure, render_target_structure,
+                                             profile.model, serialization_stats)
+
+    # Load RAG context
+    vector_store = load_vector_store(project_id)
+    rag_context = ""
+    standards_context = ""
+    if vector_store:
+        rag_results = query_vector_store(vector_store, "Relevant COBOL program and C# conversion patterns", k=5)
+        if rag_results:
+            rag_context = "\n".join([f"Source: {r.metadata.get('source', 'unknown')}\n{r.page_content}\n" for r in rag_results])
+            standards_results = query_vector_store(vector_store, "Relevant coding standards and guidelines", k=3)
+            if standards_results:
+                standards_context = "\n".join([f"Source: {r.metadata.get('source', 'unknown')}\n{r.page_content}\n" for r in standards_results])
+            logger.info("Added RAG and standards context")
+        else:
+            logger.warning("No RAG results returned from vector store")
+
+    # Detect database usage and get DB template
+    db_usage = detect_database_usage(cobol_code_str, source_language="COBOL")
+    db_type = db_usage.get("db_type", "none")
+    db_setup_template = get_db_template("C#") if db_usage.get("has_db", False) else ""
+
+    # Static instructions come first and per-request content last, so repeated
+    # conversions share the longest possible prefix in the provider's prompt cache
+    conversion_instructions = """
+    You are an expert COBOL to C# (.NET 8) migration specialist. Convert the provided COBOL code to a modern, 
+    well-structured C# application following the target structure and requirements provided.
+    
+    IMPORTANT: Use the target structure as your blueprint for organizing the code. Create ALL the files and 
+    components specified in the target structure.
+    """
+
+    conversion_guidelines = """
+    1. Follow the target structure exactly - create all specified projects, folders, and files
+    2. Map all COBOL data structures to appropriate C# models/entities
+    3. Convert all CICS operations to appropriate .NET patterns
+    4. Implement proper service layer architecture
+    5. Create comprehensive API controllers with proper endpoints
+    6. Use Entity Framework Core for data access
+    7. Implement proper dependency injection
+    8. Add comprehensive error handling and logging
+    9. Follow .NET 8 best practices and conventions
+    10. Ensure thread safety and async/await patterns
+    11. Add proper validation and security measures
+    12. Include proper configuration management
+    """
+
+    conversion_system = (
+        "You are an expert COBOL to C# migration specialist with deep knowledge of both mainframe systems and modern .NET development. "
+        "Your task is to convert COBOL/CICS applications to modern, scalable C# .NET 8 applications. "
+        "You understand enterprise architecture patterns, clean code principles, and modern development practices. "
+        "You MUST follow the provided target structure precisely and create ALL specified components. "
+        "Output your conversion as a JSON object with the following structure:\n"
+        "{\n"
+        "  \"converted_code\": [\n"
+        "    {\n"
+        "      \"file_name\": \"string\",\n"
+        "      \"path\": \"string\",\n"
+        "      \"content\": \"string\"\n"
+        "    }\n"
+        "  ],\n"
+        "  \"conversion_notes\": [\n"
+        "    {\"note\": \"string\", \"severity\": \"Info/Warning/Error\"}\n"
+        "  ],\n"
+        "  \"unit_tests\": \"string\",\n"
+        "  \"functional_tests\": \"string\"\n"
+        "}"
+    )
+
+    def conversion_blocks(sections):
+        return [
+            PromptBlock(conversion_instructions, STATIC),
+            PromptBlock(conversion_guidelines, STATIC, "CONVERSION GUIDELINES"),
+            PromptBlock("Provide a complete C# .NET 8 solution with proper folder structure.", STATIC, "REQUIRED OUTPUT"),
+            PromptBlock(sections["db_setup_template"], STATIC, "DATABASE TEMPLATE"),
+            PromptBlock(sections["standards_context"], PROJECT, "STANDARDS CONTEXT"),
+            PromptBlock(sections["target_structure"], PROJECT, "TARGET STRUCTURE (FOLLOW THIS CLOSELY)"),
+            PromptBlock(sections["cobol_analysis"], PROJECT, "COBOL ANALYSIS"),
+            PromptBlock(sections["source_code"], VOLATILE, "SOURCE CODE"),
+            PromptBlock(sections["rag_context"], VOLATILE, "RAG CONTEXT")
         ]
 
-        logger.info("Calling Azure OpenAI for conversion")
-        
-        conversion_response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT_NAME,
-            messages=conversion_msgs,
-            temperature=0.2,
-            max_tokens=8000
-        )
-
-        logger.info(f"Conversion response received. Usage: {conversion_response.usage}")
+    # Fit the variable context into the deployment's window next to the reply. Source code
+    # and target structure are kept whole first; supporting context is trimmed or dropped.
+    section_names = ("source_code", "target_structure", "cobol_analysis", "db_setup_template", "rag_context", "standards_context")
+    fixed_tokens = count_message_tokens(
+        layout_messages(conversion_system, conversion_blocks(dict.fromkeys(section_names, ""))),
+        profile.model
+    )
+    packed = pack_sections([
+        PromptSection("source_code", cobol_code_str, priority=0, trim=TRIM_ENDS),
+        PromptSection("target_structure", target_structure_str, priority=1, min_tokens=500),
+        PromptSection("cobol_analysis", cobol_analysis_str, priority=2, min_tokens=500),
+        PromptSection("db_setup_template", db_setup_template, priority=3, min_tokens=200),
+        PromptSection("rag_context", rag_context, priority=4, min_tokens=200),
+        PromptSection("standards_context", standards_context, priority=5, min_tokens=200)
+    ], get_prompt_budget(profile.model, profile.max_tokens, fixed_tokens), profile.model)
+    logger.info(f"Conversion prompt uses {packed.tokens + fixed_tokens} tokens")
+
+    # Call Azure OpenAI for conversion
+    conversion_msgs = layout_messages(conversion_system, conversion_blocks(packed.sections))
+
+    return {
+        "project_id": project_id,
+        "cobol_json": cobol_json,
+        "target_structure": target_structure,
+        "conversion_msgs": conversion_msgs,
+        "prompt_token_savings": summarize_savings(serialization_stats)
+    }
 
-        # Extract and parse the JSON response
-        converted_json = extract_json_from_response(conversion_response.choices[0].message.content)
-        
-        if not converted_json:
-            logger.error("Failed to extract JSON from conversion response")
-            return jsonify({"error": "Failed to process conversion response.", "files": {}}), 500
-
-        # --- BEGIN: Unit and Functional Test Generation Integration ---
-        # Extract Controllers and Services for test generation
-        converted_code = converted_json.get("converted_code", [])
-        # Try to extract Controllers and Services from the converted_code list
-        controllers = []
-        print(controllers)
-        services = []
-        print(services)
-        for file_info in converted_code:
-            if isinstance(file_info, dict):
-                file_name = file_info.get("file_name", "")
-                path = file_info.get("path", "")
-                content = file_info.get("content", "")
-                # Heuristics: look for 'Controller' or 'Service' in file name or path
-                if "controller" in file_name.lower() or "controller" in path.lower():
-                    controllers.append({"file_name": file_name, "path": path, "content": content})
-                if "service" in file_name.lower() or "service" in path.lower():
-                    services.append({"file_name": file_name, "path": path, "content": content})
-
-        # Compose a minimal dict to pass to the unit/functional test prompt
-        unit_test_input = {
-            "Controllers": controllers,
-            "Services": services
-        }
-        print("[DEBUG] Extracted controllers:", controllers)
-        print("[DEBUG] Extracted services:", services)
-
-        # Generate unit test prompt
-        print("[DEBUG] Creating unit test prompt with input:", unit_test_input)
-        unit_test_prompt = create_unit_test_prompt(
-            "C#",
-            unit_test_input,
-        )
-        unit_test_system = (
-            "You are an expert test engineer specializing in writing comprehensive unit tests for .NET 8 applications. "
-            "For EACH Controller class found, generate a separate unit test file named '[ControllerName]Tests.cs'. "
-            "Return your response in JSON as follows:\n"
-            "{\n"
-            '  "unitTestFiles": [{'
-            '       "fileName": "[ControllerName]Tests.cs",'
-            '       "content": "...unit test code..."'
-            '   }, ...],'
-            '  "testDescription": "...",'
-            '  "coverage": [...],'
-            '  "businessRuleTests": [...]'
-            "}\n"
+def extract_test_targets(converted_code):
+    """Collect the Controllers and Services from the converted files as input for test generation."""
+    # Try to extract Controllers and Services from the converted_code list
+    controllers = []
+    services = []
+    for file_info in converted_code:
+        if isinstance(file_info, dict):
+            file_name = file_info.get("file_name", "")
+            path = file_info.get("path", "")
+            content = file_info.get("content", "")
+            # Heuristics: look for 'Controller' or 'Service' in file name or path
+            if "controller" in file_name.lower() or "controller" in path.lower():
+                controllers.append({"file_name": file_name, "path": path, "content": content})
+            if "service" in file_name.lower() or "service" in path.lower():
+                services.append({"file_name": file_name, "path": path, "content": content})
+
+    # Compose a minimal dict to pass to the unit/functional test prompt
+    unit_test_input = {
+        "Controllers": controllers,
+        "Services": services
+    }
+    logger.debug(f"Extracted test targets: {[c['file_name'] for c in controllers]} controllers, "
+                 f"{[s['file_name'] for s in services]} services")
+    return unit_test_input
+
+def unit_test_messages(unit_test_input):
+    """Build the chat messages of the unit test call for a test input."""
+    # Generate unit test prompt
+    unit_test_prompt = create_unit_test_prompt(
+        "C#",
+        unit_test_input,
+    )
+    unit_test_system = (
+        "You are an expert test engineer specializing in writing comprehensive unit tests for .NET 8 applications. "
+        "For EACH Controller class found, generate a separate unit test file named '[ControllerName]Tests.cs'. "
+        "Return your response in JSON as follows:\n"
+        "{\n"
+        '  "unitTestFiles": [{'
+        '       "fileName": "[ControllerName]Tests.cs",'
+        '       "content": "...unit test code..."'
+        '   }, ...],'
+        '  "testDescription": "...",'
+        '  "coverage": [...],'
+        '  "businessRuleTests": [...]'
+        "}\n"
+    )
+
+    return [
+        {"role": "system", "content": unit_test_system},
+        {"role": "user", "content": unit_test_prompt}
+    ]
+
+def generate_unit_tests(unit_test_input):
+    """Generate unit test files for the converted Controllers and Services. Returns (unit_test_code, unit_test_json)."""
+    try:
+        profile = get_stage_profile(UNIT_TESTS)
+        unit_test_json, _ = structured_completion(
+            client,
+            model=profile.model,
+            messages=unit_test_messages(unit_test_input),
+            response_format=UNIT_TEST_FORMAT,
+            hedge=UNIT_TESTS,
+            **profile.request_options()
         )
+        logger.info("✅ Unit test JSON parsed successfully")
+        unit_test_code = unit_test_json.get("unitTestFiles", [])
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Unit test generation failed: {e}")
+        unit_test_json = {}
+        unit_test_code = []
+    return unit_test_code, unit_test_json
 
-        unit_test_messages = [
-            {"role": "system", "content": unit_test_system},
-            {"role": "user", "content": unit_test_prompt}
-        ]
-        print("[DEBUG] Sending unit test messages to LLM:", unit_test_messages)
-        try:
-            unit_test_response = client.chat.completions.create(
-                model=AZURE_OPENAI_DEPLOYMENT_NAME,
-                messages=unit_test_messages,
-                temperature=0.1,
-                max_tokens=3000,
-                response_format={"type": "json_object"}
-            )
-            unit_test_content = unit_test_response.choices[0].message.content.strip()
-            print("[DEBUG] Raw unit test LLM response:", unit_test_content)
-            try:
-                unit_test_json = json.loads(unit_test_content)
-                print("[DEBUG] Parsed unit test JSON:", unit_test_json)
-                logger.info("✅ Unit test JSON parsed successfully")
-            except json.JSONDecodeError:
-                logger.warning("⚠️ Failed to parse unit test JSON directly")
-                unit_test_json = extract_json_from_response(unit_test_content)
-                print("[DEBUG] Extracted unit test JSON via fallback:", unit_test_json)
-            # Fix: Extract unit test files correctly from the JSON
-            unit_test_code = unit_test_json.get("unitTestFiles")
-            if not unit_test_code:
-                unit_test_code = unit_test_json.get("unitTestCode", "")
-            print("[DEBUG] Final unit test code:", unit_test_code)
-        except Exception as e:
-            logger.error(f"Unit test generation failed: {e}")
-            print("[ERROR] Exception during unit test generation:", e)
-            try:
-                unit_test_json = json.loads(unit_test_content)
-                print("[DEBUG] Exception fallback, parsed unit test JSON:", unit_test_json)
-                unit_test_code = unit_test_json.get("unitTestFiles", [])
-            except Exception as ex:
-                print("[ERROR] Exception fallback also failed:", ex)
-                unit_test_json = {}
-                unit_test_code = []
-
-        # Generate functional test prompt
-        functional_test_prompt = create_functional_test_prompt(
-            "C#",
-            unit_test_input
+async def generate_unit_tests_async(unit_test_input):
+    """Async counterpart of generate_unit_tests."""
+    try:
+        profile = get_stage_profile(UNIT_TESTS)
+        unit_test_json, _ = await structured_completion_async(
+            None,
+            model=profile.model,
+            messages=unit_test_messages(unit_test_input),
+            response_format=UNIT_TEST_FORMAT,
+            hedge=UNIT_TESTS,
+            **profile.request_options()
         )
-        functional_test_system = (
-            "You are an expert QA engineer specializing in creating functional tests for .NET 8 applications. "
-            "You create comprehensive test scenarios that verify the application meets all business requirements. "
-            "Focus on user journey tests, acceptance criteria, and business domain validation. "
-            "Return your response in JSON format with the following structure:\n"
-            "{\n"
-            '  "functionalTests": [\n'
-            '    {"id": "FT1", "title": "Test scenario title", "steps": ["Step 1", "Step 2"], "expectedResult": "Expected outcome", "businessRule": "Related business rule"},\n'
-            '    {"id": "FT2", "title": "Another test scenario", "steps": ["Step 1", "Step 2"], "expectedResult": "Expected outcome", "businessRule": "Related business rule"}\n'
-            '  ],\n'
-            '  "testStrategy": "Description of the overall testing approach",\n'
-            '  "domainCoverage": ["List of business domain areas covered"]\n'
-            "}"
+        logger.info("✅ Unit test JSON parsed successfully")
+        unit_test_code = unit_test_json.get("unitTestFiles", [])
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Unit test generation failed: {e}")
+        unit_test_json = {}
+        unit_test_code = []
+    return unit_test_code, unit_test_json
+
+def functional_test_messages(unit_test_input):
+    """Build the chat messages of the functional test call for a test input."""
+    # Generate functional test prompt
+    functional_test_prompt = create_functional_test_prompt(
+        "C#",
+        unit_test_input
+    )
+    functional_test_system = (
+        "You are an expert QA engineer specializing in creating functional tests for .NET 8 applications. "
+        "You create comprehensive test scenarios that verify the application meets all business requirements. "
+        "Focus on user journey tests, acceptance criteria, and business domain validation. "
+        "Return your response in JSON format with the following structure:\n"
+        "{\n"
+        '  "functionalTests": [\n'
+        '    {"id": "FT1", "title": "Test scenario title", "steps": ["Step 1", "Step 2"], "expectedResult": "Expected outcome", "businessRule": "Related business rule"},\n'
+        '    {"id": "FT2", "title": "Another test scenario", "steps": ["Step 1", "Step 2"], "expectedResult": "Expected outcome", "businessRule": "Related business rule"}\n'
+        '  ],\n'
+        '  "testStrategy": "Description of the overall testing approach",\n'
+        '  "domainCoverage": ["List of business domain areas covered"]\n'
+        "}"
+    )
+    return [
+        {"role": "system", "content": functional_test_system},
+        {"role": "user", "content": functional_test_prompt}
+    ]
+
+def generate_functional_tests(unit_test_input):
+    """Generate functional test scenarios for the converted Controllers and Services."""
+    try:
+        profile = get_stage_profile(FUNCTIONAL_TESTS)
+        functional_test_json, _ = structured_completion(
+            client,
+            model=profile.model,
+            messages=functional_test_messages(unit_test_input),
+            response_format=FUNCTIONAL_TEST_FORMAT,
+            hedge=FUNCTIONAL_TESTS,
+            **profile.request_options()
         )
-        functional_test_messages = [
-            {"role": "system", "content": functional_test_system},
-            {"role": "user", "content": functional_test_prompt}
-        ]
-        try:
-            functional_test_response = client.chat.completions.create(
-                model=AZURE_OPENAI_DEPLOYMENT_NAME,
-                messages=functional_test_messages,
-                temperature=0.1,
-                max_tokens=3000,
-                response_format={"type": "json_object"}
-            )
-            functional_test_content = functional_test_response.choices[0].message.content.strip()
-            try:
-                functional_test_json = json.loads(functional_test_content)
-                logger.info("✅ Functional test JSON parsed successfully")
-            except json.JSONDecodeError:
-                logger.warning("⚠️ Failed to parse functional test JSON directly")
-                functional_test_json = extract_json_from_response(functional_test_content)
-        except Exception as e:
-            logger.error(f"Functional test generation failed: {e}")
-            functional_test_json = {}
-        # --- END: Unit and Functional Test Generation Integration ---
+        logger.info("✅ Functional test JSON parsed successfully")
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Functional test generation failed: {e}")
+        functional_test_json = {}
+    return functional_test_json
 
-        # Save converted code JSON
-        output_dir_path = os.path.join("output", "converted", project_id)
-        os.makedirs(output_dir_path, exist_ok=True)
-        output_path = os.path.join(output_dir_path, "converted_csharp.json")
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(converted_json, f, indent=2)
-        logger.info(f"Converted C# code saved to: {output_path}")
-
-        # Create and save .NET folder structure
-        files = flatten_converted_code(
-            converted_json.get("converted_code", []), 
-            unit_test_code,
-            project_id,
-            target_structure
+async def generate_functional_tests_async(unit_test_input):
+    """Async counterpart of generate_functional_tests."""
+    try:
+        profile = get_stage_profile(FUNCTIONAL_TESTS)
+        functional_test_json, _ = await structured_completion_async(
+            None,
+            model=profile.model,
+            messages=functional_test_messages(unit_test_input),
+            response_format=FUNCTIONAL_TEST_FORMAT,
+            hedge=FUNCTIONAL_TESTS,
+            **profile.request_options()
         )
-        
-        logger.info(f"Generated {len(files)} files for .NET project")
-
-        return jsonify({
-            "status": "success",
-            "project_id": project_id,
-            "converted_code": converted_json.get("converted_code", []),
-            "conversion_notes": converted_json.get("conversion_notes", []),
-            "unit_tests": unit_test_code,
-            "unit_test_details": unit_test_json,
-            "functional_tests": functional_test_json,
-            "files": files
-        })
+        logger.info("✅ Functional test JSON parsed successfully")
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Functional test generation failed: {e}")
+        functional_test_json = {}
+    return functional_test_json
+
+def save_conversion_output(project_id, converted_json, unit_test_code, target_structure):
+    """Save the converted JSON and materialize the .NET solution. Returns the generated files."""
+    # Save converted code JSON
+    output_dir_path = os.path.join("output", "converted", project_id)
+    os.makedirs(output_dir_path, exist_ok=True)
+    output_path = os.path.join(output_dir_path, "converted_csharp.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(converted_json, f, indent=2)
+    logger.info(f"Converted C# code saved to: {output_path}")
+
+    # Create and save .NET folder structure
+    files = flatten_converted_code(
+        converted_json.get("converted_code", []), 
+        unit_test_code,
+        project_id,
+        target_structure
+    )
+    
+    logger.info(f"Generated {len(files)} files for .NET project")
+    return files
+
+def _ignore_progress(stage, progress=None):
+    """Default progress reporter for pipeline runs that are not tracked."""
+
+def create_test_pipeline():
+    """Create the per-file unit/functional test generation pipeline used by conversions."""
+    return TestGenerationPipeline(
+        extract_test_targets,
+        generate_unit_tests,
+        generate_functional_tests,
+        max_workers=TEST_GENERATION_WORKERS
+    )
+
+def stream_conversion(context, tests):
+    """
+    Stream the conversion response, dispatching test generation for each converted file
+    as soon as its JSON object is complete. Yields (delta, dispatched_file_names).
+    """
+    scanner = ConvertedFileScanner()
+    profile = get_stage_profile(CODE_CONVERSION)
+    for delta in stream_chat_completion(
+        client,
+        model=profile.model,
+        messages=context["conversion_msgs"],
+        response_format=CODE_CONVERSION_FORMAT,
+        **profile.request_options()
+    ):
+        dispatched = [f.get("file_name", "") for f in scanner.feed(delta) if tests.submit(f)]
+        yield delta, dispatched
+
+def run_conversion(data, report=_ignore_progress):
+    """Run the full conversion pipeline for a request payload; `report(stage, progress)` is called as each stage starts."""
+    if LLM_ASYNC_PIPELINES:
+        return run_sync(run_conversion_async(data, report))
+    report("preparation", 0.05)
+    context = prepare_conversion(data)
+    project_id = context["project_id"]
+
+    with create_test_pipeline() as tests:
+        report("conversion", 0.15)
+        logger.info("Calling Azure OpenAI for conversion")
+
+        # Tests for each Controller/Service start while the rest of the response is still arriving
+        conversion_text = "".join(delta for delta, _ in stream_conversion(context, tests))
+        logger.info(f"Conversion response received ({len(conversion_text)} chars, "
+                    f"{tests.dispatched} files already dispatched for test generation)")
+
+        converted_json = parse_conversion_response(conversion_text)
+
+        # Pick up any files the incremental scan could not see (e.g. non-standard wrapping)
+        tests.submit_all(converted_json.get("converted_code", []))
+        report("tests", 0.6)
+        unit_test_code, unit_test_json, functional_test_json = tests.gather()
+
+    report("materialization", 0.95)
+    files = save_conversion_output(project_id, converted_json, unit_test_code, context["target_structure"])
+    return conversion_result(context, converted_json, unit_test_code, unit_test_json, functional_test_json, files)
+
+async def run_conversion_async(data, report=_ignore_progress):
+    """
+    Async counterpart of run_conversion for an event loop (see asgi.py); must run inside an app context.
+
+    The conversion call is awaited without streaming, then the unit and functional
+    tests of every converted Controller/Service are generated concurrently.
+    Preparation (RAG lookup) and materialization run on worker threads.
+    """
+    report("preparation", 0.05)
+    context = await asyncio.to_thread(prepare_conversion, data)
+    project_id = context["project_id"]
+
+    report("conversion", 0.15)
+    logger.info("Calling Azure OpenAI for conversion (async)")
+    profile = get_stage_profile(CODE_CONVERSION)
+    response = await chat_completion_async(
+        None,
+        model=profile.model,
+        messages=context["conversion_msgs"],
+        response_format=CODE_CONVERSION_FORMAT,
+        **profile.request_options()
+    )
+    converted_json = parse_conversion_response(response.choices[0].message.content or "")
+
+    report("tests", 0.6)
+    unit_test_code, unit_test_json, functional_test_json = await generate_tests_async(
+        converted_json.get("converted_code", []),
+        extract_test_targets,
+        generate_unit_tests_async,
+        generate_functional_tests_async,
+        max_workers=TEST_GENERATION_WORKERS
+    )
+
+    report("materialization", 0.95)
+    files = await asyncio.to_thread(save_conversion_output, project_id, converted_json, unit_test_code,
+                                    context["target_structure"])
+    return conversion_result(context, converted_json, unit_test_code, unit_test_json, functional_test_json, files)
+
+def parse_conversion_response(conversion_text):
+    """Parse the conversion reply, failing the request if nothing could be recovered."""
+    # The response is constrained to CODE_CONVERSION_SCHEMA, so it parses directly
+    converted_json = parse_structured_content(conversion_text)
+
+    if not converted_json:
+        logger.error("Failed to extract JSON from conversion response")
+        raise ConversionRequestError("Failed to process conversion response.", 500)
+    return converted_json
+
+def conversion_result(context, converted_json, unit_test_code, unit_test_json, functional_test_json, files):
+    """Build the response of a completed conversion run."""
+    return {
+        "status": "success",
+        "project_id": context["project_id"],
+        "converted_code": converted_json.get("converted_code", []),
+        "conversion_notes": converted_json.get("conversion_notes", []),
+        "unit_tests": unit_test_code,
+        "unit_test_details": unit_test_json,
+        "functional_tests": functional_test_json,
+        "prompt_token_savings": context["prompt_token_savings"],
+        "files": files
+    }
+
+@bp.route("/convert", methods=["POST"])
+def convert_cobol_to_csharp():
+    try:
+        data = request.json
+        project_id = data.get("projectId") if isinstance(data, dict) else None
+        # Stop spending LLM quota once the client has gone away or the deadline has passed
+        token = CancellationToken()
+        with ClientDisconnectWatcher(request.environ, token):
+            result = job_manager.run_inline(CONVERSION_JOB, project_id, run_conversion, data, token=token)
+        return jsonify(result)
+
+    except RequestError as e:
+        return jsonify({"error": e.message, "files": {}}), e.status_code
+    except Exception as e:
+        logger.error(f"❌ Conversion failed: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e), "files": {}}), 500
+
+def format_sse(event, data):
+    """Format a Server-Sent Event frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
+def _wait_with_heartbeat(future, interval=SSE_HEARTBEAT_SECONDS):
+    """Yield SSE comment frames until the future completes so proxies keep the connection open."""
+    while True:
+        try:
+            future.result(timeout=interval)
+            return
+        except FuturesTimeoutError:
+            yield ": keep-alive\n\n"
+
+@bp.route("/convert/stream", methods=["POST"])
+def convert_cobol_to_csharp_stream():
+    """Streaming variant of /convert that pushes model output and stage transitions as Server-Sent Events."""
+    data = request.json or {}
+    try:
+        context = prepare_conversion(data)
+    except ConversionRequestError as e:
+        return jsonify({"error": e.message, "files": {}}), e.status_code
     except Exception as e:
         logger.error(f"❌ Conversion failed: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": str(e), "files": {}}), 500
 
+    project_id = context["project_id"]
+
+    # The run's deadline starts now; closing the stream (client disconnect) cancels it
+    token = CancellationToken(PIPELINE_TIMEOUT_SECONDS)
+
+    def generate():
+        stage = "conversion"
+        tests = create_test_pipeline()
+        try:
+            with cancellation_scope(token):
+                yield format_sse("stage", {"stage": stage, "status": "started", "project_id": project_id})
+                logger.info("Streaming Azure OpenAI conversion")
+                parts = []
+                for delta, dispatched in stream_conversion(context, tests):
+                    parts.append(delta)
+                    yield format_sse("delta", {"content": delta})
+                    for file_name in dispatched:
+                        yield format_sse("stage", {"stage": "tests", "status": "dispatched", "file": file_name})
+                yield format_sse("stage", {"stage": stage, "status": "completed"})
+
+                converted_json = parse_structured_content("".join(parts))
+                if not converted_json:
+                    logger.error("Failed to extract JSON from conversion response")
+                    yield format_sse("error", {"stage": stage, "error": "Failed to process conversion response."})
+                    return
+
+                tests.submit_all(converted_json.get("converted_code", []))
+                stage = "tests"
+                yield format_sse("stage", {"stage": stage, "status": "started", "files": tests.dispatched})
+                with ThreadPoolExecutor(max_workers=1, thread_name_prefix="convert-stream") as executor:
+                    future = executor.submit(tests.gather)
+                    yield from _wait_with_heartbeat(future)
+                    unit_test_code, unit_test_json, functional_test_json = future.result()
+                yield format_sse("stage", {"stage": stage, "status": "completed", "functional_tests": functional_test_json})
+
+                stage = "materialization"
+                yield format_sse("stage", {"stage": stage, "status": "started"})
+                files = save_conversion_output(project_id, converted_json, unit_test_code, context["target_structure"])
+                yield format_sse("stage", {"stage": stage, "status": "completed"})
+
+                yield format_sse("manifest", {
+                    "project_id": project_id,
+                    "files": [{"path": path, "size": len(content)} for path, content in files.items()],
+                    "conversion_notes": converted_json.get("conversion_notes", []),
+                    "unit_test_details": unit_test_json
+                })
+                yield format_sse("done", {"status": "success", "project_id": project_id})
+
+        except GeneratorExit:
+            # The client went away mid-stream: abort in-flight conversion and test calls
+            token.cancel("client disconnected")
+            raise
+        except OperationCancelled as e:
+            logger.warning(f"Streaming conversion stopped at stage {stage}: {e.message}")
+            yield format_sse("error", {"stage": stage, "error": e.message})
+        except Exception as e:
+            logger.error(f"❌ Streaming conversion failed at stage {stage}: {str(e)}")
+            traceback.print_exc()
+            yield format_sse("error", {"stage": stage, "error": str(e)})
+        finally:
+            # Drop queued test generation if the client went away mid-stream
+            tests.close(cancel=True)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @bp.route("/converted-files/<base_name>", methods=["GET"])
 def get_converted_files(base_name):
     """Return the file tree and contents for a given conversion (by base_name) from ConvertedCode."""
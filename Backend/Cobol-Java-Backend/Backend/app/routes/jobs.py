@@ -0,0 +1,64 @@
+from flask import Blueprint, request, jsonify
+from ..config import logger
+from ..utils.jobs import job_manager
+from .analysis import ANALYSIS_JOB, run_requirements_analysis
+from .conversion import CONVERSION_JOB, run_conversion
+from .batch import PORTFOLIO_JOB, run_portfolio_conversion
+
+bp = Blueprint('jobs', __name__, url_prefix='/cobo')
+
+PIPELINES = {
+    ANALYSIS_JOB: run_requirements_analysis,
+    CONVERSION_JOB: run_conversion,
+    PORTFOLIO_JOB: run_portfolio_conversion
+}
+
+@bp.route("/jobs/<kind>", methods=["POST"])
+def submit_job(kind):
+    """Queue an analyze-requirements, convert or convert-batch pipeline run and return its job id immediately"""
+    try:
+        pipeline = PIPELINES.get(kind)
+        if pipeline is None:
+            return jsonify({"error": f"Unknown job type: {kind}", "supported": sorted(PIPELINES)}), 404
+
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        job = job_manager.submit(kind, data.get("projectId"), pipeline, data)
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"{bp.url_prefix}/jobs/{job.id}"
+        }), 202
+    except RuntimeError as e:
+        logger.warning(f"Job submission rejected: {e}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error submitting {kind} job: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Return stage, progress, timings and, once finished, the result of a job"""
+    job = job_manager.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@bp.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job; its pending and in-flight LLM calls are abandoned"""
+    job = job_manager.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not job.cancel():
+        return jsonify({"error": f"Job already {job.status}", "status": job.status}), 409
+    logger.info(f"Cancellation requested for job {job_id}")
+    return jsonify(job.to_dict(include_result=False)), 202
+
+@bp.route("/jobs", methods=["GET"])
+def list_jobs():
+    """List known jobs, newest first, optionally filtered by kind and project"""
+    jobs = job_manager.store.list(request.args.get("kind"), request.args.get("project_id"))
+    return jsonify({"jobs": [job.to_dict(include_result=False) for job in jobs]})
@@ -1,5 +1,11 @@
 from flask import Blueprint, jsonify
 from ..config import logger
+from ..utils.llm_cache import get_llm_cache
+from ..utils.rate_limiter import get_rate_limiter_stats
+from ..utils.llm_usage import get_usage_stats
+from ..utils.llm_hedging import get_hedge_policy
+from ..utils.llm_router import get_router_stats
+from ..utils.model_profiles import get_stage_profiles
 import time
 
 bp = Blueprint('misc', __name__, url_prefix='/cobo')
@@ -22,4 +28,47 @@ def get_languages():
     ]
     
     logger.info(f"Returning {len(languages)} supported languages")
-    return jsonify({"languages": languages})
\ No newline at end of file
+    return jsonify({"languages": languages})
+
+@bp.route("/llm-cache", methods=["GET"])
+def llm_cache_stats():
+    """Return hit/miss counters and occupancy of the LLM response cache"""
+    cache = get_llm_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(cache.stats())
+
+@bp.route("/llm-cache", methods=["DELETE"])
+def clear_llm_cache():
+    """Drop every cached LLM response"""
+    cache = get_llm_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    cache.clear()
+    logger.info("LLM response cache cleared")
+    return jsonify({"status": "cleared"})
+
+@bp.route("/llm-rate-limits", methods=["GET"])
+def llm_rate_limit_stats():
+    """Return the adaptive concurrency limit and retry counters per deployment"""
+    return jsonify(get_rate_limiter_stats())
+
+@bp.route("/llm-usage", methods=["GET"])
+def llm_usage_stats():
+    """Return prompt, cached prompt and completion token totals per deployment"""
+    return jsonify(get_usage_stats())
+
+@bp.route("/llm-hedging", methods=["GET"])
+def llm_hedging_stats():
+    """Return hedged request counters and the current hedge delay per call kind"""
+    return jsonify(get_hedge_policy().snapshot())
+
+@bp.route("/llm-deployments", methods=["GET"])
+def llm_deployment_stats():
+    """Return routing strategy, health, latency and load of each deployment pool member"""
+    return jsonify(get_router_stats())
+
+@bp.route("/llm-stage-profiles", methods=["GET"])
+def llm_stage_profiles():
+    """Return the deployment, temperature and max_tokens each pipeline stage calls the model with"""
+    return jsonify(get_stage_profiles())
@@ -0,0 +1,235 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Container, Dict, Iterable, List, Optional, Tuple
+from .source_reader import BLOCK_SIZE
+
+# A file whose mtime is this close to when it was last hashed may have been edited again
+# within the filesystem timestamp granularity, so its stat is not trusted
+RACY_WINDOW_NS = 2_000_000_000
+# SQLite's default limit on host parameters in one statement is 999
+_BATCH_SIZE = 500
+
+
+class FileAnalysisCache:
+    """
+    SQLite-backed cache of per-file COBOL analyses for one project.
+
+    Analyses are stored as serialized text keyed by a SHA-256 hash of the analyzer
+    version, the file name and the raw file content, so an unchanged file is never
+    parsed twice and a changed analyzer invalidates everything. Each entry also
+    records the content hashes of the copybooks its analysis expanded, so a caller
+    can tell when a copybook change made it stale. A manifest of the size, mtime
+    and key last seen for each path lets unchanged files skip being re-read and
+    re-hashed, except for recently modified files, which are always hashed. The
+    manifest records the analyzer version it was written under and is ignored by
+    any other version.
+    """
+
+    def __init__(self, db_path: str, version: str):
+        """
+        Open the cache and create the backing tables if needed.
+
+        Args:
+            db_path: Path of the SQLite database file
+            version: Analyzer version; entries written by another version are never returned
+        """
+        self.db_path = db_path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                deps TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        # Caches written before copybook expansion have no deps column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analyses)")}
+        if "deps" not in columns:
+            self._conn.execute("ALTER TABLE analyses ADD COLUMN deps TEXT NOT NULL DEFAULT ''")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hashed_at_ns INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                version TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        # Manifests written before versions were recorded match no version and are rebuilt
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE files ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+        self._manifest = {
+            path: (size, mtime_ns, hashed_at_ns, key)
+            for path, size, mtime_ns, hashed_at_ns, key in self._conn.execute(
+                "SELECT path, size, mtime_ns, hashed_at_ns, key FROM files WHERE version = ?", (version,)
+            )
+        }
+        self._seen = {}
+
+    def __enter__(self) -> "FileAnalysisCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def make_key(self, file_path: Path) -> str:
+        """
+        Return the content address of a file, reading it only if its stat changed.
+
+        Args:
+            file_path: File to identify
+
+        Returns:
+            Hex digest of the analyzer version, file name and content
+        """
+        path = str(file_path)
+        stat = file_path.stat()
+        known = self._manifest.get(path)
+        if (known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns
+                and known[2] - stat.st_mtime_ns > RACY_WINDOW_NS):
+            self._seen[path] = known
+            return known[3]
+
+        digest = hashlib.sha256(f"{self.version}\0{file_path.name}\0".encode("utf-8"))
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        key = digest.hexdigest()
+        self._seen[path] = (stat.st_size, stat.st_mtime_ns, time.time_ns(), key)
+        return key
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        """Return the cached (payload, deps) of the given keys; missing keys are left out."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), _BATCH_SIZE):
+            batch = keys[start:start + _BATCH_SIZE]
+            rows = self._conn.execute(
+                f"SELECT key, payload, deps FROM analyses WHERE key IN ({','.join('?' * len(batch))})", batch
+            )
+            found.update((key, (payload, deps)) for key, payload, deps in rows)
+        return found
+
+    def lookup(self, file_paths: List[Path],
+               exclude: Container[str] = ()) -> Tuple[List[Optional[str]], Dict[str, Tuple[str, str]]]:
+        """
+        Identify files and fetch whatever is already cached for them.
+
+        Args:
+            file_paths: Files of the project
+            exclude: Keys the caller already holds; they are not fetched but count as hits
+
+        Returns:
+            Tuple of (key per file in the order of `file_paths`, None for unreadable files;
+            cached (payload, deps) by key)
+        """
+        keys = []
+        for file_path in file_paths:
+            try:
+                keys.append(self.make_key(file_path))
+            except OSError:
+                # Left to the analyzer, which reports unreadable files
+                keys.append(None)
+        found = self.get_many(key for key in keys if key is not None and key not in exclude)
+        self.hits = sum(1 for key in keys if key in found or key in exclude)
+        self.misses = len(keys) - self.hits
+        return keys, found
+
+    def store(self, entries: Dict[str, Tuple[str, str]]) -> None:
+        """
+        Save new analyses and the manifest of the files seen by this lookup.
+
+        Manifest rows of files that no longer exist, and analyses no file refers
+        to any more, are dropped, so the cache stays the size of the project.
+
+        Args:
+            entries: (payload, deps) of fresh analyses by key
+        """
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO analyses (key, payload, deps) VALUES (?, ?, ?)",
+                [(key, payload, deps) for key, (payload, deps) in entries.items()]
+            )
+            self._conn.execute("DELETE FROM files")
+            self._conn.executemany(
+                "INSERT INTO files (path, size, mtime_ns, hashed_at_ns, key, version) VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, *row, self.version) for path, row in self._seen.items()]
+            )
+            self._conn.execute("DELETE FROM analyses WHERE key NOT IN (SELECT key FROM files)")
+        self._manifest = dict(self._seen)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+
+class AnalysisMemo:
+    """
+    In-process LRU of decoded analyses by FileAnalysisCache key.
+
+    Saves decoding cached payloads again on every run of a project whose files
+    are mostly unchanged. Entries are (analysis, rendered payload, deps) and are
+    shared by every caller, so analyses taken from the memo must not be modified.
+    The memo is bounded by the total length of the rendered payloads.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: Upper bound of the summed payload lengths kept (0 disables the memo)
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], str, str]]:
+        """Return the (analysis, payload, deps) of a key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, analysis: Dict[str, Any], payload: str, deps: str) -> None:
+        """Remember a decoded analysis, evicting the least recently used ones beyond max_bytes."""
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (analysis, payload, deps)
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[1])
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry[1])
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+from flask import current_app, has_app_context
+from ..config import logger
+from .cancellation import cancellation_scope, current_token
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+
+
+def get_bridge_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the background event loop that runs async pipeline code for sync callers.
+
+    The loop lives on a daemon thread for the lifetime of the process, so its
+    async HTTP pool and in-flight cap are shared by every request thread.
+
+    Returns:
+        The running bridge loop
+    """
+    global _loop, _thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _thread = threading.Thread(target=loop.run_forever, name="llm-async-bridge", daemon=True)
+                _thread.start()
+                _loop = loop
+                logger.info("Async bridge event loop started")
+    return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the bridge loop and block until it finishes.
+
+    The caller's cancellation token and app context apply inside the coroutine,
+    so a cancelled or timed-out run stops its async LLM calls at the next checkpoint.
+
+    Args:
+        coro: Coroutine to run, e.g. run_requirements_analysis_async(...)
+        timeout: Seconds to wait for the result (None = no limit)
+
+    Returns:
+        The coroutine's result
+    """
+    if _running_loop() is not None:
+        coro.close()
+        raise RuntimeError("run_sync cannot be called from a running event loop; await the coroutine instead")
+    token = current_token()
+    app = current_app._get_current_object() if has_app_context() else None
+
+    async def scoped():
+        with cancellation_scope(token):
+            if app is None:
+                return await coro
+            with app.app_context():
+                return await coro
+    return asyncio.run_coroutine_threadsafe(scoped(), get_bridge_loop()).result(timeout)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import selectors
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from ..config import logger, CLIENT_DISCONNECT_POLL_SECONDS
+from .errors import RequestError
+
+# Status reported for runs abandoned because the client went away (nginx convention)
+CLIENT_CLOSED_REQUEST = 499
+# Status reported for runs that ran past their deadline
+DEADLINE_EXCEEDED = 504
+# Longest uninterrupted wait of CancellationToken.sleep
+SLEEP_POLL_SECONDS = 0.5
+# Peeking at the client socket must never block the watcher (not available on Windows)
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+class OperationCancelled(RequestError):
+    """Raised at the next checkpoint of a cancelled or timed-out pipeline run."""
+
+    def __init__(self, message, status_code=CLIENT_CLOSED_REQUEST):
+        super().__init__(message, status_code)
+
+
+class CancellationToken:
+    """
+    Cancellation state and deadline of one pipeline run.
+
+    The token is cancelled explicitly (client disconnect, job cancellation) or
+    implicitly once its deadline passes. Long-running code calls `check()`
+    between steps and `sleep()` instead of `time.sleep()` so abandoned work
+    stops at the next checkpoint. A child token can be cancelled on its own and
+    is also cancelled with its parent.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancellationToken"] = None):
+        """
+        Args:
+            timeout: Seconds until the deadline; None or 0 for no deadline
+            parent: Token whose cancellation and deadline also apply to this one
+        """
+        self._event = threading.Event()
+        self._reason = None
+        self._deadline = None
+        self.parent = parent
+        if timeout:
+            self.set_timeout(timeout)
+
+    def set_timeout(self, timeout: float) -> None:
+        """Start the deadline `timeout` seconds from now."""
+        self._deadline = time.monotonic() + timeout
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self._reason = reason
+            self._event.set()
+            logger.info(f"Pipeline run cancelled: {reason}")
+
+    @property
+    def expired(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or self.expired or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None without one."""
+        own = None if self._deadline is None else max(0.0, self._deadline - time.monotonic())
+        inherited = self.parent.remaining() if self.parent is not None else None
+        if own is None or inherited is None:
+            return inherited if own is None else own
+        return min(own, inherited)
+
+    def check(self) -> None:
+        """Raise OperationCancelled if the run was cancelled or its deadline passed."""
+        if self._event.is_set():
+            raise OperationCancelled(f"Operation cancelled: {self._reason}")
+        if self.expired:
+            raise OperationCancelled("Operation deadline exceeded", DEADLINE_EXCEEDED)
+        if self.parent is not None:
+            self.parent.check()
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep up to `seconds`, waking early and raising once the run is cancelled or out of time."""
+        end = time.monotonic() + seconds
+        while not self.cancelled:
+            left = end - time.monotonic()
+            remaining = self.remaining()
+            if remaining is not None:
+                left = min(left, remaining)
+            if left <= 0:
+                break
+            # A parent's cancellation does not wake its children, so long sleeps re-check periodically
+            self._event.wait(min(left, SLEEP_POLL_SECONDS))
+        self.check()
+
+
+_current_token = contextvars.ContextVar("cancellation_token", default=None)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """Token of the pipeline run executing in this thread, if any."""
+    return _current_token.get()
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """Make `token` the current token for the duration of the block."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled() -> None:
+    """Checkpoint: raise OperationCancelled if the current run was cancelled or timed out."""
+    token = current_token()
+    if token is not None:
+        token.check()
+
+
+def cancellable_sleep(seconds: float) -> None:
+    """time.sleep that is cut short when the current run is cancelled."""
+    token = current_token()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+async def cancellable_sleep_async(seconds: float) -> None:
+    """asyncio.sleep that is cut short when the current run is cancelled."""
+    token = current_token()
+    if token is None:
+        await asyncio.sleep(seconds)
+        return
+    end = time.monotonic() + seconds
+    while not token.cancelled:
+        left = end - time.monotonic()
+        remaining = token.remaining()
+        if remaining is not None:
+            left = min(left, remaining)
+        if left <= 0:
+            break
+        await asyncio.sleep(min(left, SLEEP_POLL_SECONDS))
+    token.check()
+
+
+def propagate_token(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Bind the current token to `fn` so it also applies when `fn` runs on a worker thread.
+
+    Args:
+        fn: Callable submitted to an executor
+
+    Returns:
+        Wrapper running `fn` inside the caller's cancellation scope
+    """
+    token = current_token()
+
+    def run(*args, **kwargs):
+        with cancellation_scope(token):
+            return fn(*args, **kwargs)
+    return run
+
+
+class ClientDisconnectWatcher:
+    """
+    Cancels a token when the HTTP client of the current request disconnects.
+
+    Polls the request socket exposed by the development server (`werkzeug.socket`)
+    on a background thread: a readable socket with nothing left to read, or a
+    reset connection, means the peer went away. Pending request data does not. Servers that do not expose the socket are
+    not watched; the run's deadline still applies.
+    """
+
+    def __init__(self, environ: Dict[str, Any], token: CancellationToken,
+                 interval: float = CLIENT_DISCONNECT_POLL_SECONDS):
+        self.sock = environ.get("werkzeug.socket")
+        self.token = token
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "ClientDisconnectWatcher":
+        if self.sock is not None and self.interval > 0:
+            self._thread = threading.Thread(target=self._watch, name="disconnect-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _watch(self) -> None:
+        # poll/epoll based, unlike select.select, which fails for descriptors at or above FD_SETSIZE
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.sock, selectors.EVENT_READ)
+                while not self._stop.wait(self.interval):
+                    if self._disconnected(selector):
+                        self.token.cancel("client disconnected")
+                        return
+        except (OSError, ValueError) as e:
+            # The socket cannot be watched (e.g. already closed by the server); the deadline still applies
+            logger.debug(f"Stopped watching client connection: {e}")
+
+    def _disconnected(self, selector: selectors.BaseSelector) -> bool:
+        """True only when the peer closed the connection: readable with nothing left to read, or reset."""
+        if not selector.select(0):
+            return False
+        try:
+            return self.sock.recv(1, socket.MSG_PEEK | _MSG_DONTWAIT) == b""
+        except (BlockingIOError, InterruptedError):
+            return False
+        except ConnectionError:
+            return True
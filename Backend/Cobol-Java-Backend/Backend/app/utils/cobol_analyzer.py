@@ -1,21 +1,52 @@
+import atexit
+import functools
 import json
 import logging
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict
-from ..config import logger, UPLOAD_DIR, output_dir
+from typing import Dict, Iterator, List, Optional, Tuple
+from ..config import (
+    logger, UPLOAD_DIR, output_dir,
+    COBOL_ANALYSIS_WORKERS, COBOL_ANALYSIS_CHUNK_SIZE, COBOL_ANALYSIS_PARALLEL_MIN_FILES,
+    COBOL_ANALYSIS_CACHE_ENABLED, COBOL_ANALYSIS_MEMO_MAX_BYTES, COBOL_EXPAND_COPYBOOKS, COBOL_SOURCE_FORMAT
+)
+from .analysis_cache import AnalysisMemo, FileAnalysisCache
+from .copybook_library import CopybookLibrary, get_copybook_library, parse_copy_statement
+from .source_reader import SourceFile
+from .cancellation import check_cancelled
+from .cobol_lexer import (
+    CobolToken, tokenize_cobol, tokenize_jcl,
+    SECTION, PROGRAM_ID, COPY, EXEC_CICS, LEVEL_ENTRY, PARAGRAPH, STATEMENT, JCL_DEFINE
+)
 
 ANALYSIS_DIR = Path(output_dir) / "analysis"
+COBOL_EXTENSIONS = (".cbl", ".cpy", ".jcl")
+ANALYSIS_CACHE_FILE = "file_analysis_cache.sqlite3"
+# Bump whenever analyze_cobol_file produces different output for the same input,
+# so cached per-file analyses from the previous version are not reused
+ANALYZER_VERSION = "3"
 
-def analyze_cobol_file(file_path: Path) -> Dict:
-    """Analyze a single COBOL file and return its structure."""
+_pool = None
+_pool_lock = threading.Lock()
+_memo = AnalysisMemo(COBOL_ANALYSIS_MEMO_MAX_BYTES)
+
+def analyze_cobol_file(file_path: Path, copybooks: Optional[CopybookLibrary] = None) -> Dict:
+    """Analyze a single COBOL file and return its structure, expanding COPY statements from `copybooks` if given."""
     logger.info(f"Analyzing file: {file_path}")
     if file_path.suffix.lower() not in [".cbl", ".cpy", ".jcl"]:
         logger.warning(f"Invalid file extension for {file_path}. Expected .cbl, .cpy, or .jcl.")
         return {"error": f"Invalid file extension: {file_path.suffix}"}
 
     try:
-        with open(file_path, mode='r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
+        # Mapped and streamed line by line, so memory does not grow with the file size
+        source = SourceFile(file_path)
     except Exception as e:
         logger.error(f"Error reading file {file_path}: {e}")
         return {"error": f"Could not read file: {e}"}
@@ -34,115 +65,306 @@ def analyze_cobol_file(file_path: Path) -> Dict:
             "procedure": []
         },
         "copybooks": [],
+        "copybook_dependencies": [],
         "cics_commands": [],
         "variables": [],
         "paragraphs": [],
         "jcl_definitions": [] if file_path.suffix.lower() == ".jcl" else None
     }
     
-    lines = content.splitlines()
-    current_division = None
-    current_section = None
-    current_paragraph = None
     is_copybook = file_path.suffix.lower() == ".cpy"
-    
-    for line in lines:
-        line = line.strip().upper()
-        if not line or line.startswith("*") or line.startswith("//*"):
-            continue
-        
+    started = time.perf_counter()
+    with source:
         if file_path.suffix.lower() == ".jcl":
-            if line.startswith("//") and not line.startswith("//*"):
-                parts = line.split()
-                if len(parts) > 1:
-                    if "EXEC" in line:
-                        analysis["jcl_definitions"].append({
-                            "type": "EXEC",
-                            "name": parts[1],
-                            "details": line
-                        })
-                    elif "DD" in line:
-                        analysis["jcl_definitions"].append({
-                            "type": "DD",
-                            "name": parts[1],
-                            "details": line
-                        })
-                    elif "DEFINE" in line:
-                        analysis["jcl_definitions"].append({
-                            "type": "DEFINE",
-                            "resource": line.split("DEFINE")[1].split()[0] if "DEFINE" in line else "",
-                            "details": line
-                        })
-            continue
-        
-        if line.startswith("IDENTIFICATION DIVISION"):
-            current_division = "identification"
-        elif line.startswith("ENVIRONMENT DIVISION"):
-            current_division = "environment"
-        elif line.startswith("DATA DIVISION"):
-            current_division = "data"
-        elif line.startswith("PROCEDURE DIVISION"):
-            current_division = "procedure"
-        
-        if current_division == "identification":
-            if line.startswith("PROGRAM-ID"):
-                analysis["divisions"]["identification"]["program_id"] = line.split()[1].strip(".")
-        
-        if current_division == "data":
-            if line.startswith("WORKING-STORAGE SECTION"):
-                current_section = "working_storage"
-            elif line.startswith("LINKAGE SECTION"):
-                current_section = "linkage_section"
-            elif line.startswith("FILE SECTION"):
-                current_section = "file_section"
-            elif line.startswith("COPY"):
-                copybook = line.split()[1].strip(".")
-                analysis["copybooks"].append({
-                    "name": copybook,
-                    "content": line
-                })
-        
-        if "EXEC CICS" in line and not is_copybook:
-            cics_type = line.split()[2] if len(line.split()) > 2 else "UNKNOWN"
-            analysis["cics_commands"].append({
-                "command": line,
-                "type": cics_type,
-                "parameters": line[line.find("EXEC CICS"):],
-                "context": current_paragraph
-            })
-        
-        if current_division == "data" and current_section in ["working_storage", "linkage_section"]:
-            if line.startswith(("01", "05", "77")) or (is_copybook and line.startswith(("01", "05", "77", "88"))):
-                parts = line.split()
-                if len(parts) >= 2:
-                    var_level = parts[0]
-                    var_name = parts[1].strip(".")
-                    var_type = " ".join(parts[2:]) if len(parts) > 2 else ""
-                    analysis["divisions"]["data"][current_section].append({
-                        "level": var_level,
-                        "name": var_name,
-                        "type": var_type,
-                        "picture": var_type if "PIC" in var_type else ""
-                    })
-                    analysis["variables"].append(var_name)
-        
-        if current_division == "procedure" and not is_copybook and line.endswith(".") and not line.startswith("EXEC"):
-            if not any(kw in line for kw in ["MOVE", "PERFORM", "IF", "ELSE", "END"]):
-                current_paragraph = line.split()[0]
-                analysis["paragraphs"].append(current_paragraph)
-                analysis["divisions"]["procedure"].append({
-                    "paragraph": current_paragraph,
-                    "code": [line]
-                })
-            elif current_paragraph and analysis["divisions"]["procedure"]:
-                analysis["divisions"]["procedure"][-1]["code"].append(line)
+            for token in tokenize_jcl(source.lines()):
+                entry = {"type": token.kind}
+                entry["resource" if token.kind == JCL_DEFINE else "name"] = token.value
+                entry["details"] = token.text
+                analysis["jcl_definitions"].append(entry)
+        else:
+            lines = source.code_lines(fixed_format=COBOL_SOURCE_FORMAT == "fixed")
+            _collect_tokens(analysis, tokenize_cobol(lines, is_copybook), copybooks)
+        line_count = source.line_count
+    elapsed = time.perf_counter() - started
     
     if is_copybook and not analysis["variables"]:
         logger.warning(f"No variables found in copybook {file_path.name}. Content may be empty or malformed.")
     
-    logger.info(f"File {file_path.name} analyzed: {len(analysis['variables'])} variables, {len(analysis['cics_commands'])} CICS commands, {len(analysis['paragraphs'])} paragraphs")
+    logger.info(f"File {file_path.name} analyzed: {len(analysis['variables'])} variables, {len(analysis['cics_commands'])} CICS commands, {len(analysis['paragraphs'])} paragraphs "
+                f"({line_count} lines in {elapsed:.3f}s, {line_count / max(elapsed, 1e-9):,.0f} lines/s)")
     return analysis
 
+def _collect_tokens(analysis: Dict, tokens: Iterator[CobolToken], copybooks: Optional[CopybookLibrary] = None) -> None:
+    """Fill the analysis of a program or copybook from its token stream."""
+    divisions = analysis["divisions"]
+    current_section = None
+    current_paragraph = None
+    procedure = divisions["procedure"]
+    paragraphs = analysis["paragraphs"]
+    # Statements are by far the most frequent tokens, so they are checked first
+    for token in tokens:
+        kind = token.kind
+        if kind == STATEMENT:
+            if current_paragraph and procedure:
+                procedure[-1]["code"].append(token.text)
+        elif kind == PARAGRAPH:
+            current_paragraph = token.value
+            paragraphs.append(current_paragraph)
+            procedure.append({
+                "paragraph": current_paragraph,
+                "code": [token.text]
+            })
+        elif kind == LEVEL_ENTRY:
+            if current_section in ("working_storage", "linkage_section"):
+                divisions["data"][current_section].append({
+                    "level": token.value,
+                    "name": token.name,
+                    "type": token.detail,
+                    "picture": token.detail if "PIC" in token.detail else ""
+                })
+                analysis["variables"].append(token.name)
+        elif kind == EXEC_CICS:
+            analysis["cics_commands"].append({
+                "command": token.text,
+                "type": token.value,
+                "parameters": token.text[token.text.find("EXEC CICS"):],
+                "context": current_paragraph
+            })
+        elif kind == SECTION:
+            current_section = token.value
+        elif kind == COPY:
+            analysis["copybooks"].append({
+                "name": token.value,
+                "content": token.text
+            })
+            if copybooks is not None:
+                _expand_copy(analysis, token, copybooks, current_section)
+        elif kind == PROGRAM_ID:
+            divisions["identification"]["program_id"] = token.value
+
+def _expand_copy(analysis: Dict, token: CobolToken, copybooks: CopybookLibrary, section: Optional[str]) -> None:
+    """Add the data items a COPY statement brings in to the section it appears in."""
+    copy = parse_copy_statement(token.text)
+    expanded = copybooks.expand(copy.name, copy.replacing)
+    dependencies = analysis["copybook_dependencies"]
+    for name in expanded.dependencies if expanded is not None else (copy.name.upper(),):
+        if name not in dependencies:
+            dependencies.append(name)
+    if expanded is None:
+        logger.warning(f"Copybook {copy.name} copied by {analysis['file_name']} not found in project")
+        return
+    if section not in ("working_storage", "linkage_section"):
+        return
+    entries = analysis["divisions"]["data"][section]
+    for copybook, entry in expanded.entries:
+        entries.append({
+            "level": entry.value,
+            "name": entry.name,
+            "type": entry.detail,
+            "picture": entry.detail if "PIC" in entry.detail else "",
+            "copybook": copybook
+        })
+        analysis["variables"].append(entry.name)
+
+def analysis_worker_count() -> int:
+    """Number of worker processes used for project analysis."""
+    return COBOL_ANALYSIS_WORKERS if COBOL_ANALYSIS_WORKERS > 0 else (os.cpu_count() or 1)
+
+def _init_analysis_worker() -> None:
+    """Keep the per-file log lines of worker processes out of the shared log file."""
+    logging.getLogger().setLevel(logging.WARNING)
+
+def get_analysis_pool() -> ProcessPoolExecutor:
+    """Return the shared analysis process pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the server process runs request and job threads
+            _pool = ProcessPoolExecutor(
+                max_workers=analysis_worker_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_analysis_worker
+            )
+            logger.info(f"Started COBOL analysis pool with {analysis_worker_count()} worker processes")
+        return _pool
+
+def shutdown_analysis_pool(wait: bool = True) -> None:
+    """Stop the shared analysis process pool; the next analysis starts a new one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+atexit.register(shutdown_analysis_pool)
+
+def analyze_cobol_files(file_paths: List[Path], workers: Optional[int] = None,
+                        copybooks: Optional[CopybookLibrary] = None) -> List[Dict]:
+    """
+    Analyze many files, fanning them out to the process pool for large projects.
+
+    Files are handed to the workers in chunks so that the per-task overhead is paid
+    once per chunk rather than once per file. Projects smaller than
+    COBOL_ANALYSIS_PARALLEL_MIN_FILES, or a single worker, are analyzed in-process.
+    If the pool breaks (e.g. a worker is killed), the remaining files are analyzed
+    in-process as well.
+
+    Args:
+        file_paths: Files to analyze
+        workers: Number of workers; defaults to analysis_worker_count()
+        copybooks: Library to expand COPY statements from; each worker process keeps its own copy
+
+    Returns:
+        One analysis per file, in the order of `file_paths`
+    """
+    analyze = functools.partial(analyze_cobol_file, copybooks=copybooks)
+    workers = analysis_worker_count() if workers is None else workers
+    started = time.perf_counter()
+    results = []
+    if workers > 1 and len(file_paths) >= COBOL_ANALYSIS_PARALLEL_MIN_FILES:
+        chunk_size = COBOL_ANALYSIS_CHUNK_SIZE or math.ceil(len(file_paths) / (workers * 4))
+        try:
+            # map yields in submission order; stopping early cancels the chunks not started yet
+            for file_analysis in get_analysis_pool().map(analyze, file_paths, chunksize=chunk_size):
+                results.append(file_analysis)
+                check_cancelled()
+        except BrokenProcessPool as e:
+            logger.warning(f"COBOL analysis pool failed ({e}); analyzing the remaining files in-process")
+            shutdown_analysis_pool(wait=False)
+    else:
+        workers = 1
+
+    for file_path in file_paths[len(results):]:
+        check_cancelled()
+        results.append(analyze(file_path))
+
+    logger.info(f"Analyzed {len(file_paths)} files with {workers} worker(s) in {time.perf_counter() - started:.2f}s")
+    return results
+
+def render_file_analysis(analysis: Dict) -> str:
+    """Render a file analysis exactly as it appears in the "files" list of cobol_analysis.json."""
+    return "    " + json.dumps(analysis, indent=2).replace("\n", "\n    ")
+
+def analyze_project_files(project_id: str, file_paths: List[Path],
+                          copybooks: Optional[CopybookLibrary] = None) -> Tuple[List[Dict], List[Optional[str]]]:
+    """
+    Analyze the files of a project, re-parsing only files that are new or changed.
+
+    Unchanged files are identified by content hash in the project's FileAnalysisCache
+    and their cached analyses are spliced in; everything else goes through
+    analyze_cobol_files. A cached program is also re-parsed when a copybook it
+    expanded has changed. The cache holds each analysis as rendered by
+    render_file_analysis, which is returned alongside so cobol_analysis.json can be
+    written without encoding cached files again. Decoded analyses are kept in an
+    in-process memo, so later runs only decode files the process has not seen;
+    analyses from the memo are shared and must not be modified. Falls back to
+    analyzing everything if the cache is unusable.
+
+    Args:
+        project_id: Project the files belong to
+        file_paths: Files to analyze
+        copybooks: Library to expand COPY statements from, if any
+
+    Returns:
+        Tuple of (one analysis per file, in the order of `file_paths`; its rendered
+        form, or None where it was not rendered)
+    """
+    if not COBOL_ANALYSIS_CACHE_ENABLED:
+        return analyze_cobol_files(file_paths, copybooks=copybooks), [None] * len(file_paths)
+
+    started = time.perf_counter()
+    # Analyses differ by source format and with or without copybook expansion, so they are cached apart
+    version = f"{ANALYZER_VERSION}+{COBOL_SOURCE_FORMAT}" + ("" if copybooks is None else "+copybooks")
+    try:
+        cache = FileAnalysisCache(str(ANALYSIS_DIR / project_id / ANALYSIS_CACHE_FILE), version)
+    except sqlite3.Error as e:
+        logger.warning(f"COBOL analysis cache unavailable for {project_id} ({e}); analyzing all files")
+        return analyze_cobol_files(file_paths, copybooks=copybooks), [None] * len(file_paths)
+
+    with cache:
+        try:
+            keys, stored = cache.lookup(file_paths, exclude=_memo)
+        except sqlite3.Error as e:
+            logger.warning(f"COBOL analysis cache unreadable for {project_id} ({e}); analyzing all files")
+            return analyze_cobol_files(file_paths, copybooks=copybooks), [None] * len(file_paths)
+
+        # (analysis or None until decoded, rendered, deps) by key
+        cached = {key: (None, payload, deps) for key, (payload, deps) in stored.items()}
+        for key in keys:
+            entry = _memo.get(key) if key is not None else None
+            if entry is not None:
+                cached[key] = entry
+
+        if copybooks is not None:
+            for key, (_, _, deps) in list(cached.items()):
+                names = [item.rsplit("=", 1)[0] for item in deps.split()]
+                if names and copybooks.dependency_digests(names) != deps:
+                    del cached[key]
+                    _memo.discard(key)
+
+        stale = [index for index, key in enumerate(keys) if key not in cached]
+        fresh = dict(zip(stale, analyze_cobol_files([file_paths[index] for index in stale], copybooks=copybooks)))
+        # Failed analyses are not cached so the file is retried next time
+        entries = {
+            keys[index]: (
+                analysis,
+                render_file_analysis(analysis),
+                copybooks.dependency_digests(analysis["copybook_dependencies"]) if copybooks is not None else ""
+            )
+            for index, analysis in fresh.items() if keys[index] is not None and "error" not in analysis
+        }
+        cached.update(entries)
+        try:
+            cache.store({key: (rendered, deps) for key, (_, rendered, deps) in entries.items()})
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update COBOL analysis cache for {project_id}: {e}")
+
+    analyses = []
+    decoded = 0
+    for index, key in enumerate(keys):
+        if index in fresh:
+            analysis = fresh[index]
+        else:
+            analysis, rendered, deps = cached[key]
+            if analysis is None:
+                analysis = json.loads(rendered)
+                decoded += 1
+        if key in cached:
+            _memo.put(key, analysis, cached[key][1], cached[key][2])
+        analyses.append(analysis)
+    logger.info(f"COBOL analysis cache for {project_id}: {len(file_paths) - len(stale)} files reused "
+                f"({decoded} decoded), {len(stale)} analyzed in {time.perf_counter() - started:.2f}s")
+    return analyses, [cached[key][1] if key in cached else None for key in keys]
+
+def write_cobol_json(json_path: Path, cobol_json: Dict, rendered_files: List[Optional[str]]) -> None:
+    """
+    Write cobol_analysis.json as json.dump(cobol_json, f, indent=2) would.
+
+    Files are spliced in from their rendered form where one is available, which
+    spares re-encoding them with the pure-Python indenting encoder, and are
+    written one at a time rather than joined into one string first.
+
+    Args:
+        json_path: Output path
+        cobol_json: Project analysis
+        rendered_files: render_file_analysis output per entry of cobol_json["files"], or None
+    """
+    files = cobol_json["files"]
+    text = json.dumps({**cobol_json, "files": []}, indent=2)
+    json_path.parent.mkdir(exist_ok=True, parents=True)
+    with open(json_path, mode='w', encoding='utf-8') as f:
+        if not files:
+            f.write(text)
+            return
+        # String values are escaped, so the only unquoted '"files": []' is the key itself
+        head, tail = text.split('"files": []', 1)
+        f.write(head + '"files": [\n')
+        for index, (analysis, rendered) in enumerate(zip(files, rendered_files)):
+            if index:
+                f.write(",\n")
+            f.write(rendered or render_file_analysis(analysis))
+        f.write("\n  ]" + tail)
+
 def create_cobol_json(project_id: str) -> Dict:
     """Create a JSON file summarizing COBOL file analysis."""
     logger.info(f"Creating COBOL JSON for project: {project_id}")
@@ -157,23 +379,29 @@ def create_cobol_json(project_id: str) -> Dict:
         "dependencies": []
     }
     
-    for file_path in project_dir.glob("**/*"):
-        if file_path.suffix.lower() in [".cbl", ".cpy", ".jcl"]:
-            file_analysis = analyze_cobol_file(file_path)
-            if "error" not in file_analysis:
-                cobol_json["files"].append(file_analysis)
-                if file_analysis.get("copybooks"):
-                    dependencies = [cb["name"] for cb in file_analysis["copybooks"]]
-                    cobol_json["dependencies"].extend(dependencies)
-                    logger.info(f"Extracted dependencies from {file_path.name}: {dependencies}")
+    # Sorted so the JSON does not depend on directory listing order; comparing parts
+    # orders paths like Path comparison does, without its per-comparison overhead
+    file_paths = sorted((path for path in project_dir.glob("**/*") if path.suffix.lower() in COBOL_EXTENSIONS),
+                        key=lambda path: path.parts)
+    copybooks = get_copybook_library(project_dir, file_paths) if COBOL_EXPAND_COPYBOOKS else None
+    file_analyses, rendered = analyze_project_files(project_id, file_paths, copybooks)
+    rendered_files = []
+    # Results come back in file order and are merged here on the calling thread only,
+    # so files and dependencies are identical whatever the number of workers
+    for file_path, file_analysis, file_rendered in zip(file_paths, file_analyses, rendered):
+        if "error" not in file_analysis:
+            cobol_json["files"].append(file_analysis)
+            rendered_files.append(file_rendered)
+            if file_analysis.get("copybooks"):
+                dependencies = [cb["name"] for cb in file_analysis["copybooks"]]
+                cobol_json["dependencies"].extend(dependencies)
+                logger.info(f"Extracted dependencies from {file_path.name}: {dependencies}")
     
     if not cobol_json["files"]:
         logger.warning(f"No valid COBOL files found for project: {project_id}")
     
     json_path = ANALYSIS_DIR / project_id / "cobol_analysis.json"
-    json_path.parent.mkdir(exist_ok=True, parents=True)
-    with open(json_path, mode='w', encoding='utf-8') as f:
-        json.dump(cobol_json, f, indent=2)
+    write_cobol_json(json_path, cobol_json, rendered_files)
     
     logger.info(f"COBOL JSON created at: {json_path}")
     return cobol_json
\ No newline at end of file
@@ -0,0 +1,220 @@
+import re
+from typing import Callable, List, Optional, Tuple
+from ..config import logger
+from .prompt_packer import count_tokens, truncate_to_tokens
+
+DIVISION_PATTERN = re.compile(r"^(IDENTIFICATION|ID|ENVIRONMENT|DATA|PROCEDURE)\s+DIVISION\b")
+SECTION_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9-]*\s+SECTION(\s+\d+)?\s*\.")
+PARAGRAPH_PATTERN = re.compile(r"^([A-Z0-9][A-Z0-9-]*)\s*\.\s*$")
+END_PROGRAM_PATTERN = re.compile(r"^END\s+PROGRAM\b")
+
+# Single-word sentences that can appear on their own line but are not paragraph names
+NON_PARAGRAPH_WORDS = {"EXIT", "GOBACK", "CONTINUE", "STOP", "ELSE", "DECLARATIVES"}
+
+
+class CobolChunk(str):
+    """
+    A chunk of COBOL source: shared program context followed by procedure code.
+
+    Behaves as the full chunk text; `context` (everything before the procedure
+    code, including the DATA DIVISION and the PROCEDURE DIVISION header) and
+    `body` are kept so callers can avoid repeating the context.
+    """
+
+    def __new__(cls, context: str, body: str):
+        chunk = super().__new__(cls, f"{context}\n{body}" if context else body)
+        chunk.context = context
+        chunk.body = body
+        return chunk
+
+
+def _code_area(line: str) -> Tuple[str, bool, bool]:
+    """
+    Split a source line into its code text, comment flag and Area A flag.
+
+    Fixed-format lines (sequence area in columns 1-6, indicator in column 7) are
+    reduced to columns 8-72; other lines are treated as free format.
+    """
+    if len(line) > 6 and (not line[:6].strip() or line[:6].isdigit()) and line[6] in " *-/Dd":
+        code = line[7:72]
+        is_comment = line[6] in "*/"
+    else:
+        code = line
+        is_comment = line.lstrip().startswith("*>")
+    # Area A is the first four columns of the code text (columns 8-11 in fixed format)
+    in_area_a = len(code) - len(code.lstrip()) < 4
+    return code.strip().upper(), is_comment, in_area_a
+
+
+def _is_unit_header(code: str, in_area_a: bool) -> bool:
+    """True for SECTION and paragraph headers, which start in Area A."""
+    if not in_area_a or not code:
+        return False
+    if SECTION_PATTERN.match(code):
+        return True
+    match = PARAGRAPH_PATTERN.match(code)
+    return bool(match) and match.group(1) not in NON_PARAGRAPH_WORDS and not match.group(1).startswith("END-")
+
+
+def _split_programs(lines: List[str]) -> List[List[str]]:
+    """
+    Split a source file into separate programs at each IDENTIFICATION DIVISION and after each END PROGRAM.
+
+    Lines outside any program, such as comments introducing the next program, go
+    with the program that follows; what is left after the last one (e.g. the END
+    PROGRAM of a program enclosing a nested one) stays with the program before it.
+    """
+    programs, current = [], []
+    for line in lines:
+        code, is_comment, _ = _code_area(line)
+        if not is_comment and DIVISION_PATTERN.match(code) and code.startswith(("IDENTIFICATION", "ID ")) and current:
+            if _has_division(current):
+                programs.append(current)
+                current = []
+        current.append(line)
+        if not is_comment and END_PROGRAM_PATTERN.match(code):
+            programs.append(current)
+            current = []
+    if current:
+        programs.append(current)
+
+    merged = []
+    for program in programs:
+        if merged and not _has_division(program):
+            merged[-1].extend(program)
+        else:
+            merged.append(program)
+    return merged
+
+
+def _has_division(lines: List[str]) -> bool:
+    return any(DIVISION_PATTERN.match(_code_area(line)[0]) for line in lines)
+
+
+def _split_units(lines: List[str]) -> List[List[str]]:
+    """Split procedure code into units that each start at a SECTION or paragraph header."""
+    units, current = [], []
+    for line in lines:
+        code, is_comment, in_area_a = _code_area(line)
+        starts_unit = not is_comment and _is_unit_header(code, in_area_a)
+        # A SECTION header stays with the paragraph that follows it
+        if starts_unit and current and not _only_section_header(current):
+            units.append(current)
+            current = []
+        current.append(line)
+    if current:
+        units.append(current)
+    return units
+
+
+def _only_section_header(lines: List[str]) -> bool:
+    codes = [c for c, is_comment, _ in map(_code_area, lines) if c and not is_comment]
+    return len(codes) == 1 and bool(SECTION_PATTERN.match(codes[0]))
+
+
+def _split_oversized(lines: List[str], budget: int, count: Callable[[str], int]) -> List[str]:
+    """Split a unit larger than the budget at sentence ends (lines ending in a period)."""
+    pieces, current, current_tokens = [], [], 0
+    for line in lines:
+        line_tokens = count(line) + 1
+        if current and current_tokens + line_tokens > budget:
+            # Prefer to cut after the last complete sentence in the piece
+            cut = max((i for i, l in enumerate(current) if l.rstrip().endswith(".")), default=len(current) - 1) + 1
+            pieces.append("\n".join(current[:cut]))
+            current = current[cut:]
+            current_tokens = count("\n".join(current)) if current else 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_cobol_source(source_code: str, max_tokens: int,
+                       count: Optional[Callable[[str], int]] = None) -> Optional[List[CobolChunk]]:
+    """
+    Split COBOL source on DIVISION, SECTION and paragraph boundaries.
+
+    Everything before the procedure code (IDENTIFICATION, ENVIRONMENT and the whole
+    DATA DIVISION, plus the PROCEDURE DIVISION header) is repeated in every chunk of
+    a program as shared context. Whole sections/paragraphs are packed greedily into
+    the remaining token budget with no overlap; only a single paragraph larger than
+    the budget is split, at sentence ends. Chunks never span two programs.
+
+    Args:
+        source_code: COBOL source, possibly containing several programs
+        max_tokens: Token budget of one chunk, context included
+        count: Token counting function; defaults to the configured model's tokenizer
+
+    Returns:
+        List of chunks, or None if the source has no PROCEDURE DIVISION
+    """
+    count = count or count_tokens
+    chunks = []
+    found_procedure = False
+
+    for program in _split_programs(source_code.splitlines()):
+        procedure_index = next(
+            (i for i, line in enumerate(program)
+             if not _code_area(line)[1] and _code_area(line)[0].startswith("PROCEDURE DIVISION")),
+            None
+        )
+        if procedure_index is None:
+            # Copybook or data-only program: keep it whole when it fits
+            text = "\n".join(program)
+            chunks.extend(CobolChunk("", piece) for piece in (
+                [text] if count(text) <= max_tokens else _split_oversized(program, max_tokens, count)
+            ))
+            continue
+        found_procedure = True
+
+        # The PROCEDURE DIVISION header (possibly with USING over several lines) ends at its period
+        header_end = procedure_index
+        while header_end < len(program) - 1 and not _code_area(program[header_end])[0].endswith("."):
+            header_end += 1
+        context = "\n".join(program[:header_end + 1])
+        procedure_lines = program[header_end + 1:]
+
+        budget = max_tokens - count(context)
+        if budget < max_tokens // 4:
+            logger.warning(f"Shared COBOL context uses {count(context)} of {max_tokens} chunk tokens; trimming it")
+            context = truncate_to_tokens(context, max_tokens // 2)
+            budget = max_tokens - count(context)
+
+        body, body_tokens = [], 0
+        for unit in _split_units(procedure_lines):
+            unit_text = "\n".join(unit)
+            unit_tokens = count(unit_text) + 1
+            if unit_tokens > budget:
+                if body:
+                    chunks.append(CobolChunk(context, "\n".join(body)))
+                    body, body_tokens = [], 0
+                chunks.extend(CobolChunk(context, piece) for piece in _split_oversized(unit, budget, count))
+                continue
+            if body and body_tokens + unit_tokens > budget:
+                chunks.append(CobolChunk(context, "\n".join(body)))
+                body, body_tokens = [], 0
+            body.append(unit_text)
+            body_tokens += unit_tokens
+        if body:
+            chunks.append(CobolChunk(context, "\n".join(body)))
+
+    if not found_procedure:
+        return None
+    logger.info(f"COBOL chunker produced {len(chunks)} chunks within {max_tokens} tokens each")
+    return chunks
+
+
+def join_chunks(chunks: List[str]) -> str:
+    """Rebuild the source from chunks, writing each shared COBOL context only once."""
+    parts, seen = [], set()
+    for chunk in chunks:
+        context = getattr(chunk, "context", None)
+        if context is None:
+            parts.append(str(chunk))
+            continue
+        if context and context not in seen:
+            seen.add(context)
+            parts.append(context)
+        parts.append(chunk.body)
+    return "\n".join(parts)
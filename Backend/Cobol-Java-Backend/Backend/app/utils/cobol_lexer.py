@@ -0,0 +1,173 @@
+import re
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+# Token kinds emitted by tokenize_cobol / tokenize_jcl
+DIVISION = "division"
+SECTION = "section"
+PROGRAM_ID = "program_id"
+COPY = "copy"
+EXEC_CICS = "exec_cics"
+LEVEL_ENTRY = "level_entry"
+PARAGRAPH = "paragraph"
+STATEMENT = "statement"
+JCL_EXEC = "EXEC"
+JCL_DD = "DD"
+JCL_DEFINE = "DEFINE"
+
+# Everything a line can start with that the analyzer cares about, in one pattern
+LINE_START_PATTERN = re.compile(
+    r"(?P<division>IDENTIFICATION|ENVIRONMENT|DATA|PROCEDURE) DIVISION"
+    r"|(?P<section>WORKING-STORAGE|LINKAGE|FILE) SECTION"
+    r"|(?P<program_id>PROGRAM-ID)"
+    r"|(?P<copy>COPY)"
+    r"|(?P<level>01|05|77|88)"
+)
+
+SECTION_NAMES = {"WORKING-STORAGE": "working_storage", "LINKAGE": "linkage_section", "FILE": "file_section"}
+COPYBOOK_ONLY_LEVELS = ("88",)
+
+
+class CobolToken(NamedTuple):
+    """
+    One lexical fact about a source line.
+
+    `text` is the line stripped and upper-cased. `value` carries the division or
+    section name, PROGRAM-ID, copybook, CICS verb, level number or paragraph label;
+    level entries also carry the data name and the rest of the clause in `name`
+    and `detail`.
+    """
+    kind: str
+    text: str
+    value: str = ""
+    name: str = ""
+    detail: str = ""
+
+
+def tokenize_cobol(content: Union[str, Iterable[str]], is_copybook: bool = False,
+                   division: Optional[str] = None) -> Iterator[CobolToken]:
+    """
+    Lex COBOL source in a single pass, looking at each line once.
+
+    The source is upper-cased in one go and every line is classified with one
+    precompiled pattern instead of a chain of `startswith` checks; inside the
+    PROCEDURE DIVISION the pattern only runs on possible division headers. Division
+    context is tracked here because it decides how procedure lines and data
+    entries are read; one line may produce several tokens (e.g. a division
+    header that is also a procedure sentence). A COPY statement continued over
+    several lines (e.g. its REPLACING clause) becomes one token holding the whole
+    statement.
+
+    Args:
+        content: Source text of a program or copybook, or an iterable of its lines
+            (e.g. SourceFile.code_lines(), which keeps large files out of memory)
+        is_copybook: Whether the source is a copybook (no CICS or procedure tokens, 88 levels count)
+        division: Division the source starts in, e.g. "data" for copybook text copied into one
+
+    Yields:
+        Tokens in source order
+    """
+    in_procedure = division == "procedure"
+    copy_statement = None
+    match_start = LINE_START_PATTERN.match
+    for line in _upper_lines(content):
+        line = line.strip()
+        if not line:
+            continue
+        first = line[0]
+        if first == "*" or (first == "/" and line.startswith("//*")):
+            continue
+
+        if copy_statement is not None:
+            # A COPY statement runs to its period; a line starting a new entry ends it anyway
+            if match_start(line) is None:
+                copy_statement = f"{copy_statement} {line}"
+                if line[-1] == ".":
+                    yield _copy_token(copy_statement)
+                    copy_statement = None
+                continue
+            yield _copy_token(copy_statement)
+            copy_statement = None
+
+        # Inside the PROCEDURE DIVISION only another division header can match the line start
+        match = match_start(line) if not in_procedure or "DIVISION" in line else None
+        if match is not None:
+            kind = match.lastgroup
+            parts = None
+            if kind == DIVISION:
+                division = match.group(DIVISION).lower()
+                in_procedure = division == "procedure"
+                yield CobolToken(DIVISION, line, division)
+            elif kind == PROGRAM_ID:
+                if division == "identification":
+                    parts = line.split()
+                    if len(parts) > 1:
+                        yield CobolToken(PROGRAM_ID, line, parts[1].strip("."))
+            elif division == "data":
+                if kind == SECTION:
+                    yield CobolToken(SECTION, line, SECTION_NAMES[match.group(SECTION)])
+                elif kind == COPY:
+                    parts = line.split()
+                    if len(parts) > 1:
+                        if line[-1] == ".":
+                            yield CobolToken(COPY, line, parts[1].strip("."))
+                        else:
+                            copy_statement = line
+                elif kind == "level" and (is_copybook or match.group("level") not in COPYBOOK_ONLY_LEVELS):
+                    parts = line.split()
+                    if len(parts) >= 2:
+                        yield CobolToken(LEVEL_ENTRY, line, parts[0], parts[1].strip("."), " ".join(parts[2:]))
+        else:
+            parts = None
+
+        if is_copybook:
+            continue
+        if "EXEC CICS" in line:
+            if parts is None:
+                parts = line.split()
+            yield CobolToken(EXEC_CICS, line, parts[2] if len(parts) > 2 else "UNKNOWN")
+
+        if in_procedure and line[-1] == "." and not line.startswith("EXEC"):
+            # Any of these verbs anywhere in the sentence marks a statement rather than a paragraph label;
+            # chained `in` checks beat a regex here
+            if "MOVE" in line or "PERFORM" in line or "IF" in line or "ELSE" in line or "END" in line:
+                yield CobolToken(STATEMENT, line)
+            else:
+                yield CobolToken(PARAGRAPH, line, line.split(None, 1)[0])
+
+    if copy_statement is not None:
+        yield _copy_token(copy_statement)
+
+
+def _copy_token(statement: str) -> CobolToken:
+    return CobolToken(COPY, statement, statement.split()[1].strip("."))
+
+
+def tokenize_jcl(content: Union[str, Iterable[str]]) -> Iterator[CobolToken]:
+    """
+    Lex JCL in a single pass into EXEC, DD and DEFINE statements.
+
+    Args:
+        content: JCL source text, or an iterable of its lines
+
+    Yields:
+        Tokens whose `value` is the step/DD name, or the resource for DEFINE
+    """
+    for line in _upper_lines(content):
+        line = line.strip()
+        if not line.startswith("//") or line.startswith("//*"):
+            continue
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        if "EXEC" in line:
+            yield CobolToken(JCL_EXEC, line, parts[1])
+        elif "DD" in line:
+            yield CobolToken(JCL_DD, line, parts[1])
+        elif "DEFINE" in line:
+            resource = line.split("DEFINE", 1)[1].split()
+            yield CobolToken(JCL_DEFINE, line, resource[0] if resource else "")
+
+
+def _upper_lines(content: Union[str, Iterable[str]]) -> Iterable[str]:
+    # Text is upper-cased in one go; streamed lines one at a time
+    return content.upper().splitlines() if isinstance(content, str) else map(str.upper, content)
@@ -1,8 +1,20 @@
+import asyncio
 import logging
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+from ..config import CHUNK_CONVERSION_WORKERS, CHUNK_CONVERSION_TIMEOUT, CHUNK_TOKEN_SIZE, CHUNK_TOKEN_OVERLAP
+from .llm_client import get_llm_client
+from .llm_gateway import chat_completion, chat_completion_async
+from .cobol_chunker import chunk_cobol_source, join_chunks
+from .prompt_packer import count_tokens, get_prompt_budget, truncate_to_tokens, TRIM_ENDS
+from .prompts import create_code_conversion_instructions, CHUNK_CONVERSION_FORMAT
+from .prompt_serializer import render_for_prompt
+from .prompt_layout import PromptBlock, layout_prompt, STATIC, PROJECT, VOLATILE
+from .cancellation import OperationCancelled, check_cancelled, propagate_token
+from .model_profiles import get_stage_profile, CODE_STRUCTURE, CHUNK_CONVERSION, CODE_POLISH
 
 # Configure logging
 logging.basicConfig(
@@ -11,22 +23,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Tokens kept free for the system message and chat formatting around a prompt
+SYSTEM_PROMPT_RESERVE = 300
+
 class CodeConverter:
     """
     A class to handle code conversion process, including code chunking and 
     managing the conversion of large code files.
     """
     
-    def __init__(self, client, model_name: str):
+    def __init__(self, client, model_name: Optional[str] = None, max_workers: int = 1,
+                 chunk_timeout: Optional[float] = None, async_client=None):
         """
         Initialize the CodeConverter.
         
         Args:
             client: The OpenAI client instance
-            model_name: The deployment name of the model to use
+            model_name: Deployment used for every stage; None to use each stage's profile
+                (structure, chunk conversion and polish can run on different deployments)
+            max_workers: Maximum number of chunks converted concurrently (1 = sequential)
+            chunk_timeout: Timeout in seconds for each chunk conversion call (None = client default)
+            async_client: AsyncAzureOpenAI client of the *_async methods (None = the running
+                event loop's default client)
         """
         self.client = client
+        self.async_client = async_client
         self.model_name = model_name
+        self.max_workers = max(1, max_workers)
+        self.chunk_timeout = chunk_timeout
+
+    def stage_model(self, stage: str) -> str:
+        """Deployment a stage of this converter calls (see model_profiles)."""
+        return self.model_name or get_stage_profile(stage).model
     
 
 
@@ -49,19 +77,29 @@ class CodeConverter:
     
 
     def chunk_code(self, source_code: str, source_language: str, 
-                chunk_size: int = 23500, chunk_overlap: int = 1000) -> List[str]:
+                chunk_size: int = CHUNK_TOKEN_SIZE, chunk_overlap: int = CHUNK_TOKEN_OVERLAP) -> List[str]:
         """
-        Split source code into manageable chunks using LangChain text splitters.
+        Split source code into manageable chunks.
+        
+        COBOL is split on DIVISION/SECTION/paragraph boundaries with the DATA DIVISION
+        repeated as shared context and no overlap; other languages (and COBOL without
+        a PROCEDURE DIVISION) use LangChain text splitters.
         
         Args:
             source_code: The code to be chunked
             source_language: The programming language of the source code
-            chunk_size: Maximum size of each chunk
-            chunk_overlap: Overlap between consecutive chunks
+            chunk_size: Maximum size of each chunk in tokens of the configured model
+            chunk_overlap: Overlap between consecutive chunks in tokens (generic splitter only)
             
         Returns:
             List of code chunks
         """
+        if source_language.upper() == "COBOL":
+            chunks = chunk_cobol_source(source_code, chunk_size, self._count_tokens)
+            if chunks:
+                return chunks
+            logger.info("No PROCEDURE DIVISION found; falling back to the generic splitter")
+        
         language_enum = self.get_language_enum(source_language)
         
         if language_enum:
@@ -69,20 +107,26 @@ class CodeConverter:
             splitter = RecursiveCharacterTextSplitter.from_language(
                 language=language_enum,
                 chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
+                chunk_overlap=chunk_overlap,
+                length_function=self._count_tokens
             )
         else:
             logger.info(f"Using generic splitter for {source_language}")
             splitter = RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                separators=["\n\n", "\n", ".", " ", ""]
+                separators=["\n\n", "\n", ".", " ", ""],
+                length_function=self._count_tokens
             )
         
         chunks = splitter.split_text(source_code)
         logger.info(f"Split code into {len(chunks)} chunks")
         return chunks
 
+    def _count_tokens(self, text: str) -> int:
+        """Token length function for the text splitters, measured for the chunk conversion model."""
+        return count_tokens(text, self.stage_model(CHUNK_CONVERSION))
+
     
 
 
@@ -128,13 +172,108 @@ class CodeConverter:
         structure_result = self._get_code_structure(structure_prompt, target_language)
         
         # Phase 2: Convert each chunk with awareness of the overall structure
+        if self.max_workers > 1:
+            conversion_results = self._convert_chunks_concurrently(
+                chunks, source_language, target_language,
+                business_requirements, technical_requirements,
+                db_setup_template, structure_result
+            )
+        else:
+            conversion_results = []
+            for i, chunk in enumerate(chunks):
+                check_cancelled()
+                logger.info(f"Converting chunk {i+1}/{len(chunks)}")
+                result = self._convert_single_chunk(
+                    chunk, source_language, target_language,
+                    business_requirements, technical_requirements, 
+                    db_setup_template,
+                    additional_context=self._create_chunk_context(i, len(chunks), structure_result)
+                )
+                conversion_results.append(result)
+        
+        # Use the structure-aware merge to create the final code
+        return self._merge_conversion_results(conversion_results, target_language, structure_result)
+
+    async def convert_code_chunks_async(self, chunks: List[str], source_language: str,
+                                        target_language: str, business_requirements: str,
+                                        technical_requirements: str, db_setup_template: str) -> Dict[str, Any]:
+        """
+        Async counterpart of convert_code_chunks.
+        
+        Chunks are converted as concurrent coroutines, at most `max_workers` at a time.
+        The merge (including its polish call) is CPU-bound regex work and runs on a
+        worker thread so it does not block the event loop.
+        
+        Args:
+            chunks: List of code chunks to convert
+            source_language: Source programming language
+            target_language: Target programming language for conversion
+            business_requirements: Business requirements to consider during conversion
+            technical_requirements: Technical requirements to consider during conversion
+            db_setup_template: Database setup template if needed
+            
+        Returns:
+            Dictionary containing the converted code and related information
+        """
+        if not chunks:
+            # Returns the "no code" result without calling the model
+            return self.convert_code_chunks(
+                chunks, source_language, target_language,
+                business_requirements, technical_requirements, db_setup_template
+            )
+        
+        if len(chunks) == 1:
+            return await self._convert_single_chunk_async(
+                chunks[0], source_language, target_language,
+                business_requirements, technical_requirements, db_setup_template
+            )
+        
+        total = len(chunks)
+        logger.info(f"Converting {total} code chunks using a two-phase approach (async)")
+        structure_prompt = self._create_structure_prompt(chunks, source_language, target_language)
+        structure_result = await self._get_code_structure_async(structure_prompt, target_language)
+        
+        semaphore = asyncio.Semaphore(self.max_workers)
+        
+        async def convert(index: int) -> Dict[str, Any]:
+            async with semaphore:
+                check_cancelled()
+                logger.info(f"Converting chunk {index+1}/{total}")
+                return await self._convert_single_chunk_async(
+                    chunks[index], source_language, target_language,
+                    business_requirements, technical_requirements,
+                    db_setup_template,
+                    additional_context=self._create_chunk_context(index, total, structure_result)
+                )
+        
+        outcomes = await asyncio.gather(*(convert(i) for i in range(total)), return_exceptions=True)
         conversion_results = []
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Converting chunk {i+1}/{len(chunks)}")
+        for i, outcome in enumerate(outcomes):
+            if isinstance(outcome, OperationCancelled):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                logger.error(f"Chunk {i+1}/{total} failed: {str(outcome)}")
+                outcome = self._failed_chunk_result(i, outcome)
+            conversion_results.append(outcome)
+        
+        return await asyncio.to_thread(self._merge_conversion_results, conversion_results, target_language, structure_result)
+    
+
+
+    def _create_chunk_context(self, index: int, total: int, structure_result: Dict[str, Any]) -> str:
+        """
+        Build the chunk-specific context that ties a chunk to the overall code structure.
+        
+        Args:
+            index: Zero-based position of the chunk
+            total: Total number of chunks
+            structure_result: Structure information from the first conversion phase
             
-            # Enhanced context includes the code structure and chunk position
-            chunk_context = f"""
-            This is chunk {i+1} of {len(chunks)} from the complete source code.
+        Returns:
+            Context text appended to the chunk conversion prompt
+        """
+        return f"""
+            This is chunk {index+1} of {total} from the complete source code.
             
             IMPORTANT: Ensure your conversion aligns with this overall code structure:
             {structure_result.get('structure', 'No structure available')}
@@ -153,18 +292,70 @@ class CodeConverter:
             - Handle exception blocks properly - don't leave them empty
             - Complete any missing control flow statements (if/while/try)
             """
+
+
+
+    def _convert_chunks_concurrently(self, chunks: List[str], source_language: str,
+                                     target_language: str, business_requirements: str,
+                                     technical_requirements: str, db_setup_template: str,
+                                     structure_result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Convert chunks on a bounded thread pool, preserving chunk order in the results.
+        
+        A chunk that fails or times out yields an error result in its slot instead of
+        aborting the other chunks, so the merge phase always receives one result per chunk.
+        
+        Args:
+            chunks: List of code chunks to convert
+            source_language: Source programming language
+            target_language: Target programming language
+            business_requirements: Business requirements
+            technical_requirements: Technical requirements
+            db_setup_template: Database setup template
+            structure_result: Structure information shared by all chunks
             
-            result = self._convert_single_chunk(
-                chunk, source_language, target_language,
-                business_requirements, technical_requirements, 
-                db_setup_template, additional_context=chunk_context
+        Returns:
+            List of conversion results in the same order as the chunks
+        """
+        total = len(chunks)
+        workers = min(self.max_workers, total)
+        logger.info(f"Converting {total} chunks with {workers} concurrent workers")
+        
+        def convert(index: int) -> Dict[str, Any]:
+            logger.info(f"Converting chunk {index+1}/{total}")
+            return self._convert_single_chunk(
+                chunks[index], source_language, target_language,
+                business_requirements, technical_requirements,
+                db_setup_template,
+                additional_context=self._create_chunk_context(index, total, structure_result)
             )
-            
-            conversion_results.append(result)
         
-        # Use the structure-aware merge to create the final code
-        return self._merge_conversion_results(conversion_results, target_language, structure_result)
-    
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk-convert") as executor:
+            futures = [executor.submit(propagate_token(convert), i) for i in range(total)]
+            conversion_results = []
+            for i, future in enumerate(futures):
+                try:
+                    conversion_results.append(future.result())
+                except OperationCancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                except Exception as e:
+                    logger.error(f"Chunk {i+1}/{total} failed: {str(e)}")
+                    conversion_results.append(self._failed_chunk_result(i, e))
+        
+        return conversion_results
+
+    @staticmethod
+    def _failed_chunk_result(index: int, error: BaseException) -> Dict[str, Any]:
+        """Placeholder result of a chunk that failed, so the merge still gets one result per chunk."""
+        return {
+            "convertedCode": "",
+            "conversionNotes": f"Error converting chunk {index+1}: {str(error)}",
+            "potentialIssues": [f"Chunk {index+1} could not be converted"],
+            "databaseUsed": False
+        }
+
 
 
     def _create_structure_prompt(self, chunks: List[str], source_language: str, target_language: str) -> str:
@@ -180,19 +371,8 @@ class CodeConverter:
         Returns:
             A prompt for the model
         """
-        # Join all chunks to provide a complete overview
-        complete_code = "\n\n".join(chunks)
-        
-        # For very long code, use a summarized version to avoid exceeding token limits
-        if len(complete_code) > 30000:
-            # Extract a representative sample from the beginning, middle, and end
-            begin = complete_code[:10000]
-            middle_start = len(complete_code) // 2 - 5000
-            middle_end = len(complete_code) // 2 + 5000
-            middle = complete_code[middle_start:middle_end]
-            end = complete_code[-10000:]
-            
-            complete_code = f"{begin}\n\n... [code truncated for brevity] ...\n\n{middle}\n\n... [code truncated for brevity] ...\n\n{end}"
+        # Join all chunks to provide a complete overview, without repeating shared COBOL context
+        complete_code = join_chunks(chunks)
         
         # Target language specific instructions
         language_specific = ""
@@ -308,7 +488,7 @@ class CodeConverter:
             - Follow modern OO design principles (SOLID)
             """
         
-        return f"""
+        prompt = f"""
         I need to convert {source_language} code to {target_language}, but first I need a detailed high-level structure to ensure consistency, quality and maintainability.
         
         Please analyze this code and provide a DETAILED architectural blueprint including:
@@ -346,9 +526,19 @@ class CodeConverter:
         Here's the {source_language} code to analyze:
         
         ```
-        {complete_code}
+        {{complete_code}}
         ```
         """
+        
+        # For very long code, keep a representative sample from the beginning, middle
+        # and end that fits the deployment's context next to the structure reply
+        model = self.stage_model(CODE_STRUCTURE)
+        budget = get_prompt_budget(
+            model, get_stage_profile(CODE_STRUCTURE).max_tokens,
+            SYSTEM_PROMPT_RESERVE + count_tokens(prompt, model)
+        )
+        complete_code = truncate_to_tokens(complete_code, budget, model, TRIM_ENDS)
+        return prompt.replace("{complete_code}", complete_code, 1)
 
     
 
@@ -364,100 +554,159 @@ class CodeConverter:
             Dictionary with structure information
         """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are an expert software architect specializing in {target_language} and modern object-oriented design. "
-                                f"Your task is to analyze legacy code and provide a detailed architectural blueprint for modern, clean, "
-                                f"maintainable {target_language} code. You excel at creating well-structured object-oriented designs that "
-                                f"follow best practices and design patterns."
-                    },
-                    {"role": "user", "content": structure_prompt}
-                ],
-                temperature=0.1,
-                max_tokens=4000
+            response = chat_completion(
+                self.client,
+                model=self.stage_model(CODE_STRUCTURE),
+                messages=self.structure_messages(structure_prompt, target_language),
+                **self.structure_request_options()
             )
+            return self.parse_structure_content(response.choices[0].message.content, target_language)
+                
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting code structure: {str(e)}")
+            return self.parse_structure_content("Could not determine code structure", target_language)
+
+    async def _get_code_structure_async(self, structure_prompt: str, target_language: str) -> Dict[str, Any]:
+        """Async counterpart of _get_code_structure."""
+        try:
+            response = await chat_completion_async(
+                self.async_client,
+                model=self.stage_model(CODE_STRUCTURE),
+                messages=self.structure_messages(structure_prompt, target_language),
+                **self.structure_request_options()
+            )
+            return self.parse_structure_content(response.choices[0].message.content, target_language)
+                
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting code structure: {str(e)}")
+            return self.parse_structure_content("Could not determine code structure", target_language)
+
+    @staticmethod
+    def structure_request_options() -> Dict[str, Any]:
+        """Sampling options of the structure call, shared with batch submission."""
+        return get_stage_profile(CODE_STRUCTURE).request_options()
+
+    def program_structure_messages(self, chunks: List[str], source_language: str,
+                                   target_language: str) -> List[Dict[str, str]]:
+        """
+        Build the chat messages of the structure call for the chunks of one program.
+
+        Used by callers that send the request themselves, such as batch submission.
+
+        Args:
+            chunks: The code chunks of the program
+            source_language: Source programming language
+            target_language: Target programming language
+
+        Returns:
+            The chat messages
+        """
+        structure_prompt = self._create_structure_prompt(chunks, source_language, target_language)
+        return self.structure_messages(structure_prompt, target_language)
+
+    def structure_messages(self, structure_prompt: str, target_language: str) -> List[Dict[str, str]]:
+        """
+        Build the chat messages of the structure call.
+        
+        Args:
+            structure_prompt: The prompt asking for the code structure
+            target_language: The target programming language
             
-            structure_content = response.choices[0].message.content.strip()
-            
-            # Extract important structure information
-            structure_info = {
-                "structure": structure_content,
-                "classes": [],
-                "package": None,
-                "interfaces": [],
-                "database_access": False,
-                "exception_strategy": "standard",
-                "patterns": []
-            }
-            
-            # Extract class names
-            class_matches = re.findall(r'class\s+([A-Za-z0-9_]+)', structure_content)
-            structure_info["classes"] = list(set(class_matches))  # Remove duplicates
+        Returns:
+            System and user messages of the structure request
+        """
+        return [
+            {
+                "role": "system",
+                "content": f"You are an expert software architect specializing in {target_language} and modern object-oriented design. "
+                        f"Your task is to analyze legacy code and provide a detailed architectural blueprint for modern, clean, "
+                        f"maintainable {target_language} code. You excel at creating well-structured object-oriented designs that "
+                        f"follow best practices and design patterns."
+            },
+            {"role": "user", "content": structure_prompt}
+        ]
+
+    def parse_structure_content(self, content: Optional[str], target_language: str) -> Dict[str, Any]:
+        """
+        Extract structure information from the reply of the structure call.
+        
+        Args:
+            content: Reply content of the model
+            target_language: The target programming language
             
-            # Extract package/namespace
-            if target_language == "Java":
-                package_match = re.search(r'package\s+([a-z0-9_.]+)', structure_content, re.IGNORECASE)
-                if package_match:
-                    structure_info["package"] = package_match.group(1)
-            else:  # C#
-                namespace_match = re.search(r'namespace\s+([A-Za-z0-9_.]+)', structure_content, re.IGNORECASE)
-                if namespace_match:
-                    structure_info["package"] = namespace_match.group(1)
-            
-            # Extract interfaces
-            interface_matches = re.findall(r'interface\s+([A-Za-z0-9_]+)', structure_content)
-            structure_info["interfaces"] = list(set(interface_matches))  # Remove duplicates
-            
-            # Check for database access
-            db_keywords = ['JDBC', 'Connection', 'PreparedStatement', 'ResultSet', 
-                        'SqlConnection', 'SqlCommand', 'DataReader', 'EntityFramework',
-                        'JPA', 'Repository', 'DataSource']
-            for keyword in db_keywords:
+        Returns:
+            Dictionary with structure information
+        """
+        structure_content = (content or "").strip()
+        
+        # Extract important structure information
+        structure_info = {
+            "structure": structure_content,
+            "classes": [],
+            "package": None,
+            "interfaces": [],
+            "database_access": False,
+            "exception_strategy": "standard",
+            "patterns": []
+        }
+        
+        # Extract class names
+        class_matches = re.findall(r'class\s+([A-Za-z0-9_]+)', structure_content)
+        structure_info["classes"] = list(set(class_matches))  # Remove duplicates
+        
+        # Extract package/namespace
+        if target_language == "Java":
+            package_match = re.search(r'package\s+([a-z0-9_.]+)', structure_content, re.IGNORECASE)
+            if package_match:
+                structure_info["package"] = package_match.group(1)
+        else:  # C#
+            namespace_match = re.search(r'namespace\s+([A-Za-z0-9_.]+)', structure_content, re.IGNORECASE)
+            if namespace_match:
+                structure_info["package"] = namespace_match.group(1)
+        
+        # Extract interfaces
+        interface_matches = re.findall(r'interface\s+([A-Za-z0-9_]+)', structure_content)
+        structure_info["interfaces"] = list(set(interface_matches))  # Remove duplicates
+        
+        # Check for database access
+        db_keywords = ['JDBC', 'Connection', 'PreparedStatement', 'ResultSet', 
+                    'SqlConnection', 'SqlCommand', 'DataReader', 'EntityFramework',
+                    'JPA', 'Repository', 'DataSource']
+        for keyword in db_keywords:
+            if keyword in structure_content:
+                structure_info["database_access"] = True
+                break
+        
+        # Identify design patterns
+        pattern_keywords = {
+            "Factory": ["Factory", "getInstance", "createInstance"],
+            "Singleton": ["Singleton", "getInstance", "private constructor"],
+            "Builder": ["Builder", "build()", ".build()"],
+            "Strategy": ["Strategy", "algorithm", "behavior"],
+            "Observer": ["Observer", "Observable", "notify", "subscribe"],
+            "Repository": ["Repository", "DAO", "Data Access"],
+            "Service": ["Service", "Manager", "Processor"],
+            "MVC": ["Model", "View", "Controller"],
+            "DTO": ["DTO", "Data Transfer Object"]
+        }
+        
+        for pattern, keywords in pattern_keywords.items():
+            for keyword in keywords:
                 if keyword in structure_content:
-                    structure_info["database_access"] = True
+                    structure_info["patterns"].append(pattern)
                     break
-            
-            # Identify design patterns
-            pattern_keywords = {
-                "Factory": ["Factory", "getInstance", "createInstance"],
-                "Singleton": ["Singleton", "getInstance", "private constructor"],
-                "Builder": ["Builder", "build()", ".build()"],
-                "Strategy": ["Strategy", "algorithm", "behavior"],
-                "Observer": ["Observer", "Observable", "notify", "subscribe"],
-                "Repository": ["Repository", "DAO", "Data Access"],
-                "Service": ["Service", "Manager", "Processor"],
-                "MVC": ["Model", "View", "Controller"],
-                "DTO": ["DTO", "Data Transfer Object"]
-            }
-            
-            for pattern, keywords in pattern_keywords.items():
-                for keyword in keywords:
-                    if keyword in structure_content:
-                        structure_info["patterns"].append(pattern)
-                        break
-            
-            structure_info["patterns"] = list(set(structure_info["patterns"]))  # Remove duplicates
-            
-            # Get exception handling strategy
-            if "custom exception" in structure_content.lower() or "applicationexception" in structure_content.lower():
-                structure_info["exception_strategy"] = "custom"
-            
-            return structure_info
-                
-        except Exception as e:
-            logger.error(f"Error getting code structure: {str(e)}")
-            return {
-                "structure": "Could not determine code structure",
-                "classes": [],
-                "package": None,
-                "interfaces": [],
-                "database_access": False,
-                "exception_strategy": "standard",
-                "patterns": []
-            }
+        
+        structure_info["patterns"] = list(set(structure_info["patterns"]))  # Remove duplicates
+        
+        # Get exception handling strategy
+        if "custom exception" in structure_content.lower() or "applicationexception" in structure_content.lower():
+            structure_info["exception_strategy"] = "custom"
+        
+        return structure_info
     
     
 
@@ -481,21 +730,137 @@ class CodeConverter:
         Returns:
             Dictionary with conversion results
         """
-        from prompts import create_code_conversion_prompt
+        messages = self.chunk_messages(
+            code_chunk, source_language, target_language,
+            business_requirements, technical_requirements,
+            db_setup_template, additional_context
+        )
+
+        # Only override the client timeout when a per-chunk timeout is configured
+        request_options = {"timeout": self.chunk_timeout} if self.chunk_timeout else {}
+
+        try:
+            response = chat_completion(
+                self.client,
+                model=self.stage_model(CHUNK_CONVERSION),
+                messages=messages,
+                hedge=CHUNK_CONVERSION,
+                **self.chunk_request_options(),
+                **request_options
+            )
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error calling model API: {str(e)}")
+            return {
+                "convertedCode": "",
+                "conversionNotes": f"Error calling model API: {str(e)}",
+                "potentialIssues": ["Failed to get response from model"],
+                "databaseUsed": False
+            }
+
+        return self.parse_chunk_content(response.choices[0].message.content, target_language)
+
+    async def _convert_single_chunk_async(self, code_chunk: str, source_language: str,
+                                          target_language: str, business_requirements: str,
+                                          technical_requirements: str, db_setup_template: str,
+                                          additional_context: str = "") -> Dict[str, Any]:
+        """Async counterpart of _convert_single_chunk."""
+        messages = self.chunk_messages(
+            code_chunk, source_language, target_language,
+            business_requirements, technical_requirements,
+            db_setup_template, additional_context
+        )
+        request_options = {"timeout": self.chunk_timeout} if self.chunk_timeout else {}
+
+        try:
+            response = await chat_completion_async(
+                self.async_client,
+                model=self.stage_model(CHUNK_CONVERSION),
+                messages=messages,
+                hedge=CHUNK_CONVERSION,
+                **self.chunk_request_options(),
+                **request_options
+            )
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error calling model API: {str(e)}")
+            return {
+                "convertedCode": "",
+                "conversionNotes": f"Error calling model API: {str(e)}",
+                "potentialIssues": ["Failed to get response from model"],
+                "databaseUsed": False
+            }
+
+        return self.parse_chunk_content(response.choices[0].message.content, target_language)
+
+    @staticmethod
+    def chunk_request_options() -> Dict[str, Any]:
+        """Sampling options of a chunk conversion call, shared with batch submission."""
+        return {**get_stage_profile(CHUNK_CONVERSION).request_options(), "response_format": CHUNK_CONVERSION_FORMAT}
+
+    def program_chunk_messages(self, chunks: List[str], index: int, source_language: str,
+                               target_language: str, business_requirements: Any,
+                               technical_requirements: Any, db_setup_template: str,
+                               structure_result: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Build the chat messages that convert one chunk of a program.
+
+        The chunk is tied to the program structure when the program has several
+        chunks. Used by callers that send the request themselves, such as batch
+        submission.
+
+        Args:
+            chunks: The code chunks of the program
+            index: Zero-based position of the chunk to convert
+            source_language: Source programming language
+            target_language: Target programming language
+            business_requirements: Business requirements, as text or parsed JSON
+            technical_requirements: Technical requirements, as text or parsed JSON
+            db_setup_template: Database setup template
+            structure_result: Structure information from the structure call
+
+        Returns:
+            The chat messages
+        """
+        context = self._create_chunk_context(index, len(chunks), structure_result) if len(chunks) > 1 else ""
+        return self.chunk_messages(
+            chunks[index], source_language, target_language,
+            business_requirements, technical_requirements,
+            db_setup_template, context
+        )
+
+    def chunk_messages(self, code_chunk: str, source_language: str,
+                        target_language: str, business_requirements: Any,
+                        technical_requirements: Any, db_setup_template: str,
+                        additional_context: str = "") -> List[Dict[str, str]]:
+        """
+        Build the chat messages that convert one chunk.
         
-        # Create prompt for this chunk
-        prompt = create_code_conversion_prompt(
+        Args:
+            code_chunk: The code chunk to convert
+            source_language: Source programming language
+            target_language: Target programming language
+            business_requirements: Business requirements, as text or parsed JSON
+            technical_requirements: Technical requirements, as text or parsed JSON
+            db_setup_template: Database setup template
+            additional_context: Additional context for the model
+            
+        Returns:
+            System and user messages of the conversion request
+        """
+        # Instructions are the same for every chunk, requirements for every chunk of a
+        # program; the chunk itself goes last so the prompt prefix can be cached
+        blocks = [PromptBlock(create_code_conversion_instructions(
             source_language,
             target_language,
-            code_chunk,
-            business_requirements,
-            technical_requirements,
             db_setup_template
-        )
+        ), STATIC)]
         
         # Add COBOL-specific instructions for Java/C# conversion
         if source_language == "COBOL" and target_language in ["Java", "C#"]:
-            prompt += """
+            blocks.append(PromptBlock("""
             
             CRITICAL INSTRUCTIONS FOR COBOL TO JAVA/C# CONVERSION:
             
@@ -540,11 +905,11 @@ class CodeConverter:
             - Implement appropriate access modifiers (public, private, etc.)
             - Add appropriate getters and setters for class properties
             - Add appropriate package/namespace organization
-            """
+            """, STATIC))
         
         # Enhanced instructions for Java/C# conversion
         if target_language in ["Java", "C#"]:
-            prompt += """
+            blocks.append(PromptBlock("""
             
             CRITICAL INSTRUCTIONS FOR CLEAN CODE GENERATION:
             
@@ -582,92 +947,100 @@ class CodeConverter:
             7. COMPLETENESS - Make sure the generated code is complete and runnable
             - No undefined variables or methods
             - No placeholder comments where code should be
-            """
-        
+            """, STATIC))
+
+        # Requirements given as parsed JSON are rendered as compact outlines
+        if business_requirements:
+            if not isinstance(business_requirements, str):
+                business_requirements = render_for_prompt("business_requirements", business_requirements, model=self.stage_model(CHUNK_CONVERSION))
+            blocks.append(PromptBlock(business_requirements, PROJECT, "BUSINESS REQUIREMENTS"))
+        if technical_requirements:
+            if not isinstance(technical_requirements, str):
+                technical_requirements = render_for_prompt("technical_requirements", technical_requirements, model=self.stage_model(CHUNK_CONVERSION))
+            blocks.append(PromptBlock(technical_requirements, PROJECT, "TECHNICAL REQUIREMENTS"))
+
+        blocks.append(PromptBlock(code_chunk, VOLATILE, f"Source Code ({source_language})"))
         # Add chunk-specific context if provided
         if additional_context:
-            prompt += f"\n\n{additional_context}"
-        
+            blocks.append(PromptBlock(additional_context, VOLATILE))
+        prompt = layout_prompt(blocks)
+
+        return [
+            {
+                "role": "system",
+                "content": f"You are an expert code converter specializing in {source_language} to {target_language} migration. "
+                        f"You convert legacy code to modern, idiomatic code while maintaining all business logic. "
+                        f"Your code must be complete, well-structured, and follow best practices. "
+                        f"Ensure that all syntax is correct, with matching brackets and proper statement terminations. "
+                        f"Only include database setup/initialization if the original code uses databases or SQL. "
+                        f"For simple algorithms or calculations without database operations, don't add any database code. "
+                        f"Return your response in JSON format always with the following structure:\n"
+                        f"{{\n"
+                        f'  \"convertedCode\": \"The complete converted code here\",\n'
+                        f'  \"conversionNotes\": \"Notes about the conversion process\",\n'
+                        f'  \"potentialIssues\": [\"List of any potential issues or limitations\"],\n'
+                        f'  \"databaseUsed\": true/false\n'
+                        f"}}"
+            },
+            {"role": "user", "content": prompt}
+        ]
 
+    def parse_chunk_content(self, content: Optional[str], target_language: str) -> Dict[str, Any]:
+        """
+        Parse and validate the reply of a chunk conversion call.
+        
+        The reply follows CHUNK_CONVERSION_SCHEMA unless the deployment had to fall
+        back to JSON mode, in which case JSON is also searched for in the text.
+        
+        Args:
+            content: Reply content of the model
+            target_language: Target programming language
+            
+        Returns:
+            Dictionary with conversion results
+        """
+        conversion_content = (content or "").strip()
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are an expert code converter specializing in {source_language} to {target_language} migration. "
-                                f"You convert legacy code to modern, idiomatic code while maintaining all business logic. "
-                                f"Your code must be complete, well-structured, and follow best practices. "
-                                f"Ensure that all syntax is correct, with matching brackets and proper statement terminations. "
-                                f"Only include database setup/initialization if the original code uses databases or SQL. "
-                                f"For simple algorithms or calculations without database operations, don't add any database code. "
-                                f"Return your response in JSON format always with the following structure:\n"
-                                f"{{\n"
-                                f'  \"convertedCode\": \"The complete converted code here\",\n'
-                                f'  \"conversionNotes\": \"Notes about the conversion process\",\n'
-                                f'  \"potentialIssues\": [\"List of any potential issues or limitations\"],\n'
-                                f'  \"databaseUsed\": true/false\n'
-                                f"}}"
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=4000,
-                response_format={"type": "json_object"}
-            )
+            # Attempt to parse the JSON response
+            conversion_json = json.loads(conversion_content)
             
-            # Parse the JSON response
-            conversion_content = response.choices[0].message.content.strip()
+            # Validate the converted code
+            if target_language in ["Java", "C#"]:
+                self._validate_code(conversion_json, target_language)
+                
+            return conversion_json
+            
+        except json.JSONDecodeError as json_err:
+            logger.error(f"Error parsing JSON response: {str(json_err)}")
+            logger.debug(f"Problematic response content: {conversion_content}")
             
+            # Attempt to extract JSON from the response
             try:
-                # Attempt to parse the JSON response
-                conversion_json = json.loads(conversion_content)
-                
-                # Validate the converted code
-                if target_language in ["Java", "C#"]:
-                    self._validate_code(conversion_json, target_language)
+                # Use regex to find JSON-like content
+                json_pattern = r'(\{[\s\S]*\})'
+                match = re.search(json_pattern, conversion_content)
+                if match:
+                    potential_json = match.group(1)
+                    conversion_json = json.loads(potential_json)
+                    logger.info("Successfully extracted JSON from response using regex")
                     
-                return conversion_json
-                
-            except json.JSONDecodeError as json_err:
-                logger.error(f"Error parsing JSON response: {str(json_err)}")
-                logger.debug(f"Problematic response content: {conversion_content}")
-                
-                # Attempt to extract JSON from the response
-                try:
-                    # Use regex to find JSON-like content
-                    json_pattern = r'(\{[\s\S]*\})'
-                    match = re.search(json_pattern, conversion_content)
-                    if match:
-                        potential_json = match.group(1)
-                        conversion_json = json.loads(potential_json)
-                        logger.info("Successfully extracted JSON from response using regex")
+                    # Validate the converted code
+                    if target_language in ["Java", "C#"]:
+                        self._validate_code(conversion_json, target_language)
                         
-                        # Validate the converted code
-                        if target_language in ["Java", "C#"]:
-                            self._validate_code(conversion_json, target_language)
-                            
-                        return conversion_json
-                except Exception as extract_err:
-                    logger.error(f"Failed to extract JSON using regex: {str(extract_err)}")
-                
-                # Return a fallback response
-                return {
-                    "convertedCode": "// Error: Invalid response format received from server",
-                    "conversionNotes": f"Error processing response: {str(json_err)}",
-                    "potentialIssues": ["Failed to process model response", "Response was not valid JSON"],
-                    "databaseUsed": False
-                }
-                
-        except Exception as e:
-            logger.error(f"Error calling model API: {str(e)}")
+                    return conversion_json
+            except Exception as extract_err:
+                logger.error(f"Failed to extract JSON using regex: {str(extract_err)}")
+            
+            # Return a fallback response
             return {
-                "convertedCode": "",
-                "conversionNotes": f"Error calling model API: {str(e)}",
-                "potentialIssues": ["Failed to get response from model"],
+                "convertedCode": "// Error: Invalid response format received from server",
+                "conversionNotes": f"Error processing response: {str(json_err)}",
+                "potentialIssues": ["Failed to process model response", "Response was not valid JSON"],
                 "databaseUsed": False
             }
-    
+            
 
     def _validate_code(self, conversion_result: Dict[str, Any], target_language: str) -> None:
         """
@@ -742,6 +1115,23 @@ class CodeConverter:
 
 
     
+    def merge_results(self, results: List[Dict[str, Any]], target_language: str,
+                      structure_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Merge the chunk results of one program; the result of a single chunk is returned as is.
+
+        Args:
+            results: Conversion results of the program's chunks, in order
+            target_language: The target programming language
+            structure_info: Information about the code structure
+
+        Returns:
+            Merged conversion result
+        """
+        if len(results) == 1:
+            return results[0]
+        return self._merge_conversion_results(results, target_language, structure_info)
+
     def _merge_conversion_results(self, results: List[Dict[str, Any]], 
                                 target_language: str,
                                 structure_info: Dict[str, Any] = None) -> Dict[str, Any]:
@@ -893,8 +1283,9 @@ class CodeConverter:
         """
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
+            response = chat_completion(
+                self.client,
+                model=self.stage_model(CODE_POLISH),
                 messages=[
                     {
                         "role": "system",
@@ -902,8 +1293,7 @@ class CodeConverter:
                     },
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.1,
-                max_tokens=4000
+                **get_stage_profile(CODE_POLISH).request_options()
             )
             
             polished_code = response.choices[0].message.content.strip()
@@ -1267,15 +1657,19 @@ def should_chunk_code(code: str, line_threshold: int = 24000) -> bool:
 
 
 # Factory function to create a CodeConverter instance
-def create_code_converter(client, model_name: str) -> CodeConverter:
+def create_code_converter(client=None, model_name: Optional[str] = None,
+                          max_workers: int = CHUNK_CONVERSION_WORKERS,
+                          chunk_timeout: Optional[float] = CHUNK_CONVERSION_TIMEOUT) -> CodeConverter:
     """
     Create a CodeConverter instance.
     
     Args:
-        client: The OpenAI client
-        model_name: The model deployment name
+        client: The OpenAI client; defaults to the shared pooled client
+        model_name: Deployment for every stage; None to use the per-stage profiles
+        max_workers: Maximum number of chunks converted concurrently
+        chunk_timeout: Timeout in seconds for each chunk conversion call
         
     Returns:
         A CodeConverter instance
     """
-    return CodeConverter(client, model_name)
\ No newline at end of file
+    return CodeConverter(client or get_llm_client(), model_name, max_workers=max_workers, chunk_timeout=chunk_timeout)
\ No newline at end of file
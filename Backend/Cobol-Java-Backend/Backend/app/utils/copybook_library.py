@@ -0,0 +1,265 @@
+import hashlib
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from ..config import logger, COBOL_SOURCE_FORMAT
+from .cobol_lexer import CobolToken, tokenize_cobol, COPY, LEVEL_ENTRY
+from .source_reader import BLOCK_SIZE, SourceFile
+
+COPYBOOK_EXTENSION = ".cpy"
+
+# One operand of a REPLACING clause: ==pseudo-text==, a literal or a word
+_OPERAND_PATTERN = re.compile(r"\s*(?:==(?P<pseudo>.*?)==|(?P<word>\"[^\"]*\"|'[^']*'|[^\s]+))")
+# Characters a COBOL word is made of, for whole-word matching of word operands
+_WORD_CHARS = "A-Z0-9-"
+
+Replacing = Tuple[Tuple[str, str, bool], ...]
+
+
+class CopyStatement(NamedTuple):
+    """A parsed COPY statement; `replacing` holds (old, new, is_pseudo_text) pairs in clause order."""
+    name: str
+    replacing: Replacing = ()
+
+
+class CopybookEntry(NamedTuple):
+    """A data item brought in by a copybook, with the name of the copybook it is written in."""
+    copybook: str
+    token: CobolToken
+
+
+class ExpandedCopybook(NamedTuple):
+    """
+    A copybook with its REPLACING clause applied and nested COPY statements expanded.
+
+    `entries` are the LEVEL_ENTRY tokens of the copybook and everything it copies,
+    in source order, each tagged with the copybook it comes from. `dependencies` names every copybook that was copied along the
+    way, including this one and any that could not be found.
+    """
+    name: str
+    path: str
+    entries: Tuple[CopybookEntry, ...]
+    dependencies: Tuple[str, ...]
+
+
+def parse_copy_statement(statement: str) -> CopyStatement:
+    """
+    Parse a COPY statement as produced by tokenize_cobol.
+
+    Supports `COPY name [OF|IN library] [REPLACING op BY op ...].` where each
+    operand is ==pseudo-text==, a literal or a single word. LEADING and TRAILING
+    operands are treated as pseudo-text, i.e. matched anywhere in a word.
+
+    Args:
+        statement: Upper-cased COPY statement text
+
+    Returns:
+        The copybook name and its replacing pairs
+    """
+    parts = statement.split(None, 2)
+    name = parts[1].rstrip(".").strip("\"'") if len(parts) > 1 else ""
+    position = statement.find(" REPLACING ")
+    if position < 0:
+        return CopyStatement(name)
+
+    operands = []
+    clause = statement[position + len(" REPLACING "):].rstrip().rstrip(".")
+    for match in _OPERAND_PATTERN.finditer(clause):
+        if match.group("pseudo") is not None:
+            operands.append((match.group("pseudo").strip(), True))
+        elif match.group("word") not in ("LEADING", "TRAILING"):
+            operands.append((match.group("word"), False))
+
+    replacing = []
+    for (old, old_pseudo), by, (new, _) in zip(operands[0::3], operands[1::3], operands[2::3]):
+        if by != ("BY", False):
+            break
+        if old:
+            replacing.append((old, new, old_pseudo))
+    return CopyStatement(name, tuple(replacing))
+
+
+def apply_replacing(text: str, replacing: Replacing) -> str:
+    """
+    Apply REPLACING pairs to copybook text in one pass, so replaced text is never replaced again.
+
+    Word operands only match whole COBOL words; pseudo-text operands match anywhere,
+    which covers the common `==:TAG:==` prefix convention.
+
+    Args:
+        text: Upper-cased copybook text
+        replacing: Replacing pairs from parse_copy_statement
+
+    Returns:
+        The text with every occurrence replaced
+    """
+    if not replacing:
+        return text
+    alternatives = []
+    for index, (old, _, is_pseudo) in enumerate(replacing):
+        pattern = r"\s+".join(re.escape(word) for word in old.split()) if is_pseudo else re.escape(old)
+        if not is_pseudo:
+            pattern = rf"(?<![{_WORD_CHARS}]){pattern}(?![{_WORD_CHARS}])"
+        alternatives.append(f"(?P<r{index}>{pattern})")
+    combined = re.compile("|".join(alternatives))
+    return combined.sub(lambda match: replacing[int(match.lastgroup[1:])][1], text)
+
+
+class CopybookLibrary:
+    """
+    Index of the copybooks of one project with memoized expansion.
+
+    Copybooks are looked up by file stem, case-insensitively. Each copybook is read,
+    REPLACING-substituted and parsed once per distinct replacing set, however many
+    programs copy it; expansions are shared by all threads of the process, and a
+    library sent to an analysis worker process is rebuilt there once per project
+    state.
+    """
+
+    def __init__(self, root: str, paths: Dict[str, str], fingerprint: str):
+        """
+        Args:
+            root: Project directory the copybooks were found in
+            paths: Copybook name -> file path
+            fingerprint: Identifies the set of copybook files, their size and mtime and the source format
+        """
+        self.root = root
+        self.paths = paths
+        self.fingerprint = fingerprint
+        self._expanded = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Worker processes rebuild the library from its index and keep one per project state
+        return _shared_library, (self.root, self.paths, self.fingerprint)
+
+    def expand_statement(self, statement: str) -> Optional[ExpandedCopybook]:
+        """Expand the copybook a COPY statement refers to, or return None if it is not in the project."""
+        copy = parse_copy_statement(statement)
+        return self.expand(copy.name, copy.replacing)
+
+    def expand(self, name: str, replacing: Replacing = ()) -> Optional[ExpandedCopybook]:
+        """
+        Return a copybook expanded with a replacing set, parsing it on first use.
+
+        Args:
+            name: Copybook name
+            replacing: Replacing pairs from parse_copy_statement
+
+        Returns:
+            The expanded copybook, or None if the project has no copybook of that name
+        """
+        return self._expand(name.upper(), replacing, ())
+
+    def _expand(self, name: str, replacing: Replacing, stack: Tuple[str, ...]) -> Optional[ExpandedCopybook]:
+        key = (name, replacing)
+        with self._lock:
+            if key in self._expanded:
+                return self._expanded[key]
+        path = self.paths.get(name)
+        if path is None:
+            return None
+
+        try:
+            with SourceFile(path) as source:
+                text = "\n".join(source.code_lines(fixed_format=COBOL_SOURCE_FORMAT == "fixed"))
+            text = apply_replacing(text.upper(), replacing)
+        except OSError as e:
+            logger.error(f"Error reading copybook {path}: {e}")
+            return None
+
+        entries: List[CopybookEntry] = []
+        dependencies = [name]
+        for token in tokenize_cobol(text, division="data"):
+            if token.kind == LEVEL_ENTRY:
+                entries.append(CopybookEntry(name, token))
+            elif token.kind == COPY:
+                nested = parse_copy_statement(token.text)
+                dependencies.append(nested.name.upper())
+                if nested.name.upper() in stack + (name,):
+                    logger.warning(f"Copybook {name} copies {nested.name} recursively; not expanded")
+                    continue
+                expanded = self._expand(nested.name.upper(), nested.replacing, stack + (name,))
+                if expanded is not None:
+                    entries.extend(expanded.entries)
+                    dependencies.extend(expanded.dependencies)
+
+        result = ExpandedCopybook(name, path, tuple(entries), tuple(dict.fromkeys(dependencies)))
+        with self._lock:
+            return self._expanded.setdefault(key, result)
+
+    def digest(self, name: str) -> str:
+        """Content hash of a copybook, or "" if the project has none of that name."""
+        name = name.upper()
+        with self._lock:
+            if name in self._digests:
+                return self._digests[name]
+        path = self.paths.get(name)
+        digest = ""
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    hasher = hashlib.sha256()
+                    for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                        hasher.update(block)
+                    digest = hasher.hexdigest()
+            except OSError:
+                digest = ""
+        with self._lock:
+            return self._digests.setdefault(name, digest)
+
+    def dependency_digests(self, names: List[str]) -> str:
+        """Canonical string of the content hashes of copybooks, for detecting that any of them changed."""
+        return " ".join(f"{name}={self.digest(name)}" for name in sorted(set(names)))
+
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+
+def get_copybook_library(project_dir: Path, files: Optional[Iterable[Path]] = None) -> CopybookLibrary:
+    """
+    Return the copybook library of a project directory, re-indexing only when its copybooks changed.
+
+    Expansions cached by a previous call are kept as long as no copybook was added,
+    removed or modified.
+
+    Args:
+        project_dir: Directory searched recursively for .cpy files
+        files: Files of the project when the caller has already listed them, so the
+            directory is not walked again
+
+    Returns:
+        The project's CopybookLibrary
+    """
+    paths = {}
+    material = []
+    candidates = project_dir.glob("**/*") if files is None else files
+    for path in sorted((path for path in candidates if path.suffix.lower() == COPYBOOK_EXTENSION),
+                       key=lambda path: path.parts):
+        name = path.stem.upper()
+        if name in paths:
+            logger.warning(f"Copybook {name} found more than once; using {paths[name]}, ignoring {path}")
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        paths[name] = str(path)
+        material.append(f"{name}\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}")
+    # Expansions read copybooks in the configured source format, so it is part of the project state
+    material.append(f"format\0{COBOL_SOURCE_FORMAT}")
+    fingerprint = hashlib.sha256("\n".join(material).encode("utf-8")).hexdigest()
+    return _shared_library(str(project_dir), paths, fingerprint)
+
+
+def _shared_library(root: str, paths: Dict[str, str], fingerprint: str) -> CopybookLibrary:
+    with _libraries_lock:
+        library = _libraries.get(root)
+        if library is None or library.fingerprint != fingerprint:
+            library = CopybookLibrary(root, paths, fingerprint)
+            _libraries[root] = library
+            logger.info(f"Indexed {len(paths)} copybooks in {root}")
+        return library
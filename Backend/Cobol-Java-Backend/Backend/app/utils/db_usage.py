@@ -9,6 +9,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Patterns that indicate embedded SQL or file/database access in COBOL
+SQL_PATTERNS = [
+    r'EXEC\s+SQL',
+    r'SELECT\s+.*\s+FROM',
+    r'INSERT\s+INTO',
+    r'UPDATE\s+.*\s+SET',
+    r'DELETE\s+FROM',
+    r'CURSOR',
+    r'DECLARE\s+.*\s+TABLE',
+    r'FETCH',
+
+    # Check for common COBOL database access methods
+    r'CALL\s+.*DB2',
+    r'CALL\s+.*SQL',
+    r'CALL\s+.*ORACLE',
+    r'CALL\s+.*DATABASE',
+    r'OPEN\s+.*INPUT',
+    r'OPEN\s+.*OUTPUT',
+    r'OPEN\s+.*I-O',
+    r'READ\s+.*FILE',
+    r'WRITE\s+.*RECORD',
+    r'START\s+.*KEY',
+
+    # Data division entries that might indicate file/DB operations
+    r'FD\s+',
+    r'SELECT\s+.*ASSIGN\s+TO',
+    r'ORGANIZATION\s+IS\s+INDEXED',
+    r'ORGANIZATION\s+IS\s+RELATIVE',
+    r'ACCESS\s+MODE\s+IS\s+DYNAMIC',
+    r'ACCESS\s+MODE\s+IS\s+RANDOM',
+    r'RECORD\s+KEY'
+]
+# Compiled once; separate patterns keep the literal-prefix search that one alternation would lose
+_SQL_REGEXES = [(pattern, re.compile(pattern, re.IGNORECASE)) for pattern in SQL_PATTERNS]
+
 def detect_database_usage(source_code, source_language="COBOL"):
     """
     Detect if source code contains database operations or embedded SQL.
@@ -25,45 +60,12 @@ def detect_database_usage(source_code, source_language="COBOL"):
     
     # For COBOL, check for common database-related keywords and statements
     if source_language.upper() == "COBOL":
-        # Check for embedded SQL
-        sql_patterns = [
-            r'EXEC\s+SQL',
-            r'SELECT\s+.*\s+FROM',
-            r'INSERT\s+INTO',
-            r'UPDATE\s+.*\s+SET',
-            r'DELETE\s+FROM',
-            r'CURSOR',
-            r'DECLARE\s+.*\s+TABLE',
-            r'FETCH',
-            
-            # Check for common COBOL database access methods
-            r'CALL\s+.*DB2',
-            r'CALL\s+.*SQL',
-            r'CALL\s+.*ORACLE',
-            r'CALL\s+.*DATABASE',
-            r'OPEN\s+.*INPUT',
-            r'OPEN\s+.*OUTPUT',
-            r'OPEN\s+.*I-O',
-            r'READ\s+.*FILE',
-            r'WRITE\s+.*RECORD',
-            r'START\s+.*KEY',
-            
-            # Data division entries that might indicate file/DB operations
-            r'FD\s+',
-            r'SELECT\s+.*ASSIGN\s+TO',
-            r'ORGANIZATION\s+IS\s+INDEXED',
-            r'ORGANIZATION\s+IS\s+RELATIVE',
-            r'ACCESS\s+MODE\s+IS\s+DYNAMIC',
-            r'ACCESS\s+MODE\s+IS\s+RANDOM',
-            r'RECORD\s+KEY'
-        ]
-        
         # Look for any of the patterns in the source code
-        for pattern in sql_patterns:
-            if re.search(pattern, source_code, re.IGNORECASE):
+        for pattern, regex in _SQL_REGEXES:
+            if regex.search(source_code):
                 logger.info(f"Database usage detected with pattern: {pattern}")
                 result["has_db"] = True
                 result["db_type"] = "sql"  # Default to SQL; can be extended to detect specific DBs
                 return result
                 
-    return result
\ No newline at end of file
+    return result
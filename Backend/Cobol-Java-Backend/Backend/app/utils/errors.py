@@ -0,0 +1,7 @@
+class RequestError(Exception):
+    """Base of errors that end a request with a specific HTTP status; carries the message and status to return."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
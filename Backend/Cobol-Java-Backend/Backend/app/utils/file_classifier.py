@@ -1,8 +1,21 @@
 import os
+import re
 import logging
 from pathlib import Path
 from typing import Dict, List, Any
 from ..config import logger
+from .source_reader import count_lines
+
+def _keyword_pattern(*keywords: str) -> "re.Pattern[str]":
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+
+# Matched case-insensitively so content is not upper-cased into a second full-size copy
+COBOL_KEYWORDS = _keyword_pattern("IDENTIFICATION DIVISION", "PROGRAM-ID", "DATA DIVISION",
+                                  "PROCEDURE DIVISION", "WORKING-STORAGE")
+JCL_KEYWORDS = _keyword_pattern("//", "JOB ", "EXEC PGM=", "DD DSN=")
+COPYBOOK_KEYWORDS = _keyword_pattern("01 ", "05 ", "PIC ", "PICTURE")
+PROCEDURE_DIVISION = _keyword_pattern("PROCEDURE DIVISION")
+BMS_KEYWORDS = _keyword_pattern("DFHMSD", "DFHMDI", "DFHMDF")
 
 def classify_uploaded_files(file_json):
     """
@@ -77,7 +90,7 @@ def classify_uploaded_files(file_json):
             "content": content,
             "size": len(content) if isinstance(content, str) else len(str(content)),
             "extension": file_ext,
-            "lines": len(str(content).split('\n'))
+            "lines": count_lines(str(content))
         }
         
         if matched_type and matched_type in classified:
@@ -109,31 +122,20 @@ def _classify_by_content(filename: str, content: str) -> str:
     if not content or not isinstance(content, str):
         return None
     
-    content_upper = content.upper()
-    
     # COBOL indicators
-    if any(keyword in content_upper for keyword in [
-        "IDENTIFICATION DIVISION", "PROGRAM-ID", "DATA DIVISION", 
-        "PROCEDURE DIVISION", "WORKING-STORAGE"
-    ]):
+    if COBOL_KEYWORDS.search(content):
         return "COBOL Code"
     
     # JCL indicators
-    if any(keyword in content_upper for keyword in [
-        "//", "JOB ", "EXEC PGM=", "DD DSN="
-    ]):
+    if JCL_KEYWORDS.search(content):
         return "JCL"
     
     # Copybook indicators (data structures without divisions)
-    if any(keyword in content_upper for keyword in [
-        "01 ", "05 ", "PIC ", "PICTURE"
-    ]) and "PROCEDURE DIVISION" not in content_upper:
+    if COPYBOOK_KEYWORDS.search(content) and not PROCEDURE_DIVISION.search(content):
         return "Copybooks"
     
     # BMS indicators
-    if any(keyword in content_upper for keyword in [
-        "DFHMSD", "DFHMDI", "DFHMDF"
-    ]):
+    if BMS_KEYWORDS.search(content):
         return "BMS Maps"
     
     return None
@@ -0,0 +1,273 @@
+import atexit
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from flask import current_app
+from ..config import logger, JOB_WORKERS, JOB_HISTORY_LIMIT, PIPELINE_TIMEOUT_SECONDS
+from .cancellation import CancellationToken, OperationCancelled, cancellation_scope
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class Job:
+    """
+    State of one pipeline run: current stage, progress, per-stage timings and outcome.
+
+    Each job carries a CancellationToken; its deadline starts when the job starts
+    and `report` doubles as a checkpoint, so stages stop once the job is cancelled.
+    """
+
+    def __init__(self, kind: str, project_id: Optional[str], token: Optional[CancellationToken] = None,
+                 timeout: float = PIPELINE_TIMEOUT_SECONDS):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.project_id = project_id
+        self.status = JOB_QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stage_timings = {}
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self._stage_started_at = None
+        self._lock = threading.Lock()
+        self.token = token or CancellationToken()
+        self.timeout = timeout
+
+    def report(self, stage: str, progress: Optional[float] = None) -> None:
+        """
+        Record that the pipeline entered a stage.
+
+        Args:
+            stage: Name of the stage that is starting
+            progress: Overall completion between 0 and 1, if known
+
+        Raises:
+            OperationCancelled: If the job was cancelled or ran past its deadline
+        """
+        self.token.check()
+        now = time.time()
+        with self._lock:
+            self._close_stage(now)
+            self.stage = stage
+            self._stage_started_at = now
+            if progress is not None:
+                self.progress = max(0.0, min(1.0, progress))
+        logger.info(f"Job {self.id} ({self.kind}) stage: {stage}")
+
+    def _close_stage(self, now: float) -> None:
+        """Add the elapsed time of the current stage to its timing. Caller holds the lock."""
+        if self.stage and self._stage_started_at is not None:
+            elapsed = now - self._stage_started_at
+            self.stage_timings[self.stage] = round(self.stage_timings.get(self.stage, 0.0) + elapsed, 3)
+        self._stage_started_at = None
+
+    def start(self) -> None:
+        with self._lock:
+            self.status = JOB_RUNNING
+            self.started_at = time.time()
+        if self.timeout and self.token.remaining() is None:
+            self.token.set_timeout(self.timeout)
+
+    def cancel(self, reason: str = "cancelled by request") -> bool:
+        """Cancel the job; returns False if it already finished."""
+        with self._lock:
+            if self.status in FINISHED_STATES:
+                return False
+            queued = self.status == JOB_QUEUED
+        self.token.cancel(reason)
+        if queued:
+            self.fail(OperationCancelled(f"Operation cancelled: {reason}"))
+        return True
+
+    def succeed(self, result: Any) -> None:
+        with self._lock:
+            now = time.time()
+            self._close_stage(now)
+            self.status = JOB_SUCCEEDED
+            self.progress = 1.0
+            self.result = result
+            self.finished_at = now
+
+    def fail(self, error: Exception) -> None:
+        with self._lock:
+            now = time.time()
+            self._close_stage(now)
+            self.status = JOB_CANCELLED if isinstance(error, OperationCancelled) else JOB_FAILED
+            self.error = getattr(error, "message", None) or str(error)
+            self.error_status = getattr(error, "status_code", None)
+            self.finished_at = now
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        """Return a JSON-serializable view of the job."""
+        with self._lock:
+            end = self.finished_at or time.time()
+            view = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "project_id": self.project_id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": round(self.progress, 3),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else None,
+                "stage_timings": dict(self.stage_timings),
+                "error": self.error
+            }
+            if include_result:
+                view["result"] = self.result
+            return view
+
+
+class JobStore:
+    """Thread-safe registry of jobs that keeps a bounded history of finished ones."""
+
+    def __init__(self, history_limit: int = 200):
+        self.history_limit = history_limit
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None, project_id: Optional[str] = None) -> List[Job]:
+        """Return matching jobs, newest first."""
+        with self._lock:
+            jobs = [
+                job for job in self._jobs.values()
+                if (kind is None or job.kind == kind) and (project_id is None or job.project_id == project_id)
+            ]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def latest(self, kind: Optional[str] = None, project_id: Optional[str] = None) -> Optional[Job]:
+        jobs = self.list(kind, project_id)
+        return jobs[0] if jobs else None
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond the history limit. Caller holds the lock."""
+        finished = sorted(
+            (job for job in self._jobs.values() if job.status in FINISHED_STATES),
+            key=lambda job: job.created_at
+        )
+        for job in finished[:max(0, len(finished) - self.history_limit)]:
+            del self._jobs[job.id]
+
+
+class JobManager:
+    """Runs pipeline functions on a worker pool and tracks them in a JobStore."""
+
+    def __init__(self, max_workers: int = 2, history_limit: int = 200):
+        self.store = JobStore(history_limit)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._accepting = True
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, project_id: Optional[str], fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """
+        Queue a pipeline function and return its job immediately.
+
+        The function runs inside the current Flask application context and receives
+        the job's progress reporter as the ``report`` keyword argument.
+
+        Args:
+            kind: Job type, e.g. "analyze-requirements"
+            project_id: Project the job belongs to
+            fn: Pipeline function to run
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The queued job
+        """
+        app = current_app._get_current_object()
+        job = Job(kind, project_id)
+        with self._lock:
+            if not self._accepting:
+                raise RuntimeError("Job manager is shutting down; no new jobs are accepted")
+            self.store.add(job)
+            self._executor.submit(self._execute, app, job, fn, args, kwargs)
+        logger.info(f"Queued job {job.id} ({kind}) for project {project_id}")
+        return job
+
+    def run_inline(self, kind: str, project_id: Optional[str], fn: Callable[..., Any], *args,
+                   token: Optional[CancellationToken] = None, **kwargs) -> Any:
+        """
+        Run a pipeline function in the calling thread while tracking it as a job.
+
+        `token` lets the caller cancel the run, e.g. when the client disconnects.
+        Exceptions are recorded on the job and re-raised to the caller.
+        """
+        job = Job(kind, project_id, token)
+        self.store.add(job)
+        job.start()
+        try:
+            with cancellation_scope(job.token):
+                result = fn(*args, report=job.report, **kwargs)
+        except Exception as e:
+            job.fail(e)
+            raise
+        job.succeed(result)
+        return result
+
+    async def run_inline_async(self, kind: str, project_id: Optional[str], fn: Callable[..., Any], *args,
+                               token: Optional[CancellationToken] = None, **kwargs) -> Any:
+        """Counterpart of `run_inline` for a coroutine function awaited on the caller's event loop."""
+        job = Job(kind, project_id, token)
+        self.store.add(job)
+        job.start()
+        try:
+            with cancellation_scope(job.token):
+                result = await fn(*args, report=job.report, **kwargs)
+        except Exception as e:
+            job.fail(e)
+            raise
+        job.succeed(result)
+        return result
+
+    def _execute(self, app, job: Job, fn: Callable[..., Any], args, kwargs) -> None:
+        if job.status in FINISHED_STATES:
+            logger.info(f"Job {job.id} ({job.kind}) was cancelled before it started")
+            return
+        with app.app_context(), cancellation_scope(job.token):
+            job.start()
+            try:
+                job.succeed(fn(*args, report=job.report, **kwargs))
+                logger.info(f"Job {job.id} ({job.kind}) completed in {job.to_dict(False)['elapsed_seconds']}s")
+            except Exception as e:
+                job.fail(e)
+                logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+                logger.debug(traceback.format_exc())
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and, by default, wait for queued and running jobs to drain."""
+        with self._lock:
+            if not self._accepting:
+                return
+            self._accepting = False
+        pending = [job for job in self.store.list() if job.status not in FINISHED_STATES]
+        logger.info(f"Shutting down job manager; draining {len(pending)} in-flight jobs")
+        self._executor.shutdown(wait=wait)
+
+
+job_manager = JobManager(max_workers=JOB_WORKERS, history_limit=JOB_HISTORY_LIMIT)
+atexit.register(job_manager.shutdown)
@@ -0,0 +1,391 @@
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from openai.types.chat import ChatCompletion
+from ..config import (
+    logger, LLM_BATCH_BACKEND, LLM_BATCH_DIR, LLM_BATCH_MAX_REQUESTS, LLM_BATCH_MAX_FILE_BYTES,
+    LLM_BATCH_POLL_SECONDS, LLM_BATCH_TIMEOUT, LLM_BATCH_COMPLETION_WINDOW, LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONTINUATIONS
+)
+from .llm_cache import LLMResponseCache, get_llm_cache
+from .llm_client import get_llm_client
+from .llm_gateway import chat_completion, continuation_request, stitched_response, trim_overlap
+from .llm_usage import record_usage
+from .cancellation import cancellable_sleep, check_cancelled, propagate_token
+
+BATCH_ENDPOINT = "/chat/completions"
+# Batch states after which the service no longer changes the output
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+@dataclass
+class BatchItem:
+    """One chat completion request of a batch, addressed by `custom_id`."""
+    custom_id: str
+    model: str
+    messages: List[Dict[str, Any]]
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    response_format: Optional[Dict[str, Any]] = None
+
+    def body(self) -> Dict[str, Any]:
+        body = {"model": self.model, "messages": self.messages}
+        if self.temperature is not None:
+            body["temperature"] = self.temperature
+        if self.max_tokens is not None:
+            body["max_tokens"] = self.max_tokens
+        if self.response_format is not None:
+            body["response_format"] = self.response_format
+        return body
+
+    def to_line(self) -> str:
+        """Serialize as one line of a Batch API input file."""
+        return json.dumps({
+            "custom_id": self.custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": self.body()
+        }, ensure_ascii=False)
+
+    def cache_key(self) -> str:
+        return LLMResponseCache.make_key(self.model, self.messages, self.temperature,
+                                         self.max_tokens, self.response_format)
+
+
+class BatchBackend(ABC):
+    """
+    Where batch input files are executed.
+
+    `submit` takes a JSONL input file and returns a batch id, `status` reports the
+    batch state, and `results` returns the output lines (the Batch API output and
+    error file format) once the batch is in a terminal state.
+    """
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """Start executing a JSONL input file and return the batch id."""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Current state of the batch (e.g. "in_progress" or one of TERMINAL_STATUSES)."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Output and error lines of a batch in a terminal state."""
+
+
+class AzureBatchBackend(BatchBackend):
+    """Azure OpenAI Batch API: upload the file, create the batch, download output and error files."""
+
+    def __init__(self, client, completion_window: str = LLM_BATCH_COMPLETION_WINDOW):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(_parse_lines(self.client.files.content(file_id).text))
+        for line in lines:
+            body = (line.get("response") or {}).get("body") or {}
+            record_usage(body.get("model") or "batch", body.get("usage"))
+        return lines
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Stand-in that executes a batch input file through the interactive gateway.
+
+    Produces output in the Batch API format, so the submission, polling and
+    result mapping code paths are the same as against the real service. Used for
+    tests and for deployments without batch quota.
+    """
+
+    def __init__(self, client=None, complete: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                 max_workers: int = LLM_MAX_CONCURRENCY):
+        """
+        Args:
+            client: The OpenAI client used by the default `complete`
+            complete: Function running one request body and returning a ChatCompletion
+                (or a JSON-compatible dict); defaults to llm_gateway.chat_completion
+            max_workers: Requests executed concurrently
+        """
+        self.client = client
+        self.complete = complete or self._chat_completion
+        self.max_workers = max(1, max_workers)
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _chat_completion(self, body: Dict[str, Any]):
+        return chat_completion(self.client or get_llm_client(), use_cache=False, **body)
+
+    def _run_line(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            response = self.complete(line["body"])
+            body = response.model_dump(mode="json") if hasattr(response, "model_dump") else response
+            return {"custom_id": line["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+        except Exception as e:
+            return {"custom_id": line["custom_id"], "response": None,
+                    "error": {"code": type(e).__name__, "message": str(e)}}
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "r", encoding="utf-8") as f:
+            lines = _parse_lines(f.read())
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="local-batch") as executor:
+            output = list(executor.map(propagate_token(self._run_line), lines))
+        batch_id = f"local-{uuid.uuid4().hex}"
+        with self._lock:
+            self._results[batch_id] = output
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        with self._lock:
+            return "completed" if batch_id in self._results else "failed"
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._results.pop(batch_id, [])
+
+
+def _parse_lines(text: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class BatchRunner:
+    """
+    Runs many chat completion requests as offline batches.
+
+    Requests already in the response cache are answered from it; the rest are
+    written to JSONL input files (split by request count and file size),
+    submitted together and polled until every batch is finished. Replies cut off
+    at their token limit are continued in follow-up batch rounds and stitched
+    into one response. Results are mapped back by `custom_id` and stored in the
+    cache, so a re-run after a partial failure only resubmits what is missing.
+    """
+
+    def __init__(self, backend: BatchBackend, work_dir: str = LLM_BATCH_DIR,
+                 max_requests: int = LLM_BATCH_MAX_REQUESTS, max_file_bytes: int = LLM_BATCH_MAX_FILE_BYTES,
+                 poll_interval: float = LLM_BATCH_POLL_SECONDS, timeout: float = LLM_BATCH_TIMEOUT,
+                 use_cache: bool = True, max_continuations: int = LLM_MAX_CONTINUATIONS):
+        """
+        Args:
+            backend: Where the batch files are executed
+            work_dir: Directory receiving the input and output JSONL files
+            max_requests: Maximum requests per input file
+            max_file_bytes: Maximum size of one input file
+            poll_interval: Seconds between status checks
+            timeout: Seconds to wait for all batches of a round before giving up
+            use_cache: Whether the response cache is consulted and populated
+            max_continuations: Follow-up rounds allowed for truncated replies (0 disables)
+        """
+        self.backend = backend
+        self.work_dir = work_dir
+        self.max_requests = max(1, max_requests)
+        self.max_file_bytes = max_file_bytes
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.use_cache = use_cache
+        self.max_continuations = max_continuations
+
+    def run(self, items: Iterable[BatchItem], name: str = "batch") -> Dict[str, Optional[ChatCompletion]]:
+        """
+        Execute the requests and wait for all of them.
+
+        Args:
+            items: Requests to run; custom ids must be unique
+            name: Name of the run, used for the working directory
+
+        Returns:
+            Response of every custom id, or None for requests that failed
+        """
+        items = list(items)
+        results = {item.custom_id: None for item in items}
+        cache = get_llm_cache() if self.use_cache else None
+        pending = []
+        for item in items:
+            cached = cache.get(item.cache_key()) if cache is not None else None
+            if cached is not None:
+                results[item.custom_id] = ChatCompletion.model_validate(cached)
+            else:
+                pending.append(item)
+        logger.info(f"Batch {name}: {len(items)} requests, {len(items) - len(pending)} served from cache")
+        if not pending:
+            return results
+
+        run_dir = os.path.join(self.work_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}")
+        os.makedirs(run_dir, exist_ok=True)
+        responses = self._submit(pending, run_dir, name, "input")
+        self._continue_truncated(pending, responses, run_dir, name)
+
+        for item in pending:
+            completion = responses.get(item.custom_id)
+            results[item.custom_id] = completion
+            if cache is not None and _finish_reason(completion) == "stop":
+                cache.set(item.cache_key(), completion.model_dump(mode="json"))
+
+        failed = sum(1 for item in pending if results[item.custom_id] is None)
+        if failed:
+            logger.warning(f"Batch {name}: {failed}/{len(pending)} requests returned no usable response")
+        return results
+
+    def _submit(self, items: List[BatchItem], run_dir: str, name: str,
+                prefix: str) -> Dict[str, Optional[ChatCompletion]]:
+        """Run one round of requests as batches and map the results back by custom id."""
+        batch_ids = [self.backend.submit(path) for path in self._write_inputs(items, run_dir, prefix)]
+        logger.info(f"Batch {name}: submitted {len(items)} requests in {len(batch_ids)} batches")
+
+        by_id = {item.custom_id: item for item in items}
+        responses = {}
+        for batch_id, status in self._wait(batch_ids, name).items():
+            if status != "completed":
+                logger.error(f"Batch {name}: {batch_id} ended with status {status}")
+            lines = self.backend.results(batch_id) if status in TERMINAL_STATUSES else []
+            with open(os.path.join(run_dir, f"{batch_id}.output.jsonl"), "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+            for line in lines:
+                item = by_id.get(line.get("custom_id"))
+                if item is not None:
+                    responses[item.custom_id] = self._to_response(line, item)
+        return responses
+
+    def _continue_truncated(self, items: List[BatchItem], responses: Dict[str, Optional[ChatCompletion]],
+                            run_dir: str, name: str) -> None:
+        """
+        Continue replies cut off at their token limit in follow-up rounds, replacing
+        them in `responses` with the stitched reply.
+
+        Each round submits the original conversation plus the partial reply and a
+        continuation prompt, like the interactive gateway does. A reply whose
+        continuation fails, or that no longer fits the context window, is kept
+        as far as it got.
+        """
+        requests = {item.custom_id: item.body() for item in items}
+        parts, usages, last = {}, {}, {}
+        for custom_id, completion in responses.items():
+            if _finish_reason(completion) == "length":
+                parts[custom_id] = [completion.choices[0].message.content or ""]
+                usages[custom_id] = [completion.usage]
+                last[custom_id] = completion
+
+        for round_number in range(1, self.max_continuations + 1):
+            follow_ups = []
+            for custom_id, completion in last.items():
+                if _finish_reason(completion) != "length":
+                    continue
+                follow_up = continuation_request(requests[custom_id], "".join(parts[custom_id]))
+                if follow_up is not None:
+                    follow_ups.append(BatchItem(custom_id, follow_up["model"], follow_up["messages"],
+                                                follow_up.get("temperature"), follow_up.get("max_tokens")))
+            if not follow_ups:
+                break
+            logger.info(f"Batch {name}: continuing {len(follow_ups)} truncated replies "
+                        f"(round {round_number}/{self.max_continuations})")
+            continued = self._submit(follow_ups, run_dir, name, f"continuation-{round_number}")
+            for item in follow_ups:
+                completion = continued.get(item.custom_id)
+                if completion is None:
+                    # Keep the reply as far as it got instead of retrying it forever
+                    last[item.custom_id] = None
+                    continue
+                previous = "".join(parts[item.custom_id])
+                parts[item.custom_id].append(trim_overlap(previous, completion.choices[0].message.content or ""))
+                usages[item.custom_id].append(completion.usage)
+                last[item.custom_id] = completion
+
+        for custom_id, pieces in parts.items():
+            if len(pieces) > 1:
+                final = last[custom_id] or responses[custom_id]
+                responses[custom_id] = stitched_response(final, "".join(pieces), usages[custom_id])
+            if _finish_reason(responses[custom_id]) == "length":
+                logger.warning(f"Batch request {custom_id} still truncated after {len(pieces) - 1} continuations")
+
+    def _write_inputs(self, items: List[BatchItem], run_dir: str, prefix: str) -> List[str]:
+        """Write the input JSONL files, starting a new one at the request or size limit."""
+        paths, lines, size = [], [], 0
+
+        def flush():
+            path = os.path.join(run_dir, f"{prefix}-{len(paths) + 1:04d}.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            paths.append(path)
+
+        for item in items:
+            line = item.to_line() + "\n"
+            line_size = len(line.encode("utf-8"))
+            if lines and (len(lines) >= self.max_requests or size + line_size > self.max_file_bytes):
+                flush()
+                lines, size = [], 0
+            lines.append(line)
+            size += line_size
+        if lines:
+            flush()
+        return paths
+
+    def _wait(self, batch_ids: List[str], name: str) -> Dict[str, str]:
+        """Poll until every batch is in a terminal state or the timeout passes."""
+        deadline = time.monotonic() + self.timeout
+        statuses = {batch_id: None for batch_id in batch_ids}
+        while True:
+            check_cancelled()
+            for batch_id, status in statuses.items():
+                if status not in TERMINAL_STATUSES:
+                    statuses[batch_id] = self.backend.status(batch_id)
+            waiting = [batch_id for batch_id, status in statuses.items() if status not in TERMINAL_STATUSES]
+            if not waiting:
+                return statuses
+            if time.monotonic() >= deadline:
+                logger.error(f"Batch {name}: timed out with {len(waiting)} batches unfinished")
+                return statuses
+            logger.info(f"Batch {name}: {len(batch_ids) - len(waiting)}/{len(batch_ids)} batches finished")
+            cancellable_sleep(self.poll_interval)
+
+    @staticmethod
+    def _to_response(line: Dict[str, Any], item: BatchItem) -> Optional[ChatCompletion]:
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            logger.warning(f"Batch request {item.custom_id} failed: {line.get('error') or response.get('status_code')}")
+            return None
+        completion = ChatCompletion.model_validate(response["body"])
+        return completion if completion.choices else None
+
+
+def _finish_reason(completion: Optional[ChatCompletion]) -> Optional[str]:
+    return completion.choices[0].finish_reason if completion is not None else None
+
+
+def get_batch_backend(name: str = LLM_BATCH_BACKEND, client=None) -> BatchBackend:
+    """
+    Return the configured batch backend.
+
+    Args:
+        name: "azure" for the Batch API or "local" for the interactive stand-in
+        client: The OpenAI client; defaults to the shared pooled client
+
+    Returns:
+        The BatchBackend instance
+    """
+    if name == "local":
+        return LocalBatchBackend(client)
+    if name != "azure":
+        raise ValueError(f"Unknown batch backend: {name}")
+    return AzureBatchBackend(client or get_llm_client())
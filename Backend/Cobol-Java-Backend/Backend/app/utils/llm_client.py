@@ -0,0 +1,182 @@
+import asyncio
+import atexit
+import threading
+import weakref
+import httpx
+from openai import AsyncAzureOpenAI, AzureOpenAI
+from ..config import (
+    logger, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION,
+    LLM_HTTP2, LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE, LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_TIMEOUT, LLM_HTTP_CONNECT_TIMEOUT
+)
+
+_lock = threading.Lock()
+_http_client = None
+_llm_client = None
+# Async clients hold connections bound to the event loop that opened them, so each loop gets its own
+_async_http_clients = weakref.WeakKeyDictionary()
+_async_llm_clients = weakref.WeakKeyDictionary()
+
+
+def _http_client_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY
+        ),
+        "timeout": httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT),
+        "follow_redirects": True
+    }
+
+
+def _create_http_client() -> httpx.Client:
+    """Build the pooled HTTP client, falling back to HTTP/1.1 if HTTP/2 support is not installed."""
+    options = _http_client_options()
+    if LLM_HTTP2:
+        try:
+            return httpx.Client(http2=True, **options)
+        except ImportError:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+    return httpx.Client(**options)
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Return the process-wide pooled HTTP client used for all Azure OpenAI traffic.
+
+    httpx clients are thread-safe, so one pool is shared by every request thread
+    and keeps TLS connections alive between calls.
+
+    Returns:
+        The shared httpx.Client
+    """
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = _create_http_client()
+                logger.info(f"LLM HTTP pool created (max {LLM_HTTP_MAX_CONNECTIONS} connections, "
+                            f"{LLM_HTTP_MAX_KEEPALIVE} keep-alive, http2={LLM_HTTP2})")
+    return _http_client
+
+
+def create_llm_client(endpoint: str, api_key: str, api_version: str = AZURE_OPENAI_API_VERSION) -> AzureOpenAI:
+    """
+    Build an Azure OpenAI chat client for one endpoint on top of the pooled HTTP client.
+
+    Retries are left to the rate limiter in llm_gateway, so the SDK's own retries
+    are disabled.
+
+    Args:
+        endpoint: Azure OpenAI resource endpoint (or a local mock of it)
+        api_key: API key of the resource
+        api_version: API version to request
+
+    Returns:
+        The AzureOpenAI client
+    """
+    return AzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=get_http_client(),
+        max_retries=0
+    )
+
+
+def get_llm_client() -> AzureOpenAI:
+    """
+    Return the shared Azure OpenAI chat client of the default endpoint.
+
+    Returns:
+        The shared AzureOpenAI client
+    """
+    global _llm_client
+    if _llm_client is None:
+        get_http_client()
+        with _lock:
+            if _llm_client is None:
+                _llm_client = create_llm_client(AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, AZURE_OPENAI_API_VERSION)
+    return _llm_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Return the pooled async HTTP client of the running event loop.
+
+    Returns:
+        The loop's shared httpx.AsyncClient
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_http_clients.get(loop)
+        if client is None:
+            options = _http_client_options()
+            if LLM_HTTP2:
+                try:
+                    client = httpx.AsyncClient(http2=True, **options)
+                except ImportError:
+                    logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            _async_http_clients[loop] = client = client or httpx.AsyncClient(**options)
+    return client
+
+
+def create_async_llm_client(endpoint: str, api_key: str,
+                            api_version: str = AZURE_OPENAI_API_VERSION) -> AsyncAzureOpenAI:
+    """
+    Build an async Azure OpenAI chat client for one endpoint on the running loop's pooled HTTP client.
+
+    Args:
+        endpoint: Azure OpenAI resource endpoint (or a local mock of it)
+        api_key: API key of the resource
+        api_version: API version to request
+
+    Returns:
+        The AsyncAzureOpenAI client
+    """
+    return AsyncAzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=get_async_http_client(),
+        max_retries=0
+    )
+
+
+def get_async_llm_client() -> AsyncAzureOpenAI:
+    """
+    Return the async Azure OpenAI chat client of the default endpoint for the running event loop.
+
+    Returns:
+        The loop's shared AsyncAzureOpenAI client
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_llm_clients.get(loop)
+    if client is None:
+        client = create_async_llm_client(AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, AZURE_OPENAI_API_VERSION)
+        _async_llm_clients[loop] = client
+    return client
+
+
+async def aclose_async_llm_clients() -> None:
+    """Close the async connection pool of the running event loop, e.g. on ASGI shutdown."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_http_clients.pop(loop, None)
+        _async_llm_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def close_llm_clients() -> None:
+    """Close the shared connection pool."""
+    global _http_client, _llm_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        _llm_client = None
+
+
+atexit.register(close_llm_clients)
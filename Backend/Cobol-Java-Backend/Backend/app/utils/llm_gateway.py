@@ -0,0 +1,699 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+import weakref
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from openai.types.chat import ChatCompletion
+from ..config import logger, LLM_MAX_CONTINUATIONS, LLM_ASYNC_MAX_IN_FLIGHT
+from .llm_cache import LLMResponseCache, get_llm_cache
+from .llm_client import get_async_llm_client
+from .llm_usage import cached_tokens, record_usage
+from .cancellation import current_token
+from .llm_hedging import get_hedge_policy
+from .llm_router import get_router
+from .prompt_packer import count_message_tokens, get_context_window
+from .rate_limiter import get_rate_limiter, get_status_code, is_retryable_error
+from .response import extract_json_from_response
+
+CONTINUATION_PROMPT = (
+    "Your previous response was cut off because it reached the output limit. "
+    "Continue exactly where it stopped. Do not repeat any text that was already written, "
+    "do not restart the answer and do not add any preamble, explanation or code fences."
+)
+
+# Longest overlap checked when the model repeats the end of the previous part
+MAX_STITCH_OVERLAP = 400
+# Smallest completion budget worth a continuation call
+MIN_CONTINUATION_TOKENS = 256
+# Finish reason recorded for a stream that failed after part of the reply had been yielded
+INTERRUPTED = "interrupted"
+
+# Deployments (or API versions) that rejected json_schema response formats;
+# their requests are downgraded to JSON mode instead of failing every time
+_json_schema_unsupported = set()
+_json_schema_lock = threading.Lock()
+
+# Deployments (or API versions) that rejected stream_options; their streams are sent
+# without usage reporting instead of failing every time
+_stream_usage_unsupported = set()
+_stream_usage_lock = threading.Lock()
+
+# Caps the requests awaited at once on each event loop
+_async_semaphores = weakref.WeakKeyDictionary()
+
+
+def chat_completion(client, model: str, messages: List[Dict[str, Any]],
+                    temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                    response_format: Optional[Dict[str, Any]] = None,
+                    use_cache: bool = True, max_continuations: int = LLM_MAX_CONTINUATIONS,
+                    hedge: Optional[str] = None, **kwargs) -> ChatCompletion:
+    """
+    Single entry point for chat completion calls.
+
+    Identical requests are served from the shared response cache; misses go through
+    the deployment's rate limiter (quota budgets, adaptive concurrency, retries on
+    throttling), or are routed across the model's deployment pool when one is
+    configured, and are stored once they come back. A reply cut off at `max_tokens`
+    (finish_reason "length") is continued with follow-up calls and stitched into
+    one response. The usage of every call, including the prompt tokens served
+    from the provider's prefix cache, is recorded per deployment.
+
+    Args:
+        client: The OpenAI client instance
+        model: Deployment name of the model
+        messages: Chat messages
+        temperature: Sampling temperature
+        max_tokens: Completion token limit
+        response_format: Requested response format
+        use_cache: Whether the response cache may be consulted and populated
+        max_continuations: Follow-up calls allowed for a truncated reply (0 disables)
+        hedge: Latency group of the call (e.g. "chunk_conversion"); when set and hedging
+            is enabled, a call slower than usual for its group is duplicated (see llm_hedging)
+        **kwargs: Extra request options passed through to the client (e.g. timeout)
+
+    Returns:
+        The chat completion response
+    """
+    request = _build_request(model, messages, temperature, max_tokens, response_format)
+    cache, key, cached = _cache_lookup(use_cache, request)
+    if cached is not None:
+        return cached
+
+    if hedge:
+        response = get_hedge_policy().run(
+            hedge, model,
+            lambda deployment: _complete(client, {**request, "model": deployment}, kwargs, max_continuations)
+        )
+    else:
+        response = _complete(client, request, kwargs, max_continuations)
+
+    if cache is not None and _is_cacheable(response):
+        cache.set(key, response.model_dump(mode="json"))
+    return response
+
+
+async def chat_completion_async(client, model: str, messages: List[Dict[str, Any]],
+                                temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                                response_format: Optional[Dict[str, Any]] = None,
+                                use_cache: bool = True, max_continuations: int = LLM_MAX_CONTINUATIONS,
+                                hedge: Optional[str] = None, **kwargs) -> ChatCompletion:
+    """
+    Async counterpart of chat_completion for AsyncAzureOpenAI clients.
+
+    Shares the response cache, rate limiters, deployment pools, hedging policy and
+    usage accounting with the sync entry point. On top of the limiters, the
+    requests awaited at once on an event loop are capped at LLM_ASYNC_MAX_IN_FLIGHT.
+
+    Args:
+        client: The AsyncAzureOpenAI client (None = the running loop's default client)
+        model: Deployment name of the model
+        messages: Chat messages
+        temperature: Sampling temperature
+        max_tokens: Completion token limit
+        response_format: Requested response format
+        use_cache: Whether the response cache may be consulted and populated
+        max_continuations: Follow-up calls allowed for a truncated reply (0 disables)
+        hedge: Latency group of the call, see chat_completion
+        **kwargs: Extra request options passed through to the client (e.g. timeout)
+
+    Returns:
+        The chat completion response
+    """
+    client = client or get_async_llm_client()
+    request = _build_request(model, messages, temperature, max_tokens, response_format)
+    cache, key, cached = _cache_lookup(use_cache, request)
+    if cached is not None:
+        return cached
+
+    if hedge:
+        response = await get_hedge_policy().run_async(
+            hedge, model,
+            lambda deployment: _complete_async(client, {**request, "model": deployment}, kwargs, max_continuations)
+        )
+    else:
+        response = await _complete_async(client, request, kwargs, max_continuations)
+
+    if cache is not None and _is_cacheable(response):
+        cache.set(key, response.model_dump(mode="json"))
+    return response
+
+
+def _cache_lookup(use_cache: bool, request: Dict[str, Any]) -> Tuple[Optional[LLMResponseCache], Optional[str],
+                                                                     Optional[ChatCompletion]]:
+    """The response cache, the request's key and the cached response, if any."""
+    cache = get_llm_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    model = request["model"]
+    key = LLMResponseCache.make_key(model, request["messages"], request.get("temperature"),
+                                    request.get("max_tokens"), request.get("response_format"))
+    cached = cache.get(key)
+    if cached is None:
+        return cache, key, None
+    logger.info(f"LLM cache hit for {model} ({key[:12]})")
+    return cache, key, ChatCompletion.model_validate(cached)
+
+
+def _complete(client, request: Dict[str, Any], kwargs: Dict[str, Any], max_continuations: int) -> ChatCompletion:
+    """One uncached completion, continued while it is cut off at its token limit."""
+    model = request["model"]
+    response = _create(client, request, kwargs, usage=True)
+    record_usage(model, response.usage)
+    parts = [_content(response)]
+    usage = [response.usage]
+    continuation = 0
+    while _finish_reason(response) == "length" and continuation < max_continuations:
+        follow_up = continuation_request(request, "".join(parts))
+        if follow_up is None:
+            break
+        continuation += 1
+        logger.info(f"Completion from {model} was truncated; requesting continuation {continuation}/{max_continuations}")
+        response = _create(client, follow_up, kwargs, usage=True)
+        record_usage(model, response.usage)
+        parts.append(trim_overlap("".join(parts), _content(response)))
+        usage.append(response.usage)
+
+    if continuation:
+        response = stitched_response(response, "".join(parts), usage)
+    if _finish_reason(response) == "length":
+        logger.warning(f"Completion from {model} still truncated after {continuation} continuations")
+    return response
+
+
+async def _complete_async(client, request: Dict[str, Any], kwargs: Dict[str, Any],
+                          max_continuations: int) -> ChatCompletion:
+    """Async counterpart of _complete."""
+    model = request["model"]
+    response = await _create_async(client, request, kwargs)
+    record_usage(model, response.usage)
+    parts = [_content(response)]
+    usage = [response.usage]
+    continuation = 0
+    while _finish_reason(response) == "length" and continuation < max_continuations:
+        follow_up = continuation_request(request, "".join(parts))
+        if follow_up is None:
+            break
+        continuation += 1
+        logger.info(f"Completion from {model} was truncated; requesting continuation {continuation}/{max_continuations}")
+        response = await _create_async(client, follow_up, kwargs)
+        record_usage(model, response.usage)
+        parts.append(trim_overlap("".join(parts), _content(response)))
+        usage.append(response.usage)
+
+    if continuation:
+        response = stitched_response(response, "".join(parts), usage)
+    if _finish_reason(response) == "length":
+        logger.warning(f"Completion from {model} still truncated after {continuation} continuations")
+    return response
+
+
+def stream_chat_completion(client, model: str, messages: List[Dict[str, Any]],
+                           temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                           response_format: Optional[Dict[str, Any]] = None,
+                           use_cache: bool = True, max_continuations: int = LLM_MAX_CONTINUATIONS,
+                           **kwargs) -> Iterator[str]:
+    """
+    Streaming counterpart of chat_completion that yields content deltas as they arrive.
+
+    A cache hit is replayed as a single delta. On a miss the deltas are accumulated
+    and, once the stream finishes normally, stored in the cache as a regular
+    chat completion so later non-streaming calls can reuse it. A stream cut off at
+    `max_tokens`, or broken off by a retryable failure after part of the reply was
+    yielded, is continued with follow-up streams whose deltas are yielded as if
+    they were part of the first one. Each stream holds a slot of the deployment's
+    rate limiter until it has been read, and its usage, reported in the final
+    chunk, is recorded per deployment like that of a regular call.
+
+    Args:
+        client: The OpenAI client instance
+        model: Deployment name of the model
+        messages: Chat messages
+        temperature: Sampling temperature
+        max_tokens: Completion token limit
+        response_format: Requested response format
+        use_cache: Whether the response cache may be consulted and populated
+        max_continuations: Follow-up calls allowed for a truncated reply (0 disables)
+        **kwargs: Extra request options passed through to the client (e.g. timeout)
+
+    Yields:
+        Content deltas of the completion
+    """
+    request = _build_request(model, messages, temperature, max_tokens, response_format)
+
+    cache = get_llm_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        key = LLMResponseCache.make_key(model, messages, temperature, max_tokens, response_format)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM cache hit for streamed {model} request ({key[:12]})")
+            content = ChatCompletion.model_validate(cached).choices[0].message.content or ""
+            if content:
+                yield content
+            return
+
+    parts = []
+    state = {"finish_reason": None, "id": None}
+    yield from _stream_once(client, {**request, "stream": True}, kwargs, parts, state)
+
+    continuation = 0
+    while state["finish_reason"] in ("length", INTERRUPTED) and continuation < max_continuations:
+        previous = "".join(parts)
+        follow_up = continuation_request(request, previous)
+        if follow_up is None:
+            logger.warning(f"Streamed completion from {model} truncated with no room left to continue")
+            break
+        follow_up["stream"] = True
+        continuation += 1
+        logger.info(f"Streamed completion from {model} was "
+                    f"{'interrupted' if state['finish_reason'] == INTERRUPTED else 'truncated'}; "
+                    f"requesting continuation {continuation}/{max_continuations}")
+        # Hold back the start of the continuation until any repeated text can be trimmed
+        pending, released = [], False
+        for delta in _stream_once(client, follow_up, kwargs, None, state):
+            if released:
+                parts.append(delta)
+                yield delta
+                continue
+            pending.append(delta)
+            if sum(len(p) for p in pending) >= MAX_STITCH_OVERLAP:
+                released = True
+                head = trim_overlap(previous, "".join(pending))
+                if head:
+                    parts.append(head)
+                    yield head
+        if not released and pending:
+            head = trim_overlap(previous, "".join(pending))
+            if head:
+                parts.append(head)
+                yield head
+
+    if state["finish_reason"] == INTERRUPTED:
+        raise state["error"]
+    if cache is not None and state["finish_reason"] == "stop":
+        cache.set(key, {
+            "id": state["id"] or f"stream-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": state["finish_reason"],
+                "message": {"role": "assistant", "content": "".join(parts)}
+            }]
+        })
+
+
+def structured_completion(client, model: str, messages: List[Dict[str, Any]],
+                          response_format: Dict[str, Any], temperature: Optional[float] = None,
+                          max_tokens: Optional[int] = None, **kwargs) -> Tuple[Dict[str, Any], ChatCompletion]:
+    """
+    Chat completion constrained to a JSON schema, returning the parsed object.
+
+    With a `json_schema` response format the service guarantees the reply matches
+    the schema, so a plain `json.loads` is enough. The regex-based repair in
+    extract_json_from_response is kept only as a fallback for deployments that
+    had to be downgraded to JSON mode or replies that were still truncated.
+
+    Args:
+        client: The OpenAI client instance
+        model: Deployment name of the model
+        messages: Chat messages
+        response_format: A json_schema response format (see prompts.json_schema_format)
+        temperature: Sampling temperature
+        max_tokens: Completion token limit
+        **kwargs: Passed through to chat_completion
+
+    Returns:
+        Tuple of the parsed JSON object and the raw response
+    """
+    response = chat_completion(client, model, messages, temperature=temperature, max_tokens=max_tokens,
+                               response_format=response_format, **kwargs)
+    return parse_structured_content(_content(response)), response
+
+
+async def structured_completion_async(client, model: str, messages: List[Dict[str, Any]],
+                                      response_format: Dict[str, Any], temperature: Optional[float] = None,
+                                      max_tokens: Optional[int] = None,
+                                      **kwargs) -> Tuple[Dict[str, Any], ChatCompletion]:
+    """Async counterpart of structured_completion; `client` may be None for the loop's default client."""
+    response = await chat_completion_async(client, model, messages, temperature=temperature, max_tokens=max_tokens,
+                                           response_format=response_format, **kwargs)
+    return parse_structured_content(_content(response)), response
+
+
+def parse_structured_content(content: str) -> Dict[str, Any]:
+    """
+    Parse the content of a structured reply.
+
+    Args:
+        content: Reply text, normally a JSON document matching the requested schema
+
+    Returns:
+        The parsed object (empty dict if nothing could be recovered)
+    """
+    try:
+        parsed = json.loads(content)
+        if isinstance(parsed, dict):
+            return parsed
+    except (TypeError, ValueError):
+        pass
+    logger.warning("Structured reply did not parse as a JSON object; falling back to extraction")
+    parsed = extract_json_from_response(content or "")
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _build_request(model, messages, temperature, max_tokens, response_format) -> Dict[str, Any]:
+    request = {"model": model, "messages": messages}
+    if temperature is not None:
+        request["temperature"] = temperature
+    if max_tokens is not None:
+        request["max_tokens"] = max_tokens
+    if response_format is not None:
+        request["response_format"] = response_format
+    return request
+
+
+def _create(client, request: Dict[str, Any], kwargs: Dict[str, Any], usage: bool = False):
+    """
+    Send one request through the deployment's rate limiter.
+
+    Models served by a deployment pool (LLM_DEPLOYMENTS) are routed to the pool's
+    best member, using that member's client and limiter instead of `client`.
+
+    A json_schema response format rejected by the deployment (older models or API
+    versions answer 400) is downgraded to JSON mode, and remembered so later
+    requests skip the failed attempt. Within a pipeline run with a deadline, each
+    attempt's HTTP timeout is capped at the time left.
+    """
+    model = request["model"]
+    request = _apply_json_schema_support(request)
+    estimated_tokens = _estimate_tokens(request)
+
+    router = get_router(model)
+
+    def send(payload):
+        if router is not None:
+            return router.call(
+                lambda deployment: _without_client_retries(deployment.client).chat.completions.create(
+                    **{**payload, "model": deployment.deployment}, **_with_deadline(kwargs)),
+                estimated_tokens,
+                usage_tokens=_usage_tokens if usage else None
+            )
+        return get_rate_limiter(model).call(
+            lambda: _without_client_retries(client).chat.completions.create(**payload, **_with_deadline(kwargs)),
+            estimated_tokens,
+            usage_tokens=_usage_tokens if usage else None
+        )
+
+    try:
+        return send(request)
+    except Exception as e:
+        return send(_json_schema_fallback(request, e))
+
+
+async def _create_async(client, request: Dict[str, Any], kwargs: Dict[str, Any]):
+    """
+    Async counterpart of _create for a non-streaming request.
+
+    Each HTTP attempt also holds a slot of the event loop's in-flight cap.
+    """
+    model = request["model"]
+    request = _apply_json_schema_support(request)
+    estimated_tokens = _estimate_tokens(request)
+    semaphore = _async_semaphore()
+    router = get_router(model)
+
+    async def send(payload):
+        if router is not None:
+            async def attempt(deployment):
+                async with semaphore:
+                    return await _without_client_retries(deployment.async_client).chat.completions.create(
+                        **{**payload, "model": deployment.deployment}, **_with_deadline(kwargs))
+            return await router.acall(attempt, estimated_tokens, usage_tokens=_usage_tokens)
+
+        async def attempt():
+            async with semaphore:
+                return await _without_client_retries(client).chat.completions.create(
+                    **payload, **_with_deadline(kwargs))
+        return await get_rate_limiter(model).acall(attempt, estimated_tokens, usage_tokens=_usage_tokens)
+
+    try:
+        return await send(request)
+    except Exception as e:
+        return await send(_json_schema_fallback(request, e))
+
+
+def _async_semaphore() -> asyncio.Semaphore:
+    """The running loop's cap on requests awaited at once (LLM_ASYNC_MAX_IN_FLIGHT)."""
+    loop = asyncio.get_running_loop()
+    semaphore = _async_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _async_semaphores[loop] = asyncio.Semaphore(LLM_ASYNC_MAX_IN_FLIGHT)
+    return semaphore
+
+
+def _estimate_tokens(request: Dict[str, Any]) -> int:
+    return count_message_tokens(request["messages"], request["model"]) + (request.get("max_tokens") or 0)
+
+
+def _apply_json_schema_support(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Downgrade a json_schema request to JSON mode for deployments known to reject it."""
+    if _is_json_schema(request) and request["model"] in _json_schema_unsupported:
+        return _json_mode(request)
+    return request
+
+
+def _json_schema_fallback(request: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+    """
+    The JSON-mode retry of a request whose json_schema format was rejected.
+
+    Re-raises `error` for any other failure.
+    """
+    if not _is_json_schema(request) or not _rejects_json_schema(error):
+        raise error
+    model = request["model"]
+    with _json_schema_lock:
+        _json_schema_unsupported.add(model)
+    logger.warning(f"Deployment {model} does not support json_schema response formats; using JSON mode")
+    return _json_mode(request)
+
+
+def _with_deadline(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Request options with the timeout lowered to what is left of the current run's deadline."""
+    token = current_token()
+    remaining = token.remaining() if token is not None else None
+    if remaining is None:
+        return kwargs
+    timeout = kwargs.get("timeout")
+    if isinstance(timeout, (int, float)) and timeout < remaining:
+        return kwargs
+    # A zero timeout would fail instantly with a misleading error; the limiter's checkpoint raises instead
+    return {**kwargs, "timeout": max(remaining, 1.0)}
+
+
+def _is_json_schema(request: Dict[str, Any]) -> bool:
+    return (request.get("response_format") or {}).get("type") == "json_schema"
+
+
+def _json_mode(request: Dict[str, Any]) -> Dict[str, Any]:
+    return {**request, "response_format": {"type": "json_object"}}
+
+
+def _rejects_json_schema(error: Exception) -> bool:
+    """True for a 400 complaining about the response_format / json_schema parameter."""
+    if get_status_code(error) != 400:
+        return False
+    message = str(error).lower()
+    return "response_format" in message or "json_schema" in message
+
+
+def _stream(client, request: Dict[str, Any], kwargs: Dict[str, Any]) -> Iterator[Any]:
+    """
+    Streaming counterpart of _create, yielding the chunks of one request.
+
+    The deployment's (or the routed member's) limiter slot is held until the
+    stream has been read or closed. Failures before the first chunk are retried,
+    failed over and downgraded from json_schema as in _create.
+    """
+    model = request["model"]
+    request = _apply_stream_usage(_apply_json_schema_support(request))
+    estimated_tokens = _estimate_tokens(request)
+    router = get_router(model)
+
+    def chunks(payload):
+        if router is not None:
+            return router.stream(
+                lambda deployment: _without_client_retries(deployment.client).chat.completions.create(
+                    **{**payload, "model": deployment.deployment}, **_with_deadline(kwargs)),
+                estimated_tokens,
+                usage_tokens=_usage_tokens
+            )
+        return get_rate_limiter(model).stream(
+            lambda: _without_client_retries(client).chat.completions.create(**payload, **_with_deadline(kwargs)),
+            estimated_tokens,
+            usage_tokens=_usage_tokens
+        )
+
+    stream = chunks(request)
+    try:
+        # Each fallback drops one option the deployment rejected, so this ends
+        while True:
+            try:
+                first = next(stream, None)
+                break
+            except Exception as e:
+                request = _stream_fallback(request, e)
+                stream = chunks(request)
+        if first is not None:
+            yield first
+            yield from stream
+    finally:
+        stream.close()
+
+
+def _stream_once(client, request: Dict[str, Any], kwargs: Dict[str, Any],
+                 parts: Optional[List[str]], state: Dict[str, Any]) -> Iterator[str]:
+    """
+    Stream one request, recording its finish reason and id.
+
+    The stream is closed, aborting the request, as soon as the current run is
+    cancelled. A retryable failure after some of the reply was yielded ends the
+    stream with finish reason INTERRUPTED and the error in `state["error"]`, so
+    the caller can continue the reply instead of starting over.
+    """
+    state["finish_reason"] = None
+    token = current_token()
+    stream = _stream(client, request, kwargs)
+    yielded = False
+    try:
+        for chunk in stream:
+            if token is not None:
+                token.check()
+            state["id"] = state["id"] or getattr(chunk, "id", None)
+            if getattr(chunk, "usage", None) is not None:
+                record_usage(request["model"], chunk.usage)
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                state["finish_reason"] = choice.finish_reason
+            delta = choice.delta.content if choice.delta else None
+            if delta:
+                if parts is not None:
+                    parts.append(delta)
+                yielded = True
+                yield delta
+    except Exception as e:
+        if not yielded or not is_retryable_error(e):
+            raise
+        logger.warning(f"Stream from {request['model']} failed after part of the reply "
+                       f"({get_status_code(e) or type(e).__name__})")
+        state["finish_reason"] = INTERRUPTED
+        state["error"] = e
+    finally:
+        stream.close()
+
+
+def _apply_stream_usage(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Ask for the usage of a stream in its final chunk, unless the deployment is known to reject it."""
+    if request["model"] in _stream_usage_unsupported:
+        return request
+    return {**request, "stream_options": {"include_usage": True}}
+
+
+def _stream_fallback(request: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+    """
+    The retry of a stream whose stream_options or json_schema format was rejected.
+
+    Re-raises `error` for any other failure.
+    """
+    if "stream_options" in request and get_status_code(error) == 400 and "stream_options" in str(error).lower():
+        model = request["model"]
+        with _stream_usage_lock:
+            _stream_usage_unsupported.add(model)
+        logger.warning(f"Deployment {model} does not support stream_options; streaming without usage")
+        return {key: value for key, value in request.items() if key != "stream_options"}
+    return _json_schema_fallback(request, error)
+
+
+def continuation_request(request: Dict[str, Any], partial: str) -> Optional[Dict[str, Any]]:
+    """
+    Build the follow-up request for a truncated reply, or None if the context window is full.
+
+    JSON mode is dropped because it would force the continuation to start a new
+    JSON document instead of extending the partial one. The completion budget is
+    reduced when the growing conversation would not leave room for it.
+    """
+    follow_up = {key: value for key, value in request.items() if key != "response_format"}
+    follow_up["messages"] = list(request["messages"]) + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUATION_PROMPT}
+    ]
+    room = get_context_window(request["model"]) - count_message_tokens(follow_up["messages"], request["model"])
+    if room < MIN_CONTINUATION_TOKENS:
+        return None
+    if follow_up.get("max_tokens"):
+        follow_up["max_tokens"] = min(follow_up["max_tokens"], room)
+    return follow_up
+
+
+def trim_overlap(previous: str, continuation: str) -> str:
+    """Drop a code fence the model may reopen and any text it repeats from the end of the previous part."""
+    if continuation.lstrip().startswith("```") and previous.count("```") % 2 == 1:
+        continuation = continuation.lstrip().split("\n", 1)[1] if "\n" in continuation.lstrip() else ""
+    tail = previous[-MAX_STITCH_OVERLAP:]
+    for size in range(min(len(tail), len(continuation)), 7, -1):
+        if tail.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
+
+
+def stitched_response(last: ChatCompletion, content: str, usages: List[Any]) -> ChatCompletion:
+    """Combine the continued parts into one response carrying the final finish reason and summed usage."""
+    data = last.model_dump(mode="json")
+    data["choices"] = data["choices"][:1]
+    data["choices"][0]["message"]["content"] = content
+    totals, cached = {}, 0
+    for usage in usages:
+        if usage is None:
+            continue
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            totals[field] = totals.get(field, 0) + (getattr(usage, field, 0) or 0)
+        cached += cached_tokens(usage)
+    if totals:
+        totals["prompt_tokens_details"] = {"cached_tokens": cached}
+        data["usage"] = totals
+    return ChatCompletion.model_validate(data)
+
+
+def _content(response: Any) -> str:
+    if not getattr(response, "choices", None):
+        return ""
+    return response.choices[0].message.content or ""
+
+
+def _finish_reason(response: Any) -> Optional[str]:
+    if not getattr(response, "choices", None):
+        return None
+    return response.choices[0].finish_reason
+
+
+def _without_client_retries(client):
+    """The rate limiter owns retries, so the SDK's built-in retry loop is switched off."""
+    with_options = getattr(client, "with_options", None)
+    return with_options(max_retries=0) if with_options else client
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def _is_cacheable(response: Any) -> bool:
+    """Only complete, successfully finished responses are worth replaying."""
+    if not isinstance(response, ChatCompletion) or not response.choices:
+        return False
+    return response.choices[0].finish_reason in ("stop", "tool_calls", "function_call")
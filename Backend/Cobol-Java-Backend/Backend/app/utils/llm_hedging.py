@@ -0,0 +1,282 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from ..config import (
+    logger, LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_BUDGET, LLM_HEDGE_DEPLOYMENTS
+)
+from .cancellation import CancellationToken, cancellation_scope, current_token
+
+# Successful call durations kept per latency group
+LATENCY_WINDOW = 200
+# Interval at which a hedged call re-checks the cancellation of its run
+HEDGE_POLL_SECONDS = 0.5
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations for one latency group."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None while it is empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(0, min(len(samples) - 1, int(round(percentile / 100.0 * len(samples))) - 1))
+        return samples[rank]
+
+
+class HedgePolicy:
+    """
+    Duplicates slow LLM calls to cut tail latency.
+
+    Calls are grouped by kind (e.g. chunk conversion, unit tests) because their
+    latencies differ widely. Once a group has enough samples, a call still
+    running after the group's latency percentile gets a duplicate on the next
+    alternate deployment (or the same one). The first success wins and the other
+    attempt is cancelled. Duplicates are capped at a fraction of all calls, so
+    token spend grows by at most that fraction.
+    """
+
+    def __init__(self, enabled: bool = LLM_HEDGE_ENABLED, percentile: float = LLM_HEDGE_PERCENTILE,
+                 min_samples: int = LLM_HEDGE_MIN_SAMPLES, min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 budget: float = LLM_HEDGE_BUDGET, deployments: Optional[List[str]] = None):
+        """
+        Args:
+            enabled: Whether calls are hedged at all
+            percentile: Latency percentile of the group after which a duplicate is sent
+            min_samples: Samples a group needs before its calls are hedged
+            min_delay: Lower bound of the hedge delay in seconds
+            budget: Maximum share of calls that may be duplicated
+            deployments: Alternate deployments for duplicates, used round-robin;
+                empty to duplicate on the primary deployment
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget = budget
+        self.deployments = list(LLM_HEDGE_DEPLOYMENTS if deployments is None else deployments)
+        self._trackers = {}
+        self._next_deployment = 0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "budget_exhausted": 0}
+
+    def tracker(self, group: str) -> LatencyTracker:
+        with self._lock:
+            tracker = self._trackers.get(group)
+            if tracker is None:
+                tracker = self._trackers[group] = LatencyTracker()
+            return tracker
+
+    def hedge_delay(self, group: str) -> Optional[float]:
+        """Seconds to wait before duplicating a call of `group`, or None while it cannot be hedged."""
+        tracker = self.tracker(group)
+        if not self.enabled or len(tracker) < self.min_samples:
+            return None
+        return max(self.min_delay, tracker.percentile(self.percentile))
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.stats["hedged"] + 1 > self.budget * self.stats["calls"]:
+                self.stats["budget_exhausted"] += 1
+                return False
+            self.stats["hedged"] += 1
+            return True
+
+    def _record_hedge_win(self) -> None:
+        with self._lock:
+            self.stats["hedge_wins"] += 1
+
+    def _hedge_deployment(self, primary: str) -> str:
+        with self._lock:
+            candidates = [d for d in self.deployments if d != primary]
+            if not candidates:
+                return primary
+            deployment = candidates[self._next_deployment % len(candidates)]
+            self._next_deployment += 1
+            return deployment
+
+    def run(self, group: str, deployment: str, attempt: Callable[[str], Any]) -> Any:
+        """
+        Run `attempt(deployment)`, duplicating it if it is slower than usual.
+
+        Each attempt runs under its own child of the current cancellation token, so
+        the losing attempt stops at its next checkpoint (rate-limiter wait, retry
+        backoff, streamed chunk) and its result is discarded.
+
+        Args:
+            group: Latency group of the call
+            deployment: Primary deployment
+            attempt: Performs one complete call against the given deployment
+
+        Returns:
+            The result of the first successful attempt
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+        tracker = self.tracker(group)
+        delay = self.hedge_delay(group)
+        if delay is None:
+            start = time.monotonic()
+            result = attempt(deployment)
+            tracker.record(time.monotonic() - start)
+            return result
+
+        parent = current_token()
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-hedge")
+        attempts = {}
+
+        def launch(target: str, hedge: bool) -> None:
+            token = CancellationToken(parent=parent)
+            started = time.monotonic()
+
+            def run():
+                with cancellation_scope(token):
+                    return attempt(target)
+            attempts[executor.submit(run)] = (target, token, started, hedge)
+
+        try:
+            launch(deployment, False)
+            done, _ = wait(list(attempts), timeout=delay)
+            if not done and self._take_budget():
+                target = self._hedge_deployment(deployment)
+                logger.info(f"Hedging {group} call on {deployment} after {delay:.1f}s; duplicate sent to {target}")
+                launch(target, True)
+
+            error = None
+            pending = set(attempts)
+            while pending:
+                done, pending = wait(pending, timeout=HEDGE_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                if parent is not None:
+                    parent.check()
+                for future in done:
+                    target, _, started, hedge = attempts[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The other attempt may still succeed; only the last failure is raised
+                        logger.warning(f"{'Hedge' if hedge else 'Primary'} {group} attempt on {target} failed: {e}")
+                        error = e
+                        continue
+                    tracker.record(time.monotonic() - started)
+                    if hedge:
+                        self._record_hedge_win()
+                    return result
+            raise error
+        finally:
+            for future, (target, token, _, _) in attempts.items():
+                if not future.done():
+                    token.cancel(f"hedged {group} call finished first elsewhere")
+            # The losing attempt winds down in the background
+            executor.shutdown(wait=False)
+
+    async def run_async(self, group: str, deployment: str, attempt: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Async counterpart of `run`; the attempts are tasks on the running event loop.
+
+        The losing attempt is cancelled outright, which aborts its HTTP request.
+
+        Args:
+            group: Latency group of the call
+            deployment: Primary deployment
+            attempt: Coroutine function performing one complete call against the given deployment
+
+        Returns:
+            The result of the first successful attempt
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+        tracker = self.tracker(group)
+        delay = self.hedge_delay(group)
+        if delay is None:
+            start = time.monotonic()
+            result = await attempt(deployment)
+            tracker.record(time.monotonic() - start)
+            return result
+
+        parent = current_token()
+        attempts = {}
+
+        def launch(target: str, hedge: bool) -> None:
+            token = CancellationToken(parent=parent)
+            started = time.monotonic()
+
+            async def run():
+                with cancellation_scope(token):
+                    return await attempt(target)
+            attempts[asyncio.ensure_future(run())] = (target, token, started, hedge)
+
+        try:
+            launch(deployment, False)
+            done, _ = await asyncio.wait(list(attempts), timeout=delay)
+            if not done and self._take_budget():
+                target = self._hedge_deployment(deployment)
+                logger.info(f"Hedging {group} call on {deployment} after {delay:.1f}s; duplicate sent to {target}")
+                launch(target, True)
+
+            error = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=HEDGE_POLL_SECONDS,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if parent is not None:
+                    parent.check()
+                for task in done:
+                    target, _, started, hedge = attempts[task]
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"{'Hedge' if hedge else 'Primary'} {group} attempt on {target} failed: {e}")
+                        error = e
+                        continue
+                    tracker.record(time.monotonic() - started)
+                    if hedge:
+                        self._record_hedge_win()
+                    return result
+            raise error
+        finally:
+            for task, (target, token, _, _) in attempts.items():
+                if not task.done():
+                    token.cancel(f"hedged {group} call finished first elsewhere")
+                    task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, settings and current hedge delay per latency group, for diagnostics."""
+        with self._lock:
+            stats = dict(self.stats)
+            groups = list(self._trackers)
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "budget": self.budget,
+            "deployments": self.deployments,
+            **stats,
+            "groups": {
+                group: {"samples": len(self.tracker(group)), "hedge_delay": self.hedge_delay(group)}
+                for group in groups
+            }
+        }
+
+
+_policy = HedgePolicy()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """The process-wide hedging policy configured from the LLM_HEDGE_* settings."""
+    return _policy
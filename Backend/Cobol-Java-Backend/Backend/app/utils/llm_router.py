@@ -0,0 +1,447 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+from ..config import (
+    logger, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, AZURE_OPENAI_API_VERSION, AZURE_OPENAI_DEPLOYMENT_NAME,
+    LLM_DEPLOYMENTS, LLM_ROUTING_STRATEGY, LLM_DEPLOYMENT_COOLDOWN, LLM_DEPLOYMENT_MAX_COOLDOWN, LLM_MAX_RETRIES
+)
+from .cancellation import cancellable_sleep, cancellable_sleep_async, check_cancelled
+from .llm_client import create_async_llm_client, create_llm_client
+from .rate_limiter import get_rate_limiter, get_retry_after, get_status_code, is_retryable_error
+
+LEAST_LOADED = "least_loaded"
+QUOTA_AWARE = "quota_aware"
+# Statuses that point at a misconfigured deployment (bad key, missing deployment) rather than the
+# request; the request is moved to another deployment but not retried on the failing one
+FAILOVER_STATUS_CODES = (401, 403, 404)
+# Smoothing factor of the per-deployment latency average
+LATENCY_EWMA_ALPHA = 0.2
+# Latency assumed for a deployment until its first call completes
+DEFAULT_LATENCY = 1.0
+
+
+class Deployment:
+    """One deployment of a pool: its client, its rate limiter and its observed health and latency."""
+
+    def __init__(self, name: str, model: str, deployment: str, endpoint: str, api_key: str,
+                 api_version: str = AZURE_OPENAI_API_VERSION, weight: float = 1.0, rpm: Optional[int] = None,
+                 tpm: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 client_factory: Callable[[str, str, str], Any] = create_llm_client,
+                 async_client_factory: Callable[[str, str, str], Any] = create_async_llm_client):
+        """
+        Args:
+            name: Unique name of the pool member, also the name of its rate limiter
+            model: Model name callers request; every member of a pool serves the same one
+            deployment: Deployment name on the member's Azure OpenAI resource
+            endpoint: Resource endpoint (or a local mock of it)
+            api_key: API key of the resource
+            api_version: API version to request
+            weight: Relative share of the pool's traffic
+            rpm: Requests per minute quota of the deployment (None = LLM_RPM_LIMIT)
+            tpm: Tokens per minute quota of the deployment (None = LLM_TPM_LIMIT)
+            max_concurrency: Concurrency bound of the deployment (None = LLM_MAX_CONCURRENCY)
+            client_factory: Builds the chat client from endpoint, API key and version
+            async_client_factory: Builds the async chat client from endpoint, API key and version
+        """
+        self.name = name
+        self.model = model
+        self.deployment = deployment
+        self.endpoint = endpoint
+        self.weight = max(float(weight), 0.01)
+        self.limiter = get_rate_limiter(name, rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+        self._api_key = api_key
+        self._api_version = api_version
+        self._client_factory = client_factory
+        self._client = None
+        self._async_client_factory = async_client_factory
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.latency = None
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.stats = {"calls": 0, "failures": 0, "failovers": 0}
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._client_factory(self.endpoint, self._api_key, self._api_version)
+        return self._client
+
+    @property
+    def async_client(self) -> Any:
+        """Async chat client of the member for the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = self._async_client_factory(self.endpoint, self._api_key, self._api_version)
+        return client
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def load(self) -> float:
+        """Calls in flight, counting the next one, relative to the member's weighted capacity."""
+        return (self.limiter.in_flight + 1) / (self.limiter.concurrency_limit * self.weight)
+
+    def on_success(self, seconds: float) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self.unhealthy_until = 0.0
+            self.latency = seconds if self.latency is None else (
+                (1 - LATENCY_EWMA_ALPHA) * self.latency + LATENCY_EWMA_ALPHA * seconds)
+            self.stats["calls"] += 1
+
+    def on_failure(self, error: Exception, cooldown: float, max_cooldown: float) -> float:
+        """
+        Take the member out of rotation after a failure.
+
+        Args:
+            error: The failure
+            cooldown: Pause after the first consecutive failure; doubles with each further one
+            max_cooldown: Upper bound of the pause
+
+        Returns:
+            Seconds the member stays out of rotation
+        """
+        with self._lock:
+            self.consecutive_failures += 1
+            self.stats["failures"] += 1
+            pause = cooldown * 2 ** (self.consecutive_failures - 1)
+            pause = min(max_cooldown, max(pause, get_retry_after(error) or 0.0))
+            self.unhealthy_until = max(self.unhealthy_until, time.monotonic() + pause)
+            return pause
+
+    def count_failover(self) -> None:
+        with self._lock:
+            self.stats["failovers"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "deployment": self.deployment,
+                "endpoint": self.endpoint,
+                "weight": self.weight,
+                "healthy": self.healthy,
+                "unhealthy_for": round(max(0.0, self.unhealthy_until - time.monotonic()), 3),
+                "latency": None if self.latency is None else round(self.latency, 3),
+                "in_flight": self.limiter.in_flight,
+                "concurrency_limit": self.limiter.concurrency_limit,
+                **self.stats
+            }
+
+
+class DeploymentRouter:
+    """
+    Spreads the calls of one model over a pool of deployments.
+
+    Each call goes to the healthy member with the best score. `least_loaded`
+    weighs the member's calls in flight against its weighted concurrency limit
+    and its recent latency; `quota_aware` first prefers the member whose
+    requests- and tokens-per-minute budgets let the call start soonest and uses
+    the load as tie-breaker. A member failing with throttling, a transient error
+    or a configuration error (401/403/404) is taken out of rotation for a
+    cooldown that doubles with consecutive failures, and the call fails over to
+    the next member. Once every member has failed the call, it backs off before
+    another round.
+    """
+
+    def __init__(self, model: str, deployments: List[Deployment], strategy: str = LLM_ROUTING_STRATEGY,
+                 max_retries: int = LLM_MAX_RETRIES, cooldown: float = LLM_DEPLOYMENT_COOLDOWN,
+                 max_cooldown: float = LLM_DEPLOYMENT_MAX_COOLDOWN):
+        """
+        Args:
+            model: Model name the pool serves
+            deployments: Members of the pool
+            strategy: "least_loaded" or "quota_aware"
+            max_retries: Attempts after the first one, across all members
+            cooldown: Pause of a member after its first consecutive failure, in seconds
+            max_cooldown: Upper bound of a member's pause, in seconds
+        """
+        if not deployments:
+            raise ValueError(f"Deployment pool for {model} is empty")
+        if strategy not in (LEAST_LOADED, QUOTA_AWARE):
+            raise ValueError(f"Unknown routing strategy: {strategy}")
+        self.model = model
+        self.deployments = list(deployments)
+        self.strategy = strategy
+        self.max_retries = max_retries
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+    def choose(self, estimated_tokens: int = 0, exclude: Optional[set] = None) -> Deployment:
+        """
+        Pick the member for the next attempt.
+
+        Args:
+            estimated_tokens: Expected prompt plus completion tokens of the call
+            exclude: Names of members that already failed this call
+
+        Returns:
+            The best healthy member, or the one recovering first when none is healthy
+        """
+        candidates = [d for d in self.deployments if d.name not in (exclude or ())] or self.deployments
+        healthy = [d for d in candidates if d.healthy]
+        if not healthy:
+            return min(candidates, key=lambda d: d.unhealthy_until)
+        return min(healthy, key=lambda d: self._score(d, estimated_tokens) + (random.random(),))
+
+    def _score(self, deployment: Deployment, estimated_tokens: int) -> tuple:
+        load = deployment.load() * (deployment.latency or DEFAULT_LATENCY)
+        if self.strategy == QUOTA_AWARE:
+            return (deployment.limiter.expected_wait(estimated_tokens), load)
+        return (load,)
+
+    def call(self, send: Callable[[Deployment], Any], estimated_tokens: int = 0,
+             usage_tokens: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+        """
+        Send one request to the pool, failing over between members.
+
+        Each attempt runs under the chosen member's rate limiter, so its quota
+        budgets and adaptive concurrency still apply; retries are handled here
+        instead of in the limiter.
+
+        Args:
+            send: Performs the request against the given member
+            estimated_tokens: Expected prompt plus completion tokens
+            usage_tokens: Optional function extracting the real token usage from the result
+
+        Returns:
+            The result of `send`
+        """
+        tried = set()
+        attempt = 0
+        while True:
+            check_cancelled()
+            deployment = self.choose(estimated_tokens, tried)
+            timing = {}
+
+            def timed():
+                start = time.monotonic()
+                result = send(deployment)
+                timing["seconds"] = time.monotonic() - start
+                return result
+
+            try:
+                result = deployment.limiter.call(timed, estimated_tokens, usage_tokens, max_retries=0)
+            except Exception as e:
+                delay = self._failover_delay(e, deployment, tried, attempt)
+                attempt += 1
+                if delay:
+                    cancellable_sleep(delay)
+                continue
+
+            deployment.on_success(timing.get("seconds", 0.0))
+            return result
+
+    def stream(self, open_stream: Callable[[Deployment], Any], estimated_tokens: int = 0,
+               usage_tokens: Optional[Callable[[Any], Optional[int]]] = None) -> Iterator[Any]:
+        """
+        Streaming counterpart of `call`, yielding the chunks of one request.
+
+        The chosen member's limiter slot is held while the stream is read. Failures
+        before the first chunk fail over like `call`; a failure after it is raised,
+        and takes the member out of rotation when it is retryable.
+
+        Args:
+            open_stream: Opens the stream against the given member
+            estimated_tokens: Expected prompt plus completion tokens
+            usage_tokens: Optional function extracting the real token usage from a chunk
+
+        Yields:
+            The chunks of the stream
+        """
+        tried = set()
+        attempt = 0
+        while True:
+            check_cancelled()
+            deployment = self.choose(estimated_tokens, tried)
+            start = time.monotonic()
+            started = False
+            try:
+                for chunk in deployment.limiter.stream(lambda: open_stream(deployment), estimated_tokens,
+                                                       usage_tokens, max_retries=0):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started:
+                    if is_retryable_error(e):
+                        deployment.on_failure(e, self.cooldown, self.max_cooldown)
+                    raise
+                delay = self._failover_delay(e, deployment, tried, attempt)
+                attempt += 1
+                if delay:
+                    cancellable_sleep(delay)
+                continue
+
+            deployment.on_success(time.monotonic() - start)
+            return
+
+    async def acall(self, send: Callable[[Deployment], Awaitable[Any]], estimated_tokens: int = 0,
+                    usage_tokens: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+        """
+        Async counterpart of `call` for a coroutine function performing the request.
+
+        Args:
+            send: Coroutine function performing the request against the given member
+            estimated_tokens: Expected prompt plus completion tokens
+            usage_tokens: Optional function extracting the real token usage from the result
+
+        Returns:
+            The result awaited from `send`
+        """
+        tried = set()
+        attempt = 0
+        while True:
+            check_cancelled()
+            deployment = self.choose(estimated_tokens, tried)
+            timing = {}
+
+            async def timed():
+                start = time.monotonic()
+                result = await send(deployment)
+                timing["seconds"] = time.monotonic() - start
+                return result
+
+            try:
+                result = await deployment.limiter.acall(timed, estimated_tokens, usage_tokens, max_retries=0)
+            except Exception as e:
+                delay = self._failover_delay(e, deployment, tried, attempt)
+                attempt += 1
+                if delay:
+                    await cancellable_sleep_async(delay)
+                continue
+
+            deployment.on_success(timing.get("seconds", 0.0))
+            return result
+
+    def _failover_delay(self, error: Exception, deployment: Deployment, tried: set, attempt: int) -> float:
+        """
+        Take a failed member out of rotation and decide how the call continues.
+
+        Re-raises `error` when it is not worth another attempt or the retries are used up.
+
+        Returns:
+            0 to fail over to the next member at once, or the backoff once every member failed the call
+        """
+        status = get_status_code(error)
+        retryable = is_retryable_error(error)
+        if not retryable and status not in FAILOVER_STATUS_CODES:
+            raise error
+        pause = deployment.on_failure(error, self.cooldown, self.max_cooldown)
+        tried.add(deployment.name)
+        exhausted = len(tried) >= len(self.deployments)
+        if attempt >= self.max_retries or (exhausted and not retryable):
+            logger.error(f"Deployment pool {self.model}: giving up after {attempt + 1} attempts: {error}")
+            raise error
+        if not exhausted:
+            deployment.count_failover()
+            logger.warning(f"Deployment pool {self.model}: {deployment.name} failed "
+                           f"({status or type(error).__name__}), out of rotation for {pause:.1f}s; failing over")
+            return 0.0
+        # Every member failed this call: back off before another round
+        tried.clear()
+        delay = deployment.limiter.backoff_delay(attempt, get_retry_after(error))
+        logger.warning(f"Deployment pool {self.model}: all deployments failed "
+                       f"({status or type(error).__name__}); retrying in {delay:.2f}s")
+        return delay
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Strategy and per-member health, load and counters, for diagnostics."""
+        return {
+            "model": self.model,
+            "strategy": self.strategy,
+            "deployments": [deployment.snapshot() for deployment in self.deployments]
+        }
+
+
+def build_routers(configs: List[Dict[str, Any]],
+                  client_factory: Callable[[str, str, str], Any] = create_llm_client,
+                  async_client_factory: Callable[[str, str, str], Any] = create_async_llm_client
+                  ) -> Dict[str, DeploymentRouter]:
+    """
+    Group deployment entries (see LLM_DEPLOYMENTS) into one router per model.
+
+    Args:
+        configs: Deployment entries
+        client_factory: Builds the chat client of a member from endpoint, API key and version
+        async_client_factory: Builds the async chat client of a member
+
+    Returns:
+        Routers keyed by the model name they serve
+    """
+    pools, names = {}, set()
+    for index, entry in enumerate(configs):
+        model = entry.get("model", AZURE_OPENAI_DEPLOYMENT_NAME)
+        deployment = entry.get("deployment", model)
+        endpoint = entry.get("endpoint", AZURE_OPENAI_ENDPOINT)
+        name = entry.get("name") or f"{deployment}@{urlparse(endpoint or '').hostname or index}"
+        if name in names:
+            raise ValueError(f"Duplicate deployment name in LLM_DEPLOYMENTS: {name}")
+        names.add(name)
+        pools.setdefault(model, []).append(Deployment(
+            name, model, deployment, endpoint,
+            api_key=entry.get("api_key", AZURE_OPENAI_API_KEY),
+            api_version=entry.get("api_version", AZURE_OPENAI_API_VERSION),
+            weight=entry.get("weight", 1.0),
+            rpm=entry.get("rpm"),
+            tpm=entry.get("tpm"),
+            max_concurrency=entry.get("max_concurrency"),
+            client_factory=client_factory,
+            async_client_factory=async_client_factory
+        ))
+    return {model: DeploymentRouter(model, members) for model, members in pools.items()}
+
+
+_routers = None
+_routers_lock = threading.Lock()
+
+
+def _build_and_log(configs, client_factory, async_client_factory) -> Dict[str, DeploymentRouter]:
+    routers = build_routers(configs, client_factory, async_client_factory)
+    for model, router in routers.items():
+        logger.info(f"Deployment pool {model}: {', '.join(d.name for d in router.deployments)} ({router.strategy})")
+    return routers
+
+
+def configure_routers(configs: List[Dict[str, Any]],
+                      client_factory: Callable[[str, str, str], Any] = create_llm_client,
+                      async_client_factory: Callable[[str, str, str], Any] = create_async_llm_client) -> None:
+    """Replace the configured pools, e.g. to point them at local mock endpoints."""
+    global _routers
+    routers = _build_and_log(configs, client_factory, async_client_factory)
+    with _routers_lock:
+        _routers = routers
+
+
+def get_router(model: str) -> Optional[DeploymentRouter]:
+    """
+    Return the router of the pool serving `model`.
+
+    Args:
+        model: Model name requested by the caller
+
+    Returns:
+        The pool's DeploymentRouter, or None when the model is not pooled and goes
+        to the caller's client as is
+    """
+    global _routers
+    if _routers is None:
+        with _routers_lock:
+            if _routers is None:
+                _routers = _build_and_log(LLM_DEPLOYMENTS, create_llm_client, create_async_llm_client)
+    return _routers.get(model)
+
+
+def get_router_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every deployment pool."""
+    with _routers_lock:
+        routers = list((_routers or {}).values())
+    return {router.model: router.snapshot() for router in routers}
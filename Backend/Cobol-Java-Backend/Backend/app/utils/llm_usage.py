@@ -0,0 +1,87 @@
+import threading
+from typing import Any, Dict, Optional
+from ..config import logger
+
+
+def cached_tokens(usage: Any) -> int:
+    """Prompt tokens the service served from its prefix cache, from `usage.prompt_tokens_details`."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(usage, dict):
+        details = usage.get("prompt_tokens_details")
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def _field(usage: Any, name: str) -> int:
+    if isinstance(usage, dict):
+        return usage.get(name) or 0
+    return getattr(usage, name, None) or 0
+
+
+class UsageTracker:
+    """
+    Token usage reported by the service, per deployment.
+
+    Counts what the completions actually billed: prompt, cached prompt and
+    completion tokens. The cached share shows how well prompts reuse the
+    provider-side prefix cache, which only kicks in when the start of a prompt
+    is identical to a recent request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deployments = {}
+
+    def record(self, model: str, usage: Any) -> None:
+        """
+        Add the usage of one completion.
+
+        Args:
+            model: Deployment name
+            usage: The `usage` of the response (object or dict); None is ignored
+        """
+        if usage is None:
+            return
+        prompt = _field(usage, "prompt_tokens")
+        cached = cached_tokens(usage)
+        completion = _field(usage, "completion_tokens")
+        with self._lock:
+            totals = self._deployments.setdefault(model, {
+                "requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0
+            })
+            totals["requests"] += 1
+            totals["prompt_tokens"] += prompt
+            totals["cached_tokens"] += cached
+            totals["completion_tokens"] += completion
+        logger.info(f"LLM usage for {model}: {prompt} prompt tokens ({cached} cached), {completion} completion tokens")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Totals per deployment with the cached share of prompt tokens."""
+        with self._lock:
+            deployments = {model: dict(totals) for model, totals in self._deployments.items()}
+        for totals in deployments.values():
+            prompt = totals["prompt_tokens"]
+            totals["cached_ratio"] = round(totals["cached_tokens"] / prompt, 3) if prompt else 0.0
+        return deployments
+
+    def reset(self) -> None:
+        with self._lock:
+            self._deployments.clear()
+
+
+_tracker = UsageTracker()
+
+
+def record_usage(model: str, usage: Optional[Any]) -> None:
+    """Record the usage of one completion on the shared tracker."""
+    _tracker.record(model, usage)
+
+
+def get_usage_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of the shared tracker."""
+    return _tracker.snapshot()
+
+
+def reset_usage_stats() -> None:
+    _tracker.reset()
@@ -0,0 +1,97 @@
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Any, Dict, Optional
+from ..config import logger, AZURE_OPENAI_DEPLOYMENT_NAME, LLM_STAGE_PROFILES, LLM_LIGHT_DEPLOYMENT
+
+# Pipeline stages that call the model
+TARGET_STRUCTURE = "target_structure"
+BUSINESS_REQUIREMENTS = "business_requirements"
+TECHNICAL_REQUIREMENTS = "technical_requirements"
+CODE_CONVERSION = "code_conversion"
+CODE_STRUCTURE = "code_structure"
+CHUNK_CONVERSION = "chunk_conversion"
+CODE_POLISH = "code_polish"
+UNIT_TESTS = "unit_tests"
+FUNCTIONAL_TESTS = "functional_tests"
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """Deployment and sampling options of one pipeline stage."""
+    model: str
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+
+    def request_options(self) -> Dict[str, Any]:
+        """Sampling options as chat_completion keyword arguments; the model is passed separately."""
+        options = {}
+        if self.temperature is not None:
+            options["temperature"] = self.temperature
+        if self.max_tokens is not None:
+            options["max_tokens"] = self.max_tokens
+        return options
+
+
+DEFAULT_PROFILES = {
+    TARGET_STRUCTURE: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.2, 4000),
+    BUSINESS_REQUIREMENTS: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.3, 4000),
+    TECHNICAL_REQUIREMENTS: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.3, 4000),
+    CODE_CONVERSION: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.2, 8000),
+    CODE_STRUCTURE: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.1, 4000),
+    CHUNK_CONVERSION: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.1, 4000),
+    CODE_POLISH: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.1, 4000),
+    UNIT_TESTS: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.1, 3000),
+    FUNCTIONAL_TESTS: ModelProfile(AZURE_OPENAI_DEPLOYMENT_NAME, 0.1, 3000)
+}
+
+# Stages that reformat, extract or scaffold rather than reason about the program,
+# and do fine on a smaller, faster deployment
+LIGHT_STAGES = (CODE_POLISH, CODE_STRUCTURE, UNIT_TESTS, TECHNICAL_REQUIREMENTS)
+
+
+def build_profiles(overrides: Dict[str, Dict[str, Any]], light_deployment: str = "") -> Dict[str, ModelProfile]:
+    """
+    Resolve the profile of every stage from the defaults and the configuration.
+
+    Args:
+        overrides: Per-stage options (see LLM_STAGE_PROFILES); fields left out keep their defaults
+        light_deployment: Deployment for the lightweight stages, empty to keep the default one
+
+    Returns:
+        Profiles keyed by stage name
+    """
+    profiles = dict(DEFAULT_PROFILES)
+    if light_deployment:
+        for stage in LIGHT_STAGES:
+            profiles[stage] = replace(profiles[stage], model=light_deployment)
+    allowed = {field.name for field in fields(ModelProfile)}
+    for stage, override in overrides.items():
+        if stage not in profiles:
+            logger.warning(f"Ignoring LLM_STAGE_PROFILES entry for unknown stage '{stage}' "
+                           f"(known: {', '.join(sorted(profiles))})")
+            continue
+        unknown = set(override) - allowed
+        if unknown:
+            logger.warning(f"Ignoring unknown options {sorted(unknown)} in LLM_STAGE_PROFILES['{stage}']")
+        profiles[stage] = replace(profiles[stage], **{k: v for k, v in override.items() if k in allowed})
+    return profiles
+
+
+_profiles = build_profiles(LLM_STAGE_PROFILES, LLM_LIGHT_DEPLOYMENT)
+
+
+def get_stage_profile(stage: str) -> ModelProfile:
+    """
+    Return the deployment and sampling options a stage calls the model with.
+
+    Args:
+        stage: One of the stage names defined in this module
+
+    Returns:
+        The stage's ModelProfile
+    """
+    return _profiles[stage]
+
+
+def get_stage_profiles() -> Dict[str, Dict[str, Any]]:
+    """Every stage's resolved profile, for diagnostics."""
+    return {stage: asdict(profile) for stage, profile in _profiles.items()}
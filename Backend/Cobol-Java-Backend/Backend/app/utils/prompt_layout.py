@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+# Stability tiers of prompt content. Azure OpenAI caches the longest prompt prefix
+# (from 1024 tokens, in 128-token steps) it has recently seen, so content that is
+# identical across calls goes first and content that changes on every call last.
+STATIC = 0      # Same for every call of a kind: instructions, guidelines, schemas, DB templates
+PROJECT = 1     # Same for every call within a project: analysis, target structure, requirements
+VOLATILE = 2    # Specific to one call: source code or chunk, RAG results, chunk position
+
+
+@dataclass
+class PromptBlock:
+    """One section of a prompt with its stability tier; `title` renders as a `TITLE:` header."""
+    text: str
+    tier: int = VOLATILE
+    title: Optional[str] = None
+
+    def render(self) -> str:
+        text = self.text.strip("\n")
+        return text if self.title is None else f"{self.title}:\n{text}"
+
+
+def layout_prompt(blocks: Iterable[PromptBlock]) -> str:
+    """
+    Join prompt blocks ordered from the most to the least stable tier.
+
+    The order within a tier is kept, so prompts of one kind share the same
+    prefix up to their first differing block. Untitled empty blocks are left
+    out; titled ones keep their header so the layout does not shift.
+
+    Args:
+        blocks: Blocks of the prompt
+
+    Returns:
+        The prompt text
+    """
+    ordered = sorted(blocks, key=lambda block: block.tier)
+    return "\n\n".join(block.render() for block in ordered if block.text.strip() or block.title is not None)
+
+
+def layout_messages(system: str, blocks: Iterable[PromptBlock]) -> List[Dict[str, str]]:
+    """
+    Build system and user messages for a cache-friendly prompt.
+
+    The system message must be static; the user message is layout_prompt(blocks).
+
+    Args:
+        system: Static system instructions
+        blocks: Blocks of the user message
+
+    Returns:
+        The chat messages
+    """
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": layout_prompt(blocks)}
+    ]
@@ -0,0 +1,253 @@
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from ..config import logger, LLM_CONTEXT_WINDOWS, LLM_DEFAULT_CONTEXT_WINDOW
+
+# Context windows of the model families deployments are usually named after.
+# Longest prefix wins; LLM_CONTEXT_WINDOWS overrides by exact deployment name.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4.1": 1047576,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-35-turbo-16k": 16385,
+    "gpt-35-turbo": 16385,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "o4": 200000,
+}
+
+# Tokens added by the chat format for every message and for the reply primer
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMER_TOKENS = 3
+
+TRIM_HEAD = "head"
+TRIM_TAIL = "tail"
+TRIM_ENDS = "ends"
+
+_fallback_warned = threading.Event()
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: Optional[str]):
+    """Return the tiktoken encoding for a model, or None if no encoding can be loaded."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+    except KeyError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding for {model}: {e}")
+        return None
+    # Azure deployment names are arbitrary; fall back by family
+    name = "o200k_base" if model and model.startswith(("gpt-4o", "gpt-4.1", "o1", "o3", "o4")) else "cl100k_base"
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding {name}: {e}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens of a text for the given model.
+
+    Falls back to a conservative 3-characters-per-token estimate when no tiktoken
+    encoding is available (e.g. the BPE files cannot be downloaded).
+
+    Args:
+        text: Text to measure
+        model: Model or deployment name
+
+    Returns:
+        Number of tokens
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        if not _fallback_warned.is_set():
+            _fallback_warned.set()
+            logger.warning("tiktoken encoding unavailable; estimating token counts from characters")
+        return (len(text) + 2) // 3
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: Optional[str] = None) -> int:
+    """Count the prompt tokens of a list of chat messages, including per-message overhead."""
+    total = REPLY_PRIMER_TOKENS
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("role", ""), model)
+        content = message.get("content")
+        if isinstance(content, str):
+            total += count_tokens(content, model)
+    return total
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """
+    Return the context window of a deployment.
+
+    Args:
+        model: Deployment name
+
+    Returns:
+        Context window size in tokens
+    """
+    if model and model in LLM_CONTEXT_WINDOWS:
+        return int(LLM_CONTEXT_WINDOWS[model])
+    if model:
+        for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+            if model.startswith(prefix):
+                return MODEL_CONTEXT_WINDOWS[prefix]
+    return LLM_DEFAULT_CONTEXT_WINDOW
+
+
+def get_prompt_budget(model: Optional[str], max_completion_tokens: int, reserved_tokens: int = 0) -> int:
+    """
+    Return how many prompt tokens fit next to the requested completion.
+
+    Args:
+        model: Deployment name
+        max_completion_tokens: Tokens reserved for the reply
+        reserved_tokens: Tokens already used by fixed parts of the prompt
+
+    Returns:
+        Remaining prompt token budget (never negative)
+    """
+    return max(0, get_context_window(model) - max_completion_tokens - reserved_tokens)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None, mode: str = TRIM_HEAD) -> str:
+    """
+    Deterministically cut a text down to a token budget.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token budget for the result, marker included
+        model: Model or deployment name
+        mode: TRIM_HEAD keeps the beginning, TRIM_TAIL the end, TRIM_ENDS keeps
+            evenly sized samples from the beginning, middle and end
+
+    Returns:
+        The text, shortened with a marker where content was removed
+    """
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    marker = "\n\n... [{} tokens truncated to fit the context budget] ...\n\n"
+    # Re-encoding the cut text can shift a token at each seam, so keep a small margin
+    marker_tokens = count_tokens(marker.format(total), model) + 2
+    encoding = _get_encoding(model)
+
+    def encode(value):
+        return encoding.encode(value, disallowed_special=()) if encoding else value
+
+    def decode(value):
+        return encoding.decode(value) if encoding else value
+
+    # Character fallback works on 3-character units to match the estimate
+    units = encode(text)
+    scale = 1 if encoding else 3
+    if mode == TRIM_ENDS:
+        keep = max(0, max_tokens - 2 * marker_tokens) * scale
+        piece = keep // 3
+        middle_start = len(units) // 2 - piece // 2
+        parts = [units[:piece], units[middle_start:middle_start + piece], units[len(units) - piece:]]
+        dropped = (total - count_tokens("".join(decode(p) for p in parts), model))
+        return marker.format(dropped).join(decode(p) for p in parts)
+
+    keep = max(0, max_tokens - marker_tokens) * scale
+    dropped = total - keep // scale
+    if mode == TRIM_TAIL:
+        return marker.format(dropped).lstrip() + decode(units[len(units) - keep:])
+    return decode(units[:keep]) + marker.format(dropped).rstrip()
+
+
+@dataclass
+class PromptSection:
+    """
+    A named piece of a prompt.
+
+    Sections with a lower `priority` value are more important and get their
+    budget first. `min_tokens` is the smallest useful size; a section that cannot
+    get at least that much is dropped instead of trimmed.
+    """
+    name: str
+    text: str
+    priority: int = 0
+    min_tokens: int = 0
+    trim: str = TRIM_HEAD
+    tokens: int = field(default=0, init=False)
+
+
+@dataclass
+class PackedPrompt:
+    """Result of packing: section texts by name plus accounting for logging."""
+    sections: Dict[str, str]
+    tokens: int
+    budget: int
+    trimmed: Dict[str, int]
+    dropped: List[str]
+
+    def __getitem__(self, name: str) -> str:
+        return self.sections.get(name, "")
+
+
+def pack_sections(sections: List[PromptSection], budget: int, model: Optional[str] = None) -> PackedPrompt:
+    """
+    Fit prioritized sections into a token budget.
+
+    Sections are considered in priority order (ties keep declaration order). Each
+    gets its full size while the budget allows; the first one that does not fit is
+    trimmed to the remaining budget, and anything left without room is dropped.
+    The result is deterministic for the same inputs.
+
+    Args:
+        sections: Sections to pack
+        budget: Total tokens available for all sections
+        model: Model or deployment name used for counting
+
+    Returns:
+        PackedPrompt with the (possibly shortened) text of every section
+    """
+    for section in sections:
+        section.tokens = count_tokens(section.text, model)
+
+    remaining = budget
+    packed, trimmed, dropped = {}, {}, []
+    for section in sorted(sections, key=lambda s: s.priority):
+        if section.tokens <= remaining:
+            packed[section.name] = section.text
+            remaining -= section.tokens
+            continue
+        if remaining <= 0 or remaining < section.min_tokens:
+            packed[section.name] = ""
+            dropped.append(section.name)
+            continue
+        text = truncate_to_tokens(section.text, remaining, model, section.trim)
+        used = count_tokens(text, model)
+        packed[section.name] = text
+        trimmed[section.name] = section.tokens - used
+        remaining -= used
+
+    result = PackedPrompt(
+        sections={section.name: packed[section.name] for section in sections},
+        tokens=budget - remaining,
+        budget=budget,
+        trimmed=trimmed,
+        dropped=dropped
+    )
+    if trimmed or dropped:
+        logger.info(f"Prompt packed into {result.tokens}/{budget} tokens; "
+                    f"trimmed {trimmed or 'nothing'}, dropped {dropped or 'nothing'}")
+    return result
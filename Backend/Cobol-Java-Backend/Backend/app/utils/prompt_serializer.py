@@ -0,0 +1,210 @@
+import json
+from typing import Any, Callable, Dict, List, Optional
+from ..config import logger, PROMPT_COMPACT_ARTIFACTS
+from .prompt_packer import count_tokens
+
+INDENT = "  "
+# Cell separator of tabular lists; occurrences inside values are escaped
+CELL_SEPARATOR = " | "
+
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _scalar(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return " ".join(str(value).split())
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, list):
+        return ", ".join(_scalar(v) for v in value)
+    return "" if value is None else _scalar(value).replace("|", "\\|")
+
+
+def _is_table(items: List[Any]) -> bool:
+    """Lists of objects whose values are scalars (or lists of scalars) render as tables."""
+    return len(items) > 1 and all(
+        isinstance(item, dict) and all(
+            _is_scalar(v) or (isinstance(v, list) and all(_is_scalar(x) for x in v)) for v in item.values()
+        ) for item in items
+    )
+
+
+def _render_table(items: List[Dict[str, Any]], depth: int) -> List[str]:
+    """One header row naming the columns once, then one row per item; all-empty columns are left out."""
+    columns = []
+    for item in items:
+        for key, value in item.items():
+            if key not in columns and not _is_empty(value):
+                columns.append(key)
+    pad = INDENT * depth
+    lines = [f"{pad}[{len(items)}] {CELL_SEPARATOR.join(columns)}"]
+    lines.extend(f"{pad}{CELL_SEPARATOR.join(_cell(item.get(c)) for c in columns)}" for item in items)
+    return lines
+
+
+def _render(value: Any, depth: int) -> List[str]:
+    pad = INDENT * depth
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            if _is_empty(item):
+                continue
+            if _is_scalar(item):
+                lines.append(f"{pad}{key}: {_scalar(item)}")
+            elif isinstance(item, list) and all(_is_scalar(x) for x in item):
+                lines.append(f"{pad}{key}: {', '.join(_scalar(x) for x in item)}")
+            else:
+                lines.append(f"{pad}{key}:")
+                lines.extend(_render(item, depth + 1))
+        return lines
+    if isinstance(value, list):
+        items = [item for item in value if not _is_empty(item)]
+        if all(_is_scalar(item) for item in items):
+            return [f"{pad}{', '.join(_scalar(item) for item in items)}"] if items else []
+        if _is_table(items):
+            return _render_table(items, depth)
+        lines = []
+        for item in items:
+            rendered = _render(item, depth + 1)
+            if rendered:
+                # The first line of each element carries the list marker
+                lines.append(f"{pad}- {rendered[0].lstrip()}")
+                lines.extend(rendered[1:])
+        return lines
+    return [f"{pad}{_scalar(value)}"]
+
+
+def render_compact(value: Any) -> str:
+    """
+    Render a JSON-like value as a token-efficient indented outline.
+
+    Objects become `key: value` lines, lists of scalars are joined on one line,
+    and lists of flat objects become tables whose keys are written once in a
+    header row. Empty values are left out.
+
+    Args:
+        value: Parsed JSON value
+
+    Returns:
+        The outline text
+    """
+    return "\n".join(_render(value, 0))
+
+
+def render_cobol_analysis(cobol_json: Dict[str, Any]) -> str:
+    """
+    Render cobol_analysis.json for prompts.
+
+    Beyond the generic outline, fields that repeat other fields are dropped:
+    `picture` (a copy of `type` when a PIC clause is present), the flat
+    `variables` list (the data items' names), CICS `parameters` (a suffix of
+    `command`) and the paragraph code lines, which duplicate the source code
+    the prompts already carry.
+
+    Args:
+        cobol_json: Result of create_cobol_json
+
+    Returns:
+        The compact rendering
+    """
+    if not isinstance(cobol_json, dict):
+        return render_compact(cobol_json)
+
+    files = []
+    for file_info in cobol_json.get("files", []):
+        if not isinstance(file_info, dict):
+            continue
+        divisions = file_info.get("divisions") or {}
+        data = divisions.get("data") or {}
+        files.append({
+            "file": file_info.get("file_name"),
+            "type": file_info.get("file_type"),
+            "program_id": (divisions.get("identification") or {}).get("program_id"),
+            "copybooks": sorted({c.get("name") for c in file_info.get("copybooks", []) if isinstance(c, dict)} - {None}),
+            "working_storage": [_data_item(v) for v in data.get("working_storage", [])],
+            "linkage_section": [_data_item(v) for v in data.get("linkage_section", [])],
+            "file_section": [_data_item(v) for v in data.get("file_section", [])],
+            "cics_commands": [
+                {"type": c.get("type"), "paragraph": c.get("context"), "command": c.get("command")}
+                for c in file_info.get("cics_commands", []) if isinstance(c, dict)
+            ],
+            "paragraphs": file_info.get("paragraphs", []),
+            "jcl_definitions": file_info.get("jcl_definitions") or []
+        })
+
+    extra = {key: value for key, value in cobol_json.items() if key not in ("files", "dependencies")}
+    return render_compact({
+        **extra,
+        "dependencies": sorted(set(cobol_json.get("dependencies", []))),
+        "files": files
+    })
+
+
+def _data_item(item: Any) -> Any:
+    if not isinstance(item, dict):
+        return item
+    compact = {key: value for key, value in item.items() if key != "picture"}
+    if item.get("picture") and item.get("picture") != item.get("type"):
+        compact["picture"] = item["picture"]
+    return compact
+
+
+def render_target_structure(target_structure: Dict[str, Any]) -> str:
+    """Render target_structure.json for prompts as a compact outline."""
+    return render_compact(target_structure)
+
+
+def render_for_prompt(name: str, value: Any, renderer: Callable[[Any], str] = render_compact,
+                      model: Optional[str] = None, stats: Optional[Dict[str, Dict[str, int]]] = None) -> str:
+    """
+    Render an analysis artifact for a prompt and measure the tokens saved.
+
+    Falls back to pretty-printed JSON when PROMPT_COMPACT_ARTIFACTS is off.
+
+    Args:
+        name: Artifact name used in logs and statistics
+        value: Parsed JSON artifact
+        renderer: Compact renderer for the artifact
+        model: Deployment name used for token counting
+        stats: Optional dict receiving {"json_tokens", "compact_tokens", "saved_tokens"} under `name`
+
+    Returns:
+        The text to embed in the prompt
+    """
+    as_json = json.dumps(value, indent=2)
+    if not PROMPT_COMPACT_ARTIFACTS:
+        return as_json
+    compact = renderer(value)
+    json_tokens = count_tokens(as_json, model)
+    compact_tokens = count_tokens(compact, model)
+    if stats is not None:
+        stats[name] = {
+            "json_tokens": json_tokens,
+            "compact_tokens": compact_tokens,
+            "saved_tokens": json_tokens - compact_tokens
+        }
+    if json_tokens:
+        logger.info(f"Compact {name}: {compact_tokens} tokens instead of {json_tokens} "
+                    f"({100 * (json_tokens - compact_tokens) / json_tokens:.0f}% saved)")
+    return compact
+
+
+def summarize_savings(stats: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    """Totals of render_for_prompt statistics, for responses and logs."""
+    json_tokens = sum(s["json_tokens"] for s in stats.values())
+    compact_tokens = sum(s["compact_tokens"] for s in stats.values())
+    return {
+        "artifacts": stats,
+        "json_tokens": json_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_tokens": json_tokens - compact_tokens,
+        "reduction": round((json_tokens - compact_tokens) / json_tokens, 3) if json_tokens else 0.0
+    }
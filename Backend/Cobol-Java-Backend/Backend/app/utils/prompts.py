@@ -3,14 +3,15 @@ Module for generating prompts for code analysis and conversion.
 """
 
 
-
-def create_business_requirements_prompt(source_language, source_code):
+def create_business_requirements_prompt(source_language, source_code, context=""):
     """
     Creates a prompt for analyzing business requirements from source code.
     
     Args:
         source_language (str): The programming language of the source code
         source_code (str): The source code to analyze
+        context (str): Project context (analysis, target structure) placed between
+            the instructions and the code, keeping the prompt prefix cacheable
         
     Returns:
         str: The prompt for business requirements analysis
@@ -64,12 +65,12 @@ def create_business_requirements_prompt(source_language, source_code):
             ### Describe the main outputs (e.g., reports, logs, updates).
             ## Business Significance  
             ### Explain why these outputs matter for business processes.
-            
+            {context}
             {source_language} Code:
             {source_code}
             """
 
-def create_technical_requirements_prompt(source_language, target_language, source_code):
+def create_technical_requirements_prompt(source_language, target_language, source_code, context=""):
     """
     Creates a prompt for analyzing technical requirements from source code.
     
@@ -77,14 +78,15 @@ def create_technical_requirements_prompt(source_language, target_language, sourc
         source_language (str): The programming language of the source code
         target_language (str): The target programming language for conversion (.NET 8)
         source_code (str): The source code to analyze
+        context (str): Project context (analysis, target structure) placed between
+            the instructions and the code, keeping the prompt prefix cacheable
         
     Returns:
         str: The prompt for technical requirements analysis
     """
     return f"""
             Analyze the following {source_language} code and extract the technical requirements for migrating it to {target_language}.
-            Do not use any Markdown formatting (e.g., no **bold**, italics, or backticks).
-            Return plain text only.
+            Do not use any Markdown formatting (e.g., no **bold**, italics, or backticks) in the requirement texts.
 
             Focus on implementation details such as:
             1. Examine the entire codebase first to understand architectural patterns and dependencies.
@@ -105,9 +107,11 @@ def create_technical_requirements_prompt(source_language, target_language, sourc
             - Integration protocols and external system interfaces
             - Database interactions and equivalent in .NET 8 using Entity Framework Core
 
-            Format your response as a numbered list with '# Technical Requirements' as the title.
-            Each requirement should start with a number followed by a period (e.g., "1.", "2.", etc.)
-
+            Respond with a JSON object whose "technicalRequirements" array holds one entry per requirement:
+            - "id": sequential identifier of the requirement (e.g., "TR1", "TR2")
+            - "description": the requirement, phrased as above
+            - "complexity": migration complexity of the requirement, one of "High", "Medium" or "Low"
+            {context}
             {source_language} Code:
             {source_code}
             """
@@ -179,6 +183,34 @@ def create_code_conversion_prompt(
     Returns:
         str: The prompt for code conversion
     """
+    return create_code_conversion_instructions(
+        source_language,
+        target_language,
+        db_setup_template
+    ) + f"""
+    Source Code ({source_language}):
+    {source_code}
+    """
+
+def create_code_conversion_instructions(
+    source_language,
+    target_language,
+    db_setup_template
+):
+    """
+    Creates the code-independent part of the code conversion prompt.
+
+    The text only depends on the languages and the database template, so it can
+    lead every conversion prompt and be served from the provider's prompt cache.
+
+    Args:
+        source_language (str): The programming language of the source code
+        target_language (str): The target programming language for conversion (.NET 8)
+        db_setup_template (str): The database setup template for .NET 8
+
+    Returns:
+        str: The conversion instructions
+    """
     language_specific_prompt = ""
 
 # Normalize the input for safe comparison
@@ -188,7 +220,7 @@ def create_code_conversion_prompt(
     if normalized_target in [".net 8", "c#", "csharp", ".net"]:
         language_specific_prompt = create_dotnet_specific_prompt(
             source_language,
-            source_code,
+            "",
             db_setup_template
         )
     else:
@@ -280,10 +312,6 @@ def create_code_conversion_prompt(
 
     {db_setup_template if db_setup_template else 'No database setup required.'}
 
-
-    Source Code ({source_language}):
-    {source_code}
-
     IMPORTANT: Only return the complete converted code WITHOUT any markdown formatting. DO NOT wrap your code in triple backticks (```). Return just the raw code itself.
 
     Additional Database Setup Instructions:
@@ -309,11 +337,6 @@ def create_unit_test_prompt(target_language, converted_code):
     Please generate unit tests for the following {target_language} code. The tests should verify that 
     the code meets all business requirements and handles edge cases appropriately.
     
-    
-    Converted Code ({target_language}):
-    
-    {converted_code}
-    
     Guidelines for the unit tests:
     1. Use NUnit or xUnit as the unit testing framework for .NET 8
     2. Create tests for all public methods and key functionality
@@ -325,6 +348,10 @@ def create_unit_test_prompt(target_language, converted_code):
     8. Ensure high code coverage, especially for complex business logic
     
     Provide ONLY the unit test code without additional explanations.
+    
+    Converted Code ({target_language}):
+    
+    {converted_code}
     """
     
     return prompt
@@ -339,11 +366,6 @@ def create_functional_test_prompt(target_language, converted_code):
     Please generate comprehensive functional test cases that verify the application meets all business requirements.
     These test cases will be used by QA engineers to validate the application functionality.
     
-    
-    Converted Code ({target_language}):
-    
-    {converted_code}
-    
     Guidelines for functional test cases:
     1. Create test cases that cover all business requirements
     2. Organize test cases by feature or business functionality
@@ -360,6 +382,162 @@ def create_functional_test_prompt(target_language, converted_code):
     
     Format your response as a structured test plan document with clear sections and test case tables.
     Return the response in JSON format
+    
+    Converted Code ({target_language}):
+    
+    {converted_code}
     """
     
-    return prompt
\ No newline at end of file
+    return prompt
+
+
+# ---------------------------------------------------------------------------
+# JSON schemas for structured output.
+#
+# Each schema is passed as `response_format` so the model is constrained to it
+# and describes the shape of the parsed result. Schemas are strict: every
+# property is required and no other properties are allowed.
+# ---------------------------------------------------------------------------
+
+STRING = {"type": "string"}
+STRING_LIST = {"type": "array", "items": STRING}
+
+
+def _object(**properties):
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+def _array(items):
+    return {"type": "array", "items": items}
+
+
+def json_schema_format(name, schema):
+    """
+    Wrap a JSON schema as a strict `response_format` value.
+
+    Args:
+        name (str): Name of the schema, reported back by the service
+        schema (dict): The JSON schema of the response
+
+    Returns:
+        dict: The response_format argument for a chat completion
+    """
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+TARGET_STRUCTURE_SCHEMA = _object(
+    project_name=STRING,
+    architecture_pattern=STRING,
+    projects=_array(_object(
+        name=STRING,
+        type=STRING,
+        purpose=STRING,
+        folders=_array(_object(
+            name=STRING,
+            purpose=STRING,
+            files=_array(_object(
+                name=STRING,
+                type=STRING,
+                purpose=STRING,
+                key_classes=STRING_LIST,
+                dependencies=STRING_LIST
+            ))
+        ))
+    )),
+    data_models=_array(_object(
+        name=STRING,
+        source=STRING,
+        properties=_array(_object(name=STRING, type=STRING, source_field=STRING))
+    )),
+    services=_array(_object(
+        name=STRING,
+        purpose=STRING,
+        methods=_array(_object(name=STRING, purpose=STRING, parameters=STRING_LIST, return_type=STRING))
+    )),
+    controllers=_array(_object(
+        name=STRING,
+        purpose=STRING,
+        endpoints=_array(_object(method=STRING, route=STRING, purpose=STRING))
+    )),
+    infrastructure=_array(_object(component=STRING, purpose=STRING, implementation=STRING)),
+    database_design=_object(
+        tables=_array(_object(
+            name=STRING,
+            source=STRING,
+            columns=_array(_object(name=STRING, type=STRING, source_field=STRING))
+        ))
+    ),
+    key_patterns=STRING_LIST,
+    external_dependencies=STRING_LIST,
+    configuration_requirements=STRING_LIST
+)
+
+BUSINESS_REQUIREMENTS_SCHEMA = _object(**{
+    "Overview": _object(**{"Purpose of the System": STRING, "Context and Business Impact": STRING}),
+    "Objectives": _object(**{"Primary Objective": STRING, "Key Outcomes": STRING}),
+    "Business Rules & Requirements": _object(**{
+        "Business Purpose": STRING,
+        "Business Rules": STRING,
+        "Impact on System": STRING,
+        "Constraints": STRING
+    }),
+    "Assumptions & Recommendations": _object(**{"Assumptions": STRING, "Recommendations": STRING}),
+    "Expected Output": _object(**{"Output": STRING, "Business Significance": STRING})
+})
+
+TECHNICAL_REQUIREMENTS_SCHEMA = _object(
+    technicalRequirements=_array(_object(
+        id=STRING,
+        description=STRING,
+        complexity={"type": "string", "enum": ["High", "Medium", "Low"]}
+    ))
+)
+
+CODE_CONVERSION_SCHEMA = _object(
+    converted_code=_array(_object(file_name=STRING, path=STRING, content=STRING)),
+    conversion_notes=_array(_object(
+        note=STRING,
+        severity={"type": "string", "enum": ["Info", "Warning", "Error"]}
+    )),
+    unit_tests=STRING,
+    functional_tests=STRING
+)
+
+CHUNK_CONVERSION_SCHEMA = _object(
+    convertedCode=STRING,
+    conversionNotes=STRING,
+    potentialIssues=STRING_LIST,
+    databaseUsed={"type": "boolean"}
+)
+
+UNIT_TEST_SCHEMA = _object(
+    unitTestFiles=_array(_object(fileName=STRING, content=STRING)),
+    testDescription=STRING,
+    coverage=STRING_LIST,
+    businessRuleTests=STRING_LIST
+)
+
+FUNCTIONAL_TEST_SCHEMA = _object(
+    functionalTests=_array(_object(
+        id=STRING,
+        title=STRING,
+        steps=STRING_LIST,
+        expectedResult=STRING,
+        businessRule=STRING
+    )),
+    testStrategy=STRING,
+    domainCoverage=STRING_LIST
+)
+
+TARGET_STRUCTURE_FORMAT = json_schema_format("target_structure", TARGET_STRUCTURE_SCHEMA)
+BUSINESS_REQUIREMENTS_FORMAT = json_schema_format("business_requirements", BUSINESS_REQUIREMENTS_SCHEMA)
+TECHNICAL_REQUIREMENTS_FORMAT = json_schema_format("technical_requirements", TECHNICAL_REQUIREMENTS_SCHEMA)
+CODE_CONVERSION_FORMAT = json_schema_format("code_conversion", CODE_CONVERSION_SCHEMA)
+CHUNK_CONVERSION_FORMAT = json_schema_format("chunk_conversion", CHUNK_CONVERSION_SCHEMA)
+UNIT_TEST_FORMAT = json_schema_format("unit_tests", UNIT_TEST_SCHEMA)
+FUNCTIONAL_TEST_FORMAT = json_schema_format("functional_tests", FUNCTIONAL_TEST_SCHEMA)
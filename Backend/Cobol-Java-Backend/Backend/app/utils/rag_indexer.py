@@ -9,6 +9,9 @@ from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
 from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 from ..config import logger, AZURE_CONFIG, output_dir
+from .llm_client import get_http_client
+from .rate_limiter import get_rate_limiter
+from .prompt_packer import count_tokens
 import PyPDF2
 from docx import Document as DocxDocument
 
@@ -24,6 +27,7 @@ def get_embedding_client():
             api_key=AZURE_CONFIG["AZURE_OPENAI_EMBED_API_KEY"],
             azure_endpoint=AZURE_CONFIG["AZURE_OPENAI_EMBED_API_ENDPOINT"],
             api_version=AZURE_CONFIG["AZURE_OPENAI_EMBED_VERSION"],
+            http_client=get_http_client(),
         )
         logger.info("Azure OpenAI embedding client initialized successfully")
         return embed_model
@@ -37,12 +41,20 @@ class AzureOpenAIEmbeddingWrapper:
     """Wrapper for Azure OpenAI embeddings compatible with LangChain."""
     def __init__(self, azure_embedding_client):
         self.client = azure_embedding_client
+        self.rate_limiter = get_rate_limiter(AZURE_CONFIG["AZURE_OPENAI_EMBED_DEPLOYMENT"])
+    
+    def _embed(self, text: str) -> List[float]:
+        """Embed one text through the embedding deployment's shared rate limiter."""
+        return self.rate_limiter.call(
+            lambda: self.client.get_text_embedding(text),
+            count_tokens(text, AZURE_CONFIG["AZURE_OPENAI_EMBED_MODEL"])
+        )
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         try:
             embeddings = []
             for text in texts:
-                embedding = self.client.get_text_embedding(text)
+                embedding = self._embed(text)
                 embeddings.append(embedding)
             return embeddings
         except Exception as e:
@@ -51,7 +63,7 @@ class AzureOpenAIEmbeddingWrapper:
     
     def embed_query(self, text: str) -> List[float]:
         try:
-            return self.client.get_text_embedding(text)
+            return self._embed(text)
         except Exception as e:
             logger.error(f"Error embedding query: {str(e)}")
             raise
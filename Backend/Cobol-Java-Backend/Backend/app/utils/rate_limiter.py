@@ -0,0 +1,466 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+from ..config import (
+    logger, LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_MAX_CONCURRENCY, LLM_MIN_CONCURRENCY,
+    LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY
+)
+from .cancellation import OperationCancelled, cancellable_sleep, cancellable_sleep_async, check_cancelled
+
+# HTTP statuses worth retrying: throttling and transient upstream failures
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+# Interval at which callers queued for a slot re-check their run's cancellation
+SLOT_WAIT_POLL_SECONDS = 0.5
+# Interval at which coroutines queued for a slot retry; they cannot wait on the thread condition
+ASYNC_SLOT_POLL_SECONDS = 0.05
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` from the bucket, going into debt if needed.
+
+        Args:
+            amount: Units to consume; capped at the bucket capacity so oversized
+                requests can still run once the bucket is full
+
+        Returns:
+            Seconds the caller must wait before the reservation is covered
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= min(amount, self.capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds a reservation of `amount` would have to wait right now, without taking anything."""
+        with self._lock:
+            self._refill(time.monotonic())
+            short = min(amount, self.capacity) - self._tokens
+            return 0.0 if short <= 0 else short / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Correct an earlier reservation once the real cost is known (positive = consume more)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide scheduler for calls against one deployment.
+
+    Calls wait for a concurrency slot and for the requests-per-minute and
+    tokens-per-minute buckets before they are sent. Throttled and transient
+    failures are retried with jittered exponential backoff, honouring
+    Retry-After. The concurrency limit adapts AIMD-style: it grows by about one
+    slot per window of successful calls and is halved when the service throttles.
+    Waiting for a slot, for quota and between retries stops as soon as the
+    calling pipeline run is cancelled or out of time. Threads (`call`) and
+    coroutines (`acall`) share the same slots, budgets and adaptive limit.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, max_concurrency: int = 8,
+                 min_concurrency: int = 1, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Args:
+            name: Deployment the limiter guards, used in log messages
+            rpm: Requests per minute budget (0 = unlimited)
+            tpm: Tokens per minute budget (0 = unlimited)
+            max_concurrency: Upper bound of concurrent calls
+            min_concurrency: Lower bound the limit never drops below
+            max_retries: Retries after the first attempt for retryable failures
+            base_delay: Base of the exponential backoff in seconds
+            max_delay: Cap of a single backoff wait in seconds
+        """
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0) -> Iterator[None]:
+        """
+        Hold one concurrency slot and pay the rate budgets for a single attempt.
+
+        Args:
+            estimated_tokens: Expected prompt plus completion tokens of the call
+        """
+        with self._condition:
+            while self._in_flight >= self.concurrency_limit:
+                check_cancelled()
+                self._condition.wait(SLOT_WAIT_POLL_SECONDS)
+            self._take_slot()
+        try:
+            wait = self._reserve(estimated_tokens)
+            if wait > 0:
+                logger.info(f"Rate limiter {self.name}: waiting {wait:.2f}s for quota")
+                cancellable_sleep(wait)
+            yield
+        finally:
+            self._release_slot()
+
+    @asynccontextmanager
+    async def aslot(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Async counterpart of `slot`; waiting for a slot or quota suspends the coroutine, not the thread.
+
+        Args:
+            estimated_tokens: Expected prompt plus completion tokens of the call
+        """
+        while True:
+            with self._condition:
+                if self._in_flight < self.concurrency_limit:
+                    self._take_slot()
+                    break
+            check_cancelled()
+            await asyncio.sleep(ASYNC_SLOT_POLL_SECONDS)
+        try:
+            wait = self._reserve(estimated_tokens)
+            if wait > 0:
+                logger.info(f"Rate limiter {self.name}: waiting {wait:.2f}s for quota")
+                await cancellable_sleep_async(wait)
+            yield
+        finally:
+            self._release_slot()
+
+    def _take_slot(self) -> None:
+        """Count a call in flight; the caller holds the condition."""
+        self._in_flight += 1
+        self.stats["calls"] += 1
+
+    def _release_slot(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """Pay the rate budgets of one attempt; returns the seconds to wait before sending it."""
+        return max(
+            self._paused_until - time.monotonic(),
+            self.requests.reserve(1) if self.requests else 0.0,
+            self.tokens.reserve(estimated_tokens) if self.tokens and estimated_tokens else 0.0
+        )
+
+    def expected_wait(self, estimated_tokens: int = 0) -> float:
+        """Seconds a call would currently wait for quota (a throttling pause or the rate budgets)."""
+        return max(
+            self._paused_until - time.monotonic(),
+            self.requests.wait_for(1) if self.requests else 0.0,
+            self.tokens.wait_for(estimated_tokens) if self.tokens and estimated_tokens else 0.0,
+            0.0
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Settle the tokens-per-minute bucket with the usage reported by the service."""
+        if self.tokens and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def on_success(self) -> None:
+        """Additive increase: roughly one extra slot per window of successful calls."""
+        with self._condition:
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+            self._condition.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        """Multiplicative decrease and a shared pause so queued callers do not pile on."""
+        with self._condition:
+            previous = self.concurrency_limit
+            self._limit = max(float(self.min_concurrency), self._limit / 2.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self.stats["throttled"] += 1
+        logger.warning(f"Rate limiter {self.name}: throttled; concurrency {previous} -> {self.concurrency_limit}"
+                       + (f", pausing {retry_after:.1f}s" if retry_after else ""))
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Retry-After when the service sent one, otherwise full-jitter exponential backoff."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0,
+             usage_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+             max_retries: Optional[int] = None) -> Any:
+        """
+        Run `fn` under the limiter, retrying throttled and transient failures.
+
+        Args:
+            fn: Zero-argument callable performing one request
+            estimated_tokens: Expected prompt plus completion tokens
+            usage_tokens: Optional function extracting the real token usage from the result
+            max_retries: Overrides the limiter's retry count (0 leaves retries to the caller,
+                e.g. a router failing over to another deployment)
+
+        Returns:
+            The result of `fn`
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            check_cancelled()
+            try:
+                with self.slot(estimated_tokens):
+                    result = fn()
+            except Exception as e:
+                cancellable_sleep(self._retry_delay(e, attempt, max_retries))
+                attempt += 1
+                continue
+            return self._succeeded(result, estimated_tokens, usage_tokens)
+
+    def stream(self, open_stream: Callable[[], Any], estimated_tokens: int = 0,
+               usage_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+               max_retries: Optional[int] = None) -> Iterator[Any]:
+        """
+        Run a streaming request under the limiter, yielding its chunks.
+
+        The slot is held until the stream is exhausted or closed, so a stream counts
+        against the concurrency limit for as long as it is being read. Failures
+        before the first chunk are retried as in `call`; a failure once chunks have
+        been handed out is raised, since the caller has already consumed them.
+
+        Args:
+            open_stream: Zero-argument callable opening the stream (an iterable of chunks)
+            estimated_tokens: Expected prompt plus completion tokens
+            usage_tokens: Optional function extracting the real token usage from a chunk,
+                or None for chunks that carry no usage
+            max_retries: Overrides the limiter's retry count
+
+        Yields:
+            The chunks of the stream
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            check_cancelled()
+            started = False
+            try:
+                with self.slot(estimated_tokens):
+                    stream = open_stream()
+                    try:
+                        for chunk in stream:
+                            started = True
+                            actual = usage_tokens(chunk) if usage_tokens is not None else None
+                            if actual is not None:
+                                self.record_usage(estimated_tokens, actual)
+                            yield chunk
+                    finally:
+                        close = getattr(stream, "close", None)
+                        if close:
+                            close()
+            except Exception as e:
+                if started:
+                    self._interrupted(e)
+                    raise
+                cancellable_sleep(self._retry_delay(e, attempt, max_retries))
+                attempt += 1
+                continue
+            self.on_success()
+            return
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 0,
+                    usage_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+                    max_retries: Optional[int] = None) -> Any:
+        """
+        Async counterpart of `call` for a coroutine function performing one request.
+
+        Args:
+            fn: Zero-argument coroutine function performing one request
+            estimated_tokens: Expected prompt plus completion tokens
+            usage_tokens: Optional function extracting the real token usage from the result
+            max_retries: Overrides the limiter's retry count
+
+        Returns:
+            The result awaited from `fn`
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            check_cancelled()
+            try:
+                async with self.aslot(estimated_tokens):
+                    result = await fn()
+            except Exception as e:
+                await cancellable_sleep_async(self._retry_delay(e, attempt, max_retries))
+                attempt += 1
+                continue
+            return self._succeeded(result, estimated_tokens, usage_tokens)
+
+    def _retry_delay(self, error: Exception, attempt: int, max_retries: int) -> float:
+        """
+        Account for a failed attempt and return the backoff before the next one.
+
+        Re-raises `error` when it is not retryable or the retries are used up.
+        """
+        if not is_retryable_error(error):
+            raise error
+        status = get_status_code(error)
+        retry_after = get_retry_after(error)
+        if status == 429 or status == 503:
+            self.on_throttle(retry_after)
+        if attempt >= max_retries:
+            self._count("failures")
+            if max_retries:
+                logger.error(f"Rate limiter {self.name}: giving up after {attempt + 1} attempts: {error}")
+            raise error
+        delay = self.backoff_delay(attempt, retry_after)
+        self._count("retries")
+        logger.warning(f"Rate limiter {self.name}: attempt {attempt + 1} failed ({status or type(error).__name__}); "
+                       f"retrying in {delay:.2f}s")
+        return delay
+
+    def _interrupted(self, error: Exception) -> None:
+        """Account for a stream that failed after it started; it cannot be retried here."""
+        status = get_status_code(error)
+        if status == 429 or status == 503:
+            self.on_throttle(get_retry_after(error))
+        self._count("failures")
+        logger.warning(f"Rate limiter {self.name}: stream interrupted ({status or type(error).__name__})")
+
+    def _succeeded(self, result: Any, estimated_tokens: int,
+                   usage_tokens: Optional[Callable[[Any], Optional[int]]]) -> Any:
+        self.on_success()
+        if usage_tokens is not None:
+            self.record_usage(estimated_tokens, usage_tokens(result))
+        return result
+
+    def _count(self, stat: str) -> None:
+        with self._condition:
+            self.stats[stat] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limits and counters, for diagnostics."""
+        with self._condition:
+            return {
+                "name": self.name,
+                "concurrency_limit": self.concurrency_limit,
+                "in_flight": self._in_flight,
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                **self.stats
+            }
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error, if it carries one."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Throttling, transient upstream statuses and connection problems; anything else fails the call."""
+    # A run past its deadline carries 504 but must stop, not be retried
+    if isinstance(error, OperationCancelled):
+        return False
+    status = get_status_code(error)
+    if status is None:
+        return is_transient_error(error)
+    return status in RETRYABLE_STATUS_CODES
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Connection problems and timeouts that did not produce an HTTP status."""
+    try:
+        import openai
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by the Retry-After (or retry-after-ms) header of an API error."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(deployment: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                     max_concurrency: Optional[int] = None) -> AdaptiveRateLimiter:
+    """
+    Return the shared limiter of a deployment, creating it on first use.
+
+    Quotas are enforced per deployment, so every call site in the process that
+    talks to the same deployment shares one limiter.
+
+    Args:
+        deployment: Deployment name
+        rpm: Requests per minute budget, if it differs from LLM_RPM_LIMIT
+        tpm: Tokens per minute budget, if it differs from LLM_TPM_LIMIT
+        max_concurrency: Concurrency bound, if it differs from LLM_MAX_CONCURRENCY
+
+    Returns:
+        The deployment's AdaptiveRateLimiter
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(deployment)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(
+                deployment,
+                rpm=LLM_RPM_LIMIT if rpm is None else rpm,
+                tpm=LLM_TPM_LIMIT if tpm is None else tpm,
+                max_concurrency=LLM_MAX_CONCURRENCY if max_concurrency is None else max_concurrency,
+                min_concurrency=LLM_MIN_CONCURRENCY,
+                max_retries=LLM_MAX_RETRIES,
+                base_delay=LLM_RETRY_BASE_DELAY,
+                max_delay=LLM_RETRY_MAX_DELAY
+            )
+            _limiters[deployment] = limiter
+        return limiter
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every limiter created so far."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.snapshot() for limiter in limiters}
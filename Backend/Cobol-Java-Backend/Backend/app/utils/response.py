@@ -112,3 +112,143 @@ def extract_json_from_response(text):
                 "error": "JSON extraction failed",
                 "raw_text": text[:1000] + "..." if len(text) > 1000 else text
             }
+
+
+# Characters that matter to ConvertedFileScanner inside and outside string literals
+_STRING_SPECIALS = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_SCALAR_END = re.compile(r'[,\]\s]')
+# Text kept while waiting for the array key, enough to hold a key split across deltas
+_KEY_LOOKBEHIND = 256
+
+
+class ConvertedFileScanner:
+    """
+    Incrementally pick complete entries out of a streamed `converted_code` array.
+
+    Text is fed as it arrives from the model; every file object in the array is
+    returned exactly once, as soon as its closing brace has been received, so
+    follow-up work can start before the whole response is available. Each delta
+    is scanned once, with bracket depth and string state carried over between
+    deltas, and only the text of the entry in progress is kept, so the cost is
+    linear in the length of the response.
+    """
+
+    def __init__(self, array_key: str = "converted_code"):
+        self._array_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(array_key))
+        self._head = ""
+        self._in_array = False
+        self._done = False
+        # State of the array element being scanned
+        self._pieces = []
+        self._in_value = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_scalar = False
+
+    def feed(self, delta: str) -> list:
+        """
+        Append streamed text and return the file objects completed by it.
+
+        Args:
+            delta: Next piece of model output
+
+        Returns:
+            List of newly completed file dictionaries
+        """
+        if self._done:
+            return []
+        if not self._in_array:
+            self._head += delta
+            match = self._array_pattern.search(self._head)
+            if not match:
+                self._head = self._head[-_KEY_LOOKBEHIND:]
+                return []
+            delta = self._head[match.end():]
+            self._head = ""
+            self._in_array = True
+        return self._scan(delta)
+
+    def _scan(self, text: str) -> list:
+        files = []
+        value_start = 0 if self._in_value else None
+        i, n = 0, len(text)
+        while i < n:
+            if self._escape:
+                self._escape = False
+                i += 1
+            elif self._in_string:
+                match = _STRING_SPECIALS.search(text, i)
+                if match is None:
+                    break
+                i = match.end()
+                if match.group() == "\\":
+                    if i < n:
+                        i += 1
+                    else:
+                        self._escape = True
+                    continue
+                self._in_string = False
+                if self._depth == 0:
+                    self._end_value()
+                    value_start = None
+            elif self._in_scalar:
+                match = _SCALAR_END.search(text, i)
+                if match is None:
+                    break
+                i = match.start()
+                self._in_scalar = False
+                self._end_value()
+                value_start = None
+            elif value_start is None:
+                # Between array elements
+                char = text[i]
+                if char == "]":
+                    self._done = True
+                    return files
+                if char not in " \t\r\n,":
+                    value_start = i
+                    self._in_value = True
+                    if char in "{[":
+                        self._depth = 1
+                    elif char == '"':
+                        self._in_string = True
+                    else:
+                        self._in_scalar = True
+                i += 1
+            else:
+                match = _STRUCTURAL.search(text, i)
+                if match is None:
+                    break
+                i = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pieces.append(text[value_start:i])
+                        entry = self._decode("".join(self._pieces))
+                        self._end_value()
+                        value_start = None
+                        if isinstance(entry, dict):
+                            files.append(entry)
+        if value_start is not None:
+            self._pieces.append(text[value_start:])
+        return files
+
+    def _end_value(self) -> None:
+        """Forget the element just scanned."""
+        self._pieces = []
+        self._in_value = False
+
+    @staticmethod
+    def _decode(text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed converted_code entry ({len(text)} characters)")
+            return None
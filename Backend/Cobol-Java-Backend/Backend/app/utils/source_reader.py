@@ -0,0 +1,132 @@
+import mmap
+import os
+from pathlib import Path
+from typing import Iterator, NamedTuple, Union
+
+# Bytes decoded per step; blocks end on a line break so no line or character is split
+BLOCK_SIZE = 1 << 20
+# Reference format columns: 1-6 sequence area, 7 indicator, 8-72 areas A and B, 73-80 identification
+SEQUENCE_END = 6
+INDICATOR_COLUMN = 6
+CODE_END = 72
+COMMENT_INDICATORS = ("*", "/")
+
+
+class FixedFormatLine(NamedTuple):
+    """One line of reference-format (fixed-column) COBOL split into its areas."""
+    sequence: str
+    indicator: str
+    code: str
+    identification: str
+
+    @property
+    def is_comment(self) -> bool:
+        return self.indicator in COMMENT_INDICATORS
+
+
+class SourceFile:
+    """
+    Read-only, memory-mapped view of a source file.
+
+    Lines are decoded one block at a time, so iterating a file keeps only a block
+    and the current lines in memory instead of the whole text, its upper-cased
+    copy and a list of all its lines. The mapping itself is paged in by the OS.
+    """
+
+    def __init__(self, path: Union[str, Path], encoding: str = "utf-8", errors: str = "ignore"):
+        """
+        Open and map the file.
+
+        Args:
+            path: File to read
+            encoding: Text encoding of the source
+            errors: Decoding error handler, as for `open`
+        """
+        self.path = Path(path)
+        self.encoding = encoding
+        self.errors = errors
+        self.line_count = 0
+        self._file = open(self.path, "rb")
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            # Empty files cannot be mapped
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self) -> "SourceFile":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def blocks(self, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+        """Yield the decoded text in blocks of about `block_size` bytes, each ending on a line break."""
+        data = self._data
+        start, end = 0, len(data)
+        while start < end:
+            stop = data.rfind(b"\n", start, start + block_size) + 1 if start + block_size < end else end
+            if stop <= start:
+                # A single line longer than the block: extend to its end
+                stop = data.find(b"\n", start + block_size) + 1 or end
+            yield data[start:stop].decode(self.encoding, self.errors)
+            start = stop
+
+    def lines(self, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+        """
+        Yield the lines of the file without line terminators.
+
+        Line breaks are those of `str.splitlines`, as for text read with `open`.
+        `line_count` holds the number of lines yielded so far.
+
+        Args:
+            block_size: Bytes decoded per step, see `blocks`
+        """
+        count = 0
+        try:
+            for block in self.blocks(block_size):
+                block_lines = block.splitlines()
+                count += len(block_lines)
+                yield from block_lines
+        finally:
+            self.line_count = count
+
+    def fixed_format_lines(self) -> Iterator[FixedFormatLine]:
+        """Yield every line split into the columns of reference-format COBOL."""
+        for line in self.lines():
+            yield FixedFormatLine(
+                line[:SEQUENCE_END],
+                line[INDICATOR_COLUMN:INDICATOR_COLUMN + 1],
+                line[INDICATOR_COLUMN + 1:CODE_END],
+                line[CODE_END:]
+            )
+
+    def code_lines(self, fixed_format: bool = False) -> Iterator[str]:
+        """
+        Yield the lines the compiler reads.
+
+        Args:
+            fixed_format: Whether the source is reference format; if so only columns
+                8-72 of non-comment lines are yielded, otherwise whole lines
+
+        Yields:
+            Source lines
+        """
+        if not fixed_format:
+            yield from self.lines()
+            return
+        for line in self.fixed_format_lines():
+            if not line.is_comment:
+                yield line.code
+
+    def close(self) -> None:
+        """Unmap and close the file."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+def count_lines(text: str) -> int:
+    """Number of lines in `text` as `len(text.split('\\n'))` counts them, without building the list."""
+    return text.count("\n") + 1
@@ -0,0 +1,205 @@
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Optional
+from flask import current_app, has_app_context
+from ..config import logger
+from .cancellation import propagate_token
+
+
+class StageGraph:
+    """
+    Small dependency-graph executor for pipeline stages.
+
+    Each stage declares the stages it depends on and receives their results as
+    keyword arguments named after them. Stages whose dependencies are complete run
+    concurrently, so total latency follows the critical path rather than the sum of
+    all stages. Per-stage start/end offsets and durations are recorded in `timings`.
+    """
+
+    def __init__(self, name: str, max_workers: int = 4):
+        """
+        Args:
+            name: Name of the pipeline, used in log messages
+            max_workers: Maximum number of stages running at the same time
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.timings = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn: Callable[..., Any], depends_on: Iterable[str] = ()) -> "StageGraph":
+        """
+        Declare a stage.
+
+        Args:
+            name: Unique stage name; also the keyword its result is passed under
+            fn: Callable receiving the results of its dependencies as keyword arguments
+            depends_on: Names of stages that must finish first
+
+        Returns:
+            The graph, so declarations can be chained
+        """
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already declared in {self.name}")
+        self._stages[name] = (fn, tuple(depends_on))
+        return self
+
+    def _validate(self) -> None:
+        """Reject unknown dependencies and cycles before anything runs."""
+        for name, (_, deps) in self._stages.items():
+            for dep in deps:
+                if dep not in self._stages:
+                    raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle detected at stage '{name}' in {self.name}")
+            visiting.add(name)
+            for dep in self._stages[name][1]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._stages:
+            visit(name)
+
+    def run(self, on_stage_start: Optional[Callable[[str, float], None]] = None) -> Dict[str, Any]:
+        """
+        Execute all stages, starting each as soon as its dependencies are satisfied.
+
+        The first failing stage stops the scheduling of new stages; already running
+        stages are allowed to finish and the original exception is re-raised.
+        Stages run inside the caller's cancellation scope, so a cancelled run stops
+        their LLM calls at the next checkpoint.
+
+        Args:
+            on_stage_start: Optional callback receiving the stage name and the fraction
+                of stages already completed
+
+        Returns:
+            Dictionary mapping stage names to their results
+        """
+        self._validate()
+        app = current_app._get_current_object() if has_app_context() else None
+        results = {}
+        pending = dict(self._stages)
+        running = {}
+        origin = time.perf_counter()
+        self.timings = {}
+
+        def execute(name, fn, kwargs):
+            start = time.perf_counter()
+            try:
+                if app is not None:
+                    with app.app_context():
+                        return fn(**kwargs)
+                return fn(**kwargs)
+            finally:
+                self._record(name, start, origin)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-stage") as executor:
+            while pending or running:
+                ready = [name for name, (_, deps) in pending.items() if all(dep in results for dep in deps)]
+                for name in ready:
+                    fn, deps = pending.pop(name)
+                    if on_stage_start:
+                        on_stage_start(name, len(results) / len(self._stages))
+                    running[executor.submit(propagate_token(execute), name, fn, {dep: results[dep] for dep in deps})] = name
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        logger.error(f"{self.name}: stage '{name}' failed: {error}")
+                        for other in running:
+                            other.cancel()
+                        raise error
+                    results[name] = future.result()
+
+        self._finish(origin)
+        return results
+
+    async def run_async(self, on_stage_start: Optional[Callable[[str, float], None]] = None) -> Dict[str, Any]:
+        """
+        Async counterpart of `run` for use on an event loop.
+
+        Coroutine-function stages run as tasks on the loop; plain stages run on
+        worker threads (inside the caller's app context, if any) so they do not
+        block it. At most `max_workers` stages run at once, and a failing stage
+        stops the scheduling of new ones exactly as in `run`.
+
+        Args:
+            on_stage_start: Optional callback receiving the stage name and the fraction
+                of stages already completed
+
+        Returns:
+            Dictionary mapping stage names to their results
+        """
+        self._validate()
+        app = current_app._get_current_object() if has_app_context() else None
+        results = {}
+        pending = dict(self._stages)
+        running = {}
+        origin = time.perf_counter()
+        self.timings = {}
+
+        def call_in_thread(fn, kwargs):
+            if app is not None:
+                with app.app_context():
+                    return fn(**kwargs)
+            return fn(**kwargs)
+
+        async def execute(name, fn, kwargs):
+            start = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    return await fn(**kwargs)
+                return await asyncio.to_thread(call_in_thread, fn, kwargs)
+            finally:
+                self._record(name, start, origin)
+
+        while pending or running:
+            ready = [name for name, (_, deps) in pending.items() if all(dep in results for dep in deps)]
+            for name in ready[:max(0, self.max_workers - len(running))]:
+                fn, deps = pending.pop(name)
+                if on_stage_start:
+                    on_stage_start(name, len(results) / len(self._stages))
+                task = asyncio.ensure_future(execute(name, fn, {dep: results[dep] for dep in deps}))
+                running[task] = name
+
+            finished, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                name = running.pop(task)
+                error = task.exception()
+                if error is not None:
+                    logger.error(f"{self.name}: stage '{name}' failed: {error}")
+                    if running:
+                        await asyncio.wait(list(running))
+                    raise error
+                results[name] = task.result()
+
+        self._finish(origin)
+        return results
+
+    def _record(self, name: str, start: float, origin: float) -> None:
+        end = time.perf_counter()
+        with self._lock:
+            self.timings[name] = {
+                "start": round(start - origin, 3),
+                "end": round(end - origin, 3),
+                "duration": round(end - start, 3)
+            }
+
+    def _finish(self, origin: float) -> None:
+        total = round(time.perf_counter() - origin, 3)
+        self.timings["total"] = {"start": 0.0, "end": total, "duration": total}
+        logger.info(f"{self.name} completed in {total}s; stage durations: "
+                    f"{ {name: t['duration'] for name, t in self.timings.items() if name != 'total'} }")
@@ -0,0 +1,210 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from ..config import logger
+from .cancellation import propagate_token
+
+
+class TestGenerationPipeline:
+    """
+    Dispatches unit and functional test generation per converted file.
+
+    Each Controller/Service file is submitted as soon as it is available and its
+    unit and functional test prompts run concurrently on a shared pool, so test
+    generation overlaps the rest of the conversion instead of following it.
+    `gather` merges the per-file results into the shapes `flatten_converted_code`
+    and the conversion response already expect.
+    """
+
+    def __init__(self, targets_fn: Callable[[List[Dict[str, Any]]], Dict[str, list]],
+                 unit_test_fn: Callable[[Dict[str, list]], Tuple[Any, Dict[str, Any]]],
+                 functional_test_fn: Callable[[Dict[str, list]], Dict[str, Any]],
+                 max_workers: int = 4):
+        """
+        Args:
+            targets_fn: Returns the {"Controllers": [...], "Services": [...]} test input for a list of files
+            unit_test_fn: Generates unit tests for a test input; returns (unit_test_code, unit_test_json)
+            functional_test_fn: Generates functional tests for a test input; returns the functional test JSON
+            max_workers: Maximum number of test generation calls in flight
+        """
+        self.targets_fn = targets_fn
+        self.unit_test_fn = unit_test_fn
+        self.functional_test_fn = functional_test_fn
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="test-gen")
+        self._submitted = []
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "TestGenerationPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(cancel=exc_type is not None)
+
+    def submit(self, file_info: Dict[str, Any]) -> bool:
+        """
+        Dispatch test generation for one converted file if it is a Controller or Service.
+
+        Args:
+            file_info: Converted file with file_name, path and content
+
+        Returns:
+            True if test generation was dispatched for the file
+        """
+        if not isinstance(file_info, dict):
+            return False
+        key = (file_info.get("path", ""), file_info.get("file_name", ""))
+        test_input = self.targets_fn([file_info])
+        if not any(test_input.values()):
+            return False
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            self._submitted.append((
+                file_info.get("file_name", ""),
+                self._executor.submit(propagate_token(self.unit_test_fn), test_input),
+                self._executor.submit(propagate_token(self.functional_test_fn), test_input)
+            ))
+        logger.info(f"Dispatched test generation for {file_info.get('file_name', '')}")
+        return True
+
+    def submit_all(self, converted_code: List[Dict[str, Any]]) -> int:
+        """Dispatch every file not submitted yet; returns how many were dispatched."""
+        return sum(1 for file_info in converted_code or [] if self.submit(file_info))
+
+    @property
+    def dispatched(self) -> int:
+        with self._lock:
+            return len(self._submitted)
+
+    def gather(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+        """
+        Wait for all dispatched work and merge the results in submission order.
+
+        Returns:
+            Tuple of (unit_test_code, unit_test_json, functional_test_json)
+        """
+        with self._lock:
+            submitted = list(self._submitted)
+        return merge_file_tests([
+            (file_name, unit_future.result(), functional_future.result())
+            for file_name, unit_future, functional_future in submitted
+        ])
+
+    def close(self, cancel: bool = False) -> None:
+        """Shut the pool down, optionally dropping work that has not started."""
+        self._executor.shutdown(wait=not cancel, cancel_futures=cancel)
+
+
+async def generate_tests_async(converted_code: List[Dict[str, Any]],
+                               targets_fn: Callable[[List[Dict[str, Any]]], Dict[str, list]],
+                               unit_test_fn: Callable[[Dict[str, list]], Awaitable[Tuple[Any, Dict[str, Any]]]],
+                               functional_test_fn: Callable[[Dict[str, list]], Awaitable[Dict[str, Any]]],
+                               max_workers: int = 4) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+    """
+    Async counterpart of TestGenerationPipeline for a finished conversion.
+
+    The unit and functional test coroutines of every Controller/Service file run
+    concurrently, at most `max_workers` at a time, and are merged like `gather`.
+
+    Args:
+        converted_code: Converted files with file_name, path and content
+        targets_fn: Returns the test input for a list of files
+        unit_test_fn: Coroutine function returning (unit_test_code, unit_test_json)
+        functional_test_fn: Coroutine function returning the functional test JSON
+        max_workers: Maximum number of test generation calls in flight
+
+    Returns:
+        Tuple of (unit_test_code, unit_test_json, functional_test_json)
+    """
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def bounded(fn, test_input):
+        async with semaphore:
+            return await fn(test_input)
+
+    files, seen = [], set()
+    for file_info in converted_code or []:
+        if not isinstance(file_info, dict):
+            continue
+        key = (file_info.get("path", ""), file_info.get("file_name", ""))
+        test_input = targets_fn([file_info])
+        if key in seen or not any(test_input.values()):
+            continue
+        seen.add(key)
+        files.append((file_info.get("file_name", ""), test_input))
+
+    results = await asyncio.gather(*(
+        asyncio.gather(bounded(unit_test_fn, test_input), bounded(functional_test_fn, test_input))
+        for _, test_input in files
+    ))
+    return merge_file_tests([
+        (file_name, unit, functional) for (file_name, _), (unit, functional) in zip(files, results)
+    ])
+
+
+def merge_file_tests(file_tests: List[Tuple[str, Tuple[Any, Dict[str, Any]], Dict[str, Any]]]
+                     ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+    """
+    Merge per-file test generation results in order.
+
+    Args:
+        file_tests: (file_name, (unit_test_code, unit_test_json), functional_test_json) per file
+
+    Returns:
+        Tuple of (unit_test_code, unit_test_json, functional_test_json)
+    """
+    unit_test_code, unit_reports, functional_reports = [], [], []
+    for file_name, (code, unit_json), functional_json in file_tests:
+        if isinstance(code, list):
+            unit_test_code.extend(code)
+        elif isinstance(code, str) and code.strip():
+            stem = file_name.rsplit(".", 1)[0] or "Generated"
+            unit_test_code.append({"fileName": f"{stem}Tests.cs", "content": code})
+        unit_reports.append(unit_json or {})
+        functional_reports.append(functional_json or {})
+
+    unit_test_json = merge_test_reports(unit_reports)
+    unit_test_json["unitTestFiles"] = unit_test_code
+    functional_test_json = merge_test_reports(functional_reports)
+    for index, test in enumerate(functional_test_json.get("functionalTests", []), start=1):
+        if isinstance(test, dict):
+            test["id"] = f"FT{index}"
+    logger.info(f"Gathered tests for {len(file_tests)} files: {len(unit_test_code)} unit test files, "
+                f"{len(functional_test_json.get('functionalTests', []))} functional tests")
+    return unit_test_code, unit_test_json, functional_test_json
+
+
+def merge_test_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-file test JSON responses into one.
+
+    Lists are concatenated, distinct strings are joined and other values keep the
+    first one seen.
+
+    Args:
+        reports: Parsed test generation responses
+
+    Returns:
+        Merged dictionary
+    """
+    merged = {}
+    for report in reports:
+        if not isinstance(report, dict):
+            continue
+        for key, value in report.items():
+            if isinstance(value, list):
+                merged.setdefault(key, [])
+                if isinstance(merged[key], list):
+                    merged[key].extend(item for item in value if item not in merged[key])
+            elif isinstance(value, str):
+                current = merged.get(key)
+                if not current:
+                    merged[key] = value
+                elif isinstance(current, str) and value and value not in current:
+                    merged[key] = f"{current}\n\n{value}"
+            else:
+                merged.setdefault(key, value)
+    return merged
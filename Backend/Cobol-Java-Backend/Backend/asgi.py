@@ -0,0 +1,82 @@
+"""
+ASGI entry point: uvicorn asgi:app --host 0.0.0.0 --port 8010
+
+The analysis and conversion pipelines run natively on the event loop under
+/cobo/async/..., so one worker keeps many LLM calls in flight without a thread
+per call. Every other route is served by the Flask app mounted behind it.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from app import create_app
+from app.config import logger, CLIENT_DISCONNECT_POLL_SECONDS
+from app.routes.analysis import ANALYSIS_JOB, AnalysisRequestError, run_requirements_analysis_async
+from app.routes.conversion import CONVERSION_JOB, ConversionRequestError, run_conversion_async
+from app.utils.cancellation import CancellationToken, OperationCancelled
+from app.utils.jobs import job_manager
+from app.utils.llm_client import aclose_async_llm_clients
+
+flask_app = create_app()
+
+
+async def watch_disconnect(request: Request, token: CancellationToken) -> None:
+    """Cancel `token` once the client of `request` has gone away."""
+    while not token.cancelled:
+        if await request.is_disconnected():
+            token.cancel("client disconnected")
+            return
+        await asyncio.sleep(CLIENT_DISCONNECT_POLL_SECONDS)
+
+
+async def run_pipeline(request: Request, kind: str, pipeline) -> JSONResponse:
+    """Run an async pipeline for the request's JSON body as a tracked job and return its result."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    project_id = data.get("projectId") if isinstance(data, dict) else None
+    # Stop spending LLM quota once the client has gone away or the deadline has passed
+    token = CancellationToken()
+    watcher = asyncio.ensure_future(watch_disconnect(request, token))
+    try:
+        with flask_app.app_context():
+            result = await job_manager.run_inline_async(kind, project_id, pipeline, data, token=token)
+        return JSONResponse(result)
+    except (AnalysisRequestError, ConversionRequestError, OperationCancelled) as e:
+        return JSONResponse({"error": e.message}, status_code=e.status_code)
+    except Exception as e:
+        logger.error(f"❌ {kind} failed: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        watcher.cancel()
+
+
+async def analyze_requirements(request: Request) -> JSONResponse:
+    """Run the requirements analysis pipeline on the event loop"""
+    return await run_pipeline(request, ANALYSIS_JOB, run_requirements_analysis_async)
+
+
+async def convert(request: Request) -> JSONResponse:
+    """Run the conversion pipeline on the event loop"""
+    return await run_pipeline(request, CONVERSION_JOB, run_conversion_async)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    logger.info("Starting COBOL Converter Application (ASGI)")
+    yield
+    await aclose_async_llm_clients()
+
+
+app = Starlette(
+    routes=[
+        Route("/cobo/async/analyze-requirements", analyze_requirements, methods=["POST"]),
+        Route("/cobo/async/convert", convert, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app))
+    ],
+    lifespan=lifespan
+)
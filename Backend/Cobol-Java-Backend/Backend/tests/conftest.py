@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tests import the backend as `app`, like main.py does; its logging writes to logs/ under the working directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.makedirs("logs", exist_ok=True)
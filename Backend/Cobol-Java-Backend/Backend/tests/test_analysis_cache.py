@@ -0,0 +1,152 @@
+"""Content-addressed cache of per-file analyses and its in-process memo."""
+
+import os
+import time
+
+import pytest
+
+from app.utils.analysis_cache import AnalysisMemo, FileAnalysisCache
+
+
+@pytest.fixture
+def project(tmp_path):
+    files = []
+    for name in ("A.cbl", "B.cbl", "C.cpy"):
+        path = tmp_path / "src" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"       PROGRAM-ID. {name}.\n", encoding="utf-8")
+        files.append(path)
+    return files
+
+
+def age(path, seconds=60):
+    """Move the mtime out of the racy window so the manifest may trust the file's stat."""
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_stored_analyses_are_found_after_reopening(tmp_path, project):
+    db = str(tmp_path / "cache" / "analyses.sqlite3")
+    with FileAnalysisCache(db, "1") as cache:
+        keys, found = cache.lookup(project)
+        assert found == {} and (cache.hits, cache.misses) == (0, 3)
+        cache.store({key: (f"payload {i}", "dep-hash" if i == 2 else "") for i, key in enumerate(keys)})
+
+    with FileAnalysisCache(db, "1") as cache:
+        again, found = cache.lookup(project)
+        assert again == keys
+        assert found == {keys[0]: ("payload 0", ""), keys[1]: ("payload 1", ""), keys[2]: ("payload 2", "dep-hash")}
+        assert (cache.hits, cache.misses) == (3, 0)
+
+
+def test_content_and_version_change_the_key(tmp_path, project):
+    db = str(tmp_path / "analyses.sqlite3")
+    with FileAnalysisCache(db, "1") as cache:
+        key = cache.make_key(project[0])
+        project[0].write_text("       PROGRAM-ID. CHANGED.\n", encoding="utf-8")
+        assert cache.make_key(project[0]) != key
+        other = cache.make_key(project[1])
+    with FileAnalysisCache(db, "2") as cache:
+        assert cache.make_key(project[1]) != other
+
+
+def test_manifest_skips_rehashing_unchanged_files(tmp_path, project):
+    db = str(tmp_path / "analyses.sqlite3")
+    path = project[0]
+    age(path)
+    with FileAnalysisCache(db, "1") as cache:
+        keys, _ = cache.lookup(project)
+        cache.store({})
+
+    # Same size and mtime: the stat is trusted and the file is not read again
+    stat = path.stat()
+    path.write_text(path.read_text(encoding="utf-8").replace("A", "Z"), encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with FileAnalysisCache(db, "1") as cache:
+        assert cache.make_key(path) == keys[0]
+
+
+def test_manifest_of_another_version_is_not_trusted(tmp_path, project):
+    db = str(tmp_path / "analyses.sqlite3")
+    for path in project:
+        age(path)
+    with FileAnalysisCache(db, "3+free") as cache:
+        keys, _ = cache.lookup(project)
+        cache.store({key: ("free payload", "") for key in keys})
+
+    with FileAnalysisCache(db, "3+free+copybooks") as cache:
+        other, found = cache.lookup(project)
+        assert not set(other) & set(keys)
+        assert found == {} and cache.misses == 3
+        cache.store({key: ("copybooks payload", "") for key in other})
+
+    with FileAnalysisCache(db, "3+free+copybooks") as cache:
+        again, found = cache.lookup(project)
+        assert again == other
+        assert {payload for payload, _ in found.values()} == {"copybooks payload"}
+
+
+def test_recently_modified_files_are_always_hashed(tmp_path, project):
+    db = str(tmp_path / "analyses.sqlite3")
+    path = project[0]
+    with FileAnalysisCache(db, "1") as cache:
+        keys, _ = cache.lookup(project)
+        cache.store({})
+
+    stat = path.stat()
+    path.write_text(path.read_text(encoding="utf-8").replace("A", "Z"), encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with FileAnalysisCache(db, "1") as cache:
+        assert cache.make_key(path) != keys[0]
+
+
+def test_excluded_keys_count_as_hits_without_fetching(tmp_path, project):
+    db = str(tmp_path / "analyses.sqlite3")
+    with FileAnalysisCache(db, "1") as cache:
+        keys, _ = cache.lookup(project)
+        cache.store({key: ("payload", "") for key in keys})
+        _, found = cache.lookup(project, exclude={keys[0]})
+        assert set(found) == {keys[1], keys[2]}
+        assert (cache.hits, cache.misses) == (3, 0)
+
+
+def test_unreadable_files_have_no_key(tmp_path, project):
+    with FileAnalysisCache(str(tmp_path / "analyses.sqlite3"), "1") as cache:
+        keys, _ = cache.lookup(project + [tmp_path / "src" / "MISSING.cbl"])
+        assert keys[3] is None
+        assert all(keys[:3])
+
+
+def test_store_drops_analyses_of_removed_files(tmp_path, project):
+    db = str(tmp_path / "analyses.sqlite3")
+    with FileAnalysisCache(db, "1") as cache:
+        keys, _ = cache.lookup(project)
+        cache.store({key: ("payload", "") for key in keys})
+    project[2].unlink()
+    with FileAnalysisCache(db, "1") as cache:
+        cache.lookup(project[:2])
+        cache.store({})
+        assert set(cache.get_many(keys)) == set(keys[:2])
+
+
+def test_memo_evicts_least_recently_used_by_payload_size():
+    memo = AnalysisMemo(max_bytes=10)
+    memo.put("a", {"file": "a"}, "1234", "")
+    memo.put("b", {"file": "b"}, "1234", "")
+    assert memo.get("a") == ({"file": "a"}, "1234", "")
+
+    memo.put("c", {"file": "c"}, "1234", "")
+    assert "a" in memo and "c" in memo and "b" not in memo
+
+    memo.put("huge", {}, "x" * 11, "")
+    assert "huge" not in memo
+
+    memo.discard("a")
+    memo.put("d", {"file": "d"}, "123456", "")
+    assert "c" in memo and "d" in memo and memo.get("a") is None
+
+
+def test_memo_disabled_with_zero_bytes():
+    memo = AnalysisMemo(max_bytes=0)
+    memo.put("a", {}, "payload", "")
+    assert memo.get("a") is None
@@ -0,0 +1,79 @@
+"""The token-based analyzer against the line-by-line baseline on randomly generated sources."""
+
+import random
+
+import pytest
+
+import baseline_cobol_analyzer
+from app.utils.cobol_analyzer import analyze_cobol_file
+
+PROGRAMS = 300
+SEED = 20240
+
+# Every kind of line the analyzer distinguishes, plus near misses. COPY statements always end on
+# their own line: one continued over several lines is a single copybook entry now (see below), and
+# lines the baseline crashed on (a bare COPY, PROGRAM-ID or "// DEFINE") are left out.
+LINES = [
+    "IDENTIFICATION DIVISION.", "ENVIRONMENT DIVISION.", "DATA DIVISION.", "PROCEDURE DIVISION.",
+    "PROCEDURE DIVISION USING LK-DATA.", "identification division.", "DATA DIVISION",
+    "WORKING-STORAGE SECTION.", "LINKAGE SECTION.", "FILE SECTION.", "LOCAL-STORAGE SECTION.",
+    "PROGRAM-ID. PROG{n}.", "PROGRAM-ID PROG{n}", "program-id. lower{n}.", "AUTHOR. SOMEONE.",
+    "COPY CUSTREC.", "COPY ACCT{n} REPLACING ==A== BY ==B==.", "copy lowrec.", "COPY-ITEM PIC X.",
+    "01 WS-GRP-{n}.", "05 WS-F{n} PIC 9(5) VALUE 0.", "77 WS-CNT{n} PIC S9(4) COMP.", "88 WS-OK-{n} VALUE 1.",
+    "10 WS-SUB{n} PIC X.", "010 ODD-LEVEL.", "01", "05 FILLER", "0500 NOT-A-LEVEL.",
+    "FD IN-FILE.", "SELECT IN-FILE ASSIGN TO DISK.",
+    "EXEC CICS READ FILE('X') INTO(WS) END-EXEC.", "EXEC CICS SEND MAP('M')", "EXEC CICS",
+    "EXEC CICS RETURN END-EXEC.", "MOVE 1 TO WS-CNT. EXEC CICS LINK PROGRAM('P') END-EXEC.",
+    "EXEC SQL SELECT 1 END-EXEC.", "END-EXEC.",
+    "PARA-{n}.", "MAIN-LOGIC SECTION.", "MOVE A TO B.", "PERFORM PARA-{n}.", "perform lower-case-para.",
+    "IF WS-OK-{n}", "ELSE", "END-IF.", "DISPLAY 'DIFFERENT'.", "DISPLAY 'MOVE'.", "COMPUTE X = Y + 1.",
+    "ADD 1 TO WS-CNT", "GOBACK.", "STOP RUN.", "EXIT.", "DEFINITELY-LAST.", "CONTINUE",
+    "* comment line", "*> inline comment", "//* jcl comment", "", "   ",
+]
+JCL_LINES = [
+    "//JOB{n} JOB (ACCT)", "//* comment", "//STEP{n} EXEC PGM=PROG{n}", "//IN DD DSN=A.B,DISP=SHR",
+    "//  DEFINE CLUSTER(NAME(X))", "//X", "//", "//SYSIN DD *", "NOT A JCL LINE", "",
+]
+INDENTS = ["", " ", "       ", "           ", "\t"]
+
+
+def random_source(rng, lines, length):
+    out = []
+    for _ in range(length):
+        line = rng.choice(lines).format(n=rng.randrange(100))
+        if rng.random() < 0.1:
+            line = line.lower()
+        out.append(rng.choice(INDENTS) + line + rng.choice(["", "", " "]))
+    return rng.choice(["\n", "\r\n"]).join(out)
+
+
+@pytest.mark.parametrize("suffix, lines", [(".cbl", LINES), (".cpy", LINES), (".jcl", JCL_LINES)])
+def test_matches_baseline_on_random_sources(tmp_path, suffix, lines):
+    rng = random.Random(f"{SEED}{suffix}")
+    for index in range(PROGRAMS):
+        path = tmp_path / f"P{index}{suffix}"
+        path.write_text(random_source(rng, lines, rng.randrange(1, 120)), encoding="utf-8")
+        expected = baseline_cobol_analyzer.analyze_cobol_file(path)
+        actual = analyze_cobol_file(path)
+        # Keys added since (e.g. copybook_dependencies) have no baseline to compare with
+        assert {key: actual[key] for key in expected} == expected, path.read_text(encoding="utf-8")
+
+
+def test_copy_statement_continued_over_lines_is_one_entry(tmp_path):
+    path = tmp_path / "MULTI.cbl"
+    path.write_text(
+        "       DATA DIVISION.\n"
+        "       WORKING-STORAGE SECTION.\n"
+        "       COPY CUSTREC\n"
+        "           REPLACING ==:PFX:== BY ==WS-==.\n"
+        "       01 WS-CNT PIC 9(4).\n",
+        encoding="utf-8"
+    )
+
+    analysis = analyze_cobol_file(path)
+
+    assert analysis["copybooks"] == [{
+        "name": "CUSTREC",
+        "content": "COPY CUSTREC REPLACING ==:PFX:== BY ==WS-==."
+    }]
+    assert analysis["variables"] == ["WS-CNT"]
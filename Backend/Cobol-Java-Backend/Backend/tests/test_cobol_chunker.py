@@ -0,0 +1,112 @@
+"""Splitting COBOL sources into prompt-sized chunks on DIVISION, SECTION and paragraph boundaries."""
+
+import re
+
+from app.utils.cobol_chunker import chunk_cobol_source, join_chunks
+
+
+def words(text):
+    """Token count stand-in that does not depend on a tokenizer download."""
+    return len(text.split())
+
+
+def program(name="PROG", paragraphs=8, statements=4):
+    lines = [
+        "       IDENTIFICATION DIVISION.",
+        f"       PROGRAM-ID. {name}.",
+        "       DATA DIVISION.",
+        "       WORKING-STORAGE SECTION.",
+        "       01 WS-CNT PIC 9(4).",
+        "       PROCEDURE DIVISION.",
+    ]
+    for p in range(paragraphs):
+        lines.append(f"       {name}-PARA-{p}.")
+        lines.extend(f"           ADD {s} TO WS-CNT." for s in range(statements))
+    return lines
+
+
+def test_no_procedure_division_returns_none():
+    source = "\n".join(program()[:5])
+    assert chunk_cobol_source(source, 100, count=words) is None
+
+
+def test_chunks_repeat_context_and_fit_budget():
+    source = "\n".join(program())
+    chunks = chunk_cobol_source(source, 40, count=words)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.context.endswith("PROCEDURE DIVISION.")
+        assert chunk == f"{chunk.context}\n{chunk.body}"
+        assert words(chunk) <= 40
+    assert join_chunks(chunks) == source
+
+
+def test_paragraphs_are_not_split():
+    chunks = chunk_cobol_source("\n".join(program()), 40, count=words)
+    for chunk in chunks:
+        first = chunk.body.splitlines()[0].strip()
+        assert first.startswith("PROG-PARA-") and first.endswith(".")
+        assert chunk.body.count("PARA-") * 4 == chunk.body.count("ADD ")
+
+
+def test_section_header_stays_with_its_paragraph():
+    lines = program(paragraphs=4)
+    lines.insert(lines.index("       PROG-PARA-2."), "       MAIN-LOGIC SECTION.")
+    chunks = chunk_cobol_source("\n".join(lines), 30, count=words)
+
+    section = next(chunk for chunk in chunks if "MAIN-LOGIC SECTION." in chunk.body)
+    assert section.body.splitlines()[:2] == ["       MAIN-LOGIC SECTION.", "       PROG-PARA-2."]
+
+
+def test_oversized_paragraph_is_split_at_sentence_ends():
+    chunks = chunk_cobol_source("\n".join(program(paragraphs=1, statements=30)), 40, count=words)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert words(chunk) <= 40
+        assert chunk.body.rstrip().endswith(".")
+
+
+def test_chunks_never_span_programs():
+    source = "\n".join(program("FIRST", paragraphs=3) + program("SECOND", paragraphs=3))
+    chunks = chunk_cobol_source(source, 1000, count=words)
+
+    assert len(chunks) == 2
+    assert "PROGRAM-ID. FIRST." in chunks[0].context and "SECOND" not in chunks[0]
+    assert "PROGRAM-ID. SECOND." in chunks[1].context and "FIRST" not in chunks[1]
+    assert join_chunks(chunks) == source
+
+
+def test_fixed_format_sequence_numbers():
+    lines = [f"{number:06d}{line[6:]}" for number, line in enumerate(program(paragraphs=6), start=1)]
+    lines.insert(8, "000000*    PROG-PARA-X.")
+    chunks = chunk_cobol_source("\n".join(lines), 80, count=words)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.context.endswith("PROCEDURE DIVISION.")
+        # The commented-out paragraph name does not start a chunk
+        assert re.fullmatch(r"\d{6} PROG-PARA-\d\.", chunk.body.splitlines()[0])
+
+
+def test_fixed_format_label_indented_within_area_a():
+    lines = [f"{number:06d}{line[6:]}" for number, line in enumerate(program(paragraphs=6), start=1)]
+    lines = [f"{line[:7]} {line[7:]}" if "PARA-" in line else line for line in lines]
+    chunks = chunk_cobol_source("\n".join(lines), 80, count=words)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert re.fullmatch(r"\d{6}  PROG-PARA-\d\.", chunk.body.splitlines()[0])
+
+
+def test_end_program_closes_a_program():
+    first = program("FIRST", paragraphs=3) + ["       END PROGRAM FIRST."]
+    second = ["      * The second program"] + program("SECOND", paragraphs=3) + ["       END PROGRAM SECOND."]
+    source = "\n".join(first + second)
+    chunks = chunk_cobol_source(source, 1000, count=words)
+
+    assert len(chunks) == 2
+    assert chunks[0].body.splitlines()[-1] == "       END PROGRAM FIRST."
+    assert chunks[1].context.startswith("      * The second program")
+    assert join_chunks(chunks) == source
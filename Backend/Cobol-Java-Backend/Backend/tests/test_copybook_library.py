@@ -0,0 +1,132 @@
+"""COPY statement parsing, REPLACING substitution and memoized copybook expansion."""
+
+import logging
+
+from app.utils.copybook_library import (
+    CopyStatement, apply_replacing, get_copybook_library, parse_copy_statement
+)
+
+
+def write(directory, name, *lines):
+    path = directory / f"{name}.cpy"
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def names(expanded):
+    return [(entry.copybook, entry.token.name) for entry in expanded.entries]
+
+
+def test_parse_copy_without_replacing():
+    assert parse_copy_statement("COPY CUSTREC.") == CopyStatement("CUSTREC")
+    assert parse_copy_statement("COPY 'CUSTREC' OF COPYLIB.") == CopyStatement("CUSTREC")
+
+
+def test_parse_replacing_operands():
+    statement = "COPY CUSTREC REPLACING ==:TAG:== BY ==WS-CUST== CUST-ID BY ACCOUNT-ID 'A' BY 'B'."
+
+    assert parse_copy_statement(statement) == CopyStatement("CUSTREC", (
+        (":TAG:", "WS-CUST", True),
+        ("CUST-ID", "ACCOUNT-ID", False),
+        ("'A'", "'B'", False),
+    ))
+
+
+def test_parse_leading_operand_as_pseudo_text():
+    statement = "COPY CUSTREC REPLACING LEADING ==CUST-== BY ==ACCT-==."
+
+    assert parse_copy_statement(statement).replacing == (("CUST-", "ACCT-", True),)
+
+
+def test_parse_stops_at_a_malformed_pair():
+    statement = "COPY CUSTREC REPLACING ==A== BY ==B== ==C== ==D==."
+
+    assert parse_copy_statement(statement).replacing == (("A", "B", True),)
+
+
+def test_pseudo_text_replaces_tag_prefixes():
+    text = "01 :TAG:-REC.\n   05 :TAG:-ID PIC X(4)."
+
+    assert apply_replacing(text, ((":TAG:", "WS-CUST", True),)) == "01 WS-CUST-REC.\n   05 WS-CUST-ID PIC X(4)."
+
+
+def test_word_operands_match_whole_words_only():
+    text = "05 CUST-ID PIC X.\n05 CUST-ID-OLD PIC X.\n05 OLD-CUST-ID PIC X."
+
+    assert apply_replacing(text, (("CUST-ID", "ACCOUNT-ID", False),)) == (
+        "05 ACCOUNT-ID PIC X.\n05 CUST-ID-OLD PIC X.\n05 OLD-CUST-ID PIC X."
+    )
+
+
+def test_replaced_text_is_not_replaced_again():
+    replacing = (("A-FIELD", "B-FIELD", False), ("B-FIELD", "C-FIELD", False))
+
+    assert apply_replacing("05 A-FIELD. 05 B-FIELD.", replacing) == "05 B-FIELD. 05 C-FIELD."
+
+
+def test_multi_word_pseudo_text_matches_any_spacing():
+    assert apply_replacing("PIC   X(4).", (("PIC X(4)", "PIC X(8)", True),)) == "PIC X(8)."
+
+
+def test_nested_copy_is_expanded_with_its_own_replacing(tmp_path):
+    write(tmp_path, "CUSTREC",
+          "01 :TAG:-REC.",
+          "   05 :TAG:-ID PIC X(4).",
+          "   COPY ADDRESS REPLACING ==:PFX:== BY ==:TAG:-ADDR==.")
+    write(tmp_path, "ADDRESS", "   05 :PFX:-LINE PIC X(30).")
+    library = get_copybook_library(tmp_path)
+
+    expanded = library.expand_statement("COPY CUSTREC REPLACING ==:TAG:== BY ==WS-CUST==.")
+
+    # The outer REPLACING applies to the nested COPY statement before it is expanded
+    assert names(expanded) == [
+        ("CUSTREC", "WS-CUST-REC"), ("CUSTREC", "WS-CUST-ID"), ("ADDRESS", "WS-CUST-ADDR-LINE"),
+    ]
+    assert expanded.dependencies == ("CUSTREC", "ADDRESS")
+
+
+def test_missing_copybooks_are_dependencies(tmp_path):
+    write(tmp_path, "CUSTREC", "01 CUST-REC.", "   COPY NOWHERE.")
+    library = get_copybook_library(tmp_path)
+
+    assert library.expand("NOWHERE") is None
+    expanded = library.expand("custrec")
+    assert names(expanded) == [("CUSTREC", "CUST-REC")]
+    assert expanded.dependencies == ("CUSTREC", "NOWHERE")
+
+
+def test_recursive_copy_is_not_expanded(tmp_path, caplog):
+    write(tmp_path, "LOOPA", "01 A-REC.", "   COPY LOOPB.")
+    write(tmp_path, "LOOPB", "   05 B-FIELD PIC X.", "   COPY LOOPA.")
+    library = get_copybook_library(tmp_path)
+
+    with caplog.at_level(logging.WARNING):
+        expanded = library.expand("LOOPA")
+
+    assert names(expanded) == [("LOOPA", "A-REC"), ("LOOPB", "B-FIELD")]
+    assert expanded.dependencies == ("LOOPA", "LOOPB")
+    assert "Copybook LOOPB copies LOOPA recursively" in caplog.text
+
+
+def test_expansions_are_memoized_per_replacing_set(tmp_path):
+    write(tmp_path, "CUSTREC", "01 :TAG:-REC.")
+    library = get_copybook_library(tmp_path)
+    ws = parse_copy_statement("COPY CUSTREC REPLACING ==:TAG:== BY ==WS==.").replacing
+    ls = parse_copy_statement("COPY CUSTREC REPLACING ==:TAG:== BY ==LS==.").replacing
+
+    first = library.expand("CUSTREC", ws)
+    assert library.expand("CUSTREC", ws) is first
+    assert library.expand_statement("COPY CUSTREC REPLACING ==:TAG:== BY ==WS==.") is first
+    other = library.expand("CUSTREC", ls)
+    assert other is not first and names(other) == [("CUSTREC", "LS-REC")]
+
+
+def test_library_is_rebuilt_only_when_copybooks_change(tmp_path):
+    path = write(tmp_path, "CUSTREC", "01 CUST-REC.")
+    library = get_copybook_library(tmp_path)
+    assert get_copybook_library(tmp_path) is library
+
+    path.write_text("01 CUST-RECORD.\n")
+    rebuilt = get_copybook_library(tmp_path)
+    assert rebuilt is not library
+    assert names(rebuilt.expand("CUSTREC")) == [("CUSTREC", "CUST-RECORD")]
@@ -0,0 +1,187 @@
+"""Offline batch runs on the local backend: id mapping, caching, input splitting and continuations."""
+
+import json
+
+import pytest
+
+from app.utils import llm_batch
+from app.utils.llm_batch import BatchBackend, BatchItem, BatchRunner, LocalBatchBackend
+from app.utils.llm_cache import LLMResponseCache
+
+
+def completion(body, content, finish_reason="stop"):
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": finish_reason,
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    }
+
+
+def echo(body):
+    """Answer every request with the text of its last message."""
+    return completion(body, f"answer to {body['messages'][-1]['content']}")
+
+
+def item(custom_id, text=None, **options):
+    return BatchItem(custom_id, "gpt-4o", [{"role": "user", "content": text or custom_id}], **options)
+
+
+class RecordingBackend(LocalBatchBackend):
+    """Local backend that keeps the input files it was given."""
+
+    def __init__(self, complete, **kwargs):
+        super().__init__(complete=complete, **kwargs)
+        self.inputs = []
+
+    def submit(self, input_path):
+        with open(input_path, encoding="utf-8") as f:
+            self.inputs.append((input_path, [json.loads(line) for line in f]))
+        return super().submit(input_path)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "responses.sqlite3"))
+    monkeypatch.setattr(llm_batch, "get_llm_cache", lambda: cache)
+    return cache
+
+
+def runner(tmp_path, backend, **options):
+    return BatchRunner(backend, work_dir=str(tmp_path / "batch"), poll_interval=0, **options)
+
+
+def content(response):
+    return response.choices[0].message.content
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        BatchBackend()
+
+
+def test_results_are_mapped_back_by_custom_id(tmp_path):
+    backend = RecordingBackend(echo, max_workers=4)
+    items = [item(f"program-{i}::chunk::0", f"chunk {i}") for i in range(10)]
+
+    results = runner(tmp_path, backend, use_cache=False).run(items, name="map")
+
+    assert list(results) == [i.custom_id for i in items]
+    assert all(content(results[f"program-{i}::chunk::0"]) == f"answer to chunk {i}" for i in range(10))
+    (_, lines), = backend.inputs
+    assert [line["custom_id"] for line in lines] == [i.custom_id for i in items]
+    assert lines[0]["url"] == "/chat/completions" and lines[0]["body"]["model"] == "gpt-4o"
+
+
+def test_cached_requests_are_not_submitted(tmp_path, cache):
+    first = RecordingBackend(echo)
+    runner(tmp_path, first).run([item("a"), item("b")])
+
+    second = RecordingBackend(echo)
+    results = runner(tmp_path, second).run([item("a"), item("b"), item("c")])
+
+    (_, lines), = second.inputs
+    assert [line["custom_id"] for line in lines] == ["c"]
+    assert {key: content(value) for key, value in results.items()} == {
+        "a": "answer to a", "b": "answer to b", "c": "answer to c"
+    }
+
+    third = RecordingBackend(echo)
+    runner(tmp_path, third).run([item("a"), item("c")])
+    assert third.inputs == []
+
+
+def test_input_files_are_split_by_request_count_and_size(tmp_path):
+    backend = RecordingBackend(echo)
+    items = [item(str(i)) for i in range(5)]
+    runner(tmp_path, backend, use_cache=False, max_requests=2).run(items)
+    assert [len(lines) for _, lines in backend.inputs] == [2, 2, 1]
+
+    backend = RecordingBackend(echo)
+    line_bytes = len((items[0].to_line() + "\n").encode("utf-8"))
+    results = runner(tmp_path, backend, use_cache=False, max_file_bytes=line_bytes * 3 - 1).run(items)
+    assert [len(lines) for _, lines in backend.inputs] == [2, 2, 1]
+    assert all(path.endswith(f"input-{n:04d}.jsonl") for n, (path, _) in enumerate(backend.inputs, start=1))
+    assert all(results.values())
+
+
+def test_truncated_reply_is_continued_and_stitched(tmp_path, cache):
+    parts = ["public class Account {", "\n    int Id;", "\n}"]
+
+    def complete(body):
+        partial = "".join(m["content"] for m in body["messages"] if m["role"] == "assistant")
+        index = next(i for i in range(len(parts)) if "".join(parts[:i]) == partial)
+        return completion(body, parts[index], "stop" if index == len(parts) - 1 else "length")
+
+    backend = RecordingBackend(complete)
+    request = item("account", response_format={"type": "json_object"}, max_tokens=100)
+    results = runner(tmp_path, backend).run([request, item("other")])
+
+    response = results["account"]
+    assert content(response) == "".join(parts)
+    assert response.choices[0].finish_reason == "stop"
+    assert response.usage.total_tokens == 45
+    paths = [path.rsplit("/", 1)[-1] for path, _ in backend.inputs]
+    assert paths == ["input-0001.jsonl", "continuation-1-0001.jsonl", "continuation-2-0001.jsonl"]
+    follow_up = backend.inputs[1][1][0]
+    assert follow_up["custom_id"] == "account" and "response_format" not in follow_up["body"]
+    assert follow_up["body"]["messages"][1] == {"role": "assistant", "content": parts[0]}
+    # Only the stitched, finished reply is cached under the original request
+    assert cache.get(request.cache_key())["choices"][0]["message"]["content"] == "".join(parts)
+
+
+def test_reply_still_truncated_after_the_last_round_is_kept(tmp_path, cache):
+    calls = []
+
+    def complete(body):
+        calls.append(body)
+        return completion(body, f"part{len(calls)} ", "length")
+
+    backend = RecordingBackend(complete)
+    request = item("long")
+
+    response = runner(tmp_path, backend, max_continuations=2).run([request])["long"]
+
+    assert content(response) == "part1 part2 part3 "
+    assert response.choices[0].finish_reason == "length"
+    assert len(backend.inputs) == 3
+    assert cache.get(request.cache_key()) is None
+
+
+def test_failed_requests_return_none(tmp_path, cache):
+    def complete(body):
+        if body["messages"][-1]["content"] == "bad":
+            raise RuntimeError("content filter")
+        return echo(body)
+
+    results = runner(tmp_path, RecordingBackend(complete)).run([item("bad"), item("good")])
+
+    assert results["bad"] is None
+    assert content(results["good"]) == "answer to good"
+    assert cache.get(item("bad").cache_key()) is None
+
+
+def test_expired_batch_keeps_the_results_it_has(tmp_path):
+    class ExpiringBackend(RecordingBackend):
+        """Reports the batch as expired with only part of its output, like the Batch API."""
+
+        def status(self, batch_id):
+            return "expired"
+
+        def results(self, batch_id):
+            return [line for line in super().results(batch_id) if line["custom_id"] != "late"]
+
+    results = runner(tmp_path, ExpiringBackend(echo), use_cache=False).run([item("early"), item("late")])
+
+    assert content(results["early"]) == "answer to early"
+    assert results["late"] is None
+
+
+def test_unfinished_batches_time_out(tmp_path):
+    class StuckBackend(RecordingBackend):
+        def status(self, batch_id):
+            return "in_progress"
+
+    results = runner(tmp_path, StuckBackend(echo), use_cache=False, timeout=0).run([item("a")])
+
+    assert results == {"a": None}
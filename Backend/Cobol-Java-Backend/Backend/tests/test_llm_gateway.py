@@ -0,0 +1,157 @@
+"""Continuation of truncated replies in the LLM gateway: stitching, overlap trimming, usage and limits."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+from app.utils import llm_gateway
+from app.utils.llm_cache import LLMResponseCache
+from app.utils.llm_gateway import (
+    CONTINUATION_PROMPT, chat_completion, chat_completion_async, continuation_request, trim_overlap
+)
+from app.utils.llm_usage import get_usage_stats, reset_usage_stats
+
+MODEL = "gateway-test"
+MESSAGES = [{"role": "user", "content": "Convert this program."}]
+
+
+def completion(content, finish_reason, prompt_tokens=10, completion_tokens=5):
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": MODEL,
+        "choices": [{"index": 0, "finish_reason": finish_reason,
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens}
+    })
+
+
+class FakeClient:
+    """Client that answers with scripted (content, finish_reason) replies and keeps the requests."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **request):
+        self.requests.append(request)
+        content, finish_reason = self.replies.pop(0)
+        return completion(content, finish_reason, prompt_tokens=10 * len(self.requests))
+
+
+class FakeAsyncClient(FakeClient):
+
+    async def create(self, **request):
+        return FakeClient.create(self, **request)
+
+
+@pytest.fixture(autouse=True)
+def usage():
+    reset_usage_stats()
+    yield
+    reset_usage_stats()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "responses.sqlite3"))
+    monkeypatch.setattr(llm_gateway, "get_llm_cache", lambda: cache)
+    return cache
+
+
+def content(response):
+    return response.choices[0].message.content
+
+
+def test_truncated_reply_is_continued_and_stitched(cache):
+    client = FakeClient(
+        ("public class Prog {\n    void run() {\n        total = total +", "length"),
+        ("        total = total + 1;\n    }\n}\n", "stop"),
+    )
+
+    response = chat_completion(client, MODEL, MESSAGES, max_tokens=1000,
+                               response_format={"type": "json_object"}, max_continuations=3)
+
+    assert content(response) == "public class Prog {\n    void run() {\n        total = total + 1;\n    }\n}\n"
+    assert response.choices[0].finish_reason == "stop"
+    assert response.usage.prompt_tokens == 30 and response.usage.completion_tokens == 10
+    assert get_usage_stats()[MODEL]["requests"] == 2
+
+    first, follow_up = client.requests
+    assert first["response_format"] == {"type": "json_object"}
+    assert "response_format" not in follow_up
+    assert follow_up["messages"] == MESSAGES + [
+        {"role": "assistant", "content": "public class Prog {\n    void run() {\n        total = total +"},
+        {"role": "user", "content": CONTINUATION_PROMPT},
+    ]
+    assert cache.stats()["entries"] == 1
+
+
+def test_max_continuations_zero_returns_the_truncated_reply(cache):
+    client = FakeClient(("partial", "length"))
+
+    response = chat_completion(client, MODEL, MESSAGES, max_continuations=0)
+
+    assert content(response) == "partial"
+    assert response.choices[0].finish_reason == "length"
+    assert len(client.requests) == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_reply_still_truncated_after_the_limit(cache):
+    client = FakeClient(("part one, ", "length"), ("part two, ", "length"), ("part three, ", "length"))
+
+    response = chat_completion(client, MODEL, MESSAGES, max_continuations=2)
+
+    assert content(response) == "part one, part two, part three, "
+    assert response.choices[0].finish_reason == "length"
+    assert response.usage.prompt_tokens == 60 and response.usage.completion_tokens == 15
+    assert len(client.requests) == 3 and not client.replies
+    # A reply that never finished is not replayed from the cache
+    assert cache.stats()["entries"] == 0
+
+
+def test_full_context_window_stops_continuing(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "get_context_window", lambda model: 50)
+    client = FakeClient(("partial", "length"), ("never sent", "stop"))
+
+    response = chat_completion(client, MODEL, MESSAGES, use_cache=False, max_continuations=3)
+
+    assert content(response) == "partial"
+    assert len(client.requests) == 1
+
+
+def test_async_truncated_reply_is_continued():
+    client = FakeAsyncClient(("SELECT A, B", "length"), (", C FROM T", "stop"))
+
+    response = asyncio.run(chat_completion_async(client, MODEL, MESSAGES, use_cache=False, max_continuations=1))
+
+    assert content(response) == "SELECT A, B, C FROM T"
+    assert response.choices[0].finish_reason == "stop"
+    assert response.usage.total_tokens == 40
+
+
+def test_continuation_budget_shrinks_to_the_room_left(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "get_context_window", lambda model: 2000)
+    request = {"model": MODEL, "messages": MESSAGES, "max_tokens": 4000}
+
+    follow_up = continuation_request(request, "partial answer")
+
+    assert 256 <= follow_up["max_tokens"] < 2000
+    assert request["messages"] == MESSAGES
+
+
+def test_trim_overlap_drops_repeated_text():
+    assert trim_overlap("MOVE A TO B.\n    MOVE C TO", "    MOVE C TO D.\n") == " D.\n"
+    # Overlaps of up to seven characters are too likely to be coincidental
+    assert trim_overlap("ADD 1 TO X", "TO X.") == "TO X."
+    assert trim_overlap("abc", "def") == "def"
+
+
+def test_trim_overlap_drops_a_reopened_code_fence():
+    previous = "```java\nclass A {\n"
+    assert trim_overlap(previous, "```java\n}\n```") == "}\n```"
+    # A fence after a closed block is kept
+    assert trim_overlap("```java\nclass A {}\n```\n", "```sql\nSELECT 1;\n```") == "```sql\nSELECT 1;\n```"
@@ -0,0 +1,141 @@
+"""Hedged LLM calls: duplicate after the group's latency percentile, budget cap, cancellation and failures."""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.utils.cancellation import OperationCancelled, cancellable_sleep
+from app.utils.llm_hedging import HedgePolicy
+
+GROUP = "chunk_conversion"
+HEDGE_DELAY = 0.05
+
+
+class Attempts:
+    """Fake `attempt` answering each deployment with a scripted (seconds, result or error)."""
+
+    def __init__(self, **plans):
+        self.plans = plans
+        self.started = []
+        self.cancelled = threading.Event()
+
+    def __call__(self, deployment):
+        self.started.append(deployment)
+        seconds, outcome = self.plans[deployment]
+        try:
+            cancellable_sleep(seconds)
+        except OperationCancelled:
+            self.cancelled.set()
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def run_async(self, deployment):
+        self.started.append(deployment)
+        seconds, outcome = self.plans[deployment]
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def policy(budget=1.0, samples=1):
+    """Policy that hedges GROUP calls still running after HEDGE_DELAY, on the "backup" deployment."""
+    policy = HedgePolicy(enabled=True, percentile=50, min_samples=1, min_delay=HEDGE_DELAY,
+                         budget=budget, deployments=["primary", "backup"])
+    for _ in range(samples):
+        policy.tracker(GROUP).record(HEDGE_DELAY)
+    return policy
+
+
+def test_calls_are_not_hedged_without_latency_samples():
+    hedging = policy(samples=0)
+    attempts = Attempts(primary=(0.1, "primary"), backup=(0, "backup"))
+
+    assert hedging.run(GROUP, "primary", attempts) == "primary"
+    assert attempts.started == ["primary"]
+    assert len(hedging.tracker(GROUP)) == 1 and hedging.stats["hedged"] == 0
+
+
+def test_fast_call_is_not_duplicated():
+    hedging = policy()
+    attempts = Attempts(primary=(0, "primary"), backup=(0, "backup"))
+
+    assert hedging.run(GROUP, "primary", attempts) == "primary"
+    assert attempts.started == ["primary"]
+
+
+def test_slow_primary_is_cancelled_when_the_hedge_wins():
+    hedging = policy()
+    attempts = Attempts(primary=(5, "primary"), backup=(0, "backup"))
+
+    assert hedging.run(GROUP, "primary", attempts) == "backup"
+    assert attempts.started == ["primary", "backup"]
+    assert attempts.cancelled.wait(2)
+    assert hedging.stats["hedged"] == 1 and hedging.stats["hedge_wins"] == 1
+
+
+def test_hedge_wins_after_the_primary_fails():
+    hedging = policy()
+    attempts = Attempts(primary=(0.15, RuntimeError("primary failed")), backup=(0.3, "backup"))
+
+    assert hedging.run(GROUP, "primary", attempts) == "backup"
+    assert hedging.stats["hedge_wins"] == 1
+
+
+def test_last_failure_is_raised_when_both_attempts_fail():
+    hedging = policy()
+    attempts = Attempts(primary=(0.1, RuntimeError("primary failed")), backup=(0.2, RuntimeError("hedge failed")))
+
+    with pytest.raises(RuntimeError, match="hedge failed"):
+        hedging.run(GROUP, "primary", attempts)
+    assert attempts.started == ["primary", "backup"]
+
+
+def test_hedges_are_capped_by_the_budget():
+    hedging = policy(budget=0.5)
+    attempts = Attempts(primary=(0.15, "primary"), backup=(0, "backup"))
+
+    # One hedge would be 100% of one call
+    assert hedging.run(GROUP, "primary", attempts) == "primary"
+    assert attempts.started == ["primary"]
+    assert hedging.stats["budget_exhausted"] == 1
+
+    # One hedge in two calls fits a 50% budget
+    assert hedging.run(GROUP, "primary", attempts) == "backup"
+    assert hedging.stats == {"calls": 2, "hedged": 1, "hedge_wins": 1, "budget_exhausted": 1}
+
+    assert hedging.run(GROUP, "primary", attempts) == "primary"
+    assert hedging.stats["budget_exhausted"] == 2
+
+
+def test_hedge_goes_to_the_primary_without_alternates():
+    hedging = policy()
+    hedging.deployments = []
+    attempts = Attempts(primary=(0.2, "primary"))
+
+    assert hedging.run(GROUP, "primary", attempts) == "primary"
+    assert attempts.started == ["primary", "primary"]
+
+
+def test_async_slow_primary_is_cancelled_when_the_hedge_wins():
+    hedging = policy()
+    attempts = Attempts(primary=(5, "primary"), backup=(0, "backup"))
+
+    assert asyncio.run(hedging.run_async(GROUP, "primary", attempts.run_async)) == "backup"
+    assert attempts.cancelled.is_set()
+    assert hedging.stats["hedge_wins"] == 1
+
+
+def test_async_last_failure_is_raised_when_both_attempts_fail():
+    hedging = policy()
+    attempts = Attempts(primary=(0.1, RuntimeError("primary failed")), backup=(0.2, RuntimeError("hedge failed")))
+
+    with pytest.raises(RuntimeError, match="hedge failed"):
+        asyncio.run(hedging.run_async(GROUP, "primary", attempts.run_async))
@@ -0,0 +1,206 @@
+"""Deployment pool routing: member choice, failover, cooldowns and backoff, driven through chat_completion."""
+
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+from app.utils import llm_router
+from app.utils.llm_gateway import chat_completion
+from app.utils.llm_router import QUOTA_AWARE, configure_routers, get_router
+
+MESSAGES = [{"role": "user", "content": "Convert this program"}]
+
+
+class APIStatusError(Exception):
+    """Stand-in for an SDK error carrying an HTTP status and response headers."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FakeClient:
+    """Chat client of one endpoint; replays the scripted outcomes, then succeeds."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.outcomes = []
+        self.calls = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **request):
+        self.calls.append(request)
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        return ChatCompletion.model_validate({
+            "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": request["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"from {self.endpoint}"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+@pytest.fixture
+def pool():
+    """Configure a two-member pool "a"/"b" with fake clients; limiter names are unique per test."""
+    suffix = uuid.uuid4().hex[:8]
+    model = f"pool-{suffix}"
+    clients = {}
+
+    def client_factory(endpoint, api_key, api_version):
+        return clients.setdefault(endpoint, FakeClient(endpoint))
+
+    def build(**members):
+        entries = [{"name": f"{name}-{suffix}", "model": model, "deployment": f"dep-{name}",
+                    "endpoint": f"https://{name}.example", "api_key": "key", **options}
+                   for name, options in (members or {"a": {}, "b": {}}).items()]
+        configure_routers(entries, client_factory=client_factory)
+        router = get_router(model)
+        members_by_name = {d.deployment[len("dep-"):]: d for d in router.deployments}
+        fakes = {name: d.client for name, d in members_by_name.items()}
+        return SimpleNamespace(model=model, router=router, members=members_by_name, clients=fakes)
+
+    yield build
+    configure_routers([])
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the router's backoff waits instead of sleeping."""
+    recorded = []
+    monkeypatch.setattr(llm_router, "cancellable_sleep", recorded.append)
+    return recorded
+
+
+def complete(model):
+    return chat_completion(None, model, MESSAGES, use_cache=False, max_continuations=0)
+
+
+def test_least_loaded_prefers_faster_and_less_busy_member(pool):
+    p = pool()
+    p.members["a"].latency, p.members["b"].latency = 2.0, 0.5
+    assert p.router.choose() is p.members["b"]
+
+    p.members["a"].latency = p.members["b"].latency = 1.0
+    with p.members["b"].limiter.slot(), p.members["b"].limiter.slot():
+        assert p.router.choose() is p.members["a"]
+
+
+def test_least_loaded_weighs_capacity(pool):
+    p = pool(a={"weight": 1.0}, b={"weight": 4.0})
+    with p.members["b"].limiter.slot():
+        assert p.router.choose() is p.members["b"]
+
+
+def test_quota_aware_prefers_member_with_budget(pool):
+    p = pool(a={"rpm": 1}, b={})
+    p.members["a"].latency, p.members["b"].latency = 0.1, 3.0
+    p.members["a"].limiter.requests.reserve(1)
+    assert p.router.choose() is p.members["a"]
+
+    p.router.strategy = QUOTA_AWARE
+    assert p.router.choose() is p.members["b"]
+
+
+def test_call_goes_to_deployment_name_of_member(pool):
+    p = pool(a={}, b={"weight": 0.01})
+    response = complete(p.model)
+    assert response.choices[0].message.content == "from https://a.example"
+    assert p.clients["a"].calls[0]["model"] == "dep-a"
+    assert p.members["a"].stats["calls"] == 1
+
+
+@pytest.mark.parametrize("status", [429, 503, 401, 403, 404])
+def test_failover_to_next_member(pool, sleeps, status):
+    p = pool(a={"weight": 4.0}, b={})
+    p.clients["a"].outcomes = [APIStatusError(status)]
+
+    response = complete(p.model)
+
+    assert response.choices[0].message.content == "from https://b.example"
+    assert len(p.clients["a"].calls) == 1
+    assert sleeps == []
+    assert not p.members["a"].healthy
+    assert p.members["a"].stats["failovers"] == 1
+    # The failed member stays out of rotation for the next call
+    complete(p.model)
+    assert len(p.clients["a"].calls) == 1
+    assert len(p.clients["b"].calls) == 2
+
+
+def test_non_retryable_error_is_raised_without_failover(pool):
+    p = pool(a={"weight": 4.0}, b={})
+    p.clients["a"].outcomes = [APIStatusError(400)]
+
+    with pytest.raises(APIStatusError):
+        complete(p.model)
+    assert p.clients["b"].calls == []
+    assert p.members["a"].healthy
+
+
+def test_cooldown_doubles_with_consecutive_failures(pool):
+    p = pool()
+    member = p.members["a"]
+    p.router.cooldown, p.router.max_cooldown = 1.0, 5.0
+    error = APIStatusError(429)
+
+    pauses = [member.on_failure(error, p.router.cooldown, p.router.max_cooldown) for _ in range(4)]
+    assert pauses == [1.0, 2.0, 4.0, 5.0]
+    assert member.unhealthy_until > time.monotonic() + 4.0
+
+    # Retry-After longer than the cooldown wins; a success resets the streak
+    assert member.on_failure(APIStatusError(429, {"retry-after": "30"}), 1.0, 60.0) == 30.0
+    member.on_success(0.2)
+    assert member.healthy and member.consecutive_failures == 0
+    assert member.on_failure(error, 1.0, 60.0) == 1.0
+
+
+def test_all_members_failed_backs_off_before_next_round(pool, sleeps):
+    p = pool()
+    p.clients["a"].outcomes = [APIStatusError(429)]
+    p.clients["b"].outcomes = [APIStatusError(429)]
+
+    response = complete(p.model)
+
+    assert response.choices[0].finish_reason == "stop"
+    assert len(sleeps) == 1
+    assert len(p.clients["a"].calls) + len(p.clients["b"].calls) == 3
+    assert sum(d.stats["failovers"] for d in p.router.deployments) == 1
+
+
+def test_backoff_honours_retry_after(pool, sleeps):
+    p = pool()
+    p.clients["a"].outcomes = [APIStatusError(429, {"retry-after": "0.2"})]
+    p.clients["b"].outcomes = [APIStatusError(429, {"retry-after": "0.2"})]
+
+    complete(p.model)
+
+    assert len(sleeps) == 1 and sleeps[0] >= 0.2
+
+
+def test_all_members_misconfigured_gives_up(pool, sleeps):
+    p = pool()
+    p.clients["a"].outcomes = [APIStatusError(401)]
+    p.clients["b"].outcomes = [APIStatusError(401)]
+
+    with pytest.raises(APIStatusError):
+        complete(p.model)
+    assert sleeps == []
+    assert len(p.clients["a"].calls) == len(p.clients["b"].calls) == 1
+
+
+def test_gives_up_after_max_retries(pool, sleeps):
+    p = pool()
+    p.router.max_retries = 3
+    p.clients["a"].outcomes = [APIStatusError(503)] * 10
+    p.clients["b"].outcomes = [APIStatusError(503)] * 10
+
+    with pytest.raises(APIStatusError):
+        complete(p.model)
+    assert len(p.clients["a"].calls) + len(p.clients["b"].calls) == 4
+    assert len(sleeps) == 1
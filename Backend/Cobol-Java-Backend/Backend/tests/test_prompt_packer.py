@@ -0,0 +1,87 @@
+"""Token budgets: context windows, deterministic truncation and priority packing of prompt sections."""
+
+import pytest
+
+from app.utils import prompt_packer
+from app.utils.prompt_packer import (
+    PromptSection, TRIM_ENDS, TRIM_HEAD, TRIM_TAIL,
+    count_tokens, get_context_window, get_prompt_budget, pack_sections, truncate_to_tokens
+)
+
+TEXT = " ".join(f"word{i}" for i in range(2000))
+
+
+def test_context_window_by_longest_prefix_and_override(monkeypatch):
+    assert get_context_window("gpt-4o-mini-prod") == 128000
+    assert get_context_window("gpt-4-32k-east") == 32768
+    assert get_context_window("gpt-4") == 8192
+    assert get_context_window("custom-deployment") == prompt_packer.LLM_DEFAULT_CONTEXT_WINDOW
+
+    monkeypatch.setitem(prompt_packer.LLM_CONTEXT_WINDOWS, "custom-deployment", 4096)
+    assert get_context_window("custom-deployment") == 4096
+
+
+def test_prompt_budget_is_never_negative():
+    assert get_prompt_budget("gpt-4", 4000, 1000) == 8192 - 5000
+    assert get_prompt_budget("gpt-4", 8000, 1000) == 0
+
+
+def test_truncate_keeps_text_within_budget():
+    assert truncate_to_tokens(TEXT, count_tokens(TEXT)) == TEXT
+    assert truncate_to_tokens(TEXT, 0) == ""
+
+    for mode in (TRIM_HEAD, TRIM_TAIL, TRIM_ENDS):
+        result = truncate_to_tokens(TEXT, 300, mode=mode)
+        assert count_tokens(result) <= 300
+        assert "tokens truncated to fit the context budget" in result
+        assert result == truncate_to_tokens(TEXT, 300, mode=mode)
+
+
+def test_truncate_modes_keep_their_end():
+    head = truncate_to_tokens(TEXT, 300, mode=TRIM_HEAD)
+    tail = truncate_to_tokens(TEXT, 300, mode=TRIM_TAIL)
+    ends = truncate_to_tokens(TEXT, 300, mode=TRIM_ENDS)
+
+    assert head.startswith("word0 word1") and "word1999" not in head
+    assert tail.endswith("word1998 word1999") and "word0 " not in tail
+    assert ends.startswith("word0 word1") and ends.endswith("word1999")
+    assert ends.count("tokens truncated to fit the context budget") == 2
+
+
+def test_pack_sections_fills_by_priority():
+    sections = [
+        PromptSection("context", TEXT, priority=2),
+        PromptSection("instructions", "Convert the program.", priority=0),
+        PromptSection("source", TEXT[:3000], priority=1),
+    ]
+    source_tokens = count_tokens(TEXT[:3000])
+    budget = count_tokens("Convert the program.") + source_tokens + 200
+
+    packed = pack_sections(sections, budget)
+
+    assert list(packed.sections) == ["context", "instructions", "source"]
+    assert packed["instructions"] == "Convert the program."
+    assert packed["source"] == TEXT[:3000]
+    assert packed["context"].startswith("word0")
+    assert set(packed.trimmed) == {"context"} and packed.dropped == []
+    assert packed.tokens <= budget
+
+
+def test_pack_sections_drops_below_min_tokens():
+    sections = [
+        PromptSection("source", TEXT[:3000], priority=0),
+        PromptSection("examples", TEXT, priority=1, min_tokens=500),
+        PromptSection("notes", "Keep names.", priority=2),
+    ]
+    packed = pack_sections(sections, count_tokens(TEXT[:3000]) + 100)
+
+    assert packed["examples"] == "" and packed.dropped == ["examples"]
+    assert packed["notes"] == "Keep names."
+    assert packed["missing"] == ""
+
+
+@pytest.mark.parametrize("budget", [0, -5])
+def test_pack_sections_without_budget_drops_everything(budget):
+    packed = pack_sections([PromptSection("a", "text"), PromptSection("b", "more text")], budget)
+    assert packed.sections == {"a": "", "b": ""}
+    assert packed.dropped == ["a", "b"]
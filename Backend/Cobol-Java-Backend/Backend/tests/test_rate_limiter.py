@@ -0,0 +1,207 @@
+"""Rate limiter budgets, adaptive concurrency and retry backoff, on an injected clock."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import rate_limiter
+from app.utils.rate_limiter import AdaptiveRateLimiter, TokenBucket
+
+
+class APIStatusError(Exception):
+    """Stand-in for an SDK error carrying an HTTP status and response headers."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class Clock:
+    """Monotonic clock that only moves when the limiter sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def sleep_async(self, seconds):
+        self.sleep(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    monkeypatch.setattr(rate_limiter, "cancellable_sleep", clock.sleep)
+    monkeypatch.setattr(rate_limiter, "cancellable_sleep_async", clock.sleep_async)
+    # Jitter always picks the top of its range
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def failing(*errors, result="ok"):
+    """Callable raising each error in turn, then returning `result`; counts its calls."""
+    outcomes = list(errors)
+
+    def fn():
+        fn.calls += 1
+        if outcomes:
+            raise outcomes.pop(0)
+        return result
+    fn.calls = 0
+    return fn
+
+
+def test_token_bucket_goes_into_debt_and_refills(clock):
+    bucket = TokenBucket(600)
+
+    assert bucket.reserve(600) == 0.0
+    assert bucket.reserve(300) == pytest.approx(30.0)
+    clock.now += 10
+    assert bucket.wait_for(1) == pytest.approx(20.1)
+    # The real usage was lower than reserved
+    bucket.adjust(-300)
+    assert bucket.wait_for(1) == 0.0
+
+
+def test_oversized_reservation_is_capped_at_capacity(clock):
+    bucket = TokenBucket(600)
+
+    assert bucket.reserve(10_000) == 0.0
+    assert bucket.wait_for(10_000) == pytest.approx(60.0)
+
+
+def test_requests_per_minute_budget(clock):
+    limiter = AdaptiveRateLimiter("rpm-test", rpm=60)
+
+    for _ in range(60):
+        limiter.call(lambda: "ok")
+    assert clock.sleeps == []
+    assert limiter.expected_wait() == pytest.approx(1.0)
+
+    limiter.call(lambda: "ok")
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_tokens_per_minute_budget_is_settled_with_real_usage(clock):
+    limiter = AdaptiveRateLimiter("tpm-test", tpm=1200)
+
+    limiter.call(lambda: 400, estimated_tokens=1000, usage_tokens=lambda used: used)
+    # 1000 estimated, 400 used: 800 of 1200 left
+    assert limiter.expected_wait(800) == 0.0
+    assert limiter.expected_wait(900) == pytest.approx(5.0)
+
+    limiter.call(lambda: 900, estimated_tokens=900)
+    assert clock.sleeps == [pytest.approx(5.0)]
+
+
+def test_concurrency_is_halved_on_throttling_and_grows_back(clock):
+    limiter = AdaptiveRateLimiter("aimd-test", max_concurrency=8, min_concurrency=2)
+
+    limiter.on_throttle(None)
+    assert limiter.concurrency_limit == 4
+    limiter.on_throttle(None)
+    limiter.on_throttle(None)
+    assert limiter.concurrency_limit == 2
+
+    # About one slot per window of concurrency_limit successful calls
+    limiter.on_success()
+    limiter.on_success()
+    assert limiter.concurrency_limit == 2
+    limiter.on_success()
+    assert limiter.concurrency_limit == 3
+    for _ in range(50):
+        limiter.on_success()
+    assert limiter.concurrency_limit == 8
+
+
+def test_callers_wait_for_a_free_slot():
+    limiter = AdaptiveRateLimiter("slot-test", max_concurrency=2)
+    entered = threading.Event()
+
+    def third():
+        with limiter.slot():
+            entered.set()
+
+    with limiter.slot():
+        with limiter.slot():
+            waiter = threading.Thread(target=third)
+            waiter.start()
+            assert not entered.wait(0.2)
+            assert limiter.in_flight == 2
+        assert entered.wait(2)
+    waiter.join()
+    assert limiter.in_flight == 0
+
+
+def test_retry_after_is_honoured_and_pauses_the_deployment(clock):
+    limiter = AdaptiveRateLimiter("retry-after-test", max_concurrency=4, base_delay=0.5)
+    fn = failing(APIStatusError(429, {"retry-after": "7"}))
+
+    assert limiter.call(fn) == "ok"
+    # Retry-After plus up to base_delay of jitter
+    assert clock.sleeps == [7.5]
+    assert fn.calls == 2
+    assert limiter.concurrency_limit == 2
+    assert limiter.stats["throttled"] == 1 and limiter.stats["retries"] == 1
+
+    limiter.on_throttle(3.0)
+    assert limiter.expected_wait() == pytest.approx(3.0)
+
+
+def test_retry_after_ms_header(clock):
+    limiter = AdaptiveRateLimiter("retry-after-ms-test", base_delay=0)
+
+    limiter.call(failing(APIStatusError(503, {"retry-after-ms": "250"})))
+
+    assert clock.sleeps == [0.25]
+
+
+def test_exponential_backoff_is_capped(clock):
+    limiter = AdaptiveRateLimiter("backoff-test", base_delay=1.0, max_delay=3.0)
+
+    limiter.call(failing(*(APIStatusError(500) for _ in range(4))))
+
+    assert clock.sleeps == [1.0, 2.0, 3.0, 3.0]
+    # Server errors are retried without cutting concurrency
+    assert limiter.stats["throttled"] == 0
+
+
+def test_non_retryable_errors_are_raised_at_once(clock):
+    limiter = AdaptiveRateLimiter("bad-request-test")
+    fn = failing(APIStatusError(400))
+
+    with pytest.raises(APIStatusError):
+        limiter.call(fn)
+    assert fn.calls == 1 and clock.sleeps == []
+
+
+def test_retries_are_exhausted(clock):
+    limiter = AdaptiveRateLimiter("exhausted-test", max_retries=2)
+    fn = failing(*(APIStatusError(502) for _ in range(5)))
+
+    with pytest.raises(APIStatusError):
+        limiter.call(fn)
+    assert fn.calls == 3 and len(clock.sleeps) == 2
+    assert limiter.stats["failures"] == 1
+
+
+def test_async_calls_share_the_retry_logic(clock):
+    limiter = AdaptiveRateLimiter("async-test", base_delay=0)
+    fn = failing(APIStatusError(429, {"retry-after": "2"}))
+
+    async def attempt():
+        return fn()
+
+    assert asyncio.run(limiter.acall(attempt)) == "ok"
+    assert clock.sleeps == [2.0]
+    assert limiter.in_flight == 0
@@ -0,0 +1,78 @@
+"""Block-wise reading of memory-mapped sources: lines and counts match reading the whole text."""
+
+import pytest
+
+from app.utils.source_reader import BLOCK_SIZE, SourceFile, count_lines
+
+CONTENTS = {
+    "lf": "IDENTIFICATION DIVISION.\nPROGRAM-ID. PROG.\n\nPROCEDURE DIVISION.\n",
+    "crlf": "IDENTIFICATION DIVISION.\r\nPROGRAM-ID. PROG.\r\n\r\nPROCEDURE DIVISION.\r\n",
+    "no_final_break": "01 WS-A PIC X.\n01 WS-B PIC X.",
+    "long_line": "SHORT.\n" + "X" * 50 + "\nTAIL.\n",
+    "utf8": "* Überweisung – Kontostand €\nMOVE 'ÄÖÜ' TO WS-NAME.\n* 日本語のコメント\n",
+    "blank_lines": "\n\n\nA.\n\n",
+    "empty": "",
+}
+BLOCK_SIZES = [1, 4, 16, 64, BLOCK_SIZE]
+
+
+@pytest.fixture(params=sorted(CONTENTS))
+def source(request, tmp_path):
+    path = tmp_path / f"{request.param}.cbl"
+    path.write_bytes(CONTENTS[request.param].encode("utf-8"))
+    return path
+
+
+@pytest.mark.parametrize("block_size", BLOCK_SIZES)
+def test_lines_match_the_whole_text(source, block_size):
+    expected = source.read_text(encoding="utf-8").splitlines()
+
+    with SourceFile(source) as reader:
+        assert list(reader.lines(block_size)) == expected
+        assert reader.line_count == len(expected)
+
+
+@pytest.mark.parametrize("block_size", BLOCK_SIZES)
+def test_blocks_end_on_line_breaks(source, block_size):
+    data = source.read_bytes()
+
+    with SourceFile(source) as reader:
+        blocks = list(reader.blocks(block_size))
+
+    assert "".join(blocks) == data.decode("utf-8")
+    assert all(block.endswith("\n") for block in blocks[:-1])
+    # Blocks only outgrow the block size to finish a line that is longer than it
+    for block in blocks:
+        encoded = block.encode("utf-8")
+        assert len(encoded) <= block_size or b"\n" not in encoded[:-1]
+
+
+def test_line_count_covers_the_lines_read_so_far(tmp_path):
+    path = tmp_path / "partial.cbl"
+    path.write_text("A.\nB.\nC.\n")
+
+    with SourceFile(path) as reader:
+        lines = reader.lines(block_size=3)
+        assert next(lines) == "A."
+        lines.close()
+        assert reader.line_count == 1
+
+
+def test_fixed_format_code_lines_skip_comments(tmp_path):
+    path = tmp_path / "fixed.cbl"
+    path.write_text(
+        "000100 IDENTIFICATION DIVISION.                                         PROG0001\n"
+        "000200*    A COMMENT\n"
+        "000300/\n"
+        "000400 PROGRAM-ID. PROG.\n"
+    )
+
+    with SourceFile(path) as reader:
+        assert [line.rstrip() for line in reader.code_lines(fixed_format=True)] == [
+            "IDENTIFICATION DIVISION.", "PROGRAM-ID. PROG.",
+        ]
+
+
+def test_count_lines_counts_like_split():
+    for text in CONTENTS.values():
+        assert count_lines(text) == len(text.split("\n"))
@@ -0,0 +1,105 @@
+"""Dependency-ordered, concurrent execution of pipeline stages."""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.utils.stage_graph import StageGraph
+
+
+def test_results_are_passed_by_dependency_name():
+    graph = (StageGraph("test")
+             .add("source", lambda: 2)
+             .add("double", lambda source: source * 2, depends_on=["source"])
+             .add("sum", lambda source, double: source + double, depends_on=["source", "double"]))
+
+    assert graph.run() == {"source": 2, "double": 4, "sum": 6}
+    assert set(graph.timings) == {"source", "double", "sum", "total"}
+    assert graph.timings["double"]["start"] >= graph.timings["source"]["end"]
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = (StageGraph("test", max_workers=2)
+             .add("business", lambda: barrier.wait() is not None)
+             .add("technical", lambda: barrier.wait() is not None)
+             .add("report", lambda business, technical: business and technical,
+                  depends_on=["business", "technical"]))
+
+    assert graph.run()["report"] is True
+
+
+def test_on_stage_start_reports_progress():
+    started = []
+    graph = StageGraph("test").add("a", lambda: 1).add("b", lambda a: a, depends_on=["a"])
+
+    graph.run(on_stage_start=lambda name, progress: started.append((name, progress)))
+
+    assert started == [("a", 0.0), ("b", 0.5)]
+
+
+@pytest.mark.parametrize("build, message", [
+    (lambda g: g.add("a", lambda b: b, depends_on=["b"]), "unknown stage 'b'"),
+    (lambda g: g.add("a", lambda b: b, depends_on=["b"]).add("b", lambda a: a, depends_on=["a"]), "cycle"),
+])
+def test_invalid_graphs_are_rejected_before_running(build, message):
+    graph = build(StageGraph("test").add("first", pytest.fail))
+    with pytest.raises(ValueError, match=message):
+        graph.run()
+
+
+def test_duplicate_stage_is_rejected():
+    graph = StageGraph("test").add("a", lambda: 1)
+    with pytest.raises(ValueError, match="already declared"):
+        graph.add("a", lambda: 2)
+
+
+def test_failing_stage_stops_dependents():
+    ran = []
+
+    def fail():
+        raise RuntimeError("model unavailable")
+
+    graph = (StageGraph("test")
+             .add("analysis", fail)
+             .add("conversion", lambda analysis: ran.append("conversion"), depends_on=["analysis"]))
+
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        graph.run()
+    assert ran == []
+
+
+def test_run_async_mixes_coroutine_and_thread_stages():
+    async def fetch():
+        await asyncio.sleep(0)
+        return "structure"
+
+    graph = (StageGraph("test")
+             .add("structure", fetch)
+             .add("requirements", lambda: "requirements")
+             .add("prompt", lambda structure, requirements: f"{structure}+{requirements}",
+                  depends_on=["structure", "requirements"]))
+
+    results = asyncio.run(graph.run_async())
+
+    assert results["prompt"] == "structure+requirements"
+    assert "total" in graph.timings
+
+
+def test_run_async_respects_max_workers():
+    running, peak = [0], [0]
+
+    async def stage():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    graph = StageGraph("test", max_workers=2)
+    for name in "abcde":
+        graph.add(name, stage)
+
+    asyncio.run(graph.run_async())
+
+    assert peak[0] == 2